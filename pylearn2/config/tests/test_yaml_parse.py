@@ -5,6 +5,7 @@ Unit tests for ./yaml_parse.py
 from __future__ import print_function
 
 import os
+import shutil
 import numpy as np
 from theano.compat import six
 from theano.compat.six.moves import cPickle
@@ -283,6 +284,34 @@ def test_instantiate_regression():
     assert obj['a'] is obj['b']
 
 
+def test_parse_cache():
+    """
+    Test that parsed configurations are cached in PYLEARN2_YAML_CACHE and
+    that the cache gives back the same objects.
+    """
+    cache_dir = tempfile.mkdtemp()
+    environ['PYLEARN2_YAML_CACHE'] = cache_dir
+    try:
+        yaml = ("{'a': &test !obj:pylearn2.config.tests.test_yaml_parse."
+                "DumDum {}, 'b': *test, 'c': !import 'os.path.join'}")
+        timings = {}
+        obj = load(yaml, timings=timings)
+        assert not timings['cached']
+        assert len(os.listdir(cache_dir)) == 1
+        for key in ['import', 'parse', 'instantiate']:
+            assert timings[key] >= 0.
+        timings = {}
+        cached = load(yaml, timings=timings)
+        assert timings['cached']
+        assert isinstance(cached['a'], DumDum)
+        assert cached['a'] is cached['b']
+        assert cached['c'] is obj['c']
+        assert cached['a'].yaml_src == obj['a'].yaml_src
+    finally:
+        del environ['PYLEARN2_YAML_CACHE']
+        shutil.rmtree(cache_dir)
+
+
 if __name__ == "__main__":
     test_multi_constructor_obj()
     test_duplicate_keywords()
@@ -6,11 +6,16 @@ from pylearn2.utils.string_utils import preprocess
 from pylearn2.utils.call_check import checked_call
 from pylearn2.utils.string_utils import match
 from collections import namedtuple
+import hashlib
 import logging
+import os
+import tempfile
+import time
 import warnings
 import re
 
 from theano.compat import six
+from theano.compat.six.moves import cPickle
 
 SCIENTIFIC_NOTATION_REGEXP = r'^[\-\+]?(\d+\.?\d*|\d*\.?\d+)?[eE][\-\+]?\d+$'
 
@@ -18,6 +23,13 @@ is_initialized = False
 additional_environ = None
 logger = logging.getLogger(__name__)
 
+# The C implementation of the YAML parser (LibYAML) is much faster than the
+# pure-Python one, but is not always compiled in.
+Loader = getattr(yaml, 'CLoader', yaml.Loader)
+
+# Seconds spent importing the modules named by tags, see `load`
+_import_seconds = 0.
+
 # Lightweight container for initial YAML evaluation.
 #
 # This is intended as a robust, forward-compatible intermediate representation
@@ -169,10 +181,17 @@ def _instantiate(proxy, bindings=None):
         return proxy
 
 
-def load(stream, environ=None, instantiate=True, **kwargs):
+def load(stream, environ=None, instantiate=True, timings=None, **kwargs):
     """
     Loads a YAML configuration from a string or file-like object.
 
+    The configuration is parsed with LibYAML when PyYAML was built with
+    it. If the PYLEARN2_YAML_CACHE environment variable names a
+    directory, the parsed `Proxy` graphs are cached there, keyed by a
+    hash of the YAML string, so that loading the same configuration
+    again skips parsing (configurations with `!pkl:` tags are not
+    cached, since the files they load may change).
+
     Parameters
     ----------
     stream : str or object
@@ -185,6 +204,12 @@ def load(stream, environ=None, instantiate=True, **kwargs):
     instantiate : bool, optional
         If `False`, do not actually instantiate the objects but instead
         produce a nested hierarchy of `Proxy` objects.
+    timings : dict, optional
+        If specified, the seconds spent importing the modules named by
+        the tags, parsing and instantiating are added to its 'import',
+        'parse' and 'instantiate' items, and its 'cached' item tells
+        whether the parsed graph came from the cache (whose loading,
+        including the imports it triggers, then counts as parsing).
 
     Returns
     -------
@@ -208,11 +233,110 @@ def load(stream, environ=None, instantiate=True, **kwargs):
     else:
         string = stream.read()
 
-    proxy_graph = yaml.load(string, **kwargs)
+    import_seconds = _import_seconds
+    t0 = time.time()
+    cache_dir = os.environ.get('PYLEARN2_YAML_CACHE')
+    # Other arguments of yaml.load could change the parsed graph
+    use_cache = bool(cache_dir) and not kwargs
+    proxy_graph = None
+    if use_cache:
+        entry = os.path.join(cache_dir, _cache_key(string) + '.pkl')
+        proxy_graph = _load_cached(entry)
+    cached = proxy_graph is not None
+    if not cached:
+        kwargs.setdefault('Loader', Loader)
+        proxy_graph = yaml.load(string, **kwargs)
+        if use_cache:
+            _save_cached(entry, proxy_graph)
+    t1 = time.time()
     if instantiate:
-        return _instantiate(proxy_graph)
+        rval = _instantiate(proxy_graph)
     else:
-        return proxy_graph
+        rval = proxy_graph
+    t2 = time.time()
+
+    if timings is not None:
+        imported = _import_seconds - import_seconds
+        timings['import'] = timings.get('import', 0.) + imported
+        timings['parse'] = timings.get('parse', 0.) + t1 - t0 - imported
+        timings['instantiate'] = timings.get('instantiate', 0.) + t2 - t1
+        timings['cached'] = cached
+    return rval
+
+
+def _cache_key(string):
+    """
+    Returns the key of the parsed graph of the YAML `string` in the
+    cache of `load`.
+    """
+    h = hashlib.sha1()
+    h.update(('%s\n%s\n' % (yaml.__version__, Loader.__name__)
+              ).encode('utf-8'))
+    h.update(string.encode('utf-8'))
+    return h.hexdigest()
+
+
+def _load_cached(entry):
+    """
+    Returns the parsed graph cached in `entry`, or None.
+    """
+    try:
+        with open(entry, 'rb') as f:
+            return cPickle.load(f)
+    except IOError:
+        return None
+    except Exception as e:
+        logger.warning("Could not load the parsed YAML configuration "
+                       "cached in %s: %s" % (entry, e))
+        return None
+
+
+def _save_cached(entry, proxy_graph):
+    """
+    Caches the parsed graph `proxy_graph` in `entry`, unless it loads
+    pickle files or cannot be pickled.
+    """
+    if _has_pkl(proxy_graph, set()):
+        return
+    cache_dir = os.path.dirname(entry)
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        handle, tmp = tempfile.mkstemp(prefix='.tmp', dir=cache_dir)
+    except OSError as e:
+        logger.warning("Could not cache the parsed YAML configuration: %s"
+                       % e)
+        return
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            cPickle.dump(proxy_graph, f, protocol=2)
+        # Written under a temporary name so that concurrent jobs never
+        # read a partial entry
+        os.rename(tmp, entry)
+    except Exception as e:
+        logger.debug("Not caching the parsed YAML configuration: %s" % e)
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _has_pkl(proxy, seen):
+    """
+    Returns True if the graph of `proxy` holds objects loaded from
+    `!pkl:` tags.
+    """
+    if id(proxy) in seen:
+        return False
+    seen.add(id(proxy))
+    if isinstance(proxy, Proxy):
+        if proxy.callable == do_not_recurse:
+            return True
+        return any(_has_pkl(v, seen) for v in proxy.keywords.values())
+    elif isinstance(proxy, dict):
+        return any(_has_pkl(k, seen) or _has_pkl(v, seen)
+                   for k, v in six.iteritems(proxy))
+    elif isinstance(proxy, list):
+        return any(_has_pkl(v, seen) for v in proxy)
+    return False
 
 
 def load_path(path, environ=None, instantiate=True, **kwargs):
@@ -257,9 +381,31 @@ def load_path(path, environ=None, instantiate=True, **kwargs):
 
 def try_to_import(tag_suffix):
     """
-    .. todo::
+    Imports the module of `tag_suffix` and returns the object it names,
+    adding the time spent to the one reported by `load`.
 
-        WRITEME
+    Parameters
+    ----------
+    tag_suffix : str
+        The full name of a Python object, e.g.
+        'pylearn2.models.mlp.MLP'.
+
+    Returns
+    -------
+    obj : object
+        The object.
+    """
+    global _import_seconds
+    start = time.time()
+    try:
+        return _try_to_import(tag_suffix)
+    finally:
+        _import_seconds += time.time() - start
+
+
+def _try_to_import(tag_suffix):
+    """
+    Implementation of `try_to_import`.
     """
     components = tag_suffix.split('.')
     modulename = '.'.join(components[:-1])
@@ -329,16 +475,20 @@ def initialize():
     """
     global is_initialized
 
-    # Add the custom multi-constructor
-    yaml.add_multi_constructor('!obj:', multi_constructor_obj)
-    yaml.add_multi_constructor('!pkl:', multi_constructor_pkl)
-    yaml.add_multi_constructor('!import:', multi_constructor_import)
-
-    yaml.add_constructor('!import', constructor_import)
-    yaml.add_constructor("!float", constructor_float)
-
     pattern = re.compile(SCIENTIFIC_NOTATION_REGEXP)
-    yaml.add_implicit_resolver('!float', pattern)
+    for loader in set([yaml.Loader, Loader]):
+        # Add the custom multi-constructor
+        yaml.add_multi_constructor('!obj:', multi_constructor_obj,
+                                   Loader=loader)
+        yaml.add_multi_constructor('!pkl:', multi_constructor_pkl,
+                                   Loader=loader)
+        yaml.add_multi_constructor('!import:', multi_constructor_import,
+                                   Loader=loader)
+
+        yaml.add_constructor('!import', constructor_import, Loader=loader)
+        yaml.add_constructor("!float", constructor_float, Loader=loader)
+
+        yaml.add_implicit_resolver('!float', pattern, Loader=loader)
 
     is_initialized = True
 
@@ -19,6 +19,104 @@ import os
 from pylearn2.cross_validation.mlp import PretrainedLayerCV
 from pylearn2.train import Train, SerializationGuard
 from pylearn2.utils import serial
+from pylearn2.utils.fork import ForkedState, fork_pool
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+
+# The trainers and time budget used by the processes of TrainCV.main_loop.
+# They are inherited by the processes when they are forked, instead of
+# pickled, so the datasets of the folds are not copied.
+_main_loop_state = ForkedState()
+
+
+def _limit_threads(threads_per_worker):
+    """
+    Initializes a process of `TrainCV.main_loop`.
+
+    Parameters
+    ----------
+    threads_per_worker : int or None
+        If not None, the number of threads the OpenMP and BLAS libraries
+        loaded in the process may use.
+    """
+    if threads_per_worker is not None:
+        # The libraries were loaded (and their environment variables read)
+        # by the parent process, so the limit must be set at runtime
+        threadpool_limits(threads_per_worker)
+
+
+def _get_fold_datasets(trainer):
+    """
+    Returns the training and monitoring datasets of a trainer, in an
+    order which is the same in every process.
+    """
+    datasets = [trainer.dataset]
+    monitoring_dataset = getattr(trainer.algorithm, 'monitoring_dataset',
+                                 None)
+    if isinstance(monitoring_dataset, dict):
+        datasets.extend(monitoring_dataset[name]
+                        for name in sorted(monitoring_dataset))
+    return datasets
+
+
+def _train_fold(k):
+    """
+    Runs the main loop of the trainer of fold `k` in a process of
+    `TrainCV.main_loop`.
+
+    Returns
+    -------
+    k : int
+        The fold.
+    model : Model
+        The trained model. The datasets of its monitor are removed, so
+        that they are not sent back to the parent process, which has its
+        own references to them.
+    extensions : list
+        The extensions of the trainer.
+    monitor_datasets : list or None
+        The datasets of the monitor of the model, replaced by their index
+        in `_get_fold_datasets` (see `_restore_monitor_datasets`), or
+        None if the model has no monitor.
+    """
+    trainers, time_budget = _main_loop_state.value
+    trainer = trainers[k]
+    trainer.main_loop(time_budget)
+    monitor = getattr(trainer.model, 'monitor', None)
+    monitor_datasets = None
+    if monitor is not None:
+        datasets = _get_fold_datasets(trainer)
+        # Monitor.__getstate__ would drop the indices, as they are neither
+        # datasets nor YAML strings, so they are returned separately
+        monitor_datasets = [_index_by_identity(datasets, dataset)
+                            for dataset in monitor._datasets]
+        monitor._datasets = []
+    return k, trainer.model, trainer.extensions, monitor_datasets
+
+
+def _restore_monitor_datasets(trainer, monitor, monitor_datasets):
+    """
+    Sets the datasets of `monitor` from the output of `_train_fold`,
+    replacing the indices by the datasets of `trainer`.
+    """
+    datasets = _get_fold_datasets(trainer)
+    monitor._datasets = [datasets[dataset] if isinstance(dataset, int)
+                         else dataset for dataset in monitor_datasets]
+
+
+def _index_by_identity(items, item):
+    """
+    Returns the index of `item` in `items`, compared by identity, or
+    `item` itself if it is not in `items`.
+    """
+    for i, candidate in enumerate(items):
+        if candidate is item:
+            return i
+    return item
 
 
 class TrainCV(object):
@@ -114,13 +212,20 @@ class TrainCV(object):
             extension.setup(self.trainers)
 
     def main_loop(self, time_budget=None, parallel=False, client_kwargs=None,
-                  view_flags=None):
+                  view_flags=None, n_jobs=None, threads_per_worker=None):
         """
         Run main_loop of each trainer.
 
         Note: if you get PickleErrors when running in parallel, make sure
         you have `dill` installed.
 
+        With `n_jobs`, the folds are instead trained by a pool of local
+        processes, forked after the trainers are built, so that they share
+        the memory of the datasets (see
+        `pylearn2.cross_validation.dataset_iterators.ArraySubset`) instead
+        of receiving copies. Since the processes are forked, this should
+        not be used once a GPU has been initialized.
+
         Parameters
         ----------
         time_budget : int, optional
@@ -133,9 +238,19 @@ class TrainCV(object):
             Keyword arguments for IPython.parallel Client.
         view_flags : dict, optional
             Flags for IPython.parallel LoadBalancedView.
+        n_jobs : int, optional
+            If greater than 1 (and `parallel` is False), the maximum
+            number of folds trained at the same time by local processes.
+        threads_per_worker : int, optional
+            The number of threads each local process may use for OpenMP
+            and BLAS, which requires `threadpoolctl`. If it is installed,
+            defaults to the number of cores divided by the number of
+            processes; otherwise the number of threads is not limited.
         """
         self.setup()
-        if parallel:
+        if not parallel and n_jobs is not None and n_jobs > 1:
+            self._local_main_loop(time_budget, n_jobs, threads_per_worker)
+        elif parallel:
             from IPython.parallel import Client
 
             def _train(trainer, time_budget=None):
@@ -170,6 +285,47 @@ class TrainCV(object):
                 trainer.main_loop(time_budget)
         self.save()
 
+    def _local_main_loop(self, time_budget, n_jobs, threads_per_worker=None):
+        """
+        Runs the main loop of each trainer in a pool of forked processes.
+
+        Parameters
+        ----------
+        time_budget : int or None
+            See `main_loop`.
+        n_jobs : int
+            The maximum number of processes.
+        threads_per_worker : int, optional
+            See `main_loop`.
+        """
+        from multiprocessing import cpu_count
+
+        n_jobs = min(n_jobs, len(self.trainers))
+        if threadpool_limits is None:
+            if threads_per_worker is not None:
+                raise ImportError("threads_per_worker requires "
+                                  "threadpoolctl.")
+        elif threads_per_worker is None:
+            threads_per_worker = max(1, cpu_count() // n_jobs)
+        with _main_loop_state.bind((self.trainers, time_budget)):
+            pool = fork_pool(n_jobs, _limit_threads, (threads_per_worker,))
+        try:
+            for k, model, extensions, monitor_datasets in \
+                    pool.imap_unordered(_train_fold,
+                                        range(len(self.trainers))):
+                trainer = self.trainers[k]
+                if monitor_datasets is not None:
+                    _restore_monitor_datasets(trainer, model.monitor,
+                                              monitor_datasets)
+                trainer.model = model
+                trainer.extensions = extensions
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
     def save(self):
         """
         Call on_save for Train and TrainCV extensions and serialize trained
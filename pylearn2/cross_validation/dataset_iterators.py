@@ -25,10 +25,137 @@ from pylearn2.datasets.dense_design_matrix import DenseDesignMatrix
 from pylearn2.datasets.transformer_dataset import TransformerDataset
 
 
+class ArraySubset(object):
+    """
+    A read-only view of a subset of the rows of an array.
+
+    Unlike fancy indexing, building the view does not copy the rows:
+    they are only copied batch by batch when the view is indexed, or as a
+    whole when it is converted with `numpy.asarray`. The datasets of the
+    cross-validation folds can thus all share the same base array, which
+    forked processes also share, e.g. in `TrainCV.main_loop`.
+
+    This is not an ndarray: only `SubsetDesignMatrix` accepts it as its
+    design matrix or targets (see `subset_rows`).
+
+    Parameters
+    ----------
+    base : array_like
+        The full array, e.g. a numpy.memmap.
+    indices : array_like
+        The indices (or boolean mask) of the rows of `base` in the view.
+    """
+    def __init__(self, base, indices):
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        self.base = base
+        self.indices = indices
+
+    @property
+    def shape(self):
+        """The shape of the view."""
+        return (len(self.indices),) + tuple(self.base.shape[1:])
+
+    @property
+    def ndim(self):
+        """The number of dimensions of the view."""
+        return self.base.ndim
+
+    @property
+    def dtype(self):
+        """The dtype of the view."""
+        return self.base.dtype
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            return self.base[(self.indices[index[0]],) + index[1:]]
+        return self.base[self.indices[index]]
+
+    def __array__(self, dtype=None):
+        rval = self.base[self.indices]
+        if dtype is not None:
+            rval = rval.astype(dtype)
+        return rval
+
+    def __reduce__(self):
+        # Only the rows of the view are serialized
+        return (np.asarray, (np.asarray(self),))
+
+
+def subset_rows(data, subset):
+    """
+    Returns the rows of `data` selected by `subset` without copying them.
+
+    Parameters
+    ----------
+    data : ndarray
+        The full array.
+    subset : array_like
+        The indices (or boolean mask) of the rows.
+
+    Returns
+    -------
+    rows : ndarray or ArraySubset
+        A slice of `data` if the rows are contiguous, an `ArraySubset`
+        otherwise.
+    """
+    indices = np.asarray(subset)
+    if indices.dtype == bool:
+        indices = np.flatnonzero(indices)
+    if len(indices) > 0 and np.all(np.diff(indices) == 1):
+        return data[indices[0]:indices[-1] + 1]
+    return ArraySubset(data, indices)
+
+
+class SubsetDesignMatrix(DenseDesignMatrix):
+    """
+    A DenseDesignMatrix whose design matrix and targets may be
+    `ArraySubset` views. It takes the parameters of `DenseDesignMatrix`.
+
+    Its iterators only copy the rows of each batch, while
+    `get_design_matrix`, `get_targets` and `get_topological_view` return
+    ndarrays, which are copies of the rows of the views.
+    """
+
+    def get_design_matrix(self, topo=None):
+        """
+        Returns the design matrix as an ndarray, or `topo` in design
+        matrix format. See `DenseDesignMatrix.get_design_matrix`.
+        """
+        if topo is not None:
+            return super(SubsetDesignMatrix, self).get_design_matrix(topo)
+        return np.asanyarray(self.X)
+
+    def get_targets(self):
+        """
+        Returns the targets as an ndarray, or None.
+        """
+        if self.y is None:
+            return None
+        return np.asanyarray(self.y)
+
+    def get_topological_view(self, mat=None):
+        """
+        Returns the topological view of `mat`, or of the design matrix.
+        See `DenseDesignMatrix.get_topological_view`.
+        """
+        if mat is None:
+            mat = self.get_design_matrix()
+        return super(SubsetDesignMatrix, self).get_topological_view(mat)
+
+
 class DatasetCV(object):
     """
     Construct a new DenseDesignMatrix for each subset.
 
+    The design matrix and targets of each subset are views of those of
+    the full dataset (see `subset_rows`), so that the subsets are not
+    copied unless a preprocessor has to be applied to them.
+
     Parameters
     ----------
     dataset : object
@@ -88,7 +215,8 @@ class DatasetCV(object):
             # data_subsets is an OrderedDict to maintain label order
             data_subsets = OrderedDict()
             for i, subset in enumerate(subsets):
-                subset_data = tuple(data[subset] for data in self._data)
+                subset_data = tuple(subset_rows(data, subset)
+                                    for data in self._data)
                 if len(subset_data) == 2:
                     X, y = subset_data
                 else:
@@ -106,10 +234,15 @@ class DatasetCV(object):
             datasets = {}
             for label, data in data_subsets.items():
                 X, y = data
-                datasets[label] = DenseDesignMatrix(X=X, y=y)
+                datasets[label] = SubsetDesignMatrix(X=X, y=y)
 
             # preprocessing
             if self.preprocessor is not None:
+                # preprocessors modify the data, which must then be copied
+                for dataset in datasets.values():
+                    dataset.X = np.array(dataset.X)
+                    if dataset.y is not None:
+                        dataset.y = np.array(dataset.y)
                 self.preprocessor.apply(datasets['train'],
                                         can_fit=self.fit_preprocessor)
                 for label, dataset in datasets.items():
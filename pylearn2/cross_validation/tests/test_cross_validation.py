@@ -48,6 +48,25 @@ def test_train_cv():
     os.remove(layer0_filename)
     os.remove(layer1_filename)
 
+
+def test_train_cv_n_jobs():
+    """Test TrainCV with folds trained by local processes."""
+    skip_if_no_sklearn()
+    handle, layer0_filename = tempfile.mkstemp()
+    trainer = yaml_parse.load(test_yaml_layer0 %
+                              {'layer0_filename': layer0_filename})
+    trainer.main_loop(n_jobs=2)
+    for fold in trainer.trainers:
+        monitor = fold.model.monitor
+        assert monitor.get_epochs_seen() == 1
+        assert len(monitor._datasets) == len(monitor._batch_size)
+        datasets = fold.algorithm.monitoring_dataset
+        expected = [datasets[name] for name in sorted(datasets)]
+        assert len(monitor._datasets) == len(expected)
+        for dataset in monitor._datasets:
+            assert any(dataset is d for d in expected)
+    os.remove(layer0_filename)
+
 test_yaml_layer0 = """
 !obj:pylearn2.cross_validation.TrainCV {
     dataset_iterator:
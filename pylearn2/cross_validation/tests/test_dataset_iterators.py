@@ -1,10 +1,50 @@
 """
 Test cross-validation dataset iterators.
 """
+import numpy as np
+
 from pylearn2.config import yaml_parse
+from pylearn2.cross_validation.dataset_iterators import (ArraySubset,
+                                                         SubsetDesignMatrix,
+                                                         subset_rows)
 from pylearn2.testing.skip import skip_if_no_sklearn
 
 
+def test_array_subset():
+    """Test ArraySubset."""
+    base = np.arange(20).reshape((10, 2))
+    mask = np.zeros(10, dtype=bool)
+    mask[[1, 4, 7]] = True
+    subset = ArraySubset(base, mask)
+    assert subset.shape == (3, 2)
+    assert len(subset) == 3
+    assert np.all(subset[1] == base[4])
+    assert np.all(subset[1:, 0] == base[[4, 7], 0])
+    assert np.all(np.asarray(subset) == base[mask])
+    base[7] = -1
+    assert np.all(subset[2] == -1)
+
+
+def test_subset_rows():
+    """Test subset_rows and SubsetDesignMatrix."""
+    X = np.arange(20.).reshape((10, 2))
+    y = np.arange(10.).reshape((10, 1))
+    contiguous = subset_rows(X, [3, 4, 5])
+    assert isinstance(contiguous, np.ndarray)
+    assert np.may_share_memory(contiguous, X)
+    assert np.all(contiguous == X[3:6])
+    rows = [0, 1, 8, 9]
+    dataset = SubsetDesignMatrix(X=subset_rows(X, rows),
+                                 y=subset_rows(y, rows))
+    assert isinstance(dataset.X, ArraySubset)
+    design_matrix = dataset.get_design_matrix()
+    assert isinstance(design_matrix, np.ndarray)
+    assert np.all(design_matrix == X[rows])
+    targets = dataset.get_targets()
+    assert isinstance(targets, np.ndarray)
+    assert np.all(targets == y[rows])
+
+
 def test_dataset_k_fold():
     """Test DatasetKFold."""
     skip_if_no_sklearn()
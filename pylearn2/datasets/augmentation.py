@@ -0,0 +1,228 @@
+"""
+Random transformations of the examples of image datasets, applied to each
+batch as it is drawn from the dataset iterator (data augmentation).
+"""
+__license__ = "3-clause BSD"
+__maintainer__ = "LISA Lab"
+__email__ = "pylearn-dev@googlegroups"
+
+import numpy
+
+from pylearn2.space import Conv2DSpace
+from pylearn2.utils.rng import make_np_rng
+
+
+def _padded_b01c(batch, window_shape, pad, axes):
+    """
+    Returns `batch` with axes ('b', 0, 1, 'c') and `pad` rows and columns
+    of zeros around each image, checking that windows of shape
+    `window_shape` fit in the padded images.
+    """
+    b01c = batch.transpose([axes.index(axis) for axis in ('b', 0, 1, 'c')])
+    if pad > 0:
+        padded = numpy.zeros((b01c.shape[0], b01c.shape[1] + 2 * pad,
+                              b01c.shape[2] + 2 * pad, b01c.shape[3]),
+                             dtype=b01c.dtype)
+        padded[:, pad:-pad, pad:-pad, :] = b01c
+        b01c = padded
+    rows, cols = b01c.shape[1:3]
+    if window_shape[0] > rows or window_shape[1] > cols:
+        raise ValueError("Windows of shape %s do not fit in padded images "
+                         "of shape %s" % (str(tuple(window_shape)),
+                                          str((rows, cols))))
+    return b01c
+
+
+def random_window_and_flip(batch, window_shape, rng, flip=True, pad=0,
+                           axes=('b', 0, 1, 'c')):
+    """
+    Extracts a randomly positioned window from each image of a batch,
+    reflecting it on the horizontal axis with probability 0.5.
+
+    All windows are gathered with a single indexing operation.
+
+    Parameters
+    ----------
+    batch : numpy.ndarray
+        A batch of images, with axes ordered as in `axes`.
+    window_shape : tuple
+        The (rows, columns) shape of the windows.
+    rng : numpy.random.RandomState
+        The random number generator drawing the positions and flips.
+    flip : bool, optional
+        Whether to randomly flip the windows.
+    pad : int, optional
+        Number of rows and columns of zeros around each image from which
+        windows can also be drawn.
+    axes : tuple, optional
+        The axes of `batch`, a permutation of ('b', 0, 1, 'c').
+
+    Returns
+    -------
+    windows : numpy.ndarray
+        The batch of windows, with axes ordered as in `axes`.
+    """
+    axes = tuple(axes)
+    b01c = _padded_b01c(batch, window_shape, pad, axes)
+    num_examples, rows, cols = b01c.shape[:3]
+    window_rows, window_cols = window_shape
+    row_idx = (rng.randint(0, rows - window_rows + 1,
+                           size=num_examples)[:, numpy.newaxis] +
+               numpy.arange(window_rows))
+    col_idx = (rng.randint(0, cols - window_cols + 1,
+                           size=num_examples)[:, numpy.newaxis] +
+               numpy.arange(window_cols))
+    if flip:
+        flipped = rng.randint(0, 2, size=num_examples).astype(bool)
+        col_idx[flipped] = col_idx[flipped, ::-1]
+    windows = b01c[numpy.arange(num_examples)[:, numpy.newaxis, numpy.newaxis],
+                   row_idx[:, :, numpy.newaxis],
+                   col_idx[:, numpy.newaxis, :]]
+    return windows.transpose([('b', 0, 1, 'c').index(axis)
+                              for axis in axes])
+
+
+def central_window(batch, window_shape, pad=0, axes=('b', 0, 1, 'c')):
+    """
+    Extracts the central window of each image of a batch, the
+    deterministic counterpart of `random_window_and_flip`.
+
+    Parameters
+    ----------
+    batch : numpy.ndarray
+        A batch of images, with axes ordered as in `axes`.
+    window_shape : tuple
+        The (rows, columns) shape of the windows.
+    pad : int, optional
+        Number of rows and columns of zeros around each image.
+    axes : tuple, optional
+        The axes of `batch`, a permutation of ('b', 0, 1, 'c').
+
+    Returns
+    -------
+    windows : numpy.ndarray
+        The batch of windows, with axes ordered as in `axes`.
+    """
+    axes = tuple(axes)
+    b01c = _padded_b01c(batch, window_shape, pad, axes)
+    window_rows, window_cols = window_shape
+    row_off = (b01c.shape[1] - window_rows) // 2
+    col_off = (b01c.shape[2] - window_cols) // 2
+    windows = b01c[:, row_off:row_off + window_rows,
+                   col_off:col_off + window_cols, :]
+    return windows.transpose([('b', 0, 1, 'c').index(axis)
+                              for axis in axes])
+
+
+class WindowAndFlipAugmentation(object):
+    """
+    Randomly windows and flips the images of each batch drawn from the
+    training iterators of a dataset, so that every epoch sees new windows
+    without rewriting the dataset. The other iterators of the dataset
+    (e.g. the monitor's) yield the central windows of the images. See
+    `DenseDesignMatrix.set_augmentation`.
+
+    Parameters
+    ----------
+    window_shape : tuple
+        The (rows, columns) shape of the windows. The datasets yield
+        batches of images of this shape.
+    pad : int, optional
+        Number of rows and columns of zeros added around the images
+        before drawing the windows. Default is 0.
+    flip : bool, optional
+        Reflect images on the horizontal axis with probability 0.5.
+        `True` by default.
+    rng : numpy.random.RandomState object or seed, optional
+        A random number generator or seed used to create one.
+        Seeded deterministically by default.
+    prefetch : int, optional
+        If specified, the iterators of the augmented dataset prepare
+        this many batches in a background thread by default, so that
+        the augmentation overlaps with training. See `Dataset.iterator`.
+    """
+
+    def __init__(self, window_shape, pad=0, flip=True, rng=(2013, 2, 20),
+                 prefetch=None):
+        self.window_shape = tuple(window_shape)
+        self.pad = pad
+        self.flip = flip
+        self.rng = make_np_rng(rng, which_method="randint")
+        self.prefetch = prefetch
+
+    def __call__(self, batch, axes=('b', 0, 1, 'c')):
+        """
+        Returns randomly windowed and flipped images.
+
+        Parameters
+        ----------
+        batch : numpy.ndarray
+            A batch of images, with axes ordered as in `axes`.
+        axes : tuple, optional
+            The axes of `batch`.
+
+        Returns
+        -------
+        windows : numpy.ndarray
+            The batch of windows, with axes ordered as in `axes`.
+        """
+        return random_window_and_flip(batch, self.window_shape, self.rng,
+                                      flip=self.flip, pad=self.pad,
+                                      axes=axes)
+
+    def get_space(self, view_converter, dtype='floatX'):
+        """
+        Returns the space of the windows of the images of a dataset.
+
+        Parameters
+        ----------
+        view_converter : DefaultViewConverter
+            The view converter of the dataset.
+        dtype : str, optional
+            The dtype of the space.
+
+        Returns
+        -------
+        space : Conv2DSpace
+            The space of the windows, with the axes of `view_converter`.
+        """
+        return Conv2DSpace(shape=self.window_shape,
+                           num_channels=view_converter.shape[-1],
+                           axes=tuple(view_converter.axes), dtype=dtype)
+
+    def format_batch(self, view_converter, batch, space, randomize=True):
+        """
+        Windows a batch of rows of a design matrix and formats it.
+
+        Parameters
+        ----------
+        view_converter : DefaultViewConverter
+            The view converter of the dataset the batch comes from.
+        batch : numpy.ndarray
+            A batch of rows of the design matrix of the dataset.
+        space : Space
+            The space the batch must be formatted as, whose images have
+            the shape of the windows.
+        randomize : bool, optional
+            If True, the windows are randomly positioned and flipped,
+            otherwise the central windows are extracted.
+
+        Returns
+        -------
+        batch : numpy.ndarray
+            The windowed batch, in `space`.
+        """
+        if (isinstance(space, Conv2DSpace) and
+                tuple(space.shape) != self.window_shape):
+            raise ValueError("The batches of the augmented dataset are "
+                             "windows of shape %s, they cannot be formatted "
+                             "as %s." % (str(self.window_shape), str(space)))
+        axes = tuple(view_converter.axes)
+        topo = view_converter.design_mat_to_topo_view(batch)
+        if randomize:
+            windows = self(topo, axes)
+        else:
+            windows = central_window(topo, self.window_shape, pad=self.pad,
+                                     axes=axes)
+        window_space = self.get_space(view_converter, dtype=windows.dtype)
+        return window_space.np_format_as(windows, space)
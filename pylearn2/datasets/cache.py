@@ -18,14 +18,21 @@ gauranteed by default copy.
 """
 
 import atexit
+import errno
+import glob
+import hashlib
 import logging
 import os
+import shutil
 import stat
 import time
 
 import theano.gof.compilelock as compilelock
 
+from pylearn2.utils import serial
 from pylearn2.utils import string_utils
+from pylearn2.utils.disk_cache import (evict_lru, file_lock, hash_update,
+                                       Uncacheable)
 
 
 log = logging.getLogger(__name__)
@@ -394,4 +401,183 @@ class LocalDatasetCache:
         compilelock.release_lock()
 
 
+class PreprocessedDatasetCache(LocalDatasetCache):
+
+    """
+    A local cache of preprocessed datasets, so that jobs applying the
+    same preprocessor to the same dataset do it only once.
+
+    Entries are keyed by a hash of the raw dataset (its design matrix,
+    targets and view converter), of the preprocessor (its configuration,
+    and its parameters if already fit) and of `can_fit`. Each entry holds
+    the state of the preprocessed dataset and of the (fit) preprocessor,
+    saved with `serial.save` in the `serial.ARRAY_PICKLE_SUFFIX` format,
+    whose arrays are memory-mapped on a hit. When the entries take more
+    than `max_size` bytes, the least recently used ones are evicted.
+
+    A lock on the entry (see `disk_cache.file_lock`) is held while it is
+    computed, so that concurrent jobs wait for the first one instead of
+    all computing it, and readlocks keep the entries in use from being
+    evicted. Datasets or preprocessors whose state cannot be hashed (see
+    `disk_cache.hash_update`) are preprocessed without the cache.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        The directory of the cache. Defaults to a `preprocessed`
+        directory in ${PYLEARN2_LOCAL_DATA_PATH}. If neither is defined,
+        the cache is deactivated and preprocessors are simply applied.
+    max_size : int, optional
+        The maximum size of the cache in bytes. If None, entries are
+        never evicted.
+    mmap_mode : str, optional
+        The mode with which the arrays of an entry are memory-mapped (see
+        `numpy.load`). The default, 'c', lets later preprocessors modify
+        the design matrix in place without modifying the entry.
+    """
+
+    def __init__(self, cache_dir=None, max_size=None, mmap_mode='c'):
+        LocalDatasetCache.__init__(self)
+        if cache_dir is None and self.dataset_local_dir != "":
+            cache_dir = os.path.join(self.dataset_local_dir, 'preprocessed')
+        if cache_dir is None:
+            self.cache_dir = ""
+            log.debug("Preprocessed dataset cache is deactivated")
+        else:
+            self.cache_dir = os.path.abspath(
+                string_utils.preprocess(cache_dir))
+        self.max_size = max_size
+        self.mmap_mode = mmap_mode
+
+    def get_key(self, preprocessor, dataset, can_fit=False):
+        """
+        Returns the key of the entry of `dataset` preprocessed by
+        `preprocessor`.
+
+        Parameters
+        ----------
+        preprocessor : Preprocessor
+            The preprocessor to apply.
+        dataset : Dataset
+            The raw dataset.
+        can_fit : bool, optional
+            See `Preprocessor.apply`.
+
+        Returns
+        -------
+        key : str
+            A hexadecimal digest.
+
+        Raises
+        ------
+        Uncacheable
+            If the state of `preprocessor` or `dataset` cannot be hashed.
+        """
+        h = hashlib.sha1()
+        hash_update(h, (type(dataset), getattr(dataset, 'X', None),
+                        getattr(dataset, 'y', None),
+                        getattr(dataset, 'view_converter', None)))
+        hash_update(h, preprocessor)
+        hash_update(h, bool(can_fit))
+        return h.hexdigest()
+
+    def apply(self, preprocessor, dataset, can_fit=False):
+        """
+        Applies `preprocessor` to `dataset`, or loads the result from the
+        cache if it was computed before.
+
+        On a hit, the state of `dataset` is replaced by the cached one,
+        whose arrays are memory-mapped, and so is the state of
+        `preprocessor` when `can_fit` is True, so that it can then be
+        applied to other datasets.
+
+        Parameters
+        ----------
+        preprocessor : Preprocessor
+            The preprocessor to apply.
+        dataset : Dataset
+            The dataset to act on. Only datasets with a design matrix
+            (e.g. `DenseDesignMatrix`) are cached.
+        can_fit : bool, optional
+            See `Preprocessor.apply`.
+        """
+        if self.cache_dir == "" or not hasattr(dataset, 'get_design_matrix'):
+            preprocessor.apply(dataset, can_fit)
+            return
+
+        try:
+            key = self.get_key(preprocessor, dataset, can_fit)
+        except Uncacheable as e:
+            log.warning("Not caching the preprocessed dataset: %s" % e)
+            preprocessor.apply(dataset, can_fit)
+            return
+        entry = os.path.join(self.cache_dir, key + serial.ARRAY_PICKLE_SUFFIX)
+        self.safe_mkdir(self.cache_dir)
+
+        # Concurrent jobs computing the same entry wait for the first one
+        with file_lock(entry + '.lock'):
+            if os.path.isdir(entry):
+                log.info("Loading preprocessed dataset from %s" % entry)
+                cached = serial.load(entry, mmap_mode=self.mmap_mode)
+                dataset.__dict__.clear()
+                dataset.__dict__.update(cached['dataset'])
+                if can_fit:
+                    preprocessor.__dict__.update(
+                        cached['preprocessor'].__dict__)
+                # mark the entry as recently used
+                os.utime(entry, None)
+            else:
+                preprocessor.apply(dataset, can_fit)
+                log.info("Caching preprocessed dataset to %s" % entry)
+                serial.save(entry, {'dataset': dict(dataset.__dict__),
+                                    'preprocessor': preprocessor})
+            self.get_readlock(entry)
+
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def evict(self, max_size):
+        """
+        Removes the least recently used entries which are not in use
+        until the cache takes at most `max_size` bytes.
+
+        Parameters
+        ----------
+        max_size : int
+            The maximum size of the cache in bytes.
+        """
+        def remove(entry):
+            with file_lock(entry + '.lock'):
+                if self.in_use(entry) or not os.path.isdir(entry):
+                    return False
+                log.info("Evicting preprocessed dataset %s" % entry)
+                shutil.rmtree(entry)
+
+        evict_lru(glob.glob(os.path.join(self.cache_dir,
+                                         '*' + serial.ARRAY_PICKLE_SUFFIX)),
+                  max_size, remove)
+
+    def in_use(self, path):
+        """
+        Returns True if a live process on this host holds a readlock on
+        `path`. Readlocks left behind by dead processes are removed.
+
+        Parameters
+        ----------
+        path : string
+            Name of the file or directory to check
+        """
+        in_use = False
+        for lockdir in glob.glob(path + '.readlock.*'):
+            pid = int(lockdir.rsplit('.', 2)[-2])
+            try:
+                os.kill(pid, 0)
+            except OSError as e:
+                if e.errno == errno.ESRCH:
+                    self.release_readlock(lockdir)
+                    continue
+            in_use = True
+        return in_use
+
+
 datasetCache = LocalDatasetCache()
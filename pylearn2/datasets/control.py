@@ -43,3 +43,41 @@ def get_load_data():
         WRITEME
     """
     return load_data[-1]
+
+
+mmap_mode = [None]
+
+
+def pop_mmap_mode():
+    """
+    Restores the memory-mapping mode that was in effect before the last
+    call to `push_mmap_mode`.
+    """
+    global mmap_mode
+
+    del mmap_mode[-1]
+
+
+def push_mmap_mode(setting):
+    """
+    Sets the memory-mapping mode used by datasets that load their arrays
+    from .npy files while being unpickled (see
+    `DenseDesignMatrix.use_design_loc`).
+
+    Parameters
+    ----------
+    setting : str or None
+        A `mmap_mode` accepted by `numpy.load` (e.g. 'r'), or None to
+        use the mode recorded in each dataset.
+    """
+    global mmap_mode
+
+    mmap_mode.append(setting)
+
+
+def get_mmap_mode():
+    """
+    Returns the memory-mapping mode set by the last call to
+    `push_mmap_mode`, or None if the datasets' own modes should be used.
+    """
+    return mmap_mode[-1]
@@ -19,7 +19,8 @@ class Dataset(object):
         return self.iterator()
 
     def iterator(self, mode=None, batch_size=None, num_batches=None,
-                 rng=None, data_specs=None, return_tuple=False):
+                 rng=None, data_specs=None, return_tuple=False,
+                 prefetch=None, batch_buffers=None):
         """
         Return an iterator for this dataset with the specified
         behaviour. Unspecified values are filled-in by the default.
@@ -77,6 +78,23 @@ class Dataset(object):
             at each iteration. If False, it will return the minibatch
             itself. This flag has no effect if data_specs is composite.
             Default: False.
+        prefetch : int, optional
+            If a positive integer, the batches are fetched and formatted
+            in a background thread that keeps up to `prefetch` ready
+            batches in a bounded queue, overlapping the data path with
+            the computation done on the previous batches. The sequence of
+            batches is the same as without prefetching. Not every
+            `Dataset` supports this argument. Default: None (no
+            prefetching).
+        batch_buffers : int, optional
+            If a positive integer, batches selected with lists of indices
+            (e.g. in 'shuffled_sequential' or 'random_uniform' mode) are
+            copied into `batch_buffers` preallocated buffers that are
+            reused in turn, instead of allocating a new array for each
+            batch. A returned batch is overwritten `batch_buffers` calls
+            to `next()` later, so use 2 if the previous batch must stay
+            valid while the next one is fetched. Not every `Dataset`
+            supports this argument. Default: None (allocate every batch).
 
         Returns
         -------
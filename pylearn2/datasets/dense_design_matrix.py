@@ -17,6 +17,7 @@ __email__ = "pylearn-dev@googlegroups"
 import functools
 
 import logging
+import os
 import warnings
 
 import numpy as np
@@ -240,6 +241,10 @@ class DenseDesignMatrix(Dataset):
 
         self.compress = False
         self.design_loc = None
+        self.targets_loc = None
+        self.design_mmap_mode = None
+        self._topo_view_cache = None
+        self._topo_view_cache_lazy = False
         self.rng = make_np_rng(rng, which_method="random_integers")
         # Defaults for iterators
         self._iter_mode = resolve_iterator_class('sequential')
@@ -267,8 +272,12 @@ class DenseDesignMatrix(Dataset):
     @functools.wraps(Dataset.iterator)
     def iterator(self, mode=None, batch_size=None, num_batches=None,
                  rng=None, data_specs=None,
-                 return_tuple=False):
+                 return_tuple=False, prefetch=None, batch_buffers=None,
+                 augment=False):
 
+        augmentation = getattr(self, 'augmentation', None)
+        if data_specs is None and augmentation is not None:
+            data_specs = (self._get_augmented_X_space(), 'features')
         [mode, batch_size, num_batches, rng, data_specs] = self._init_iterator(
             mode, batch_size, num_batches, rng, data_specs)
 
@@ -283,10 +292,25 @@ class DenseDesignMatrix(Dataset):
             sub_spaces = (space,)
             sub_sources = (source,)
 
+        if augmentation is not None and augment and prefetch is None:
+            prefetch = augmentation.prefetch
+
         convert = []
+        raw_data = {}
         for sp, src in safe_zip(sub_spaces, sub_sources):
-            if src == 'features' and \
-               getattr(self, 'view_converter', None) is not None:
+            if src == 'features' and augmentation is not None:
+                conv_fn = (
+                    lambda batch, space=sp:
+                    augmentation.format_batch(self.view_converter, batch,
+                                              space, randomize=augment))
+            elif src == 'features' and \
+                    self._get_topo_view_cache(sp, batch_size) is not None:
+                # The batches are sliced from a copy of the features
+                # already stored in the layout of sp.
+                raw_data[src] = self._topo_view_cache
+                conv_fn = lambda batch: batch
+            elif src == 'features' and \
+                    getattr(self, 'view_converter', None) is not None:
                 conv_fn = (
                     lambda batch, self=self, space=sp:
                     self.view_converter.get_formatted_batch(batch, space))
@@ -301,7 +325,114 @@ class DenseDesignMatrix(Dataset):
                                           rng),
                                      data_specs=data_specs,
                                      return_tuple=return_tuple,
-                                     convert=convert)
+                                     convert=convert,
+                                     prefetch=prefetch,
+                                     batch_buffers=batch_buffers,
+                                     raw_data=raw_data)
+
+    def cache_topological_view(self, axes=None, batch_size=None,
+                               dtype='floatX'):
+        """
+        Stores a C-contiguous copy of the topological view of the
+        examples, in the layout given by `axes`. The iterators asking for
+        the features in a `Conv2DSpace` with these axes slice their
+        batches out of this copy, instead of transposing every batch of
+        rows of the design matrix into the layout of the space.
+
+        The copy takes as much memory as the design matrix. It is made
+        from the current design matrix and is discarded by
+        `set_design_matrix` and `set_topological_view`, but not updated
+        if the design matrix is modified in place: call this method again
+        after such a modification.
+
+        Parameters
+        ----------
+        axes : tuple, optional
+            A permutation of ('b', 0, 1, 'c'). If None, the copy is made
+            lazily, once, in the layout (and with the batch size and dtype)
+            of the first iterator that asks for the features in a
+            `Conv2DSpace`.
+        batch_size : int, optional
+            Required when 'b' is not the first axis, in which case a slice
+            of examples would not be contiguous: the examples are then
+            stored in blocks of `batch_size` examples, each contiguous in
+            the layout of `axes`, and only the batches that are exactly
+            one block (the batches of the sequential iteration modes with
+            this batch size) are taken from the copy. The other batches
+            are formatted from the design matrix, as without the copy.
+        dtype : str, optional
+            The dtype of the copy, which should be the dtype of the
+            `Conv2DSpace` of the iterators. Defaults to 'floatX'.
+        """
+        if getattr(self, 'view_converter', None) is None:
+            raise ValueError("Caching the topological view of a dataset "
+                             "requires a view converter.")
+        self._topo_view_cache = None
+        if axes is None:
+            self._topo_view_cache_lazy = True
+            return
+        self._topo_view_cache_lazy = False
+        rows, cols, channels = self.view_converter.shape
+        space = Conv2DSpace(shape=(rows, cols), num_channels=channels,
+                            axes=tuple(axes), dtype=dtype)
+        self._topo_view_cache = _TopoViewCache(self.X, self.view_converter,
+                                               space, batch_size)
+
+    def _get_topo_view_cache(self, space, batch_size):
+        """
+        Returns the copy of the topological view made by
+        `cache_topological_view` if the iterators can slice batches in
+        `space` out of it, making it first if it is lazy, and None
+        otherwise.
+        """
+        if not isinstance(space, Conv2DSpace) or \
+                getattr(self, 'view_converter', None) is None:
+            return None
+        if getattr(self, '_topo_view_cache', None) is None and \
+                getattr(self, '_topo_view_cache_lazy', False) and \
+                space.dtype is not None:
+            if space.axes[0] == 'b':
+                self.cache_topological_view(space.axes, None, space.dtype)
+            elif batch_size is not None:
+                self.cache_topological_view(space.axes, batch_size,
+                                            space.dtype)
+        cache = getattr(self, '_topo_view_cache', None)
+        if cache is None or cache.space != space:
+            return None
+        return cache
+
+    def set_augmentation(self, augmentation):
+        """
+        Sets a random transformation applied to the features of each batch
+        drawn from the iterators of this dataset, e.g. a
+        `pylearn2.datasets.augmentation.WindowAndFlipAugmentation`.
+
+        Unlike preprocessors, the transformation does not modify the
+        stored data, and is drawn anew every time an example is visited.
+        Only the iterators created with `augment=True`, as the training
+        algorithms do, apply the random transformation. The other
+        iterators (e.g. the monitor's) apply its deterministic version,
+        so that all batches are in the same space, which
+        `get_data_specs` then declares.
+
+        Parameters
+        ----------
+        augmentation : object or None
+            An object with a `format_batch(view_converter, batch, space,
+            randomize)` method returning the transformed `batch` of rows
+            of the design matrix in `space`, randomly transformed if
+            `randomize` is True, a `get_space(view_converter)` method
+            returning the space of the transformed examples, and a
+            `prefetch` attribute giving the default `prefetch` argument
+            of the iterators that augment the batches. None removes the
+            current transformation.
+        """
+        if augmentation is not None and \
+                getattr(self, 'view_converter', None) is None:
+            raise ValueError("Augmenting the batches of a dataset requires "
+                             "a topological view of its examples, but this "
+                             "dataset has no view converter.")
+        self.augmentation = augmentation
 
     def get_data(self):
         """
@@ -319,7 +450,7 @@ class DenseDesignMatrix(Dataset):
         else:
             return (self.X, self.y)
 
-    def use_design_loc(self, path):
+    def use_design_loc(self, path, mmap_mode=None, targets_path=None):
         """
         Calling this function changes the serialization behavior of the object
         permanently.
@@ -330,19 +461,34 @@ class DenseDesignMatrix(Dataset):
         object. This avoids pickle's unfortunate behavior of using 2X the RAM
         when unpickling.
 
-        TODO: Get rid of this logic, use custom array-aware picklers (joblib,
-        custom pylearn2 serialization format).
+        Saving with `pylearn2.utils.serial.save` to a path ending in
+        `serial.ARRAY_PICKLE_SUFFIX` stores the design matrix (and every
+        other large array) in separate .npy files without this function.
 
         Parameters
         ----------
         path : str
             The path to save the design matrix to
+        mmap_mode : str, optional
+            If given (e.g. 'r'), the design matrix (and the targets, if
+            `targets_path` is given) are memory-mapped with this mode
+            rather than read into memory when the object is unpickled.
+            With 'r', processes loading the same dataset share the
+            pages of the file through the page cache instead of holding
+            private copies. See the `numpy.load` docstring for details.
+        targets_path : str, optional
+            If given, the targets are saved to this .npy file in the same
+            way as the design matrix.
         """
 
         if not path.endswith('.npy'):
             raise ValueError("path should end with '.npy'")
+        if targets_path is not None and not targets_path.endswith('.npy'):
+            raise ValueError("targets_path should end with '.npy'")
 
         self.design_loc = path
+        self.targets_loc = targets_path
+        self.design_mmap_mode = mmap_mode
 
     def get_topo_batch_axis(self):
         """
@@ -377,6 +523,10 @@ class DenseDesignMatrix(Dataset):
             WRITEME
         """
         rval = copy.copy(self.__dict__)
+        # The copy of the topological view is made again when needed.
+        if rval.get('_topo_view_cache') is not None:
+            rval['_topo_view_cache'] = None
+            rval['_topo_view_cache_lazy'] = True
         # TODO: Not sure this should be implemented as something a base dataset
         # does. Perhaps as a mixin that specific datasets (i.e. CIFAR10)
         # inherit from.
@@ -391,11 +541,17 @@ class DenseDesignMatrix(Dataset):
             rval['X'] = np.cast['uint8'](rval['X'])
 
         if self.design_loc is not None:
-            # TODO: Get rid of this logic, use custom array-aware picklers
-            # (joblib, custom pylearn2 serialization format).
-            np.save(self.design_loc, rval['X'])
+            # Kept for compatibility: the serial.ARRAY_PICKLE_SUFFIX format
+            # handles all the arrays of the object graph this way.
+            if not _is_mapped_from(rval['X'], self.design_loc):
+                np.save(self.design_loc, rval['X'])
             del rval['X']
 
+        if getattr(self, 'targets_loc', None) is not None:
+            if not _is_mapped_from(rval['y'], self.targets_loc):
+                np.save(self.targets_loc, rval['y'])
+            del rval['y']
+
         return rval
 
     def __setstate__(self, d):
@@ -404,13 +560,27 @@ class DenseDesignMatrix(Dataset):
 
             WRITEME
         """
+        # Older pickles don't have the memory-mapping attributes
+        d.setdefault('targets_loc', None)
+        d.setdefault('design_mmap_mode', None)
+        mmap_mode = control.get_mmap_mode()
+        if mmap_mode is None:
+            mmap_mode = d['design_mmap_mode']
+
         if d['design_loc'] is not None:
             if control.get_load_data():
                 fname = cache.datasetCache.cache_file(d['design_loc'])
-                d['X'] = np.load(fname)
+                d['X'] = np.load(fname, mmap_mode=mmap_mode)
             else:
                 d['X'] = None
 
+        if d['targets_loc'] is not None:
+            if control.get_load_data():
+                fname = cache.datasetCache.cache_file(d['targets_loc'])
+                d['y'] = np.load(fname, mmap_mode=mmap_mode)
+            else:
+                d['y'] = None
+
         if d['compress']:
             X = d['X']
             mx = d['compress_max']
@@ -752,6 +922,7 @@ class DenseDesignMatrix(Dataset):
         self.view_converter = DefaultViewConverter([rows, cols, channels],
                                                    axes=axes)
         self.X = self.view_converter.topo_view_to_design_mat(V)
+        self._drop_topo_view_cache()
         # self.X_topo_space stores a "default" topological space that
         # will be used only when self.iterator is called without a
         # data_specs, and with "topo=True", which is deprecated.
@@ -823,6 +994,16 @@ class DenseDesignMatrix(Dataset):
         assert len(X.shape) == 2
         assert not contains_nan(X)
         self.X = X
+        self._drop_topo_view_cache()
+
+    def _drop_topo_view_cache(self):
+        """
+        Discards the copy made by `cache_topological_view` after the
+        design matrix is replaced. A lazy copy will be made again.
+        """
+        if getattr(self, '_topo_view_cache', None) is not None:
+            self._topo_view_cache = None
+            self._topo_view_cache_lazy = True
 
     def get_targets(self):
         """
@@ -1037,9 +1218,28 @@ class DenseDesignMatrix(Dataset):
         """
         Returns the data_specs specifying how the data is internally stored.
 
-        This is the format the data returned by `self.get_data()` will be.
+        This is the format the data returned by `self.get_data()` will be,
+        except that the features of an augmented dataset (see
+        `set_augmentation`) are in the space of the transformed examples
+        its iterators yield.
         """
-        return self.data_specs
+        if getattr(self, 'augmentation', None) is None:
+            return self.data_specs
+        space, source = self.data_specs
+        X_space = self._get_augmented_X_space()
+        if isinstance(space, CompositeSpace):
+            return (CompositeSpace((X_space,) + tuple(space.components[1:])),
+                    source)
+        return (X_space, source)
+
+    def _get_augmented_X_space(self):
+        """
+        Returns the VectorSpace of the features of the examples yielded by
+        the iterators of an augmented dataset.
+        """
+        window_space = self.augmentation.get_space(self.view_converter)
+        return VectorSpace(dim=window_space.get_total_dimension(),
+                           dtype=self.X_space.dtype)
 
     def set_view_converter_axes(self, axes):
         """
@@ -1066,6 +1266,81 @@ class DenseDesignMatrix(Dataset):
         self.X_topo_space = self.view_converter.topo_space
 
 
+def _is_mapped_from(array, path):
+    """
+    Returns True if `array` is a memory-map of the file at `path`, in
+    which case it must not be saved back to `path`: that would truncate
+    the file it is reading from.
+    """
+    filename = getattr(array, 'filename', None)
+    if not isinstance(array, np.memmap) or filename is None:
+        return False
+    return (os.path.exists(path) and os.path.exists(filename) and
+            os.path.samefile(path, filename))
+
+
+class _TopoViewCache(object):
+    """
+    A C-contiguous copy of the topological view of a design matrix in the
+    layout of a `Conv2DSpace`, indexed along the examples like the design
+    matrix. See `DenseDesignMatrix.cache_topological_view`.
+
+    Parameters
+    ----------
+    X : ndarray
+        The design matrix.
+    view_converter : DefaultViewConverter
+        The view converter of the dataset.
+    space : Conv2DSpace
+        The space of the batches.
+    batch_size : int, optional
+        The number of examples of each contiguous block. Required, and
+        only used, when 'b' is not the first axis of `space`.
+    """
+
+    def __init__(self, X, view_converter, space, batch_size=None):
+        self.X = X
+        self.view_converter = view_converter
+        self.space = space
+        self.num_examples = X.shape[0]
+        if space.axes[0] == 'b':
+            self.batch_size = None
+            self.blocks = [self._format(slice(None))]
+        else:
+            if batch_size is None:
+                raise ValueError("Caching a topological view with axes %s, "
+                                 "where 'b' is not the first axis, requires "
+                                 "a batch_size." % str(space.axes))
+            self.batch_size = batch_size
+            self.blocks = [self._format(slice(start, start + batch_size))
+                           for start in xrange(0, self.num_examples,
+                                               batch_size)]
+
+    def _format(self, index):
+        """
+        Formats the examples of `X` selected by `index` into a new
+        C-contiguous array in `self.space`.
+        """
+        batch = self.view_converter.get_formatted_batch(self.X[index],
+                                                        self.space)
+        return np.ascontiguousarray(batch)
+
+    def __len__(self):
+        return self.num_examples
+
+    def __getitem__(self, index):
+        if self.batch_size is None:
+            return self.blocks[0][index]
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.num_examples)
+            block, offset = divmod(start, self.batch_size)
+            if step == 1 and offset == 0 and block < len(self.blocks) and \
+                    stop - start == self.blocks[block].shape[
+                        self.space.axes.index('b')]:
+                return self.blocks[block]
+        return self._format(index)
+
+
 class DenseDesignMatrixPyTables(DenseDesignMatrix):
 
     """
@@ -1127,6 +1402,7 @@ class DenseDesignMatrixPyTables(DenseDesignMatrix):
         DenseDesignMatrixPyTables.fill_hdf5(file_handle=self.h5file,
                                             data_x=X,
                                             start=start)
+        self._drop_topo_view_cache()
 
     def set_topological_view(self, V, axes=('b', 0, 1, 'c'), start=0):
         """
@@ -1161,6 +1437,7 @@ class DenseDesignMatrixPyTables(DenseDesignMatrix):
         DenseDesignMatrixPyTables.fill_hdf5(file_handle=self.h5file,
                                             data_x=X,
                                             start=start)
+        self._drop_topo_view_cache()
 
     def init_hdf5(self, path, shapes):
         """
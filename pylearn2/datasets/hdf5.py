@@ -17,12 +17,14 @@ except ImportError:
     tables = None
 import warnings
 from os.path import isfile
+import numpy as np
 from pylearn2.compat import OrderedDict
 from pylearn2.datasets import cache
 from pylearn2.datasets.dataset import Dataset
 from pylearn2.datasets.hdf5_deprecated import HDF5DatasetDeprecated
 from pylearn2.utils import safe_zip, wraps, py_integer_types
-from pylearn2.utils.iteration import FiniteDatasetIterator
+from pylearn2.utils.iteration import (FiniteDatasetIterator,
+                                      ChunkShuffledSubsetIterator)
 from pylearn2.utils.exc import reraise_as
 from pylearn2.space import Space, CompositeSpace
 from theano.compat.six import string_types
@@ -198,7 +200,8 @@ class HDF5Dataset(Dataset):
 
     @wraps(Dataset.iterator, assigned=(), updated=(), append=True)
     def iterator(self, mode=None, data_specs=None, batch_size=None,
-                 num_batches=None, rng=None, return_tuple=False, **kwargs):
+                 num_batches=None, rng=None, return_tuple=False,
+                 prefetch=None, **kwargs):
         """
         if data_specs is set to None, the aliases (or sources) and spaces
         provided when the dataset object has been created will be used.
@@ -210,14 +213,41 @@ class HDF5Dataset(Dataset):
             mode, batch_size, num_batches, rng, data_specs)
         convert = None
 
+        if issubclass(mode, ChunkShuffledSubsetIterator):
+            # Align the shuffling chunks on the storage chunks of the file
+            subset_iterator = mode(self.get_num_examples(),
+                                   batch_size,
+                                   num_batches,
+                                   rng,
+                                   chunk_size=self._get_chunk_size())
+        else:
+            subset_iterator = mode(self.get_num_examples(),
+                                   batch_size,
+                                   num_batches,
+                                   rng)
+
         return FiniteDatasetIterator(self,
-                                     mode(self.get_num_examples(),
-                                          batch_size,
-                                          num_batches,
-                                          rng),
+                                     subset_iterator,
                                      data_specs=data_specs,
                                      return_tuple=return_tuple,
-                                     convert=convert)
+                                     convert=convert,
+                                     prefetch=prefetch)
+
+    def _get_chunk_size(self):
+        """
+        Returns the number of examples per storage chunk of the first
+        chunked source, or None if no source is chunked (e.g. when the
+        data is loaded in memory).
+        """
+        for source in self._get_sources():
+            data = self.data[source]
+            # h5py exposes `chunks`, pytables `chunkshape`
+            chunks = getattr(data, 'chunks', None)
+            if chunks is None:
+                chunks = getattr(data, 'chunkshape', None)
+            if chunks:
+                return chunks[0]
+        return None
 
     def _get_sources(self):
         """
@@ -288,17 +318,29 @@ class HDF5Dataset(Dataset):
         ------
         rval : tuple
             A tuple of batches, one for each source
+
+        Notes
+        -----
+        Lists of indexes do not need to be sorted and may contain
+        duplicates. When the data is on disk, the requested indexes are
+        sorted and deduplicated, read with as few contiguous slices as
+        possible (or with a single h5py point selection when they are
+        too scattered) and then put back in the requested order. Use the
+        'chunk_shuffled_sequential' iteration mode to get stochastic
+        batches that are cheap to read.
         """
         assert isinstance(sources, (tuple, list)) and len(sources) > 0, (
             'sources should be an instance of tuple and not empty')
         assert all([isinstance(el, string_types) for el in sources]), (
             'sources elements should be strings')
-        assert isinstance(indexes, (tuple, list, slice, py_integer_types)), (
+        assert isinstance(indexes, (tuple, list, np.ndarray, slice,
+                                    py_integer_types)), (
             'indexes should be either an int, a slice or a tuple/list of ints')
-        if isinstance(indexes, (tuple, list)):
-            assert len(indexes) > 0 and all([isinstance(i, py_integer_types)
-                                            for i in indexes]), (
-                'indexes elements should be ints')
+        if isinstance(indexes, (tuple, list, np.ndarray)):
+            indexes = np.asarray(indexes)
+            assert indexes.ndim == 1 and len(indexes) > 0 and \
+                indexes.dtype.kind in 'iu', (
+                    'indexes elements should be ints')
 
         rval = []
         for s in sources:
@@ -308,17 +350,13 @@ class HDF5Dataset(Dataset):
                 reraise_as(ValueError(
                     'The requested source %s is not part of the dataset' %
                     sources[s], *e.args))
-            if (isinstance(indexes, (slice, py_integer_types)) or
-                    len(indexes) == 1):
+            if isinstance(indexes, (slice, py_integer_types)):
+                rval.append(sdata[indexes])
+            elif isinstance(sdata, np.ndarray):
+                # Loaded in memory: plain fancy indexing
                 rval.append(sdata[indexes])
             else:
-                warnings.warn('Accessing non sequential elements of an '
-                              'HDF5 file will be at best VERY slow. Avoid '
-                              'using iteration schemes that access '
-                              'random/shuffled data with hdf5 datasets!!')
-                val = []
-                [val.append(sdata[idx]) for idx in indexes]
-                rval.append(val)
+                rval.append(_read_indexes(sdata, indexes))
         return tuple(rval)
 
     @wraps(Dataset.get_num_examples, assigned=(), updated=())
@@ -347,6 +385,42 @@ class HDF5Dataset(Dataset):
         return data.shape[0]
 
 
+def _read_indexes(sdata, indexes):
+    """
+    Reads arbitrary (unsorted, possibly repeated) rows from an on-disk
+    HDF5 dataset.
+
+    The unique indexes are read in increasing order, coalescing runs of
+    consecutive indexes into contiguous slices, and the rows are then
+    rearranged into the requested order.
+
+    Parameters
+    ----------
+    sdata : h5py or pytables dataset
+        The on-disk data, indexed along its first axis.
+    indexes : ndarray
+        A 1D array of integer indexes.
+
+    Returns
+    -------
+    rval : ndarray
+        The rows `sdata[i]` for each `i` in `indexes`.
+    """
+    unique, inverse = np.unique(indexes, return_inverse=True)
+    breaks = np.flatnonzero(np.diff(unique) != 1) + 1
+    starts = np.concatenate(([0], breaks))
+    stops = np.concatenate((breaks, [len(unique)]))
+    if (h5py is not None and isinstance(sdata, h5py.Dataset) and
+            2 * len(starts) > len(unique)):
+        # Mostly isolated indexes: a single point selection (which h5py
+        # only supports with increasing indexes) beats many tiny reads.
+        rows = sdata[unique.tolist()]
+    else:
+        rows = np.concatenate([sdata[unique[start]:unique[stop - 1] + 1]
+                               for start, stop in zip(starts, stops)])
+    return rows[inverse]
+
+
 class alias_dict(OrderedDict):
     """
     A class that behaves like a dictionary, but let you associates a key and
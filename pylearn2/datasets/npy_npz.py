@@ -20,9 +20,20 @@ class NpyDataset(DenseDesignMatrix):
         mmap_mode : str, optional
             Memory mapping options for memory-mapping an array on disk,
             rather than loading it into memory. See the `numpy.load`
-            docstring for details.
+            docstring for details. With 'r', the design matrix is a
+            read-only `numpy.memmap` and only the pages touched by the
+            iterators are read. When memory-mapped, the dataset pickles
+            to its path only and maps the file again when unpickled.
+
+        Notes
+        -----
+        A 4-dimensional array is used as a topological view with axes
+        ('b', 0, 1, 'c'), which requires a copy to build the design
+        matrix. To avoid materializing a memory-mapped file, store the
+        data as a 2-dimensional design matrix.
         """
         self._path = file
+        self._mmap_mode = mmap_mode
         self._loaded = False
 
     def _deferred_load(self):
@@ -32,7 +43,8 @@ class NpyDataset(DenseDesignMatrix):
             WRITEME
         """
         self._loaded = True
-        loaded = numpy.load(self._path)
+        loaded = numpy.load(self._path,
+                            mmap_mode=getattr(self, '_mmap_mode', None))
         assert isinstance(loaded, numpy.ndarray), (
             "single arrays (.npy) only"
         )
@@ -61,6 +73,28 @@ class NpyDataset(DenseDesignMatrix):
             self._deferred_load()
         return super(NpyDataset, self).iterator(*args, **kwargs)
 
+    def __getstate__(self):
+        """
+        Pickles a memory-mapped or not yet loaded dataset as a reference
+        to its file.
+        """
+        mmap_mode = getattr(self, '_mmap_mode', None)
+        if self._loaded and mmap_mode is None:
+            return super(NpyDataset, self).__getstate__()
+        return {'_path': self._path,
+                '_mmap_mode': mmap_mode,
+                '_loaded': False}
+
+    def __setstate__(self, d):
+        """
+        Restores either a fully pickled dataset or one that will be
+        loaded from its file on first use.
+        """
+        if d.get('_loaded', True):
+            super(NpyDataset, self).__setstate__(d)
+        else:
+            self.__dict__.update(d)
+
 
 class NpzDataset(DenseDesignMatrix):
 
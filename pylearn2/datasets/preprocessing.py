@@ -19,21 +19,18 @@ import warnings
 import os
 import numpy
 from theano.compat.six.moves import xrange
-import scipy
-try:
-    from scipy import linalg
-except ImportError:
-    warnings.warn("Could not import scipy.linalg")
 import theano
 from theano import function, tensor
 
 from pylearn2.blocks import Block
+from pylearn2.datasets.cache import PreprocessedDatasetCache
 from pylearn2.linear.conv2d import Conv2D
 from pylearn2.space import Conv2DSpace, VectorSpace
 from pylearn2.expr.preprocessing import global_contrast_normalize
 from pylearn2.utils.insert_along_axis import insert_columns
 from pylearn2.utils import sharedX
 from pylearn2.utils.exc import reraise_as
+from pylearn2.utils.fork import ForkedState, fork_pool
 from pylearn2.utils.rng import make_np_rng
 from pylearn2.utils import contains_nan
 
@@ -141,6 +138,38 @@ class ExamplewisePreprocessor(Preprocessor):
         raise NotImplementedError(str(type(self)) +
                                   " does not implement as_block.")
 
+    def can_stream(self, can_fit=False):
+        """
+        Returns True if this preprocessor can be applied with
+        `transform_batch`, one batch of examples at a time, which lets a
+        `Pipeline` fuse it with its neighbours and stream batches through
+        them.
+
+        Parameters
+        ----------
+        can_fit : bool, optional
+            See `Preprocessor.apply`. Preprocessors which fit parameters
+            to the whole dataset can only be streamed once fit.
+        """
+        return False
+
+    def transform_batch(self, X, dataset):
+        """
+        Returns the preprocessed version of a batch of rows of the design
+        matrix of `dataset`, with the same shape, without modifying
+        `dataset`.
+
+        Parameters
+        ----------
+        X : numpy.ndarray
+            A batch of rows of `dataset.get_design_matrix()`.
+        dataset : Dataset
+            The dataset the rows come from, e.g. to convert them to a
+            topological view.
+        """
+        raise NotImplementedError(str(type(self)) +
+                                  " does not implement transform_batch.")
+
 
 class BlockPreprocessor(ExamplewisePreprocessor):
 
@@ -165,6 +194,40 @@ class BlockPreprocessor(ExamplewisePreprocessor):
         dataset.X = self.block.perform(dataset.X)
 
 
+# The state shared by the processes of Pipeline._stream
+_stream_state = ForkedState()
+
+
+def _stream_rows(rows):
+    """
+    Reads the rows `start:stop` of the design matrix, passes them through
+    the fused preprocessors and writes them to the output, all found in
+    the value of `_stream_state`.
+
+    Parameters
+    ----------
+    rows : tuple
+        `(start, stop)`.
+
+    Returns
+    -------
+    start : int
+        The index of the first row.
+    batch : numpy.ndarray or None
+        The preprocessed rows, when there is no output array to write
+        them to.
+    """
+    items, dataset, X, out = _stream_state.value
+    start, stop = rows
+    batch = numpy.array(X[start:stop])
+    for item in items:
+        batch = item.transform_batch(batch, dataset)
+    if out is None:
+        return start, batch
+    out[start:stop] = batch
+    return start, None
+
+
 class Pipeline(Preprocessor):
 
     """
@@ -174,10 +237,48 @@ class Pipeline(Preprocessor):
     Parameters
     ----------
     items : WRITEME
+    batch_size : int or None, optional
+        If specified, consecutive example-wise preprocessors which can be
+        streamed (see `ExamplewisePreprocessor.can_stream`) are fused:
+        the design matrix is read `batch_size` examples at a time, passed
+        through all of them, and written back, instead of each of them
+        going over the whole dataset. Preprocessors which need to fit
+        parameters are applied on their own, which also separates the
+        fit phase of a pipeline from its transform phase. As with the
+        preprocessors themselves, an in-memory design matrix is replaced
+        by a new array. A memory-mapped design matrix opened for writing
+        (mode 'r+' or 'w+') is instead written in place, so that data
+        larger than memory can be streamed; so are the design matrices
+        stored on disk, as with `DenseDesignMatrixPyTables`.
+    n_jobs : int or None, optional
+        If greater than 1 (and `batch_size` is specified), the batches of
+        in-memory or memory-mapped design matrices are spread over this
+        many forked processes. Not available on platforms that cannot
+        fork processes.
     """
 
-    def __init__(self, items=None):
+    def __init__(self, items=None, batch_size=None, n_jobs=None):
         self.items = items if items is not None else []
+        if batch_size is not None:
+            batch_size = int(batch_size)
+            assert batch_size > 0, "batch_size must be positive"
+        self.batch_size = batch_size
+        self.n_jobs = n_jobs
+
+    def __setstate__(self, state):
+        """
+        Used to unpickle.
+
+        Parameters
+        ----------
+        state : dict
+            The dictionary created by __getstate__, presumably unpickled
+            from disk.
+        """
+        # Patch old pickle files
+        state.setdefault('batch_size', None)
+        state.setdefault('n_jobs', None)
+        self.__dict__.update(state)
 
     def apply(self, dataset, can_fit=False):
         """
@@ -185,8 +286,134 @@ class Pipeline(Preprocessor):
 
             WRITEME
         """
+        if self.batch_size is None:
+            for item in self.items:
+                item.apply(dataset, can_fit)
+            return
+
+        fused = []
         for item in self.items:
+            if (isinstance(item, ExamplewisePreprocessor) and
+                    item.can_stream(can_fit)):
+                fused.append(item)
+                continue
+            if fused:
+                self._stream(fused, dataset)
+                fused = []
             item.apply(dataset, can_fit)
+        if fused:
+            self._stream(fused, dataset)
+
+    def _stream(self, items, dataset):
+        """
+        Applies the fused example-wise preprocessors `items` to `dataset`,
+        `self.batch_size` examples at a time.
+
+        Parameters
+        ----------
+        items : list
+            Preprocessors which can be streamed.
+        dataset : Dataset
+            The dataset to act on.
+        """
+        X = dataset.get_design_matrix()
+        in_memory = isinstance(X, numpy.ndarray)
+        n_jobs = self.n_jobs if in_memory else None
+        parallel = n_jobs is not None and n_jobs > 1
+        log.info("Streaming {0} through {1}".format(
+            X.shape, ', '.join(type(item).__name__ for item in items)))
+
+        if not in_memory:
+            # e.g. DenseDesignMatrixPyTables, written with
+            # set_design_matrix(batch, start)
+            out = None
+        elif (isinstance(X, numpy.memmap) and X.flags.writeable and
+                X.mode in ('r+', 'w+')):
+            # the pages of the file are also shared with the processes
+            out = X
+        elif parallel:
+            from multiprocessing import sharedctypes
+            buf = sharedctypes.RawArray('b', X.size * X.itemsize)
+            out = numpy.frombuffer(buf, dtype=X.dtype).reshape(X.shape)
+        else:
+            # Do not overwrite arrays the caller may still refer to
+            out = numpy.empty(X.shape, X.dtype)
+
+        rows = [(start, min(start + self.batch_size, X.shape[0]))
+                for start in xrange(0, X.shape[0], self.batch_size)]
+        with _stream_state.bind((items, dataset, X, out)):
+            pool = None
+            if parallel:
+                pool = fork_pool(min(n_jobs, len(rows)))
+                results = pool.imap_unordered(_stream_rows, rows)
+            else:
+                results = (_stream_rows(r) for r in rows)
+            try:
+                for start, batch in results:
+                    if batch is not None:
+                        dataset.set_design_matrix(batch, start=start)
+            finally:
+                if pool is not None:
+                    pool.close()
+                    pool.join()
+
+        if out is not None:
+            if isinstance(out, numpy.memmap):
+                out.flush()
+            dataset.set_design_matrix(out)
+
+
+class CachedPreprocessor(Preprocessor):
+
+    """
+    A Preprocessor that applies another Preprocessor through a
+    `PreprocessedDatasetCache`: the first job to apply it to a dataset
+    saves the result, and later jobs applying it to the same dataset
+    memory-map the saved result instead of recomputing it.
+
+    For example, in a YAML file:
+
+    .. code-block:: yaml
+
+        preprocessor: !obj:pylearn2.datasets.preprocessing.CachedPreprocessor {
+            preprocessor: !obj:pylearn2.datasets.preprocessing.ZCA {},
+            max_size: 20000000000,
+        },
+
+    Parameters
+    ----------
+    preprocessor : Preprocessor
+        The preprocessor to apply.
+    cache_dir : str, optional
+        See `PreprocessedDatasetCache`.
+    max_size : int, optional
+        See `PreprocessedDatasetCache`.
+    mmap_mode : str, optional
+        See `PreprocessedDatasetCache`.
+    """
+
+    def __init__(self, preprocessor, cache_dir=None, max_size=None,
+                 mmap_mode='c'):
+        self.preprocessor = preprocessor
+        self.cache = PreprocessedDatasetCache(cache_dir=cache_dir,
+                                              max_size=max_size,
+                                              mmap_mode=mmap_mode)
+
+    def apply(self, dataset, can_fit=False):
+        """
+        .. todo::
+
+            WRITEME
+        """
+        self.cache.apply(self.preprocessor, dataset, can_fit)
+
+    def invert(self):
+        """
+        .. todo::
+
+            WRITEME
+        """
+        self.preprocessor.invert()
 
 
 class ExtractGridPatches(Preprocessor):
@@ -520,6 +747,18 @@ class MakeUnitNorm(ExamplewisePreprocessor):
         X /= X_norm[:, None]
         dataset.set_design_matrix(X)
 
+    def can_stream(self, can_fit=False):
+        """
+        See `ExamplewisePreprocessor.can_stream`.
+        """
+        return True
+
+    def transform_batch(self, X, dataset):
+        """
+        See `ExamplewisePreprocessor.transform_batch`.
+        """
+        return X / numpy.sqrt(numpy.sum(X ** 2, axis=1))[:, None]
+
     def as_block(self):
         """
         .. todo::
@@ -674,6 +913,18 @@ class RemoveMean(ExamplewisePreprocessor):
         X -= self._mean
         dataset.set_design_matrix(X)
 
+    def can_stream(self, can_fit=False):
+        """
+        See `ExamplewisePreprocessor.can_stream`.
+        """
+        return not can_fit and self._mean is not None and self._axis != 1
+
+    def transform_batch(self, X, dataset):
+        """
+        See `ExamplewisePreprocessor.transform_batch`.
+        """
+        return X - self._mean
+
     def as_block(self):
         """
         .. todo::
@@ -733,6 +984,19 @@ class Standardize(ExamplewisePreprocessor):
         new = (X - self._mean) / (self._std_eps + self._std)
         dataset.set_design_matrix(new)
 
+    def can_stream(self, can_fit=False):
+        """
+        See `ExamplewisePreprocessor.can_stream`.
+        """
+        return (not can_fit and self._mean is not None and
+                self._std is not None)
+
+    def transform_batch(self, X, dataset):
+        """
+        See `ExamplewisePreprocessor.transform_batch`.
+        """
+        return (X - self._mean) / (self._std_eps + self._std)
+
     def as_block(self):
         """
         .. todo::
@@ -897,9 +1161,20 @@ class RemapInterval(ExamplewisePreprocessor):
             WRITEME
         """
         X = dataset.get_design_matrix()
+        dataset.set_design_matrix(self.transform_batch(X, dataset))
+
+    def can_stream(self, can_fit=False):
+        """
+        See `ExamplewisePreprocessor.can_stream`.
+        """
+        return True
+
+    def transform_batch(self, X, dataset):
+        """
+        See `ExamplewisePreprocessor.transform_batch`.
+        """
         X = (X - self.map_from[0]) / numpy.diff(self.map_from)
-        X = X * numpy.diff(self.map_to) + self.map_to[0]
-        dataset.set_design_matrix(X)
+        return X * numpy.diff(self.map_to) + self.map_to[0]
 
 
 class PCA_ViewConverter(object):
@@ -979,6 +1254,72 @@ class PCA_ViewConverter(object):
                                                                 dspace)
 
 
+def _design_batches(dataset, batch_size):
+    """
+    Yields `(start, batch)` pairs covering the design matrix of `dataset`
+    in order, `batch_size` rows at a time, without loading it whole (the
+    design matrix may be in memory, memory-mapped or on disk, as with
+    `DenseDesignMatrixPyTables`).
+
+    Parameters
+    ----------
+    dataset : Dataset
+        The dataset to read.
+    batch_size : int
+        The maximum number of rows per batch.
+    """
+    X = dataset.get_design_matrix()
+    for i in xrange(0, X.shape[0], batch_size):
+        yield i, X[i:i + batch_size]
+
+
+def _batch_moments(batches, ddof=0):
+    """
+    Accumulates the mean and covariance of the rows of a sequence of
+    batches, in float64.
+
+    The sums are taken relative to the mean of the first batch, so that
+    features with a large mean do not lose precision.
+
+    Parameters
+    ----------
+    batches : iterable
+        `(start, batch)` pairs, as yielded by `_design_batches`.
+    ddof : int, optional
+        The covariance is normalized by `n - ddof`, where `n` is the
+        number of rows.
+
+    Returns
+    -------
+    mean : numpy.ndarray
+        The mean of the rows.
+    covariance : numpy.ndarray
+        The covariance matrix of the rows.
+    """
+    n = 0
+    shift = total = outer = None
+    for start, batch in batches:
+        batch = numpy.asarray(batch, dtype='float64')
+        assert batch.ndim == 2
+        assert not contains_nan(batch)
+        log.info("accumulating moments of rows {0} to {1}".format(
+            start, start + batch.shape[0]))
+        if shift is None:
+            shift = batch.mean(axis=0)
+            total = numpy.zeros_like(shift)
+            outer = numpy.zeros((shift.shape[0], shift.shape[0]))
+        batch -= shift
+        n += batch.shape[0]
+        total += batch.sum(axis=0)
+        outer += numpy.dot(batch.T, batch)
+    if n <= ddof:
+        raise ValueError("Not enough examples to estimate a covariance "
+                         "matrix: %d" % n)
+    offset = total / n
+    covariance = (outer - n * numpy.outer(offset, offset)) / (n - ddof)
+    return shift + offset, covariance
+
+
 class PCA(object):
 
     """
@@ -992,11 +1333,20 @@ class PCA(object):
     whiten : bool, optional
         If False, whitening (or sphering) will not be performed (default).
         If True, the preprocessed data will have zero mean and unit covariance.
+    batch_size : int or None, optional
+        If specified, the covariance matrix is accumulated from batches
+        no larger than `batch_size` of the dataset, and the data is
+        projected one batch at a time, so that the dataset is never
+        loaded whole.
     """
 
-    def __init__(self, num_components, whiten=False):
+    def __init__(self, num_components, whiten=False, batch_size=None):
         self._num_components = num_components
         self._whiten = whiten
+        if batch_size is not None:
+            batch_size = int(batch_size)
+            assert batch_size > 0, "batch_size must be positive"
+        self._batch_size = batch_size
         self._pca = None
         # TODO: Is storing these really necessary? This computation
         # can't really be merged since we're basically creating the
@@ -1017,7 +1367,12 @@ class PCA(object):
             from pylearn2.models import pca
             self._pca = pca.CovEigPCA(num_components=self._num_components,
                                       whiten=self._whiten)
-            self._pca.train(dataset.get_design_matrix())
+            if self._batch_size is None:
+                self._pca.train(dataset.get_design_matrix())
+            else:
+                mean, covariance = _batch_moments(
+                    _design_batches(dataset, self._batch_size), ddof=1)
+                self._pca.train_from_cov(covariance, mean)
             self._transform_func = function([self._input],
                                             self._pca(self._input))
             self._invert_func = function([self._output],
@@ -1027,20 +1382,34 @@ class PCA(object):
                 self._pca.reconstruct(self._output, add_mean=False)
             )
 
-        orig_data = dataset.get_design_matrix()
-        dataset.set_design_matrix(
-            self._transform_func(dataset.get_design_matrix())
-        )
-        proc_data = dataset.get_design_matrix()
-        orig_var = orig_data.var(axis=0)
-        proc_var = proc_data.var(axis=0)
-        # assert below fails when 'whiten' is True or sometimes on test
-        # or validation set when the preprocessor was fit on train set
-        if not self._whiten and can_fit:
-            assert proc_var[0] > orig_var.max()
-
-        log.info('original variance: {0}'.format(orig_var.sum()))
-        log.info('processed variance: {0}'.format(proc_var.sum()))
+        if self._batch_size is None:
+            orig_data = dataset.get_design_matrix()
+            dataset.set_design_matrix(
+                self._transform_func(dataset.get_design_matrix())
+            )
+            proc_data = dataset.get_design_matrix()
+            orig_var = orig_data.var(axis=0)
+            proc_var = proc_data.var(axis=0)
+            # assert below fails when 'whiten' is True or sometimes on test
+            # or validation set when the preprocessor was fit on train set
+            if not self._whiten and can_fit:
+                assert proc_var[0] > orig_var.max()
+
+            log.info('original variance: {0}'.format(orig_var.sum()))
+            log.info('processed variance: {0}'.format(proc_var.sum()))
+        else:
+            # The projected data has fewer columns than the original, so
+            # it is written to a new matrix, one batch at a time.
+            X = dataset.get_design_matrix()
+            proc_data = None
+            for start, batch in _design_batches(dataset, self._batch_size):
+                proc_batch = self._transform_func(batch)
+                if proc_data is None:
+                    proc_data = numpy.empty((X.shape[0],
+                                             proc_batch.shape[1]),
+                                            dtype=proc_batch.dtype)
+                proc_data[start:start + proc_batch.shape[0]] = proc_batch
+            dataset.set_design_matrix(proc_data)
         if hasattr(dataset, 'view_converter'):
             if dataset.view_converter is not None:
                 new_converter = PCA_ViewConverter(self._transform_func,
@@ -1101,7 +1470,7 @@ class Downsample(object):
         dataset.set_topological_view(X)
 
 
-class GlobalContrastNormalization(Preprocessor):
+class GlobalContrastNormalization(ExamplewisePreprocessor):
 
     """
     .. todo::
@@ -1167,6 +1536,23 @@ class GlobalContrastNormalization(Preprocessor):
                     min_divisor=self._min_divisor)
                 dataset.set_design_matrix(X, start=i)
 
+    def can_stream(self, can_fit=False):
+        """
+        See `ExamplewisePreprocessor.can_stream`.
+        """
+        return True
+
+    def transform_batch(self, X, dataset):
+        """
+        See `ExamplewisePreprocessor.transform_batch`.
+        """
+        return global_contrast_normalize(X,
+                                         scale=self._scale,
+                                         subtract_mean=self._subtract_mean,
+                                         use_std=self._use_std,
+                                         sqrt_bias=self._sqrt_bias,
+                                         min_divisor=self._min_divisor)
+
 
 class ZCA(Preprocessor):
 
@@ -1195,10 +1581,20 @@ class ZCA(Preprocessor):
         When self.apply(dataset, can_fit=True) store not just the
         preprocessing matrix, but its inverse. This is necessary when
         using this preprocessor to instantiate a ZCA_Dataset.
+    batch_size : int or None, optional
+        If specified, the mean and covariance matrix are accumulated in
+        float64 from batches no larger than `batch_size` of the data, and
+        `apply` whitens and writes the data one batch at a time. The data
+        is then never copied whole, so datasets larger than memory
+        (memory-mapped or `DenseDesignMatrixPyTables`) can be whitened.
+        Note that when the design matrix is a writeable array, it is
+        overwritten in place, so any other reference to it (e.g. the
+        array passed to the dataset's constructor) sees the whitened
+        data. The dataset must have a design matrix.
     """
 
     def __init__(self, n_components=None, n_drop_components=None,
-                 filter_bias=0.1, store_inverse=True):
+                 filter_bias=0.1, store_inverse=True, batch_size=None):
         warnings.warn("This ZCA preprocessor class is known to yield very "
                       "different results on different platforms. If you plan "
                       "to conduct experiments with this preprocessing on "
@@ -1218,6 +1614,10 @@ class ZCA(Preprocessor):
         self.filter_bias = numpy.cast[theano.config.floatX](filter_bias)
         self.has_fit_ = False
         self.store_inverse = store_inverse
+        if batch_size is not None:
+            batch_size = int(batch_size)
+            assert batch_size > 0, "batch_size must be positive"
+        self.batch_size = batch_size
         self.P_ = None  # set by fit()
         self.inv_P_ = None  # set by fit(), if self.store_inverse is True
 
@@ -1387,6 +1787,8 @@ class ZCA(Preprocessor):
 
         if not hasattr(self, "inv_P_"):
             self.inv_P_ = None
+        if not hasattr(self, "batch_size"):
+            self.batch_size = None
 
     def fit(self, X):
         """
@@ -1402,21 +1804,30 @@ class ZCA(Preprocessor):
         Implementation details:
         Stores result as `self.P_`.
         If self.store_inverse is true, this also computes `self.inv_P_`.
+        If self.batch_size is set, `X` is read `batch_size` rows at a time
+        and is not copied.
         """
 
         assert X.dtype in ['float32', 'float64']
-        assert not contains_nan(X)
         assert len(X.shape) == 2
-        n_samples = X.shape[0]
+
+        log.info('computing zca of a {0} matrix'.format(X.shape))
+
+        if self.batch_size is not None:
+            self._fit_batches((i, X[i:i + self.batch_size])
+                              for i in xrange(0, X.shape[0], self.batch_size))
+            return
+
+        assert not contains_nan(X)
         if self.copy:
             X = X.copy()
         # Center data
         self.mean_ = numpy.mean(X, axis=0)
         X -= self.mean_
 
-        log.info('computing zca of a {0} matrix'.format(X.shape))
         t1 = time.time()
 
+        import scipy.sparse
         bias = self.filter_bias * scipy.sparse.identity(X.shape[1],
                                                         theano.config.floatX)
 
@@ -1424,6 +1835,39 @@ class ZCA(Preprocessor):
         t2 = time.time()
         log.info("cov estimate took {0} seconds".format(t2 - t1))
 
+        self._fit_covariance(covariance)
+
+    def _fit_batches(self, batches):
+        """
+        Fits this `ZCA` instance to the rows of a sequence of batches,
+        accumulating the mean and covariance matrix in float64.
+
+        Parameters
+        ----------
+        batches : iterable
+            `(start, batch)` pairs, as yielded by `_design_batches`.
+        """
+        t1 = time.time()
+        self.mean_, covariance = _batch_moments(batches)
+        covariance.flat[::covariance.shape[0] + 1] += self.filter_bias
+        t2 = time.time()
+        log.info("cov estimate took {0} seconds".format(t2 - t1))
+
+        self._fit_covariance(covariance)
+
+    def _fit_covariance(self, covariance):
+        """
+        Computes `self.P_` (and `self.inv_P_`) from the regularized
+        covariance matrix of the data.
+
+        Parameters
+        ----------
+        covariance : numpy.ndarray
+            The covariance matrix, with `filter_bias` added to its
+            diagonal.
+        """
+        # scipy.linalg is slow to import and only needed here
+        from scipy import linalg
         t1 = time.time()
         eigs, eigv = linalg.eigh(covariance)
         t2 = time.time()
@@ -1465,9 +1909,18 @@ class ZCA(Preprocessor):
 
     def apply(self, dataset, can_fit=False):
         """
-        .. todo::
+        Whitens the design matrix of `dataset`, after fitting this ZCA to
+        it if it has not been fit yet and `can_fit` is True.
 
-            WRITEME
+        When `batch_size` is set, a writeable design matrix is
+        overwritten in place, otherwise it is replaced by a new array.
+
+        Parameters
+        ----------
+        dataset : DenseDesignMatrix
+            The dataset to whiten.
+        can_fit : bool, optional
+            Whether this ZCA may be fit to `dataset`.
         """
         # Compiles apply.x_minus_mean_times_p(), a numeric Theano function that
         # evauates dot(X - mean, P)
@@ -1481,6 +1934,10 @@ class ZCA(Preprocessor):
                                                          p_symbol],
                                                         new_x_symbol)
 
+        if self.batch_size is not None:
+            self._apply_batches(dataset, can_fit)
+            return
+
         X = dataset.get_design_matrix()
         assert X.dtype in ['float32', 'float64']
         if not self.has_fit_:
@@ -1490,6 +1947,42 @@ class ZCA(Preprocessor):
         new_X = ZCA._gpu_matrix_dot(X - self.mean_, self.P_)
         dataset.set_design_matrix(new_X)
 
+    def _apply_batches(self, dataset, can_fit):
+        """
+        Fits (if needed) and applies this `ZCA` instance to `dataset`,
+        `self.batch_size` examples at a time.
+
+        In-memory design matrices are overwritten in place (or, if they
+        are read-only, e.g. memory-mapped in mode 'r', written to a
+        single new matrix), on-disk ones are written back batch by batch
+        with `set_design_matrix(batch, start)`.
+        """
+        if not hasattr(dataset, 'get_design_matrix'):
+            raise NotImplementedError("%s has no design matrix to read the "
+                                      "data from and write the whitened "
+                                      "data to." % type(dataset))
+        if not self.has_fit_:
+            assert can_fit
+            log.info('computing zca of {0} in batches of {1}'.format(
+                dataset, self.batch_size))
+            self._fit_batches(_design_batches(dataset, self.batch_size))
+
+        X = dataset.get_design_matrix()
+        assert X.dtype in ['float32', 'float64']
+        in_memory = isinstance(X, numpy.ndarray)
+        if in_memory:
+            new_X = X if X.flags.writeable else numpy.empty(X.shape, X.dtype)
+        for start, batch in _design_batches(dataset, self.batch_size):
+            log.info("ZCA processing data from {0} to {1}".format(
+                start, start + batch.shape[0]))
+            new_batch = ZCA._gpu_matrix_dot(batch - self.mean_, self.P_)
+            if in_memory:
+                new_X[start:start + new_batch.shape[0]] = new_batch
+            else:
+                dataset.set_design_matrix(new_batch, start=start)
+        if in_memory:
+            dataset.set_design_matrix(new_X)
+
     def inverse(self, X):
         """
         .. todo::
@@ -1618,6 +2111,23 @@ class LeCunLCN(ExamplewisePreprocessor):
             dataset.set_topological_view(transformed,
                                          dataset.view_converter.axes)
 
+    def can_stream(self, can_fit=False):
+        """
+        See `ExamplewisePreprocessor.can_stream`.
+        """
+        return True
+
+    def transform_batch(self, X, dataset):
+        """
+        See `ExamplewisePreprocessor.transform_batch`.
+        """
+        axes = ['b', 0, 1, 'c']
+        dataset_axes = dataset.view_converter.axes
+        transformed = self.transform(convert_axes(
+            dataset.get_topological_view(X), dataset_axes, axes))
+        transformed = convert_axes(transformed, axes, dataset_axes)
+        return dataset.view_converter.topo_view_to_design_mat(transformed)
+
 
 class RGB_YUV(ExamplewisePreprocessor):
 
@@ -1727,6 +2237,20 @@ class RGB_YUV(ExamplewisePreprocessor):
                                              dataset.view_converter.axes,
                                              start=i)
 
+    def can_stream(self, can_fit=False):
+        """
+        See `ExamplewisePreprocessor.can_stream`.
+        """
+        return True
+
+    def transform_batch(self, X, dataset):
+        """
+        See `ExamplewisePreprocessor.transform_batch`.
+        """
+        transformed = self.transform(dataset.get_topological_view(X),
+                                     dataset.view_converter.axes)
+        return dataset.view_converter.topo_view_to_design_mat(transformed)
+
 
 class CentralWindow(Preprocessor):
 
@@ -0,0 +1,104 @@
+"""
+Tests for pylearn2.datasets.augmentation
+"""
+import numpy as np
+from nose.tools import assert_raises
+
+from pylearn2.datasets.augmentation import (central_window,
+                                            random_window_and_flip,
+                                            WindowAndFlipAugmentation)
+from pylearn2.datasets.dense_design_matrix import (DenseDesignMatrix,
+                                                   DefaultViewConverter)
+from pylearn2.space import Conv2DSpace
+
+
+def test_random_window_and_flip():
+    """
+    Compares the windows to windows extracted one image at a time.
+    """
+    rng = np.random.RandomState([2014, 10, 16])
+    # 6 channels of 5x7 images, in c01b order
+    batch = rng.normal(size=(6, 5, 7, 4))
+    axes = ('c', 0, 1, 'b')
+    windows = random_window_and_flip(batch, (4, 3),
+                                     np.random.RandomState([1, 2]),
+                                     pad=1, axes=axes)
+    assert windows.shape == (6, 4, 3, 4)
+
+    rng = np.random.RandomState([1, 2])
+    padded = np.zeros((4, 7, 9, 6))
+    padded[:, 1:-1, 1:-1, :] = batch.transpose(3, 1, 2, 0)
+    rows = rng.randint(0, 4, size=4)
+    cols = rng.randint(0, 7, size=4)
+    flipped = rng.randint(0, 2, size=4)
+    for i in range(4):
+        window = padded[i, rows[i]:rows[i] + 4, cols[i]:cols[i] + 3, :]
+        if flipped[i]:
+            window = window[:, ::-1, :]
+        assert np.array_equal(window, windows.transpose(3, 1, 2, 0)[i])
+
+    assert_raises(ValueError, random_window_and_flip, batch, (6, 6),
+                  rng, axes=axes)
+
+
+def test_central_window():
+    """
+    Checks the central windows, with and without padding.
+    """
+    batch = np.arange(2 * 5 * 6 * 3).reshape((2, 5, 6, 3))
+    windows = central_window(batch, (3, 2))
+    assert np.array_equal(windows, batch[:, 1:4, 2:4, :])
+    windows = central_window(batch, (7, 8), pad=1)
+    assert windows.shape == (2, 7, 8, 3)
+    assert np.array_equal(windows[:, 1:-1, 1:-1, :], batch)
+    assert_raises(ValueError, central_window, batch, (6, 6))
+
+
+def test_augmented_iterator():
+    """
+    Checks that an augmented dataset yields windows of its images in the
+    requested space, and that its stored data is left unchanged.
+    """
+    rng = np.random.RandomState([2014, 10, 17])
+    X = rng.normal(size=(10, 5 * 5 * 2)).astype('float32')
+    view_converter = DefaultViewConverter((5, 5, 2), axes=('b', 0, 1, 'c'))
+    dataset = DenseDesignMatrix(X=X.copy(), view_converter=view_converter)
+    topo = dataset.get_topological_view()
+    dataset.set_augmentation(WindowAndFlipAugmentation((3, 3), flip=False))
+
+    space = Conv2DSpace(shape=(3, 3), num_channels=2, axes=('c', 0, 1, 'b'),
+                        dtype='float32')
+    for prefetch in (None, 2):
+        it = dataset.iterator(mode='sequential', batch_size=5,
+                              data_specs=(space, 'features'),
+                              prefetch=prefetch, augment=True)
+        start = 0
+        for batch in it:
+            assert batch.shape == (2, 3, 3, 5)
+            batch = batch.transpose(3, 1, 2, 0)
+            for i, window in enumerate(batch):
+                image = topo[start + i]
+                # the window is somewhere in the image
+                assert any(np.array_equal(window,
+                                          image[r:r + 3, c:c + 3, :])
+                           for r in range(3) for c in range(3))
+            start += len(batch)
+        assert start == 10
+    assert np.array_equal(dataset.X, X)
+
+    # Iterators that do not augment yield the central windows, and all
+    # iterators are in the space declared by the dataset
+    it = dataset.iterator(mode='sequential', batch_size=5,
+                          data_specs=(space, 'features'))
+    batch = np.concatenate(list(it), axis=3).transpose(3, 1, 2, 0)
+    assert np.array_equal(batch, topo[:, 1:4, 1:4, :])
+    assert dataset.get_data_specs()[0].get_total_dimension() == 3 * 3 * 2
+    batch = dataset.iterator(mode='sequential', batch_size=5).next()
+    assert batch.shape == (5, 3 * 3 * 2)
+    assert_raises(ValueError, dataset.iterator(
+        mode='sequential', batch_size=5,
+        data_specs=(Conv2DSpace(shape=(5, 5), num_channels=2),
+                    'features')).next)
+
+    assert_raises(ValueError, DenseDesignMatrix(X=X).set_augmentation,
+                  WindowAndFlipAugmentation((3, 3)))
@@ -1,9 +1,14 @@
+import os
+import shutil
+import tempfile
+
 import numpy as np
 
 from pylearn2.datasets.dense_design_matrix import DenseDesignMatrix
 from pylearn2.datasets.dense_design_matrix import DenseDesignMatrixPyTables
 from pylearn2.datasets.dense_design_matrix import DefaultViewConverter
 from pylearn2.datasets.dense_design_matrix import from_dataset
+from pylearn2.space import Conv2DSpace
 from pylearn2.utils import serial
 
 
@@ -106,3 +111,73 @@ def test_from_dataset():
     assert slice_d.X.shape[1] == d3.X.shape[1]
     assert slice_d.X.shape[0] == 5
     assert slice_d.y.shape[0] == 5
+
+
+def test_design_loc_mmap():
+    """
+    Tests that a dataset saved with use_design_loc can be memory-mapped
+    when it is loaded back, and saved again without clobbering the file.
+    """
+    rng = np.random.RandomState([1, 2, 3])
+    X = rng.randn(10, 4)
+    y = rng.randn(10, 2)
+    tmpdir = tempfile.mkdtemp()
+    try:
+        X_path = os.path.join(tmpdir, 'X.npy')
+        y_path = os.path.join(tmpdir, 'y.npy')
+        pkl_path = os.path.join(tmpdir, 'ddm.pkl')
+        ds = DenseDesignMatrix(X=X, y=y)
+        ds.use_design_loc(X_path, mmap_mode='r', targets_path=y_path)
+        serial.save(pkl_path, ds)
+
+        loaded = serial.load(pkl_path)
+        assert isinstance(loaded.X, np.memmap)
+        assert isinstance(loaded.y, np.memmap)
+        assert np.all(loaded.X == X)
+        batch = loaded.iterator(mode='shuffled_sequential',
+                                batch_size=3).next()
+        assert batch.shape == (3, 4)
+
+        # Saving a memory-mapped dataset must leave its files intact
+        serial.save(pkl_path, loaded)
+        assert np.all(serial.load(pkl_path, mmap_mode='r').X == X)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_cache_topological_view():
+    """
+    Tests that the batches sliced from the cached topological view are
+    contiguous and equal to the ones formatted from the design matrix.
+    """
+    rng = np.random.RandomState([1, 2, 3])
+    topo_view = rng.randn(10, 2, 2, 3).astype('float32')
+    for axes, batch_size in ((('b', 'c', 0, 1), None),
+                             (('c', 0, 1, 'b'), 4)):
+        space = Conv2DSpace(shape=(2, 2), num_channels=3, axes=axes,
+                            dtype='float32')
+        data_specs = (space, 'features')
+        ds = DenseDesignMatrix(topo_view=topo_view)
+        expected = list(ds.iterator(mode='sequential', batch_size=4,
+                                    data_specs=data_specs))
+        ds.cache_topological_view(axes, batch_size, 'float32')
+        batches = list(ds.iterator(mode='sequential', batch_size=4,
+                                   data_specs=data_specs))
+        assert len(batches) == len(expected)
+        for batch, expected_batch in zip(batches, expected):
+            assert batch.flags.c_contiguous
+            assert np.all(batch == expected_batch)
+        batch = ds.iterator(mode='shuffled_sequential', batch_size=3,
+                            data_specs=data_specs, rng=0).next()
+        assert batch.shape == space.get_origin_batch(3).shape
+
+    # Lazily made by the first iterator, and discarded with the data
+    ds = DenseDesignMatrix(topo_view=topo_view)
+    ds.cache_topological_view()
+    ds.iterator(mode='sequential', batch_size=4, data_specs=data_specs)
+    assert ds._topo_view_cache.space == space
+    ds.set_design_matrix(ds.X * 2)
+    assert ds._topo_view_cache is None
+    batch = ds.iterator(mode='sequential', batch_size=4,
+                        data_specs=data_specs).next()
+    assert np.all(batch == 2 * expected[0])
@@ -99,6 +99,37 @@ def test_hdf5_load_all():
     # cleanup
     os.remove(filename)
 
+
+def test_hdf5_chunk_shuffled_get():
+    """Read shuffled batches from a chunked HDF5 file."""
+    skip_if_no_h5py()
+    import h5py
+    from pylearn2.datasets.hdf5 import HDF5Dataset
+    from pylearn2.space import VectorSpace
+
+    handle, filename = tempfile.mkstemp()
+    X = np.random.RandomState(1).rand(100, 5)
+    with h5py.File(filename, 'w') as f:
+        f.create_dataset('X', data=X, chunks=(10, 5))
+
+    dataset = HDF5Dataset(filename, sources=['X'], spaces=[VectorSpace(5)],
+                          aliases=['features'], use_h5py=True)
+    # unsorted indexes with duplicates
+    indexes = np.array([42, 3, 41, 97, 3, 0, 43])
+    batch, = dataset.get(('features',), indexes)
+    assert np.all(batch == X[indexes])
+
+    iterator = dataset.iterator(mode='chunk_shuffled_sequential',
+                                batch_size=8, rng=0,
+                                data_specs=(VectorSpace(5), 'features'))
+    assert iterator._subset_iterator._chunk_size == 10
+    visited = np.concatenate(list(iterator))
+    assert np.all(np.sort(visited, axis=0) == np.sort(X, axis=0))
+    dataset._fhandler.close()
+
+    # cleanup
+    os.remove(filename)
+
 design_matrix_yaml = """
 !obj:pylearn2.train.Train {
     dataset: &train !obj:pylearn2.datasets.hdf5.HDF5Dataset {
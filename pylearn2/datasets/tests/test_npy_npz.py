@@ -1,6 +1,7 @@
 from pylearn2.datasets.npy_npz import NpyDataset, NpzDataset
 import unittest
 from pylearn2.testing.skip import skip_if_no_data
+from pylearn2.utils import serial
 import numpy as np
 import os
 
@@ -16,3 +17,17 @@ def test_npy_npz():
     assert np.all(npy.X == npz.X)
     os.remove('test.npy')
     os.remove('test.npz')
+
+
+def test_npy_mmap():
+    skip_if_no_data()
+    arr = np.array([[3, 4, 5], [4, 5, 6]], dtype='float32')
+    np.save('test.npy', arr)
+    npy = NpyDataset(file='test.npy', mmap_mode='r')
+    npy._deferred_load()
+    assert isinstance(npy.X, np.memmap)
+    assert np.all(npy.X == arr)
+    npy = serial.from_string(serial.to_string(npy))
+    assert not npy._loaded
+    assert np.all(npy.get_design_matrix() == arr)
+    os.remove('test.npy')
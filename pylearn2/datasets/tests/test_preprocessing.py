@@ -3,6 +3,8 @@ Unit tests for ./preprocessing.py
 """
 
 import copy
+import shutil
+import tempfile
 import numpy as np
 
 from theano import config
@@ -19,7 +21,12 @@ from pylearn2.datasets.preprocessing import (GlobalContrastNormalization,
                                              LeCunLCN,
                                              RGB_YUV,
                                              ZCA,
-                                             PCA)
+                                             PCA,
+                                             Pipeline,
+                                             CachedPreprocessor,
+                                             RemapInterval,
+                                             MakeUnitNorm,
+                                             Standardize)
 
 
 class testGlobalContrastNormalization:
@@ -194,6 +201,76 @@ def test_rgb_yuv():
     assert isfinite(result)
 
 
+def test_pipeline_stream():
+    """
+    Checks that streaming batches through fused preprocessors, serially
+    or with several processes, gives the same result as applying them one
+    after the other.
+    """
+    rng = np.random.RandomState([2014, 10, 20])
+    X = as_floatX(rng.uniform(size=(23, 6)))
+
+    def make_pipeline(**kwargs):
+        return Pipeline([GlobalContrastNormalization(),
+                         Standardize(),
+                         RemapInterval([-10, 10], [0, 1]),
+                         MakeUnitNorm()], **kwargs)
+
+    pipeline = make_pipeline()
+    train = DenseDesignMatrix(X=X.copy())
+    pipeline.apply(train, can_fit=True)
+    test = DenseDesignMatrix(X=X.copy())
+    pipeline.apply(test)
+
+    for n_jobs in [None, 2]:
+        streamed = make_pipeline(batch_size=5, n_jobs=n_jobs)
+        dataset = DenseDesignMatrix(X=X.copy())
+        streamed.apply(dataset, can_fit=True)
+        assert_allclose(dataset.get_design_matrix(),
+                        train.get_design_matrix(), rtol=1e-5)
+
+        # Once fit, Standardize is fused with the other preprocessors
+        assert streamed.items[1].can_stream(can_fit=False)
+        original = X.copy()
+        dataset = DenseDesignMatrix(X=original)
+        streamed.apply(dataset)
+        assert_allclose(dataset.get_design_matrix(),
+                        test.get_design_matrix(), rtol=1e-5)
+        # The array given to the dataset is not overwritten
+        assert np.array_equal(original, X)
+
+
+def test_cached_preprocessor():
+    """
+    Checks that a preprocessor applied through the cache is only fit
+    once, and that a hit restores both the dataset and the preprocessor.
+    """
+    rng = np.random.RandomState([2014, 10, 21])
+    X = as_floatX(rng.normal(size=(100, 5)))
+    cache_dir = tempfile.mkdtemp()
+    try:
+        preprocessor = CachedPreprocessor(ZCA(), cache_dir=cache_dir)
+        expected = DenseDesignMatrix(X=X.copy())
+        preprocessor.apply(expected, can_fit=True)
+
+        cached = CachedPreprocessor(ZCA(), cache_dir=cache_dir)
+        dataset = DenseDesignMatrix(X=X.copy())
+        cached.apply(dataset, can_fit=True)
+        assert isinstance(dataset.get_design_matrix(), np.memmap)
+        assert_allclose(dataset.get_design_matrix(),
+                        expected.get_design_matrix())
+        assert cached.preprocessor.has_fit_
+        assert_allclose(cached.preprocessor.P_,
+                        preprocessor.preprocessor.P_)
+
+        # A different dataset misses
+        dataset = DenseDesignMatrix(X=X[::-1].copy())
+        cached.apply(dataset)
+        assert not isinstance(dataset.get_design_matrix(), np.memmap)
+    finally:
+        shutil.rmtree(cache_dir)
+
+
 class testZCA:
 
     def setup(self):
@@ -295,6 +372,24 @@ class testZCA:
         test(store_inverse=True)
         test(store_inverse=False)
 
+    def test_zca_batches(self):
+        """
+        Confirm that fitting and applying ZCA in batches gives the same
+        result as in one go, writing the whitened data in place.
+        """
+        expected_X = self.get_preprocessed_data(ZCA(filter_bias=0.0))
+
+        X = as_floatX(copy.copy(self.X))
+        dataset = DenseDesignMatrix(X=X)
+        preprocessor = ZCA(filter_bias=0.0, batch_size=3)
+        preprocessor.apply(dataset, can_fit=True)
+        assert dataset.get_design_matrix() is X
+        assert_allclose(X, expected_X, rtol=1e-3)
+
+        preprocessor = ZCA(filter_bias=0.0, batch_size=3)
+        preprocessor.fit(self.X)
+        assert_allclose(preprocessor.mean_, self.X.mean(axis=0))
+
     def test_zca_dtypes(self):
         """
         Confirm that ZCA.fit works regardless of dtype of
@@ -366,3 +461,21 @@ class testPCA:
 
         assert self.dataset.get_design_matrix().shape[1] ==\
             self.num_components - 1
+
+    def test_apply_batches(self):
+        """
+        Checks that PCA fitted and applied in batches gives the same
+        projection as in one go, up to the signs of the components
+        """
+        X = self.dataset.get_design_matrix().copy()
+        sut = PCA(self.num_components, whiten=True)
+        sut.apply(self.dataset, True)
+        expected = self.dataset.get_design_matrix()
+
+        dataset = DenseDesignMatrix(X=X)
+        sut = PCA(self.num_components, whiten=True, batch_size=4)
+        sut.apply(dataset, True)
+        actual = dataset.get_design_matrix()
+        assert actual.shape == expected.shape
+        np.testing.assert_allclose(np.abs(actual), np.abs(expected),
+                                   rtol=1e-3, atol=1e-4)
@@ -82,7 +82,7 @@ class VectorSpacesDataset(Dataset):
     @functools.wraps(Dataset.iterator)
     def iterator(self, mode=None, batch_size=None, num_batches=None,
                  rng=None, data_specs=None,
-                 return_tuple=False):
+                 return_tuple=False, prefetch=None, batch_buffers=None):
 
         if mode is None:
             if hasattr(self, '_iter_subset_class'):
@@ -105,7 +105,8 @@ class VectorSpacesDataset(Dataset):
             self,
             mode(self.get_num_examples(),
                  batch_size, num_batches, rng),
-            data_specs=data_specs, return_tuple=return_tuple
+            data_specs=data_specs, return_tuple=return_tuple,
+            prefetch=prefetch, batch_buffers=batch_buffers
         )
 
     def get_data_specs(self):
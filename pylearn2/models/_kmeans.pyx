@@ -113,7 +113,7 @@ cdef inline void _compute_means(np.ndarray[DTYPE_t, ndim=2] data,
 @cython.embedsignature(True)
 cpdef tuple kmeans(np.ndarray[DTYPE_t, ndim=2] data, np.npy_intp k,
                    np.npy_intp max_iter=1000, np.ndarray init=None,
-                   rng=(2013, 02, 22)):
+                   rng=None):
     """
     Run k-means on a dense matrix of features, parallelizing
     computations with OpenMP and BLAS where possible.
@@ -138,7 +138,8 @@ cpdef tuple kmeans(np.ndarray[DTYPE_t, ndim=2] data, np.npy_intp k,
         in the absence of `init`, or a seed with which to create one.
         See the docstring for `numpy.random.RandomState` for
         details on the accepted seed formats. Default is a
-        deterministic seed to enusre reproducibility.
+        deterministic seed to ensure reproducibility. Must be None
+        if `init` is provided.
 
     Returns
     -------
@@ -205,7 +206,7 @@ cpdef tuple kmeans(np.ndarray[DTYPE_t, ndim=2] data, np.npy_intp k,
     else:
         means = np.empty((k, nfeat), dtype=dtype)
         # Randomly initialize assignments to uniformly drawn training points.
-	rng = make_np_rng(rng, which_method='random_integers')
+        rng = make_np_rng(rng, (2013, 2, 22), which_method='random_integers')
         assign = rng.random_integers(0, k - 1, size=ndata).astype(intp)
         # Compute the means from the random initial assignments.
         _compute_means(data, assign, means, counts)
@@ -253,4 +254,4 @@ cpdef tuple kmeans(np.ndarray[DTYPE_t, ndim=2] data, np.npy_intp k,
             _compute_means(data, assign, means, counts)
         else:
             break
-    return assign, means, iteration + 1, converged
+    return means, assign, iteration + 1, converged
@@ -10,18 +10,143 @@ from pylearn2.utils import sharedX
 from pylearn2.utils.mem import improve_memory_error_message
 from pylearn2.utils import wraps
 from pylearn2.utils import contains_nan
-import warnings
+from pylearn2.utils.rng import make_np_rng
 
 try:
     import milk
 except ImportError:
     milk = None
-    warnings.warn(""" Install milk ( http://packages.python.org/milk/ )
-                    It has a better k-means implementation. Falling back to
-                    our own really slow implementation. """)
+
+try:
+    from pylearn2.models import _kmeans
+except ImportError:
+    _kmeans = None
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of entries of the blocks of the distance matrix computed
+# at once, to bound the memory used by the assignment step
+_MAX_DISTS_BLOCK_SIZE = 2 ** 22
+
+
+def _chunks(n, k, chunk_size=None):
+    """
+    Splits the indices of `n` examples into slices of consecutive
+    examples, whose distance matrix to `k` centroids fits in memory.
+
+    Parameters
+    ----------
+    n : int
+        Number of examples.
+    k : int
+        Number of centroids.
+    chunk_size : int, optional
+        Number of examples per slice. By default, each slice has at most
+        `_MAX_DISTS_BLOCK_SIZE` distances.
+
+    Returns
+    -------
+    slices : list of slice
+        The slices, in order.
+    """
+    if chunk_size is None:
+        chunk_size = max(1, _MAX_DISTS_BLOCK_SIZE // max(k, 1))
+    return [slice(start, min(start + chunk_size, n))
+            for start in xrange(0, n, chunk_size)]
+
+
+def _squared_distances(X, mu, mu_sqnorm=None):
+    """
+    Computes the squared euclidean distances between examples and
+    centroids as ||x||^2 - 2 x.mu + ||mu||^2, with a single matrix
+    product.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Matrix of examples of shape (n, d)
+    mu : numpy.ndarray
+        Matrix of centroids of shape (k, d)
+    mu_sqnorm : numpy.ndarray, optional
+        The squared norms of the centroids, if already known.
+
+    Returns
+    -------
+    dists : numpy.ndarray
+        Matrix of shape (n, k) of squared distances.
+    """
+    if mu_sqnorm is None:
+        mu_sqnorm = numpy.square(mu).sum(axis=1)
+    dists = numpy.dot(X, mu.T)
+    dists *= -2
+    dists += numpy.square(X).sum(axis=1)[:, numpy.newaxis]
+    dists += mu_sqnorm
+    # Rounding errors can make the distance of a point to itself negative
+    numpy.maximum(dists, 0, out=dists)
+    return dists
+
+
+def _assign(X, mu, sums=None, chunk_size=None):
+    """
+    Assigns each example to its closest centroid, processing the examples
+    by chunks to bound the memory used by the distance matrix.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Matrix of examples of shape (n, d)
+    mu : numpy.ndarray
+        Matrix of centroids of shape (k, d)
+    sums : numpy.ndarray, optional
+        If specified, a (k, d) matrix to which the sum of the examples
+        assigned to each centroid is added.
+    chunk_size : int, optional
+        Number of examples processed at once. See `_chunks`.
+
+    Returns
+    -------
+    assign : numpy.ndarray
+        Vector of length n of the indices of the closest centroids.
+    min_dists : numpy.ndarray
+        Vector of length n of the squared distances to the closest
+        centroids.
+    """
+    n = X.shape[0]
+    assign = numpy.empty(n, dtype='int64')
+    min_dists = numpy.empty(n, dtype=X.dtype)
+    mu_sqnorm = numpy.square(mu).sum(axis=1)
+    for chunk in _chunks(n, mu.shape[0], chunk_size):
+        dists = _squared_distances(X[chunk], mu, mu_sqnorm)
+        assign[chunk] = dists.argmin(axis=1)
+        min_dists[chunk] = dists[numpy.arange(dists.shape[0]),
+                                 assign[chunk]]
+        if sums is not None:
+            _add_sums(X[chunk], assign[chunk], sums)
+    return assign, min_dists
+
+
+def _add_sums(X, assign, sums):
+    """
+    Adds the sum of the examples assigned to each centroid to `sums`.
+
+    Parameters
+    ----------
+    X : numpy.ndarray
+        Matrix of examples of shape (n, d)
+    assign : numpy.ndarray
+        Vector of length n of the indices of the centroids.
+    sums : numpy.ndarray
+        Matrix of shape (k, d), updated in place.
+    """
+    if len(assign) == 0:
+        return
+    order = numpy.argsort(assign, kind='mergesort')
+    sorted_assign = assign[order]
+    starts = numpy.flatnonzero(numpy.concatenate(
+        ([True], sorted_assign[1:] != sorted_assign[:-1])))
+    sums[sorted_assign[starts]] += numpy.add.reduceat(X[order], starts,
+                                                      axis=0)
+
 
 class KMeans(Block, Model):
     """
@@ -38,13 +163,41 @@ class KMeans(Block, Model):
         Threshold of distance to clusters under which k-means stops
         iterating.
     max_iter : int, optional
-        Maximum number of iterations. Defaults to infinity.
+        Maximum number of iterations. Defaults to infinity. In mini-batch
+        mode, this is the maximum number of passes through the dataset.
     verbose : bool
         WRITEME
+    batch_size : int, optional
+        If specified, trains with mini-batch k-means (Sculley, 2010) on
+        batches of this size drawn from the iterator of the dataset, so
+        the dataset does not need to fit in memory. Otherwise, trains
+        with batch k-means on the design matrix of the dataset.
+    backend : str, optional
+        Implementation of batch k-means to use:
+
+        - 'numpy' : the vectorized implementation of this module, which
+          computes distances by blocks of examples to bound memory usage
+        - 'cython' : the parallel implementation of
+          `pylearn2.models._kmeans`, which initializes the centroids
+          differently and stops when the assignments stop changing
+          rather than using `convergence_th`, so it has to be selected
+          explicitly. It requires float32 data and the compiled
+          extension (run `python setup.py develop`).
+        - 'milk' : the implementation of the milk package
+        - 'auto' (default) : 'milk' if it is installed, else 'numpy',
+          as in previous versions.
+    chunk_size : int, optional
+        Number of examples whose distances to the centroids are computed
+        at once by the 'numpy' backend and in mini-batch mode. By
+        default, chunks are chosen to hold about four million distances.
+    seed : int or list of int, optional
+        Seed of the random number generator used to initialize the
+        centroids and to draw the mini-batches.
     """
 
     def __init__(self, k, nvis, convergence_th=1e-6, max_iter=None,
-                 verbose=False):
+                 verbose=False, batch_size=None, backend='auto',
+                 chunk_size=None, seed=None):
         Block.__init__(self)
         Model.__init__(self)
 
@@ -62,6 +215,24 @@ class KMeans(Block, Model):
 
         self.verbose = verbose
 
+        if backend not in ('auto', 'numpy', 'cython', 'milk'):
+            raise ValueError("KMeans init: backend should be 'auto', "
+                             "'numpy', 'cython' or 'milk', got %s" %
+                             str(backend))
+        if backend == 'cython' and _kmeans is None:
+            raise ImportError("Import of Cython module "
+                              "pylearn2.models._kmeans failed. Please make "
+                              "sure you have run 'python setup.py develop' "
+                              "in the pylearn2 directory")
+        if backend == 'milk' and milk is None:
+            raise ImportError("The milk backend of KMeans requires milk "
+                              "( http://packages.python.org/milk/ )")
+        self.backend = backend
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.rng = make_np_rng(seed, [2014, 10, 16],
+                               which_method=['randint', 'permutation'])
+
     def train_all(self, dataset, mu=None):
         """
         Process kmeans algorithm on the input to localize clusters.
@@ -79,35 +250,66 @@ class KMeans(Block, Model):
 
         # TODO-- why does this sometimes return X and sometimes return nothing?
 
+        if mu is not None:
+            if not len(mu) == self.k:
+                raise Exception("You gave %i clusters"
+                                ", but k=%i were expected"
+                                % (len(mu), self.k))
+
+        if self.batch_size is not None:
+            mu = self._train_minibatch(dataset, mu)
+            if mu is None:
+                return None
+            self.mu = sharedX(mu)
+            self._params = [self.mu]
+            return
+
         X = dataset.get_design_matrix()
 
         n, m = X.shape
         k = self.k
 
-        if milk is not None:
-            # use the milk implementation of k-means if it's available
+        backend = self.backend
+        if backend == 'auto':
+            if milk is not None:
+                backend = 'milk'
+            else:
+                backend = 'numpy'
+
+        if backend == 'milk':
             cluster_ids, mu = milk.kmeans(X, k)
+        elif backend == 'cython':
+            if mu is not None:
+                init = numpy.array(mu, dtype='float32')
+                rng = None
+            else:
+                init = None
+                rng = self.rng
+            if self.max_iter == float('inf'):
+                max_iter = numpy.iinfo(numpy.intp).max
+            else:
+                max_iter = int(self.max_iter)
+            mu, assign, iteration, converged = _kmeans.kmeans(
+                numpy.asarray(X, dtype='float32'), k, max_iter=max_iter,
+                init=init, rng=rng)
+            if self.verbose:
+                logger.info('kmeans stopped after {0} iterations, '
+                            'converged: {1}'.format(iteration, converged))
         else:
-            # our own implementation
-
             # taking random inputs as initial clusters if user does not provide
             # them.
-            if mu is not None:
-                if not len(mu) == k:
-                    raise Exception("You gave %i clusters"
-                                    ", but k=%i were expected"
-                                    % (len(mu), k))
-            else:
-                indices = numpy.random.randint(X.shape[0], size=k)
+            if mu is None:
+                indices = self.rng.randint(X.shape[0], size=k)
                 mu = X[indices]
+            mu = numpy.array(mu, dtype=X.dtype)
 
             try:
-                dists = numpy.zeros((n, k))
+                sums = numpy.zeros((k, m), dtype=X.dtype)
             except MemoryError as e:
                 improve_memory_error_message(e, "dying trying to allocate "
-                                                "dists matrix for {0} "
-                                                "examples and {1} "
-                                                "means".format(n, k))
+                                                "sums matrix for {0} "
+                                                "means of {1} "
+                                                "features".format(k, m))
 
             old_kills = {}
 
@@ -117,21 +319,19 @@ class KMeans(Block, Model):
                 if self.verbose:
                     logger.info('kmeans iter {0}'.format(iter))
 
-                # print 'iter:',iter,' conv crit:',abs(mmd-prev_mmd)
-                # if numpy.sum(numpy.isnan(mu)) > 0:
                 if contains_nan(mu):
                     logger.info('nan found')
                     return X
 
-                # computing distances
-                for i in xrange(k):
-                    dists[:, i] = numpy.square((X - mu[i, :])).sum(axis=1)
+                # computing distances, and the sums of the points of each
+                # cluster, by chunks of examples
+                sums[...] = 0
+                min_dist_inds, min_dists = _assign(X, mu, sums,
+                                                   self.chunk_size)
 
                 if iter > 0:
                     prev_mmd = mmd
 
-                min_dists = dists.min(axis=1)
-
                 # mean minimum distance:
                 mmd = min_dists.mean()
 
@@ -142,49 +342,44 @@ class KMeans(Block, Model):
                     # converged
                     break
 
-                # finding minimum distances
-                min_dist_inds = dists.argmin(axis=1)
-
                 # computing means
-                i = 0
-                blacklist = []
+                counts = numpy.bincount(min_dist_inds, minlength=k)
+                full = counts > 0
+                mu[full] = sums[full] / counts[full, numpy.newaxis]
+
+                # initializes each empty cluster to be the mean of the d
+                # data points farthest from their corresponding means,
+                # using different points for different clusters
+                empty = numpy.flatnonzero(~full)
                 new_kills = {}
-                while i < k:
-                    b = min_dist_inds == i
-                    if not numpy.any(b):
-                        killed_on_prev_iter = True
-                        # initializes empty cluster to be the mean of the d
-                        # data points farthest from their corresponding means
-                        if i in old_kills:
-                            d = old_kills[i] - 1
-                            if d == 0:
-                                d = 50
-                            new_kills[i] = d
-                        else:
-                            d = 5
-                        mu[i, :] = 0
-                        for j in xrange(d):
-                            idx = numpy.argmax(min_dists)
-                            min_dists[idx] = 0
-                            # chose point idx
-                            mu[i, :] += X[idx, :]
-                            blacklist.append(idx)
-                        mu[i, :] /= float(d)
-                        # cluster i was empty, reset it to d far out data
-                        # points recomputing distances for this cluster
-                        dists[:, i] = numpy.square((X - mu[i, :])).sum(axis=1)
-                        min_dists = dists.min(axis=1)
-                        for idx in blacklist:
-                            min_dists[idx] = 0
-                        min_dist_inds = dists.argmin(axis=1)
-                        # done
-                        i += 1
+                sizes = []
+                for i in empty:
+                    if i in old_kills:
+                        d = old_kills[i] - 1
+                        if d == 0:
+                            d = 50
+                        new_kills[i] = d
                     else:
-                        mu[i, :] = numpy.mean(X[b, :], axis=0)
-                        if contains_nan(mu):
-                            logger.info('nan found at {0}'.format(i))
-                            return X
-                        i += 1
+                        d = 5
+                    sizes.append(d)
+                if len(empty) > 0:
+                    total = min(sum(sizes), n)
+                    if hasattr(numpy, 'argpartition'):
+                        farthest = numpy.argpartition(-min_dists, total - 1)
+                        farthest = farthest[:total]
+                    else:
+                        # numpy < 1.8
+                        farthest = numpy.argsort(-min_dists)[:total]
+                    farthest = farthest[numpy.argsort(-min_dists[farthest])]
+                    start = 0
+                    for i, d in zip(empty, sizes):
+                        idx = farthest[start:start + d]
+                        if len(idx) > 0:
+                            mu[i, :] = X[idx].mean(axis=0)
+                        start += d
+                if contains_nan(mu):
+                    logger.info('nan found')
+                    return X
 
                 old_kills = new_kills
 
@@ -193,6 +388,76 @@ class KMeans(Block, Model):
         self.mu = sharedX(mu)
         self._params = [self.mu]
 
+    def _train_minibatch(self, dataset, mu=None):
+        """
+        Runs mini-batch k-means on batches drawn from the iterator of
+        `dataset`.
+
+        Each centroid is moved towards the examples of each batch assigned
+        to it, with a learning rate that is the inverse of the number of
+        examples it has been assigned so far, so that it is the mean of
+        these examples (with the positions of the centroid at the time
+        they were assigned to it).
+
+        Parameters
+        ----------
+        dataset : Dataset
+            The dataset to cluster.
+        mu : numpy.ndarray, optional
+            The initial centroids. By default, k random examples.
+
+        Returns
+        -------
+        mu : numpy.ndarray
+            The centroids, or None if they diverged.
+        """
+        data_specs = (self.input_space, 'features')
+        k = self.k
+        if mu is None:
+            # k different examples from a random batch
+            it = dataset.iterator(mode='shuffled_sequential', batch_size=k,
+                                  num_batches=1, data_specs=data_specs,
+                                  rng=self.rng)
+            mu = numpy.array(next(it))
+        else:
+            mu = numpy.array(mu)
+        counts = numpy.zeros(k)
+        sums = numpy.zeros_like(mu)
+
+        epoch = 0
+        mmd = prev_mmd = float('inf')
+        while epoch < self.max_iter:
+            if self.verbose:
+                logger.info('kmeans epoch {0}'.format(epoch))
+            total_dist = 0.
+            num_examples = 0
+            it = dataset.iterator(mode='shuffled_sequential',
+                                  batch_size=self.batch_size,
+                                  data_specs=data_specs, rng=self.rng)
+            for X in it:
+                sums[...] = 0
+                assign, min_dists = _assign(X, mu, sums, self.chunk_size)
+                total_dist += min_dists.sum()
+                num_examples += X.shape[0]
+                batch_counts = numpy.bincount(assign, minlength=k)
+                counts += batch_counts
+                full = batch_counts > 0
+                mu[full] += ((sums[full] -
+                              batch_counts[full, numpy.newaxis] * mu[full]) /
+                             counts[full, numpy.newaxis])
+            if contains_nan(mu):
+                logger.info('nan found')
+                return None
+
+            prev_mmd = mmd
+            mmd = total_dist / num_examples
+            logger.info('cost: {0}'.format(mmd))
+            epoch += 1
+            if abs(mmd - prev_mmd) < self.convergence_th:
+                break
+
+        return mu
+
     @wraps(Model.continue_learning)
     def continue_learning(self):
         # One call to train_all currently trains the model fully,
@@ -226,12 +491,10 @@ class KMeans(Block, Model):
         -------
         WRITEME
         """
-        n, m = X.shape
-        k = self.k
         mu = self.mu
-        dists = numpy.zeros((n, k))
-        for i in xrange(k):
-            dists[:, i] = numpy.square((X - mu[i, :])).sum(axis=1)
+        if hasattr(mu, 'get_value'):
+            mu = mu.get_value()
+        dists = _squared_distances(X, mu)
         return dists / dists.sum(axis=1).reshape(-1, 1)
 
     def get_weights(self):
@@ -6,9 +6,8 @@
 import logging
 from theano import function, shared
 from pylearn2.optimization import linear_cg as cg
-from pylearn2.optimization.feature_sign import feature_sign_search
+from pylearn2.optimization.feature_sign import _feature_sign_search_single
 import numpy as N
-from theano.compat.six.moves import xrange
 import theano.tensor as T
 from pylearn2.utils.rng import make_np_rng
 
@@ -68,79 +67,116 @@ class LocalCoordinateCoding(object):
 
             WRITEME
         """
+        return self.optimize_gammas(N.atleast_2d(example))[0]
 
-        #variable names chosen to follow the arguments to l1ls_featuresign
-
-        Y = N.zeros((self.nvis,))
-        Y[:] = example
-        c = (1e-10 + N.square(self.W.get_value(borrow=True) -
-                              example).sum(axis=1))
-        A = self.W.get_value(borrow=True).T / c
-        x = feature_sign_search(A, Y, self.coeff)
-        g = x / c
-        return g
-
-    def train_batch(self, dataset, batch_size):
+    def optimize_gammas(self, examples):
         """
-        .. todo::
-
-            WRITEME
+        Computes the codes of several examples at once.
+
+        The code of each example is found by feature sign search with the
+        dictionary elements scaled by their inverse squared distance to
+        the example. The Gram matrix of the dictionary and the products
+        of the examples with it are computed once for all the examples,
+        and only rescaled for each of them.
+
+        Parameters
+        ----------
+        examples : ndarray
+            A design matrix of examples.
+
+        Returns
+        -------
+        gammas : ndarray
+            The codes of the examples, one per row.
         """
-        #TODO-- this results in compilation happening every time learn is
-        # called should cache the compilation results, including those
-        # inside cg
-        X = dataset.get_design_matrix()
-        m = X.shape[0]
-        assert X.shape[1] == self.nvis
+        W = self.W.get_value(borrow=True)
+        examples = N.asarray(examples, dtype=W.dtype)
+        gram = N.dot(W, W.T)
+        products = N.dot(examples, W.T)
+        # squared distances of the examples to the dictionary elements
+        c = (N.square(examples).sum(axis=1)[:, N.newaxis] - 2 * products +
+             N.square(W).sum(axis=1))
+        c = 1e-10 + N.maximum(c, 0.)
+        gammas = N.zeros((examples.shape[0], self.nhid), dtype=W.dtype)
+        for Y, c_i, product, gamma in zip(examples, c, products, gammas):
+            # variable names chosen to follow the arguments to
+            # l1ls_featuresign: A would be W.T / c_i
+            _feature_sign_search_single(
+                W.T, Y, self.coeff, 1000, gamma,
+                gram_matrix=gram / N.outer(c_i, c_i),
+                target_correlation=product / c_i)
+            gamma /= c_i
+        return gammas
+
+    def _get_functions(self):
+        """
+        Compiles, the first time it is called, the functions computing
+        the objective of a batch and updating W to minimize it.
+
+        Returns
+        -------
+        objective : theano function
+            Maps a batch of examples and their codes to the objective.
+        update_W : theano function
+            Updates W given a batch of examples and their codes.
+        """
+        if getattr(self, '_functions', None) is None:
+            V = T.matrix(name='V')
+            gamma = T.matrix(name='gamma')
+            recons = T.dot(gamma, self.W)
+            recons.name = 'recons'
 
-        gamma = N.zeros((batch_size, self.nhid))
-        cur_gamma = T.vector(name='cur_gamma')
-        cur_v = T.vector(name='cur_v')
-        recons = T.dot(cur_gamma, self.W)
-        recons.name = 'recons'
+            recons_error = T.sum(T.sqr(V - recons))
+            recons_error.name = 'recons_error'
 
-        recons_diffs = cur_v - recons
-        recons_diffs.name = 'recons_diffs'
+            dict_dists = T.sum(T.sqr(self.W.dimshuffle('x', 0, 1) -
+                                     V.dimshuffle(0, 'x', 1)), axis=2)
+            dict_dists.name = 'dict_dists'
 
-        recons_diff_sq = T.sqr(recons_diffs)
-        recons_diff_sq.name = 'recons_diff'
+            weighted_dists = T.sum(abs(gamma) * dict_dists)
+            weighted_dists.name = 'weighted_dists'
 
-        recons_error = T.sum(recons_diff_sq)
-        recons_error.name = 'recons_error'
+            penalty = self.coeff * weighted_dists
+            penalty.name = 'penalty'
 
-        dict_dists = T.sum(T.sqr(self.W - cur_v), axis=1)
-        dict_dists.name = 'dict_dists'
+            #prevent directions of absolute flatness in the hessian
+            debug = 1e-10 * T.sum(dict_dists)
+            debug.name = 'debug'
 
-        abs_gamma = abs(cur_gamma)
-        abs_gamma.name = 'abs_gamma'
+            J = recons_error + penalty + debug
+            J.name = 'J'
 
-        weighted_dists = T.dot(abs_gamma, dict_dists)
-        weighted_dists.name = 'weighted_dists'
+            new_W, = cg.linear_cg(J, [self.W], max_iters=3)
+            self._functions = (function([V, gamma], J),
+                               function([V, gamma], [],
+                                        updates=[(self.W, new_W)]))
+        return self._functions
 
-        penalty = self.coeff * weighted_dists
-        penalty.name = 'penalty'
+    def __getstate__(self):
+        """
+        Returns the state of the model, without its compiled functions.
+        """
+        d = self.__dict__.copy()
+        d.pop('_functions', None)
+        return d
 
-        #prevent directions of absolute flatness in the hessian
-        #W_sq = T.sqr(self.W)
-        #W_sq.name = 'W_sq'
-        #debug =  T.sum(W_sq)
-        debug = 1e-10 * T.sum(dict_dists)
-        debug.name = 'debug'
+    def train_batch(self, dataset, batch_size):
+        """
+        .. todo::
 
-        #J = debug
-        J = recons_error + penalty + debug
-        J.name = 'J'
+            WRITEME
+        """
+        X = dataset.get_design_matrix()
+        m = X.shape[0]
+        assert X.shape[1] == self.nvis
 
-        Jf = function([cur_v, cur_gamma], J)
+        Jf, update_W = self._get_functions()
 
         start = self.rng.randint(m - batch_size + 1)
         batch_X = X[start:start + batch_size, :]
 
-        #TODO-- optimize gamma
         logger.info('optimizing gamma')
-        for i in xrange(batch_size):
-            #print str(i+1)+'/'+str(batch_size)
-            gamma[i, :] = self.optimize_gamma(batch_X[i, :])
+        gamma = self.optimize_gammas(batch_X)
 
         logger.info('max min')
         logger.info(N.abs(gamma).min(axis=0).max())
@@ -151,12 +187,9 @@ class LocalCoordinateCoding(object):
         logger.info('optimizing W')
         logger.warning("not tested since switching to Razvan's all-theano "
                        "implementation of linear cg")
-        cg.linear_cg(J, [self.W], max_iters=3)
-
-        err = 0.
+        update_W(batch_X, gamma)
 
-        for i in xrange(batch_size):
-            err += Jf(batch_X[i, :], gamma[i, :])
+        err = Jf(batch_X, gamma)
         assert not N.isnan(err)
         assert not N.isinf(err)
         logger.info('err: {0}'.format(err))
@@ -19,7 +19,6 @@ from theano.compat.six.moves import reduce, xrange
 from theano import config
 from theano.gof.op import get_debug_values
 from theano.sandbox.rng_mrg import MRG_RandomStreams
-from theano.sandbox.cuda.dnn import dnn_available, dnn_pool
 from theano.tensor.signal.downsample import max_pool_2d
 import theano.tensor as T
 
@@ -3457,6 +3456,9 @@ def pool_dnn(bc01, pool_shape, pool_stride, mode='max'):
                                   'in Pylearn2 using cuDNN as of '
                                   'January 19th, 2015.')
 
+    # Imported here since importing theano.sandbox.cuda looks for CUDA,
+    # which slows down the import of this module
+    from theano.sandbox.cuda.dnn import dnn_pool
     mx = dnn_pool(bc01, tuple(pool_shape), tuple(pool_stride), mode)
     return mx
 
@@ -3504,6 +3506,7 @@ def max_pool(bc01, pool_shape, pool_stride, image_shape, try_dnn=True):
         name = 'anon_bc01'
 
     if try_dnn and bc01.dtype == "float32":
+        from theano.sandbox.cuda.dnn import dnn_available
         use_dnn = dnn_available()
     else:
         use_dnn = False
@@ -126,6 +126,22 @@ class _PCABase(Block):
         # Compute eigen{values,vectors} of the covariance matrix.
         v, W = self._cov_eigen(X)
 
+        self._set_eigen(v, W, mean)
+
+    def _set_eigen(self, v, W, mean):
+        """
+        Stores the eigen{values,vectors} of the covariance matrix and the
+        feature means, and drops the unwanted components.
+
+        Parameters
+        ----------
+        v : numpy.ndarray
+            Eigenvalues in decreasing order
+        W : numpy.ndarray
+            Matrix containing the corresponding eigenvectors in its columns
+        mean : numpy.ndarray
+            Feature means of shape (d,)
+        """
         # Build Theano shared variables
         # For the moment, I do not use borrow=True because W and v are
         # subtensors, and I want the original memory to be freed
@@ -479,6 +495,24 @@ class CovEigPCA(_PCABase):
         # W contains eigenvectors in its *columns*, so we simply reverse both.
         return v[::-1], W[:, ::-1]
 
+    def train_from_cov(self, cov, mean):
+        """
+        Compute the PCA transformation matrix from an already estimated
+        covariance matrix, e.g. one accumulated over batches of a dataset
+        too large to be held in memory.
+
+        Parameters
+        ----------
+        cov : numpy.ndarray
+            Covariance matrix of shape (d, d)
+        mean : numpy.ndarray
+            Feature means of shape (d,)
+        """
+        if self.num_components is None:
+            self.num_components = cov.shape[0]
+        v, W = linalg.eigh(cov)
+        self._set_eigen(v[::-1], W[:, ::-1], mean)
+
 
 class SVDPCA(_PCABase):
     """
@@ -3,9 +3,10 @@ Tests of ../kmeans.py
 """
 
 import numpy as np
+from nose.plugins.skip import SkipTest
 
 from pylearn2.datasets.dense_design_matrix import DenseDesignMatrix
-from pylearn2.models.kmeans import KMeans
+from pylearn2.models.kmeans import KMeans, _assign, _kmeans
 from pylearn2.train import Train
 
 
@@ -26,3 +27,83 @@ def test_kmeans():
 
     train = Train(model=model, dataset=dataset)
     train.main_loop()
+
+
+def test_assign():
+    """
+    Tests that the chunked assignment step matches a brute force
+    computation of the distances.
+    """
+
+    rng = np.random.RandomState([2014, 10, 16])
+    X = rng.randn(50, 4)
+    mu = rng.randn(6, 4)
+    dists = np.square(X[:, np.newaxis, :] - mu).sum(axis=2)
+
+    sums = np.zeros_like(mu)
+    assign, min_dists = _assign(X, mu, sums, chunk_size=7)
+
+    assert np.all(assign == dists.argmin(axis=1))
+    assert np.allclose(min_dists, dists.min(axis=1))
+    for i in range(len(mu)):
+        assert np.allclose(sums[i], X[assign == i].sum(axis=0))
+
+
+def check_kmeans_blobs(**kwargs):
+    """
+    Checks that KMeans finds the centers of well separated clusters.
+    """
+
+    rng = np.random.RandomState([2014, 10, 17])
+    centers = np.array([[0., 0.], [10., 10.], [-10., 10.]])
+    X = np.concatenate([c + 0.1 * rng.randn(40, 2) for c in centers])
+    dataset = DenseDesignMatrix(X=X)
+
+    model = KMeans(k=3, nvis=2, **kwargs)
+    # one point of each cluster as initial centroids
+    model.train_all(dataset, mu=X[[0, 40, 80]] + 1.)
+
+    mu = model.get_params()[0].get_value()
+    assert np.allclose(mu, centers, atol=0.1)
+
+
+def test_kmeans_numpy():
+    """
+    Tests the numpy implementation of batch k-means.
+    """
+    check_kmeans_blobs(backend='numpy', chunk_size=16)
+
+
+def test_kmeans_minibatch():
+    """
+    Tests mini-batch k-means.
+    """
+    check_kmeans_blobs(batch_size=10, max_iter=5)
+
+
+def test_kmeans_cython():
+    """
+    Tests that the Cython implementation of batch k-means finds the same
+    assignments and centroids as the numpy one, from the same centroids.
+    """
+    if _kmeans is None:
+        raise SkipTest("pylearn2.models._kmeans is not built")
+
+    rng = np.random.RandomState([2014, 10, 18])
+    centers = np.array([[0., 0.], [6., 6.], [-6., 6.]])
+    X = np.concatenate([c + rng.randn(40, 2) for c in centers])
+    X = X.astype('float32')
+    dataset = DenseDesignMatrix(X=X)
+    init = X[[0, 40, 80]] + 1.
+
+    results = []
+    for backend in ['numpy', 'cython']:
+        model = KMeans(k=3, nvis=2, backend=backend)
+        model.train_all(dataset, mu=init)
+        mu = model.get_params()[0].get_value()
+        assign, _ = _assign(X, mu)
+        results.append((assign, mu))
+    (numpy_assign, numpy_mu), (cython_assign, cython_mu) = results
+
+    assert np.array_equal(numpy_assign, cython_assign)
+    assert np.allclose(numpy_mu, cython_mu, atol=1e-5)
@@ -10,6 +10,9 @@ __maintainer__ = "LISA Lab"
 __email__ = "pylearn-dev@googlegroups"
 
 import copy
+import fnmatch
+import sys
+import threading
 import time
 import warnings
 import logging
@@ -20,12 +23,15 @@ from pylearn2.compat import OrderedDict
 import theano.sparse
 from theano import config
 from theano import tensor as T
+from theano.compile.sharedvalue import SharedVariable
 from theano.printing import var_descriptor
 
 from pylearn2.config import yaml_parse
 from pylearn2.datasets.dataset import Dataset
+from pylearn2.monitor_log import MonitorLogWriter
 from pylearn2.space import Space, CompositeSpace, NullSpace
 from pylearn2.utils import function, sharedX, safe_zip, safe_izip
+from pylearn2.utils.compile import cached_function
 from pylearn2.utils.exc import reraise_as
 from pylearn2.utils.iteration import is_stochastic
 from pylearn2.utils.data_specs import DataSpecsMapping
@@ -59,6 +65,9 @@ class Monitor(object):
             new channel and transfering history of old_monitor
         `overwrite` : this is a behavior when creating a
             new channel without taking an account of old_monitor
+    asynchronous : bool
+        Whether the channels are evaluated in a background thread while
+        training goes on. See `set_asynchronous`.
     """
 
     def __init__(self, model):
@@ -74,10 +83,16 @@ class Monitor(object):
         self._num_batches = []
         self._dirty = True
         self._rng_seed = []
-        self.names_to_del = ['theano_function_mode']
+        self._subsampled = []
+        self.names_to_del = ['theano_function_mode', '_log']
         self.t0 = time.time()
         self.theano_function_mode = None
         self.on_channel_conflict = 'error'
+        self.asynchronous = False
+        self._record_max_length = None
+        self._record_retention = 'downsample'
+        self._log = None
+        self._channel_patterns = None
 
         # Initialize self._nested_data_specs, self._data_specs_mapping,
         # and self._flat_data_specs
@@ -94,7 +109,7 @@ class Monitor(object):
         m_space, m_source = self.model.get_monitoring_data_specs()
         input_spaces = [m_space]
         input_sources = [m_source]
-        for channel in self.channels.values():
+        for channel in self.get_active_channels().values():
             space = channel.data_specs[0]
             assert isinstance(space, Space)
             input_spaces.append(space)
@@ -128,8 +143,143 @@ class Monitor(object):
             self._dirty = True
             self.theano_function_mode = mode
 
+    def set_asynchronous(self, asynchronous=True):
+        """
+        Chooses whether the channels are evaluated in a background thread,
+        overlapping with training.
+
+        In asynchronous mode, each call to the monitor copies the shared
+        variables the channels depend on (the model parameters, the
+        learning rate, ...) and starts evaluating the channels on that
+        snapshot, so the training algorithm can modify the originals in
+        the meantime. The values are recorded, along with the epoch,
+        batch and example counts and the time of the snapshot, by the
+        next call to the monitor or by `wait`. The records of the
+        channels, as seen by train extensions and termination criteria,
+        thus lag one call behind, except for the first call, which is
+        always synchronous.
+
+        Channels with prerequisites, or depending on shared variables
+        with a default update (e.g. the random streams of dropout), are
+        not supported in asynchronous mode, since they could modify the
+        state of the model while it is being trained.
+
+        Parameters
+        ----------
+        asynchronous : bool, optional
+            Whether to evaluate the channels in the background.
+        """
+        if asynchronous != self.asynchronous:
+            self.wait()
+            self._dirty = True
+            self.asynchronous = asynchronous
+
+    def select_channels(self, patterns):
+        """
+        Restricts the channels which are compiled and evaluated to the
+        ones whose names match `patterns`. The other channels are still
+        defined, but their records are not updated until they are
+        enabled by `enable_channels`. Changing the selection recompiles
+        the monitoring functions at the next call to the monitor, so
+        channels can be enabled or disabled during training.
+
+        Parameters
+        ----------
+        patterns : list of str or None
+            Channel names or shell-style wildcard patterns (see
+            `fnmatch`), e.g. `['valid_y_misclass', '*_objective']`.
+            None selects all the channels (the default).
+        """
+        if patterns is not None:
+            patterns = list(patterns)
+        if patterns != getattr(self, '_channel_patterns', None):
+            self.wait()
+            self._channel_patterns = patterns
+            self._dirty = True
+
+    def enable_channels(self, patterns):
+        """
+        Adds channels to the ones selected by `select_channels`. Does
+        nothing if all the channels are selected.
+
+        Parameters
+        ----------
+        patterns : list of str
+            Channel names or shell-style wildcard patterns.
+        """
+        current = getattr(self, '_channel_patterns', None)
+        if current is None:
+            return
+        new = [p for p in patterns if p not in current]
+        if new:
+            self.select_channels(current + new)
+
+    def get_active_channels(self):
+        """
+        Returns the channels which are compiled and evaluated, i.e. the
+        ones selected by `select_channels`.
+
+        Returns
+        -------
+        channels : OrderedDict
+            Maps the names of the active channels to the channels.
+        """
+        patterns = getattr(self, '_channel_patterns', None)
+        if patterns is None:
+            return self.channels
+        return OrderedDict(
+            (name, channel) for name, channel in six.iteritems(self.channels)
+            if any(name == p or fnmatch.fnmatchcase(name, p)
+                   for p in patterns))
+
+    def set_record_retention(self, max_length, retention='downsample'):
+        """
+        Bounds the number of entries kept in the records of the channels,
+        for the channels already added and the ones added later.
+
+        Parameters
+        ----------
+        max_length : int or None
+            The maximum number of entries of each record, or None for no
+            limit.
+        retention : str, optional
+            'ring' to keep the last entries, 'downsample' to keep entries
+            evenly spaced over the whole history plus the last one. See
+            `ChannelRecord.set_retention`.
+        """
+        self._record_max_length = max_length
+        self._record_retention = retention
+        for channel in self.channels.values():
+            channel.set_record_retention(max_length, retention)
+
+    def set_log(self, path, max_records=None):
+        """
+        Appends the values of the channels to a monitor log at each
+        monitoring step, in addition to their records. See
+        `pylearn2.monitor_log`.
+
+        The log holds the whole history of the channels outside of the
+        model, so the records kept in the model, which are serialized
+        along with it at every save, can be bounded with `max_records`
+        to keep the size of the saves constant.
+
+        Parameters
+        ----------
+        path : str or None
+            The path of the log, which is appended to if it exists. None
+            stops logging.
+        max_records : int, optional
+            If specified, the records of the channels only keep their
+            last `max_records` entries. See `set_record_retention`.
+        """
+        if self._log is not None:
+            self._log.close()
+        self._log = None if path is None else MonitorLogWriter(path)
+        if max_records is not None:
+            self.set_record_retention(max_records, 'ring')
+
     def add_dataset(self, dataset, mode='sequential', batch_size=None,
-                    num_batches=None, seed=None):
+                    num_batches=None, seed=None, subsample=None):
         """
         Determines the data used to calculate the values of each channel.
 
@@ -150,6 +300,15 @@ class Monitor(object):
             batches will be calculated based on full dataset size).
         seed : int, optional
             Optional. The seed to be used for random iteration modes.
+        subsample : int, optional
+            If specified, the channels are computed on a fixed random
+            subset of about `subsample` examples of the dataset (rounded
+            up to a whole number of batches of size `batch_size`, and at
+            most the whole dataset),
+            regardless of `mode` and `num_batches`, and the standard error
+            of each channel value is recorded in the `stderr_record` of
+            the channel. This gives cheap estimates of channels on large
+            datasets.
         """
         # The user can ommit using lists if only one dataset is set
         if not isinstance(dataset, list):
@@ -164,14 +323,34 @@ class Monitor(object):
             seed = [None] * len(dataset)
         if not isinstance(seed, list):
             seed = [seed]
+        if subsample is None:
+            subsample = [None] * len(dataset)
+        if not isinstance(subsample, list):
+            subsample = [subsample]
         if len(mode) != len(dataset):
             raise ValueError("Received " + str(len(dataset)) +
                              " dataset but " + str(len(mode)) + " modes.")
-        if any([len(l) != len(dataset) for l in [batch_size, seed]]):
+        if any([len(l) != len(dataset)
+                for l in [batch_size, seed, subsample]]):
             raise ValueError("make sure each dataset has its iteration " +
                              "batch size and number of batches.")
-        for (d, m, b, n, sd) in safe_izip(dataset, mode, batch_size,
-                                          num_batches, seed):
+        for (d, m, b, n, sd, ss) in safe_izip(dataset, mode, batch_size,
+                                              num_batches, seed, subsample):
+            if ss is not None:
+                if b is None:
+                    raise ValueError("Monitor.add_dataset needs a batch " +
+                                     "size to subsample a dataset.")
+                # The same seed gives the same permutation, hence the same
+                # examples, at each call
+                m = 'shuffled_sequential'
+                try:
+                    # More batches than the dataset holds are not valid
+                    ss = min(ss, d.get_num_examples())
+                except NotImplementedError:
+                    pass
+                n = int(np.ceil(float(ss) / b))
+                if sd is None:
+                    sd = [2013, 2, 22]
             try:
                 it = d.iterator(mode=m,
                                 batch_size=b,
@@ -205,19 +384,103 @@ class Monitor(object):
                 self._batch_size.append(b)
                 self._num_batches.append(n)
                 self._rng_seed.append(sd)
+                self._subsampled.append(ss is not None)
 
     def __call__(self):
         """
         Runs the model on the monitoring dataset in order to add one
         data point to each of the channels.
+
+        In asynchronous mode (see `set_asynchronous`), this records the
+        values computed in the background since the previous call, and
+        starts computing the values of this call in the background.
         """
+        asynchronous = getattr(self, 'asynchronous', False)
+        if asynchronous:
+            self.wait()
 
         # If the channels have changed at all, we need to recompile the theano
         # functions used to compute them
         if self._dirty:
             self.redo_theano()
 
+        if not asynchronous:
+            num_batches = self._accumulate()
+            self._record_entry(self._epochs_seen, self._num_batches_seen,
+                               self._examples_seen, time.time() - self.t0,
+                               num_batches)
+            return
+
+        self._take_snapshot()
+        counts = (self._epochs_seen, self._num_batches_seen,
+                  self._examples_seen, time.time() - self.t0)
+        if not any(channel.val_record
+                   for channel in self._active_channels.values()):
+            # Record the first values right away, so that train extensions
+            # always find values in the channels
+            self._record_entry(*(counts + (self._accumulate(),)))
+            return
+
+        self._pending = {'counts': counts, 'num_batches': None,
+                         'exc_info': None}
+        worker = threading.Thread(target=self._accumulate_pending,
+                                  args=(self._pending,), name='Monitor')
+        worker.daemon = True
+        self._pending['worker'] = worker
+        self.register_names_to_del(['_pending'])
+        worker.start()
+
+    def wait(self):
+        """
+        Waits for the channel values being computed in the background in
+        asynchronous mode, if any, and records them. Exceptions raised
+        while computing them are raised here.
+        """
+        pending = getattr(self, '_pending', None)
+        if pending is None:
+            return
+        self._pending = None
+        pending['worker'].join()
+        if pending['exc_info'] is not None:
+            six.reraise(*pending['exc_info'])
+        self._record_entry(*(pending['counts'] + (pending['num_batches'],)))
+
+    def _take_snapshot(self):
+        """
+        Copies the current values of the shared variables the channels
+        depend on to the shared variables the asynchronous mode evaluates
+        the channels with.
+        """
+        for var, snapshot in self._snapshot:
+            snapshot.set_value(var.get_value(borrow=False), borrow=True)
+
+    def _accumulate_pending(self, pending):
+        """
+        Body of the background thread of the asynchronous mode.
+
+        Parameters
+        ----------
+        pending : dict
+            Receives the number of batches drawn from each dataset, or
+            the exception raised while accumulating the values.
+        """
+        try:
+            pending['num_batches'] = self._accumulate()
+        except Exception:
+            pending['exc_info'] = sys.exc_info()
+
+    def _accumulate(self):
+        """
+        Accumulates the values of the channels over the monitoring
+        datasets in their trackers.
+
+        Returns
+        -------
+        num_batches : list
+            The number of batches drawn from each monitoring dataset.
+        """
         datasets = self._datasets
+        num_batches = []
 
         # Set all channels' val_shared to 0
         self.begin_record_entry()
@@ -248,44 +511,86 @@ class Monitor(object):
                 X = ()
                 self.run_prereqs(X, d)
                 a(*X)
+                num_batches.append(1)
 
             else:
                 actual_ne = 0
+                actual_nb = 0
                 for X in myiterator:
                     # X is a flat (not nested) tuple
                     self.run_prereqs(X, d)
                     a(*X)
                     actual_ne += self._flat_data_specs[0].np_batch_size(X)
+                    actual_nb += 1
                 # end for X
                 if actual_ne != ne:
                     raise RuntimeError("At compile time, your iterator said "
                                        "it had %d examples total, but at "
                                        "runtime it gave us %d." %
                                        (ne, actual_ne))
+                num_batches.append(actual_nb)
         # end for d
+        return num_batches
+
+    def _record_entry(self, epochs_seen, batches_seen, examples_seen, t,
+                      num_batches):
+        """
+        Appends the values accumulated by `_accumulate` to the records of
+        the channels.
 
+        Parameters
+        ----------
+        epochs_seen : int
+            The number of epochs seen when the values were computed.
+        batches_seen : int
+            The number of batches seen when the values were computed.
+        examples_seen : int
+            The number of examples seen when the values were computed.
+        t : float
+            The time when the values were computed, in seconds since
+            `self.t0`.
+        num_batches : list
+            The number of batches drawn from each monitoring dataset, as
+            returned by `_accumulate`.
+        """
         log.info("Monitoring step:")
-        log.info("\tEpochs seen: %d" % self._epochs_seen)
-        log.info("\tBatches seen: %d" % self._num_batches_seen)
-        log.info("\tExamples seen: %d" % self._examples_seen)
-        t = time.time() - self.t0
-        for channel_name in sorted(self.channels.keys(),
+        log.info("\tEpochs seen: %d" % epochs_seen)
+        log.info("\tBatches seen: %d" % batches_seen)
+        log.info("\tExamples seen: %d" % examples_seen)
+        logged = OrderedDict()
+        for channel_name in sorted(self._active_channels.keys(),
                                    key=number_aware_alphabetical_key):
-            channel = self.channels[channel_name]
+            channel = self._active_channels[channel_name]
             channel.time_record.append(t)
-            channel.batch_record.append(self._num_batches_seen)
-            channel.example_record.append(self._examples_seen)
-            channel.epoch_record.append(self._epochs_seen)
+            channel.batch_record.append(batches_seen)
+            channel.example_record.append(examples_seen)
+            channel.epoch_record.append(epochs_seen)
             val = channel.val_shared.get_value()
             channel.val_record.append(val)
+            stderr = None
+            if channel_name in self._sq_shared:
+                # The standard error of the mean of the batch values
+                nb = num_batches[self._datasets.index(channel.dataset)]
+                if nb > 1:
+                    var = self._sq_shared[channel_name].get_value() - val ** 2
+                    stderr = np.sqrt(max(var, 0.) / (nb - 1))
+                else:
+                    stderr = np.nan
+            channel.stderr_record.append(np.nan if stderr is None else stderr)
+            logged[channel_name] = (val, np.nan if stderr is None else stderr)
             # TODO: use logging infrastructure so that user can configure
             # formatting
             if abs(val) < 1e4:
                 val_str = str(val)
             else:
                 val_str = '%.3e' % val
+            if stderr is not None:
+                val_str += ' +/- %.3e' % stderr
 
             log.info("\t%s: %s" % (channel_name, val_str))
+        if self._log is not None:
+            self._log.append(epochs_seen, batches_seen, examples_seen, t,
+                             logged)
 
     def run_prereqs(self, data, dataset):
         """
@@ -376,16 +681,20 @@ class Monitor(object):
 
         All channels are compiled as part of the same theano function
         so that the theano optimizations can eliminate subexpressions
-        that are shared between multiple channels.
+        that are shared between multiple channels. Only the channels
+        selected by `select_channels` are compiled.
         """
+        # Do not replace the functions a background evaluation is using
+        self.wait()
         self._dirty = False
 
         # Recompute the data specs, since the channels may have changed.
         self._build_data_specs()
 
         init_names = dir(self)
+        channels = self._active_channels = self.get_active_channels()
         self.prereqs = OrderedDict()
-        for channel in self.channels.values():
+        for channel in channels.values():
             if channel.prereqs is not None:
                 dataset = channel.dataset
                 if dataset not in self.prereqs:
@@ -395,9 +704,48 @@ class Monitor(object):
                     if prereq not in prereqs:
                         prereqs.append(prereq)
 
+        asynchronous = getattr(self, 'asynchronous', False)
+        if asynchronous and any(self.prereqs.values()):
+            raise ValueError("Asynchronous monitoring does not support "
+                             "channels with prerequisites.")
+
+        # The channels of subsampled datasets also accumulate the squares
+        # of their batch values, to estimate their standard error
+        self._sq_shared = OrderedDict()
+        for name, channel in six.iteritems(channels):
+            index = self._datasets.index(channel.dataset)
+            if self._subsampled[index]:
+                self._sq_shared[name] = sharedX(0.0, name + "_sq_tracker")
+
+        # In asynchronous mode, the channels are computed from copies of
+        # the shared variables they depend on, taken by _take_snapshot
+        snapshot = OrderedDict()
+        if asynchronous:
+            for channel in channels.values():
+                for var in theano.gof.graph.inputs([channel.val]):
+                    if not isinstance(var, SharedVariable):
+                        continue
+                    if getattr(var, 'default_update', None) is not None:
+                        # e.g. the state of the random streams of dropout:
+                        # the background thread would update it while
+                        # training uses it
+                        raise ValueError("Asynchronous monitoring does not "
+                                         "support channels depending on "
+                                         "shared variables with a default "
+                                         "update, such as %s." % var)
+                    if var not in snapshot:
+                        snapshot[var] = type(var)(
+                            name='%s_snapshot' % var.name,
+                            type=var.type,
+                            value=var.get_value(),
+                            strict=False)
+        self._snapshot = list(six.iteritems(snapshot))
+
         updates = OrderedDict()
-        for channel in self.channels.values():
+        for channel in channels.values():
             updates[channel.val_shared] = np.cast[config.floatX](0.0)
+        for sq_shared in self._sq_shared.values():
+            updates[sq_shared] = np.cast[config.floatX](0.0)
         with log_timing(log, "compiling begin_record_entry"):
             self.begin_record_entry = function(
                 inputs=[],
@@ -423,15 +771,18 @@ class Monitor(object):
         nested_theano_args = self._data_specs_mapping.nest(theano_args)
         if not isinstance(nested_theano_args, tuple):
             nested_theano_args = (nested_theano_args,)
-        assert len(nested_theano_args) == (len(self.channels) + 1)
+        assert len(nested_theano_args) == (len(channels) + 1)
 
         log.info('Monitored channels: ')
-        for key in sorted(self.channels.keys()):
+        for key in sorted(channels.keys()):
             mode = self.theano_function_mode
             if mode is not None and hasattr(mode, 'record'):
                 mode.record.handle_line('compiling monitor including ' +
                                         'channel ' + key + '\n')
             log.info('\t%s' % key)
+        if len(channels) < len(self.channels):
+            log.info('%d channels not selected' %
+                     (len(self.channels) - len(channels)))
         it = []
         for d, i, n, b in safe_izip(self._datasets, self._iteration_mode,
                                     self._num_batches, self._batch_size):
@@ -440,9 +791,9 @@ class Monitor(object):
                                  return_tuple=True))
         self.num_examples = [np.cast[config.floatX](float(i.num_examples))
                              for i in it]
-        givens = [OrderedDict() for d in self._datasets]
+        givens = [OrderedDict(snapshot) for d in self._datasets]
         updates = [OrderedDict() for d in self._datasets]
-        for i, channel in enumerate(self.channels.values()):
+        for i, channel in enumerate(channels.values()):
             index = self._datasets.index(channel.dataset)
             d = self._datasets[index]
             g = givens[index]
@@ -474,8 +825,11 @@ class Monitor(object):
                 if n == 0:
                     raise ValueError("Iterating over 0 examples results in " +
                                      "divide by 0")
-                val = (channel.val * T.cast(batch_size, config.floatX)
-                       / cur_num_examples)
+                weight = T.cast(batch_size, config.floatX) / cur_num_examples
+                val = channel.val * weight
+                if channel.name in self._sq_shared:
+                    sq_shared = self._sq_shared[channel.name]
+                    u[sq_shared] = sq_shared + T.sqr(channel.val) * weight
             u[channel.val_shared] = channel.val_shared + val
 
         with log_timing(log, "Compiling accum"):
@@ -510,11 +864,12 @@ class Monitor(object):
                 # monitor the model parameters, or some shared variable updated
                 # by the training algorithm, so we need to ignore the unused
                 # input error
-                self.accum.append(function(theano_args,
-                                           givens=g,
-                                           updates=u,
-                                           mode=self.theano_function_mode,
-                                           name=function_name))
+                self.accum.append(cached_function(
+                    theano_args,
+                    givens=g,
+                    updates=u,
+                    mode=self.theano_function_mode,
+                    name=function_name))
             for a in self.accum:
                 if mode is not None and hasattr(mode, 'record'):
                     for elem in a.maker.fgraph.outputs:
@@ -593,6 +948,12 @@ class Monitor(object):
         if '_dataset' in d:
             d['_datasets'] = [d['_dataset']]
             del d['_dataset']
+        if '_subsampled' not in d:
+            d['_subsampled'] = [False] * len(d['_datasets'])
+        if 'asynchronous' not in d:
+            d['asynchronous'] = False
+        if '_log' not in d:
+            d['_log'] = None
 
         self.__dict__.update(d)
 
@@ -723,10 +1084,52 @@ class Monitor(object):
                                                  self.channels[name])
         elif ((name not in self.channels or
                self.on_channel_conflict == 'overwrite')):
-            self.channels[name] = MonitorChannel(ipt, val, name, data_specs,
-                                                 dataset, prereqs)
+            old_channel = None
+            if name not in self.channels:
+                # Continue the records of a monitor passed to continue_from
+                old_channel = getattr(self, '_continued_channels',
+                                      {}).pop(name, None)
+            channel = MonitorChannel(ipt, val, name, data_specs, dataset,
+                                     prereqs, old_channel)
+            if old_channel is not None and not self._continued_drop_last:
+                for record in MonitorChannel.record_dtypes:
+                    setattr(channel, record,
+                            copy.deepcopy(getattr(old_channel, record)))
+            self.channels[name] = channel
+        channel = self.channels[name]
+        max_length = getattr(self, '_record_max_length', None)
+        if max_length is not None:
+            channel.set_record_retention(max_length, self._record_retention)
         self._dirty = True
 
+    def continue_from(self, old_monitor, drop_last=True):
+        """
+        Makes this monitor continue where `old_monitor` stopped, typically
+        when resuming training from a checkpoint: the numbers of epochs,
+        batches and examples seen and the start time are copied, and each
+        channel added afterwards under the name of one of `old_monitor`'s
+        channels starts with that channel's records.
+
+        Parameters
+        ----------
+        old_monitor : Monitor
+            The monitor to continue, usually deserialized along with its
+            model.
+        drop_last : bool, optional
+            If True (the default), the last record of each channel is
+            dropped, as with `push_monitor`, because the next call to the
+            monitor recomputes it. Use False when the model has been
+            trained since that record was made.
+        """
+        self._num_batches_seen = old_monitor._num_batches_seen
+        self._examples_seen = old_monitor._examples_seen
+        self._epochs_seen = old_monitor._epochs_seen
+        self.t0 = old_monitor.t0
+        self._continued_channels = OrderedDict(old_monitor.channels)
+        self._continued_drop_last = drop_last
+        self.register_names_to_del(['_continued_channels',
+                                    '_continued_drop_last'])
+
     def _sanity_check(self):
         """
         Sometimes we serialize models and then load them somewhere else
@@ -794,7 +1197,7 @@ class Monitor(object):
 
     def setup(self, dataset, cost, batch_size, num_batches=None,
               extra_costs=None, mode='sequential', obj_prereqs=None,
-              cost_monitoring_args=None):
+              cost_monitoring_args=None, subsample=None):
         """
         Sets up the monitor for a cost minimization problem.
         Adds channels defined by both the model and the cost for
@@ -829,6 +1232,9 @@ class Monitor(object):
             Dictionary of kwargs that will be passed to
             `cost.get_monitoring_channels()`
             (but not for the extra_costs).
+        subsample : int, optional
+            If specified, the channels are computed on a fixed random
+            subset of each dataset, with error bars. See `add_dataset`.
         """
 
         if dataset is None:
@@ -925,7 +1331,8 @@ class Monitor(object):
                              mode=mode,
                              batch_size=batch_size,
                              num_batches=num_batches,
-                             seed=seed)
+                             seed=seed,
+                             subsample=subsample)
             if dataset_name == '':
                 dprefix = ''
             else:
@@ -963,6 +1370,221 @@ class Monitor(object):
                                  dataset=cur_dataset)
 
 
+class ChannelRecord(object):
+    """
+    A growable, typed array holding one of the records of a
+    `MonitorChannel` (its values, or the number of batches seen when
+    they were computed, etc.).
+
+    It behaves like the list it replaces: it supports `append`, `extend`,
+    `+=`, `len`, iteration, indexing and comparison with lists. Slices
+    are returned as numpy views, without copying, and `numpy.asarray`
+    returns a view of the whole record. The values are stored in a
+    numpy array, which is much more compact than a list of numpy
+    scalars, in memory and in pickles.
+
+    Parameters
+    ----------
+    dtype : str or numpy.dtype
+        The type of the values.
+    values : iterable, optional
+        Initial values. None values are stored as NaN.
+    max_length : int, optional
+        If specified, the maximum number of values stored. See
+        `set_retention`.
+    retention : str, optional
+        How to discard values beyond `max_length`. See `set_retention`.
+    """
+
+    def __init__(self, dtype, values=(), max_length=None,
+                 retention='downsample'):
+        values = list(values)
+        self.dtype = np.dtype(dtype)
+        if any(value is None for value in values):
+            values = [np.nan if value is None else value
+                      for value in values]
+            if self.dtype.kind in 'iub':
+                self.dtype = np.dtype('float64')
+        self._data = np.empty(max(16, len(values)), dtype=self.dtype)
+        self._start = 0
+        self._length = 0
+        # Downsampling state: only every _stride-th value is kept, plus the
+        # last one, which is a "tail" value if it is not on the stride.
+        self._stride = 1
+        self._num_appended = 0
+        self._tail = False
+        self.max_length = None
+        self.retention = retention
+        self.extend(values)
+        self.set_retention(max_length, retention)
+
+    def set_retention(self, max_length, retention='downsample'):
+        """
+        Bounds the number of values stored.
+
+        Parameters
+        ----------
+        max_length : int or None
+            The maximum number of values stored, or None to store all the
+            values appended from now on.
+        retention : str, optional
+            'ring' keeps the last `max_length` values. 'downsample' keeps
+            values evenly spaced over the whole history, plus the last
+            one: whenever the record is full, every other value is
+            discarded and only every other value is kept from then on.
+            Records appended in lockstep (e.g. the records of a channel)
+            keep the same entries.
+        """
+        if retention not in ('ring', 'downsample'):
+            raise ValueError("retention should be 'ring' or 'downsample', "
+                             "got %s" % str(retention))
+        if max_length is not None and max_length < 3:
+            raise ValueError("max_length should be at least 3, got %d" %
+                             max_length)
+        self.max_length = max_length
+        self.retention = retention
+        if retention == 'ring' and self._stride > 1:
+            # Keep the values downsampled so far, and all the next ones
+            self._stride = 1
+            self._tail = False
+        if max_length is not None:
+            while self._length > max_length:
+                self._discard()
+
+    @property
+    def values(self):
+        """
+        A numpy view of the stored values.
+        """
+        return self._data[self._start:self._start + self._length]
+
+    def append(self, value):
+        """
+        Appends a value.
+
+        Parameters
+        ----------
+        value : object
+            The value, convertible to `self.dtype`. None is stored as NaN.
+        """
+        if value is None:
+            value = np.nan
+        on_stride = self._num_appended % self._stride == 0
+        self._num_appended += 1
+        if self._tail:
+            # The previous value was only kept as the last one
+            self._length -= 1
+        end = self._start + self._length
+        if end == len(self._data):
+            if 0 < self._start and self._length <= self._start:
+                self._data[:self._length] = self._data[self._start:end]
+            else:
+                data = np.empty(max(16, 2 * len(self._data)),
+                                dtype=self.dtype)
+                data[:self._length] = self._data[self._start:end]
+                self._data = data
+            self._start = 0
+            end = self._length
+        self._data[end] = value
+        self._length += 1
+        self._tail = not on_stride
+        if self.max_length is not None and self._length > self.max_length:
+            self._discard()
+
+    def _discard(self):
+        """
+        Discards values according to the retention policy.
+        """
+        if self.retention == 'ring':
+            self._start += 1
+            self._length -= 1
+            self._tail = False
+            return
+        values = self.values
+        last = values[-1]
+        if self._tail:
+            values = values[:-1]
+        # The kept values were appended at multiples of self._stride
+        kept = values[::2].copy()
+        self._stride *= 2
+        latest = self._num_appended - 1
+        self._tail = latest % self._stride != 0
+        if self._tail:
+            kept = np.append(kept, last)
+        self._length = len(kept)
+        self._start = 0
+        self._data[:self._length] = kept
+
+    def extend(self, values):
+        """
+        Appends values.
+
+        Parameters
+        ----------
+        values : iterable
+            The values.
+        """
+        for value in values:
+            self.append(value)
+
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __setitem__(self, index, value):
+        self.values[index] = value
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self.values
+        return self.values.astype(dtype)
+
+    def __eq__(self, other):
+        try:
+            other = list(other)
+        except TypeError:
+            return False
+        return self.tolist() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def tolist(self):
+        """
+        Returns the stored values as a list of Python scalars.
+        """
+        return self.values.tolist()
+
+    def __repr__(self):
+        return 'ChannelRecord(%s)' % str(self.tolist())
+
+    def __getstate__(self):
+        """
+        Returns the stored values without the unused capacity.
+        """
+        d = copy.copy(self.__dict__)
+        d['_data'] = self.values.copy()
+        d['_start'] = 0
+        return d
+
+    def __setstate__(self, d):
+        """
+        Sets the object to have the state described by `d`.
+        """
+        self.__dict__.update(d)
+
+
 class MonitorChannel(object):
     """
     A class representing a specific quantity to be monitored.
@@ -1015,26 +1637,73 @@ class MonitorChannel(object):
                              str(val.ndim))
         # Dataset monitored by this channel
         self.dataset = dataset
-        if old_channel is not None:
-            # Value of the desired quantity at measurement time.
-            self.val_record = old_channel.val_record[:-1]
-            # Number of batches seen at measurement time.
-            self.batch_record = old_channel.batch_record[:-1]
-            # Number of examples seen at measurement time (batch sizes may
-            # fluctuate).
-            self.example_record = old_channel.example_record[:-1]
-            self.epoch_record = old_channel.epoch_record[:-1]
-            self.time_record = old_channel.time_record[:-1]
-        else:
-            # Value of the desired quantity at measurement time.
-            self.val_record = []
-            # Number of batches seen at measurement time.
-            self.batch_record = []
-            # Number of examples seen at measurement time (batch sizes may
-            # fluctuate).
-            self.example_record = []
-            self.epoch_record = []
-            self.time_record = []
+        for record, dtype in six.iteritems(self.record_dtypes):
+            if old_channel is not None:
+                values = getattr(old_channel, record)[:-1]
+            else:
+                values = ()
+            setattr(self, record, ChannelRecord(dtype, values))
+
+    # The records of the channel and the types of their values:
+    # - val_record: value of the desired quantity at measurement time.
+    # - batch_record: number of batches seen at measurement time.
+    # - example_record: number of examples seen at measurement time
+    #   (batch sizes may fluctuate).
+    # - epoch_record: number of epochs seen at measurement time.
+    # - time_record: seconds since the start of training at measurement
+    #   time.
+    # - stderr_record: standard error of the value, or NaN if it was
+    #   computed on the whole dataset.
+    record_dtypes = OrderedDict([('val_record', config.floatX),
+                                 ('batch_record', 'int64'),
+                                 ('example_record', 'int64'),
+                                 ('epoch_record', 'int64'),
+                                 ('time_record', 'float64'),
+                                 ('stderr_record', config.floatX)])
+
+    def set_record_retention(self, max_length, retention='downsample'):
+        """
+        Bounds the number of entries kept in the records of the channel.
+
+        Parameters
+        ----------
+        max_length : int or None
+            The maximum number of entries, or None for no limit.
+        retention : str, optional
+            'ring' to keep the last entries, 'downsample' to keep entries
+            evenly spaced over the whole history plus the last one. See
+            `ChannelRecord.set_retention`.
+        """
+        for record in self.record_dtypes:
+            getattr(self, record).set_retention(max_length, retention)
+
+    def sliced(self, start=None, stop=None, step=None):
+        """
+        Returns a copy of the channel restricted to a slice of its
+        records, without its Theano expressions, e.g. to send it to
+        another process.
+
+        Parameters
+        ----------
+        start : int, optional
+            First entry of the records to copy.
+        stop : int, optional
+            End of the slice.
+        step : int, optional
+            Step of the slice.
+
+        Returns
+        -------
+        channel : MonitorChannel
+            An object like an unpickled channel, whose records hold
+            copies of the selected entries.
+        """
+        d = self.__getstate__()
+        for record, dtype in six.iteritems(self.record_dtypes):
+            d[record] = ChannelRecord(dtype, d[record][start:stop:step])
+        rval = MonitorChannel.__new__(MonitorChannel)
+        rval.__setstate__(d)
+        return rval
 
     def __str__(self):
         """
@@ -1111,7 +1780,8 @@ class MonitorChannel(object):
             'batch_record': self.batch_record,
             'time_record': self.time_record,
             'epoch_record': self.epoch_record,
-            'val_record': self.val_record
+            'val_record': self.val_record,
+            'stderr_record': self.stderr_record
         }
 
     def __setstate__(self, d):
@@ -1134,6 +1804,13 @@ class MonitorChannel(object):
             self.epoch_record = range(len(self.val_record))
         if 'time_record' not in d:
             self.time_record = [None] * len(self.val_record)
+        if 'stderr_record' not in d:
+            self.stderr_record = [None] * len(self.val_record)
+        # Patch old pickle files storing the records as lists
+        for record, dtype in six.iteritems(self.record_dtypes):
+            values = getattr(self, record)
+            if not isinstance(values, ChannelRecord):
+                setattr(self, record, ChannelRecord(dtype, values))
 
 
 def push_monitor(model, name, transfer_experience=False,
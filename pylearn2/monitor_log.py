@@ -0,0 +1,446 @@
+"""
+An append-only, on-disk log of the values of the monitoring channels.
+
+A `Monitor` with a log (see `Monitor.set_log`) appends one line to it at
+each monitoring step, so the whole history of the channels need not be
+kept in the model and serialized with it at every save. The analysis
+scripts (`plot_monitor.py`, `print_monitor.py`, `diff_monitor.py`) read
+the log directly, without unpickling the model.
+
+The log is a text file of JSON values, one per line. A line holding an
+object lists the names of the channels, and applies to the lines that
+follow it; it is written at the start of each run, and whenever the set
+of channels changes. The other lines are arrays holding, for one
+monitoring step, the numbers of epochs, batches and examples seen, the
+time in seconds since training started, then the value and the standard
+error of each channel, in the order of the last list of names.
+
+`MonitorLog` keeps an index of the log in a sidecar file (the path of
+the log followed by `INDEX_SUFFIX`), which maps each channel to the byte
+ranges of the lines holding it, and records how far the log was indexed.
+As the log is only appended to, a later read only scans the lines added
+since, and reading a channel only parses the lines of the runs in which
+it was monitored.
+"""
+__license__ = "3-clause BSD"
+__maintainer__ = "LISA Lab"
+__email__ = "pylearn-dev@googlegroups"
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from pylearn2.compat import OrderedDict
+
+
+MONITOR_LOG_EXTENSION = '.jsonl'
+INDEX_SUFFIX = '.idx'
+_INDEX_VERSION = 1
+_RECORD_NAMES = ('epoch_record', 'batch_record', 'example_record',
+                 'time_record', 'val_record', 'stderr_record')
+
+
+def is_monitor_log(path):
+    """
+    Tells whether a path names a monitor log, rather than e.g. a pickled
+    model.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    Returns
+    -------
+    is_log : bool
+        True if the path has the extension of monitor logs.
+    """
+    return path.endswith(MONITOR_LOG_EXTENSION)
+
+
+class MonitorLogWriter(object):
+    """
+    Appends the values of the monitoring channels to a monitor log.
+
+    Parameters
+    ----------
+    path : str
+        The path of the log. If the file exists, the entries are appended
+        to it, which is what happens when training is resumed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._names = None
+
+    def append(self, epochs_seen, batches_seen, examples_seen, t, values):
+        """
+        Appends the values of a monitoring step to the log, and flushes it.
+
+        Parameters
+        ----------
+        epochs_seen : int
+            The number of epochs seen when the values were computed.
+        batches_seen : int
+            The number of batches seen when the values were computed.
+        examples_seen : int
+            The number of examples seen when the values were computed.
+        t : float
+            The time when the values were computed, in seconds.
+        values : OrderedDict
+            Maps the names of the channels to their value and standard
+            error (NaN if unknown).
+        """
+        if self._file is None:
+            self._file = open(self.path, 'a')
+            if self._file.tell() > 0:
+                # Terminate the last line, in case a crash cut it short
+                self._file.write('\n')
+        names = list(values.keys())
+        if names != self._names:
+            self._file.write(json.dumps({'channels': names}) + '\n')
+            self._names = names
+        row = [int(epochs_seen), int(batches_seen), int(examples_seen),
+               float(t)]
+        for val, stderr in values.values():
+            row.append(float(val))
+            row.append(float(stderr))
+        self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+
+    def close(self):
+        """
+        Closes the log. It is opened again by the next call to `append`.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._names = None
+
+    def __getstate__(self):
+        """
+        Returns the state of the writer, without its open file.
+        """
+        return {'path': self.path}
+
+    def __setstate__(self, d):
+        """
+        Restores the state returned by `__getstate__`.
+
+        Parameters
+        ----------
+        d : dict
+            The state of the writer.
+        """
+        self.__init__(d['path'])
+
+
+class LoggedChannel(object):
+    """
+    The records of a monitoring channel read from a monitor log. It has
+    the record attributes of `MonitorChannel`, as numpy arrays, which
+    are read from the log when first accessed.
+
+    Parameters
+    ----------
+    name : str
+        The name of the channel.
+    log : MonitorLog
+        The log holding the channel.
+    ranges : list
+        The byte ranges of the lines of each run holding the channel, and
+        the column of the channel in these lines, as `[start, end,
+        column]` lists.
+    """
+
+    def __init__(self, name, log, ranges):
+        self.name = name
+        self._log = log
+        self._ranges = ranges
+
+    def __getattr__(self, name):
+        """
+        Reads the records from the log when one of them is first
+        accessed.
+        """
+        if name not in _RECORD_NAMES:
+            raise AttributeError(name)
+        self._load()
+        return getattr(self, name)
+
+    def _load(self):
+        """
+        Reads the records from the log.
+        """
+        for name in _RECORD_NAMES:
+            setattr(self, name, [])
+        for start, end, column in self._ranges:
+            resumed = True
+            for row in self._log._read_rows(start, end):
+                self._append(row, column, resumed)
+                resumed = False
+        self._freeze()
+
+    def _append(self, row, column, resumed=False):
+        """
+        Appends the values of a monitoring step to the records. If
+        `resumed`, the step is the first one of a new run, and replaces
+        the steps of previous runs that were not made before it.
+        """
+        if resumed:
+            step = (row[1], row[0])
+            while (self.batch_record and
+                   (self.batch_record[-1], self.epoch_record[-1]) >= step):
+                for record in self._records():
+                    record.pop()
+        self.epoch_record.append(row[0])
+        self.batch_record.append(row[1])
+        self.example_record.append(row[2])
+        self.time_record.append(row[3])
+        self.val_record.append(row[column])
+        self.stderr_record.append(row[column + 1])
+
+    def _records(self):
+        """
+        Returns the records, in a fixed order.
+        """
+        return [self.epoch_record, self.batch_record, self.example_record,
+                self.time_record, self.val_record, self.stderr_record]
+
+    def _freeze(self):
+        """
+        Converts the records to numpy arrays.
+        """
+        self.epoch_record = np.asarray(self.epoch_record, dtype='int64')
+        self.batch_record = np.asarray(self.batch_record, dtype='int64')
+        self.example_record = np.asarray(self.example_record, dtype='int64')
+        self.time_record = np.asarray(self.time_record, dtype='float64')
+        self.val_record = np.asarray(self.val_record, dtype='float64')
+        self.stderr_record = np.asarray(self.stderr_record, dtype='float64')
+
+    def __str__(self):
+        """
+        Returns a short description of the channel.
+        """
+        return 'LoggedChannel(%s, %d entries)' % (self.name,
+                                                  len(self.val_record))
+
+
+class MonitorLog(object):
+    """
+    Reads a monitor log. The file is only read when the channels or the
+    counters are first accessed, and the records of each channel when
+    they are first accessed.
+
+    When training was interrupted and resumed, the log holds the steps
+    recorded after the last checkpoint twice: the first step of each run
+    replaces the steps of the previous runs made at the same numbers of
+    batches and epochs or later.
+
+    Lines which are not terminated yet, because they are being written,
+    are left for a later read.
+
+    Parameters
+    ----------
+    path : str
+        The path of the log.
+    """
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise IOError("No monitor log at " + path)
+        self.path = path
+        self._channels = None
+        self._index = None
+        self._rows = {}
+
+    @property
+    def channels(self):
+        """
+        An OrderedDict mapping the names of the channels to
+        `LoggedChannel` objects.
+        """
+        if self._channels is None:
+            index = self._get_index()
+            self._channels = OrderedDict(
+                (name, LoggedChannel(name, self, ranges))
+                for name, ranges in index['channels'].items())
+        return self._channels
+
+    def _get_index(self):
+        """
+        Returns the index of the log, bringing the one saved next to the
+        log up to date with the lines appended since.
+        """
+        if self._index is None:
+            index = self._load_index()
+            if self._update_index(index):
+                self._save_index(index)
+            self._index = index
+        return self._index
+
+    def _load_index(self):
+        """
+        Reads the index saved next to the log, or returns an empty index
+        if there is none, or if the log was rewritten since.
+        """
+        empty = {'version': _INDEX_VERSION, 'size': 0, 'lines': 0,
+                 'tail': '', 'channels': OrderedDict(), 'current': [],
+                 'truncated': None, 'last_row': None}
+        try:
+            with open(self.path + INDEX_SUFFIX) as f:
+                index = json.load(f, object_pairs_hook=OrderedDict)
+            if index.get('version') != _INDEX_VERSION:
+                return empty
+            tail = index['tail'].encode('utf-8')
+            with open(self.path, 'rb') as f:
+                f.seek(index['size'] - len(tail))
+                if f.read(len(tail)) != tail:
+                    return empty
+        except (IOError, OSError, ValueError, KeyError):
+            return empty
+        return index
+
+    def _update_index(self, index):
+        """
+        Adds the lines appended to the log since it was indexed to the
+        index, and returns whether there were any.
+        """
+        channels = index['channels']
+        offset = index['size']
+        updated = False
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                line_start = offset
+                offset += len(line)
+                index['lines'] += 1
+                index['size'] = offset
+                index['tail'] = line.decode('utf-8')
+                updated = True
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    # The last line of a run may have been cut short by a
+                    # crash
+                    entry = None
+                if (index['truncated'] is not None and
+                        not isinstance(entry, dict)):
+                    raise ValueError("%s:%d is not a valid monitor log "
+                                     "entry" % (self.path, index['truncated']))
+                index['truncated'] = None
+                if entry is None:
+                    index['truncated'] = index['lines']
+                    continue
+                if isinstance(entry, dict):
+                    for name in index['current']:
+                        channels[name][-1][1] = line_start
+                    index['current'] = entry['channels']
+                    for i, name in enumerate(entry['channels']):
+                        channels.setdefault(name, []).append(
+                            [offset, offset, 4 + 2 * i])
+                    continue
+                index['last_row'] = entry
+        for name in index['current']:
+            channels[name][-1][1] = offset
+        return updated
+
+    def _save_index(self, index):
+        """
+        Saves the index next to the log. It is written to a temporary
+        file renamed over the previous index, so that concurrent readers
+        never see a partial index. Failures, e.g. in a read-only
+        directory, only mean that the next read scans the whole log.
+        """
+        index_path = self.path + INDEX_SUFFIX
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                prefix='.%s.tmp' % os.path.basename(index_path),
+                dir=os.path.dirname(os.path.abspath(index_path)))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(index, f)
+            os.rename(tmp_path, index_path)
+        except (IOError, OSError):
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _read_rows(self, start, end):
+        """
+        Returns the monitoring steps of the lines of the log between the
+        byte offsets `start` and `end`. The steps are kept, as the
+        channels of a run share its lines.
+        """
+        rows = self._rows.get((start, end))
+        if rows is None:
+            with open(self.path, 'rb') as f:
+                f.seek(start)
+                lines = f.read(end - start).decode('utf-8').splitlines()
+            rows = []
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Empty, or cut short by a crash, as checked by
+                    # _update_index
+                    continue
+                rows.append(entry)
+            self._rows[(start, end)] = rows
+        return rows
+
+    def _counter(self, index):
+        """
+        Returns one of the counters of the last monitoring step.
+        """
+        last_row = self._get_index()['last_row']
+        if last_row is None:
+            return 0
+        return last_row[index]
+
+    def get_epochs_seen(self):
+        """
+        Returns the number of epochs seen at the last monitoring step.
+        """
+        return self._counter(0)
+
+    def get_batches_seen(self):
+        """
+        Returns the number of batches seen at the last monitoring step.
+        """
+        return self._counter(1)
+
+    def get_examples_seen(self):
+        """
+        Returns the number of examples seen at the last monitoring step.
+        """
+        return self._counter(2)
+
+
+def load_monitor(path):
+    """
+    Loads the monitor of a model saved by train.py, or a monitor log.
+
+    Parameters
+    ----------
+    path : str
+        The path of a pickled model, or of a monitor log (see
+        `is_monitor_log`).
+
+    Returns
+    -------
+    monitor : Monitor or MonitorLog
+        An object with the `channels` of the monitor and its
+        `get_epochs_seen` method.
+    """
+    if is_monitor_log(path):
+        return MonitorLog(path)
+    from pylearn2.utils import serial
+    return serial.load(path).monitor
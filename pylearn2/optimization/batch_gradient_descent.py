@@ -25,6 +25,7 @@ from pylearn2.utils import function
 from pylearn2.utils import grad
 from pylearn2.utils import safe_zip
 from pylearn2.utils import sharedX
+from pylearn2.utils.compile import cached_function
 
 
 logger = logging.getLogger(__name__)
@@ -140,7 +141,7 @@ class BatchGradientDescent(object):
         if self.accumulate:
             self._compute_grad = Accumulator(inputs, updates=updates)
         else:
-            self._compute_grad = function(
+            self._compute_grad = cached_function(
                 inputs,
                 updates=updates,
                 mode=self.theano_function_mode,
@@ -154,8 +155,9 @@ class BatchGradientDescent(object):
         if self.accumulate:
             self.obj = Accumulator(inputs, obj)
         else:
-            self.obj = function(inputs, obj, mode=self.theano_function_mode,
-                                name='BatchGradientDescent.obj')
+            self.obj = cached_function(inputs, obj,
+                                       mode=self.theano_function_mode,
+                                       name='BatchGradientDescent.obj')
 
         if self.verbose:
             logger.info('done')
@@ -234,6 +236,7 @@ class BatchGradientDescent(object):
 
             grad_ordered = list(grad_to_old_grad.keys())
             old_grad_ordered = [grad_to_old_grad[g_] for g_ in grad_ordered]
+            self._old_grads = old_grad_ordered
 
             def dot_product(x, y):
                 return sum([(x_elem * y_elem).sum()
@@ -292,6 +295,44 @@ class BatchGradientDescent(object):
         self.ave_step_size = sharedX(0.)
         self.ave_grad_mult = sharedX(0.)
 
+    def _state_vars(self):
+        """
+        Returns the shared variables that keep information from one call
+        of `minimize` to the next.
+        """
+        rval = [self.ave_step_size, self.ave_grad_size, self.ave_grad_mult,
+                self.new_weight]
+        if self.conjugate:
+            rval.extend(self._old_grads)
+        return rval
+
+    def get_state(self):
+        """
+        Returns the state carried from one call of `minimize` to the next
+        (initial step sizes, running averages and, with conjugate
+        gradients, the previous gradient).
+
+        Returns
+        -------
+        state : dict
+        """
+        return {'init_alpha': self.init_alpha,
+                'shared_values': [var.get_value()
+                                  for var in self._state_vars()]}
+
+    def set_state(self, state):
+        """
+        Restores the state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+        """
+        self.init_alpha = tuple(state['init_alpha'])
+        for var, value in safe_zip(self._state_vars(),
+                                   state['shared_values']):
+            var.set_value(value)
+
     def minimize(self, * inputs):
         """
         .. todo::
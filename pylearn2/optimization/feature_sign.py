@@ -16,7 +16,7 @@ from itertools import count
 import logging
 import numpy as np
 from theano.compat import six
-from theano.compat.six.moves import zip as izip
+from theano.compat.six.moves import xrange, zip as izip
 
 log = logging.getLogger(__name__)
 log.setLevel(logging.INFO)
@@ -58,8 +58,41 @@ def _feature_sign_checkargs(dictionary, signals, sparsity, max_iter,
             )
 
 
+def _optimality(grad, signs, sparsity):
+    """
+    Computes the optimality conditions of feature-sign search.
+
+    Parameters
+    ----------
+    grad : ndarray, 1-dimensional
+        The gradient of the reconstruction error.
+    signs : ndarray, 1-dimensional
+        The signs of the coefficients of the current solution.
+    sparsity : float
+        The coefficient on the L1 penalty term of the cost function.
+
+    Returns
+    -------
+    z_opt : float
+        The largest absolute gradient of the zero coefficients.
+    nz_optimal : bool
+        Whether the gradient of the cost with respect to the non-zero
+        coefficients is approximately 0.
+    """
+    zero = signs == 0
+    num_zeros = np.count_nonzero(zero)
+    z_opt = np.max(abs(grad[zero])) if num_zeros > 0 else 0.
+    if num_zeros == len(signs):
+        return z_opt, True
+    nonzero = ~zero
+    nz_opt = np.max(abs(grad[nonzero] + sparsity * signs[nonzero]))
+    # Same as np.allclose(nz_opt, 0), without its overhead
+    return z_opt, nz_opt <= 1e-8
+
+
 def _feature_sign_search_single(dictionary, signal, sparsity, max_iter,
-                                solution=None):
+                                solution=None, gram_matrix=None,
+                                target_correlation=None, warm_start=False):
     """
     Solve a single L1-penalized minimization problem with
     feature-sign search.
@@ -78,6 +111,14 @@ def _feature_sign_search_single(dictionary, signal, sparsity, max_iter,
         The maximum number of iterations to run.
     solution : ndarray, 1-dimensional, optional
         Pre-allocated vector to use to store the solution.
+    gram_matrix : ndarray, 2-dimensional, optional
+        `np.dot(dictionary.T, dictionary)`, if already computed, so that
+        it can be shared between the problems of several signals.
+    target_correlation : ndarray, 1-dimensional, optional
+        `np.dot(dictionary.T, signal)`, if already computed.
+    warm_start : bool, optional
+        If True, the search starts from the coefficients in `solution`
+        instead of zeros.
 
     Returns
     -------
@@ -98,28 +139,39 @@ def _feature_sign_search_single(dictionary, signal, sparsity, max_iter,
     sparsity = np.array(sparsity).astype(dictionary.dtype)
     effective_zero = 1e-18
     # precompute matrices for speed.
-    gram_matrix = np.dot(dictionary.T, dictionary)
-    target_correlation = np.dot(dictionary.T, signal)
+    if gram_matrix is None:
+        gram_matrix = np.dot(dictionary.T, dictionary)
+    if target_correlation is None:
+        target_correlation = np.dot(dictionary.T, signal)
     # initialization goes here.
     if solution is None:
         solution = np.zeros(gram_matrix.shape[0], dtype=dictionary.dtype)
+        warm_start = False
     else:
         assert solution.ndim == 1, "solution must be 1-dimensional"
         assert solution.shape[0] == dictionary.shape[1], (
             "solution.shape[0] does not match dictionary.shape[1]"
         )
-        # Initialize all elements to be zero.
-        solution[...] = 0.
+        if not warm_start:
+            # Initialize all elements to be zero.
+            solution[...] = 0.
     signs = np.zeros(gram_matrix.shape[0], dtype=np.int8)
-    active_set = set()
-    z_opt = np.inf
-    # Used to store whether max(abs(grad[nzidx] + sparsity * signs[nzidx]))
-    # is approximately 0.
-    # Set to True here to trigger a new feature activation on first iteration.
-    nz_optimal = True
-    # second term is zero on initialization.
-    grad = - 2 * target_correlation  # + 2 * np.dot(gram_matrix, solution)
-    max_grad_zero = np.argmax(np.abs(grad))
+    if warm_start:
+        active = np.flatnonzero(solution)
+        signs[active] = np.sign(solution[active])
+        active_set = set(active)
+        grad = (- 2 * target_correlation +
+                2 * np.dot(gram_matrix[:, active], solution[active]))
+        z_opt, nz_optimal = _optimality(grad, signs, sparsity)
+    else:
+        active_set = set()
+        z_opt = np.inf
+        # Used to store whether max(abs(grad[nzidx] + sparsity *
+        # signs[nzidx])) is approximately 0. Set to True here to trigger
+        # a new feature activation on first iteration.
+        nz_optimal = True
+        # second term is zero on initialization.
+        grad = - 2 * target_correlation  # + 2 * np.dot(gram_matrix, solution)
     # Just used to compute exact cost function.
     sds = np.dot(signal.T, signal)
     counter = count(0)
@@ -215,16 +267,49 @@ def _feature_sign_search_single(dictionary, signal, sparsity, max_iter,
         solution[zeros] = 0.
         signs[indices] = np.int8(np.sign(solution[indices]))
         active_set.difference_update(zeros)
-        grad = - 2 * target_correlation + 2 * np.dot(gram_matrix, solution)
-        z_opt = np.max(abs(grad[signs == 0]))
-        nz_opt = np.max(abs(grad[signs != 0] + sparsity * signs[signs != 0]))
-        nz_optimal = np.allclose(nz_opt, 0)
+        # Only the columns of the active coefficients contribute
+        grad = (- 2 * target_correlation +
+                2 * np.dot(gram_matrix[:, indices], solution[indices]))
+        z_opt, nz_optimal = _optimality(grad, signs, sparsity)
 
     return solution, min(six.next(counter), max_iter)
 
 
+def _feature_sign_search_rows(args):
+    """
+    Solves the problems of several signals sharing a dictionary, one at a
+    time. This is the work done by each process of `feature_sign_search`.
+
+    Parameters
+    ----------
+    args : tuple
+        `(dictionary, gram_matrix, signals, correlations, sparsity,
+        max_iter, solution, warm_start)`, where `correlations` is
+        `np.dot(signals, dictionary)` and `solution` is a 2-dimensional
+        array updated in place.
+
+    Returns
+    -------
+    solution : ndarray, 2-dimensional
+        The solutions, one per row.
+    iters : list
+        The number of iterations run for each signal.
+    """
+    (dictionary, gram_matrix, signals, correlations, sparsity, max_iter,
+     solution, warm_start) = args
+    iters = []
+    for signal, corr, sol in izip(signals, correlations, solution):
+        _, num_iters = _feature_sign_search_single(
+            dictionary, signal, sparsity, max_iter, sol,
+            gram_matrix=gram_matrix, target_correlation=corr,
+            warm_start=warm_start)
+        iters.append(num_iters)
+    return solution, iters
+
+
 def feature_sign_search(dictionary, signals, sparsity, max_iter=1000,
-                        solution=None):
+                        solution=None, warm_start=False, n_jobs=None,
+                        chunk_size=256):
     """
     Solve L1-penalized quadratic minimization problems with
     feature-sign search.
@@ -235,6 +320,11 @@ def feature_sign_search(dictionary, signals, sparsity, max_iter=1000,
     subsets of the variables, with candidates for non-zero elements
     chosen by means of a gradient-based criterion.
 
+    The Gram matrix of the dictionary is computed once and shared by
+    the problems of all the signals, and the correlations of all the
+    signals with the dictionary are computed with a single matrix
+    product.
+
     Parameters
     ----------
     dictionary : array_like, 2-dimensional
@@ -255,6 +345,17 @@ def feature_sign_search(dictionary, signals, sparsity, max_iter=1000,
         Pre-allocated vector or matrix used to store the solution(s).
         If provided, it should have the same rank as `signals`. If
         2-dimensional, it should have as many rows as `signals`.
+    warm_start : bool, optional
+        If True, the search starts from the codes in `solution` (e.g.
+        the codes of the same signals for a slightly different
+        dictionary) instead of zeros, which usually takes much fewer
+        iterations. Requires `solution`.
+    n_jobs : int, optional
+        If greater than 1, the signals are split into chunks of
+        `chunk_size` rows solved by a pool of `n_jobs` processes.
+    chunk_size : int, optional
+        The number of signals solved by a process at a time, when
+        `n_jobs` is greater than 1.
 
     Returns
     -------
@@ -290,6 +391,8 @@ def feature_sign_search(dictionary, signals, sparsity, max_iter=1000,
     """
     dictionary = np.asarray(dictionary)
     _feature_sign_checkargs(dictionary, signals, sparsity, max_iter, solution)
+    if warm_start and solution is None:
+        raise ValueError("warm_start requires the solution to start from")
     # Make things the code a bit simpler by always forcing the
     # 2-dimensional case.
     signals_ndim = signals.ndim
@@ -301,14 +404,35 @@ def feature_sign_search(dictionary, signals, sparsity, max_iter=1000,
     else:
         orig_sol = solution
         solution = np.atleast_2d(solution)
-    # Solve each minimization in sequence.
-    for row, (signal, sol) in enumerate(izip(signals, solution)):
-        _, iters = _feature_sign_search_single(dictionary, signal, sparsity,
-                                               max_iter, sol)
-        if iters >= max_iter:
+    gram_matrix = np.dot(dictionary.T, dictionary)
+    correlations = np.dot(signals, dictionary)
+    if n_jobs is not None and n_jobs > 1 and signals.shape[0] > chunk_size:
+        from multiprocessing import Pool
+        chunks = [(dictionary, gram_matrix, signals[start:start + chunk_size],
+                   correlations[start:start + chunk_size], sparsity,
+                   max_iter, solution[start:start + chunk_size], warm_start)
+                  for start in xrange(0, signals.shape[0], chunk_size)]
+        pool = Pool(n_jobs)
+        try:
+            results = pool.map(_feature_sign_search_rows, chunks)
+        finally:
+            pool.close()
+            pool.join()
+        iters = []
+        for start, (chunk_solution, chunk_iters) in izip(
+                xrange(0, signals.shape[0], chunk_size), results):
+            # The processes solved copies of the chunks
+            solution[start:start + chunk_size] = chunk_solution
+            iters.extend(chunk_iters)
+    else:
+        _, iters = _feature_sign_search_rows(
+            (dictionary, gram_matrix, signals, correlations, sparsity,
+             max_iter, solution, warm_start))
+    for row, num_iters in enumerate(iters):
+        if num_iters >= max_iter:
             log.warning("maximum number of iterations reached when "
                         "optimizing code for training case %d; solution "
-                        "may not be optimal" % iters)
+                        "may not be optimal" % row)
     # Attempt to return the exact same object reference.
     if orig_sol is not None and orig_sol.ndim == 1:
         solution = orig_sol
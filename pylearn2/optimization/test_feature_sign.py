@@ -414,3 +414,28 @@ class TestFeatureSign(object):
         newsol = feature_sign_search(self.dictionary, signal, sparsity,
                                      solution=solution)
         assert solution is newsol
+
+    def test_batch_matches_rows(self):
+        rng = np.random.RandomState(1)
+        signals = rng.normal(size=(6, 100)) / 1000
+        sparsity = self.penalties[3]
+        reference = np.array([feature_sign_search(self.dictionary, signal,
+                                                  sparsity)
+                              for signal in signals])
+        solution = feature_sign_search(self.dictionary, signals, sparsity)
+        assert np.allclose(solution, reference)
+        solution = feature_sign_search(self.dictionary, signals, sparsity,
+                                       n_jobs=2, chunk_size=4)
+        assert np.allclose(solution, reference)
+
+    def test_warm_start(self):
+        sparsity = self.penalties[4]
+        reference = feature_sign_search(self.dictionary, self.signal,
+                                        sparsity)
+        # start from the solution for a smaller penalty
+        solution = feature_sign_search(self.dictionary, self.signal,
+                                       self.penalties[3])
+        newsol = feature_sign_search(self.dictionary, self.signal, sparsity,
+                                     solution=solution, warm_start=True)
+        assert newsol is solution
+        assert np.allclose(solution, reference)
@@ -1,18 +1,99 @@
 """Tools for estimating the partition function of an RBM"""
+import logging
 import numpy
 from theano.compat.six.moves import xrange
 import theano
 from theano import tensor, config
 from theano.tensor import nnet
 from pylearn2.utils.exc import reraise_as
+from pylearn2.utils.fork import ForkedState, fork_pool
 from pylearn2.utils.rng import make_np_rng, make_theano_rng
-from pylearn2.utils.mem import improve_memory_error_message
 
 
-def compute_log_z(rbm, free_energy_fn, max_bits=15):
+logger = logging.getLogger(__name__)
+
+
+def _bit_patterns(start, num_states, width, out=None):
+    """
+    Returns the binary configurations `start` to `start + num_states - 1`
+    of `width` units, one per row, most significant bit first.
+
+    Parameters
+    ----------
+    start : int
+        The index of the first configuration.
+    num_states : int
+        The number of configurations.
+    width : int
+        The number of units.
+    out : numpy.ndarray, optional
+        A (num_states, width) array to write the configurations to.
+    """
+    if out is None:
+        out = numpy.empty((num_states, width), dtype=config.floatX)
+    states = numpy.arange(start, start + num_states, dtype='int64')
+    shifts = numpy.arange(width - 1, -1, -1, dtype='int64')
+    numpy.bitwise_and(states[:, numpy.newaxis] >> shifts, 1, out=out,
+                      casting='unsafe')
+    return out
+
+
+# The free energy function used by the processes of compute_log_z
+_free_energy_fn = ForkedState()
+
+
+def _log_sum_exp_blocks(args):
+    """
+    Accumulates the negative free energies of blocks of configurations
+    into a running maximum and a running sum of exponentials relative to
+    that maximum, so that only one block is in memory at a time.
+
+    Parameters
+    ----------
+    args : tuple
+        `(first_block, last_block, block_bits, width)`. The blocks from
+        `first_block` to `last_block - 1` of `2 ** block_bits`
+        configurations of `width` units are enumerated.
+
+    Returns
+    -------
+    alpha : float
+        The largest negative free energy.
+    total : float
+        The sum of the exponentials of the negative free energies minus
+        `alpha`.
+    """
+    first_block, last_block, block_bits, width = args
+    block_size = 2 ** block_bits
+    try:
+        states = numpy.empty((block_size, width), dtype=config.floatX)
+    except MemoryError:
+        reraise_as(MemoryError("failed to allocate (%d, %d) matrix of "
+                               "type %s in compute_log_z; try a smaller "
+                               "value of max_bits" %
+                               (block_size, width, str(config.floatX))))
+    alpha = -numpy.inf
+    total = 0.
+    for block in xrange(first_block, last_block):
+        _bit_patterns(block * block_size, block_size, width, out=states)
+        nfe = -numpy.asarray(_free_energy_fn.value(states), dtype='float64')
+        block_max = nfe.max()
+        if block_max > alpha:
+            total *= numpy.exp(alpha - block_max)
+            alpha = block_max
+        total += numpy.exp(nfe - alpha).sum()
+    return alpha, total
+
+
+def compute_log_z(rbm, free_energy_fn, max_bits=15, n_jobs=None,
+                  ais_threshold=None, ais_runs=100):
     """
     Compute the log partition function of an (binary-binary) RBM.
 
+    The configurations of the smaller layer are enumerated by blocks,
+    whose free energies are reduced to a running log-sum-exp, so the
+    memory used does not depend on the number of configurations.
+
     Parameters
     ----------
     rbm : object
@@ -23,6 +104,17 @@ def compute_log_z(rbm, free_energy_fn, max_bits=15):
     max_bits : int, optional
         The (base-2) log of the number of states to enumerate (and
         compute free energy for) at a time.
+    n_jobs : int, optional
+        If greater than 1, the blocks of configurations are split
+        between this many processes. The processes are forked, so
+        `free_energy_fn` need not be picklable, but this is only
+        supported on platforms that fork.
+    ais_threshold : int, optional
+        If specified, and the smaller layer has more units than this,
+        log Z is estimated with `rbm_ais` instead of being computed
+        exactly. This requires an RBM from `pylearn2.models.rbm`.
+    ais_runs : int, optional
+        The number of AIS runs of the estimate.
 
     Notes
     -----
@@ -37,57 +129,37 @@ def compute_log_z(rbm, free_energy_fn, max_bits=15):
         width = rbm.nhid
         type = 'hid'
 
+    if ais_threshold is not None and width > ais_threshold:
+        rbm_params = [rbm.get_weights(), rbm.bias_vis.get_value(),
+                      rbm.bias_hid.get_value()]
+        (log_z, var_dlogz), ais = rbm_ais(rbm_params, n_runs=ais_runs)
+        return log_z
+
     # Determine in how many steps to compute Z.
     block_bits = width if (not max_bits or width < max_bits) else max_bits
-    block_size = 2 ** block_bits
-
-    # Allocate storage for 2**block_bits of the 2**width possible
-    # configurations.
-    try:
-        logz_data_c = numpy.zeros(
-            (block_size, width),
-            order='C',
-            dtype=config.floatX
-        )
-    except MemoryError:
-        reraise_as(MemoryError("failed to allocate (%d, %d) matrix of "
-                               "type %s in compute_log_z; try a smaller "
-                               "value of max_bits" %
-                          (block_size, width, str(config.floatX))))
-
-    # fill in the first block_bits, which will remain fixed for all
-    # 2**width configs
-    tensor_10D_idx = numpy.ndindex(*([2] * block_bits))
-    for i, j in enumerate(tensor_10D_idx):
-        logz_data_c[i, -block_bits:] = j
-    try:
-        logz_data = numpy.array(logz_data_c, order='F', dtype=config.floatX)
-    except MemoryError:
-        reraise_as(MemoryError("failed to allocate (%d, %d) matrix of "
-                               "type %s in compute_log_z; try a smaller "
-                               "value of max_bits" %
-                          (block_size, width, str(config.floatX))))
+    num_blocks = 2 ** (width - block_bits)
+
+    with _free_energy_fn.bind(free_energy_fn):
+        if n_jobs is not None and n_jobs > 1 and num_blocks > 1:
+            n_jobs = min(n_jobs, num_blocks)
+            bounds = numpy.linspace(0, num_blocks,
+                                    n_jobs + 1).astype('int64')
+            pool = fork_pool(n_jobs)
+            try:
+                results = pool.map(_log_sum_exp_blocks,
+                                   [(first, last, block_bits, width)
+                                    for first, last in zip(bounds[:-1],
+                                                           bounds[1:])])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [_log_sum_exp_blocks((0, num_blocks, block_bits,
+                                            width))]
 
-    # Allocate storage for (negative) free-energy of all 2**width
-    # configurations.
-    try:
-        nFE = numpy.zeros(2 ** width, dtype=config.floatX)
-    except MemoryError as e:
-        improve_memory_error_message(e, 
-            "failed to allocate free energy storage "
-            "array in compute_log_z; your model is too "
-            "big to use with this function")
-
-    # now loop 2**(width - block_bits) times, filling in the
-    # most-significant bits
-    for bi, up_bits in enumerate(numpy.ndindex(*([2] * (width - block_bits)))):
-        logz_data[:, :width - block_bits] = up_bits
-        nFE[bi * block_size:(bi + 1) * block_size] = -free_energy_fn(logz_data)
-    alpha = nFE.max()
-    # Do the subtraction and exponentiation in-place so as to not incur a copy.
-    nFE -= alpha
-    numpy.exp(nFE, nFE)
-    log_z = numpy.log(nFE.sum()) + alpha
+    alphas, totals = numpy.asarray(results).T
+    alpha = alphas.max()
+    log_z = numpy.log(numpy.sum(totals * numpy.exp(alphas - alpha))) + alpha
     return log_z
 
 
@@ -113,7 +185,8 @@ def compute_nll(rbm, data, log_z, free_energy_fn, bufsize=1000, preproc=None):
 
 
 def rbm_ais(rbm_params, n_runs, visbias_a=None, data=None,
-            betas=None, key_betas=None, rng=None, seed=23098):
+            betas=None, key_betas=None, rng=None, seed=23098,
+            chunk_size=None, n_shards=1, n_jobs=None, max_var=None):
     """
     Implements Annealed Importance Sampling for Binary-Binary RBMs
 
@@ -146,6 +219,22 @@ def rbm_ais(rbm_params, n_runs, visbias_a=None, data=None,
         Random number generator object to use.
     seed : int, optional
         If rng is None, initialize rng with this seed.
+    chunk_size : int, optional
+        If specified, the particles are moved through this many
+        temperatures per call to a compiled function (see `AIS`),
+        instead of one.
+    n_shards : int, optional
+        If greater than 1, the particles are split into this many
+        shards, run one after the other, each with its own seed drawn
+        from `rng`. The estimate only depends on the seeds, not on how
+        the shards are run.
+    n_jobs : int, optional
+        If greater than 1, the shards are run by this many forked
+        processes.
+    max_var : float, optional
+        If specified, no more shards are run once the estimated variance
+        of log(Zb/Za), `var_dlogz / n`, where `n` is the number of
+        particles run so far, falls below this value.
 
     References
     ----------
@@ -176,13 +265,24 @@ def rbm_ais(rbm_params, n_runs, visbias_a=None, data=None,
         visbias_a = -numpy.log(1. / data - 1)
     hidbias_a = numpy.zeros_like(hidbias)
     weights_a = numpy.zeros_like(weights)
-    # generate exact sample for the base model
-    v0 = numpy.tile(1. / (1 + numpy.exp(-visbias_a)), (n_runs, 1))
-    v0 = numpy.array(v0 > rng.random_sample(v0.shape), dtype=config.floatX)
-    # we now compute the log AIS weights for the ratio log(Zb/Za)
-    ais = rbm_z_ratio((weights_a, visbias_a, hidbias_a),
-                      rbm_params, n_runs, v0,
-                      betas=betas, key_betas=key_betas, rng=rng)
+    rbmA_params = (weights_a, visbias_a, hidbias_a)
+    if n_shards > 1:
+        # we compute the log AIS weights of each shard of particles, with
+        # a seed per shard, and merge them
+        shard_runs = numpy.diff(numpy.linspace(0, n_runs, n_shards + 1)
+                                .astype('int64'))
+        shard_seeds = rng.randint(2 ** 30, size=n_shards)
+        shards = [(rbmA_params, rbm_params, runs, betas, key_betas,
+                   shard_seed, chunk_size)
+                  for runs, shard_seed in zip(shard_runs, shard_seeds)]
+        ais = _run_ais_shards(shards, n_jobs, max_var)
+    else:
+        # generate exact sample for the base model
+        v0 = _base_rate_sample(visbias_a, n_runs, rng)
+        # we now compute the log AIS weights for the ratio log(Zb/Za)
+        ais = rbm_z_ratio(rbmA_params, rbm_params, n_runs, v0,
+                          betas=betas, key_betas=key_betas, rng=rng,
+                          chunk_size=chunk_size)
     dlogz, var_dlogz = ais.estimate_from_weights()
     # log Z = log_za + dlogz
     ais.log_za = weights_a.shape[1] * numpy.log(2) + \
@@ -191,8 +291,81 @@ def rbm_ais(rbm_params, n_runs, visbias_a=None, data=None,
     return (ais.log_zb, var_dlogz), ais
 
 
+def _base_rate_sample(visbias_a, n_runs, rng):
+    """
+    Draws `n_runs` exact samples of the visible units of a base-rate
+    model, which has no weights and no hidden biases.
+    """
+    v0 = numpy.tile(1. / (1 + numpy.exp(-visbias_a)), (n_runs, 1))
+    return numpy.array(v0 > rng.random_sample(v0.shape), dtype=config.floatX)
+
+
+def _ais_shard(args):
+    """
+    Runs AIS on one shard of the particles of `rbm_ais`.
+
+    Parameters
+    ----------
+    args : tuple
+        `(rbmA_params, rbmB_params, n_runs, betas, key_betas, seed,
+        chunk_size)`.
+
+    Returns
+    -------
+    log_ais_w : numpy.ndarray
+        The log AIS weights of the shard.
+    key_log_ais_w : list
+        The log AIS weights of the shard at each key temperature.
+    """
+    (rbmA_params, rbmB_params, n_runs, betas, key_betas, seed,
+     chunk_size) = args
+    rng = make_np_rng(None, seed, ['random_sample', 'randint'])
+    v0 = _base_rate_sample(rbmA_params[1], n_runs, rng)
+    ais = rbm_z_ratio(rbmA_params, rbmB_params, n_runs, v0, betas=betas,
+                      key_betas=key_betas, rng=rng, chunk_size=chunk_size)
+    return ais.log_ais_w, ais.key_log_ais_w
+
+
+def _run_ais_shards(shards, n_jobs=None, max_var=None):
+    """
+    Runs the shards of `rbm_ais` in order, in `n_jobs` processes if
+    greater than 1, until they are all run or the variance of the merged
+    estimate falls below `max_var`.
+
+    Returns
+    -------
+    ais : AIS
+        An `AIS` object holding the merged log AIS weights.
+    """
+    pool = None
+    if n_jobs is not None and n_jobs > 1:
+        from multiprocessing import Pool
+        pool = Pool(min(n_jobs, len(shards)))
+        results = pool.imap(_ais_shard, shards)
+    else:
+        results = (_ais_shard(shard) for shard in shards)
+    done = []
+    try:
+        for result in results:
+            done.append(result)
+            ais = AIS.from_weights(done, shards[0][3], shards[0][4])
+            dlogz, var_dlogz = ais.estimate_from_weights()
+            var_estimate = var_dlogz / ais.n_runs
+            logger.info('AIS shard %d/%d: log(Zb/Za) = %f, variance of the '
+                        'estimate = %f', len(done), len(shards), dlogz,
+                        var_estimate)
+            if max_var is not None and var_estimate <= max_var:
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return ais
+
+
 def rbm_z_ratio(rbmA_params, rbmB_params, n_runs, v0=None,
-                betas=None, key_betas=None, rng=None, seed=23098):
+                betas=None, key_betas=None, rng=None, seed=23098,
+                chunk_size=None):
     """
     Computes the AIS log-weights :math:`log\:w^{(i)}`, such that
 
@@ -220,6 +393,10 @@ def rbm_z_ratio(rbmA_params, rbmB_params, n_runs, v0=None,
     rng : WRITEME
     seed : int
         WRITEME
+    chunk_size : int, optional
+        If specified, a function moving the particles through this many
+        temperatures per call is compiled with `scan`, and used instead
+        of one call per temperature.
 
     Notes
     -----
@@ -231,7 +408,7 @@ def rbm_z_ratio(rbmA_params, rbmB_params, n_runs, v0=None,
     # check that both models have the same number of visible units
     assert len(rbmA_params[1]) == len(rbmB_params[1])
 
-    rng = make_np_rng(rng, seed, 'rand')
+    rng = make_np_rng(rng, seed, ['rand', 'randint'])
 
     # make sure parameters are in floatX format for GPU support
     rbmA_params = [numpy.asarray(q, dtype=config.floatX) for q in rbmA_params]
@@ -240,11 +417,12 @@ def rbm_z_ratio(rbmA_params, rbmB_params, n_runs, v0=None,
     # declare symbolic vars for current sample `v_sample` and temp `beta`
     v_sample = tensor.matrix('ais_v_sample')
     beta = tensor.scalar('ais_beta')
+    sample_seed = rng.randint(2 ** 30)
 
     ### given current sample `v_sample`, generate new samples from inv.
     ### temperature `beta`
     new_v_sample = rbm_ais_gibbs_for_v(rbmA_params, rbmB_params,
-                                       beta, v_sample)
+                                       beta, v_sample, seed=sample_seed)
     sample_fn = theano.function([beta, v_sample], new_v_sample)
 
     ### build theano function to compute the free-energy
@@ -252,10 +430,32 @@ def rbm_z_ratio(rbmA_params, rbmB_params, n_runs, v0=None,
     free_energy_fn = theano.function([beta, v_sample],
                                      fe, allow_input_downcast=False)
 
+    ### build theano function to run through a chunk of temperatures
+    chunk_fn = None
+    if chunk_size is not None:
+        chunk_betas = tensor.vector('ais_chunk_betas')
+
+        def ais_step(bp, bp1, v, log_w):
+            log_w = log_w + \
+                rbm_ais_pk_free_energy(rbmA_params, rbmB_params, bp, v) - \
+                rbm_ais_pk_free_energy(rbmA_params, rbmB_params, bp1, v)
+            v = rbm_ais_gibbs_for_v(rbmA_params, rbmB_params, bp1, v,
+                                    seed=sample_seed)
+            return v, log_w
+
+        log_w0 = tensor.zeros((v_sample.shape[0],), dtype=config.floatX)
+        (v_samples, log_ws), updates = theano.scan(
+            ais_step,
+            sequences=[chunk_betas[:-1], chunk_betas[1:]],
+            outputs_info=[v_sample, log_w0])
+        chunk_fn = theano.function([chunk_betas, v_sample],
+                                   [v_samples[-1], log_ws[-1]],
+                                   updates=updates)
+
     ### RUN AIS ###
-    weights_b = rbmB_params
-    v0 = rng.rand(n_runs, weights_b.shape[0]) if v0 is None else v0
-    ais = AIS(sample_fn, free_energy_fn, v0, n_runs)
+    v0 = rng.rand(n_runs, rbmB_params[0].shape[0]) if v0 is None else v0
+    ais = AIS(sample_fn, free_energy_fn, v0, n_runs, chunk_fn=chunk_fn,
+              chunk_size=chunk_size)
     ais.set_betas(betas, key_betas=key_betas)
     ais.run()
 
@@ -399,6 +599,16 @@ class AIS(object):
     log_int : int
         Log standard deviation of log ais weights every `log_int`
         temperatures.
+    chunk_fn : compiled theano function, optional
+        `chunk_fn(betas, v_sample)` moves the particles `v_sample`
+        through all the temperatures of `betas`, and returns the new
+        samples along with the log AIS weights accumulated on the way.
+        When specified, it is used by `run` instead of `sample_fn` and
+        `free_energy_fn`.
+    chunk_size : int, optional
+        The maximum number of temperatures passed to `chunk_fn` per call.
+        Chunks are also cut at key temperatures and every `log_int`
+        temperatures.
     """
 
 
@@ -411,15 +621,24 @@ class AIS(object):
                                             dtype=config.floatX)))
 
     def __init__(self, sample_fn, free_energy_fn, v_sample0, n_runs,
-                 log_int=500):
+                 log_int=500, chunk_fn=None, chunk_size=None):
         self.sample_fn = sample_fn
         self.free_energy_fn = free_energy_fn
         self.v_sample0 = v_sample0
         self.n_runs = n_runs
         self.log_int = log_int
+        if chunk_fn is not None and chunk_size is None:
+            raise ValueError("chunk_size must be specified with chunk_fn")
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError("chunk_size must be positive, got %d"
+                             % chunk_size)
+        self.chunk_fn = chunk_fn
+        self.chunk_size = chunk_size
 
         # initialize log importance weights
         self.log_ais_w = numpy.zeros(n_runs, dtype=config.floatX)
+        # log importance weights at every key temperature
+        self.key_log_ais_w = []
 
         # utility function for safely computing log-mean of the ais weights
         ais_w = tensor.vector()
@@ -430,6 +649,42 @@ class AIS(object):
         self.log_mean = theano.function([ais_w], dlogz,
                                         allow_input_downcast=False)
 
+    @classmethod
+    def from_weights(cls, shards, betas=None, key_betas=None):
+        """
+        Merges the log AIS weights of several runs of AIS with the same
+        temperatures, e.g. of shards of the particles run separately.
+
+        Parameters
+        ----------
+        shards : list
+            List of `(log_ais_w, key_log_ais_w)` pairs, as found in the
+            attributes of a run `AIS` object.
+        betas : numpy.ndarray, optional
+            See `set_betas`.
+        key_betas : numpy.ndarray, optional
+            See `set_betas`.
+
+        Returns
+        -------
+        ais : AIS
+            An `AIS` object which can estimate log(Zb/Za) from the merged
+            weights, but cannot be run.
+        """
+        log_ais_w = numpy.concatenate([shard[0] for shard in shards])
+        ais = cls(None, None, None, len(log_ais_w))
+        ais.set_betas(betas, key_betas=key_betas)
+        ais.log_ais_w = log_ais_w
+        ais.key_log_ais_w = [numpy.concatenate(key_w) for key_w in
+                             zip(*[shard[1] for shard in shards])]
+        ais.logz_beta = []
+        ais.var_logz_beta = []
+        for key_w in ais.key_log_ais_w:
+            log_ais_w_bi, var_log_ais_w_bi = ais.estimate_from_weights(key_w)
+            ais.logz_beta.insert(0, log_ais_w_bi)
+            ais.var_logz_beta.insert(0, var_log_ais_w_bi)
+        return ais
+
     def set_betas(self, betas=None, key_betas=None):
         """
         Set the inverse temperature parameters of the AIS procedure.
@@ -477,20 +732,43 @@ class AIS(object):
         self.std_ais_w = []  # used to log std of log_ais_w regularly
         self.logz_beta = []  # used to log log_ais_w at every `key_beta` value
         self.var_logz_beta = []  # used to log variance of log_ais_w as above
+        self.key_log_ais_w = []  # used to log log_ais_w at every key_beta
 
         # initial sample
         state = self.v_sample0
         ki = 0
+        n_betas = len(self.betas)
+
+        # temperatures at which a chunk must end, so that the weights can
+        # be logged there
+        if self.chunk_fn is not None:
+            stops = numpy.arange(self.log_int, n_betas - 1, self.log_int)
+            if self.key_betas is not None:
+                stops = numpy.union1d(
+                    stops,
+                    numpy.flatnonzero(numpy.in1d(self.betas, self.key_betas)))
+            stops = numpy.append(stops[stops > 0], n_betas - 1)
 
         # loop over all temperatures from beta=0 to beta=1
-        for i in range(len(self.betas) - 1):
-            bp, bp1 = self.betas[i], self.betas[i + 1]
-            # log-ratio of (free) energies for two nearby temperatures
-            self.log_ais_w += \
-                self.free_energy_fn(bp, state) - \
-                self.free_energy_fn(bp1, state)
+        i = 0
+        while i < n_betas - 1:
+            if self.chunk_fn is None:
+                j = i + 1
+                bp, bp1 = self.betas[i], self.betas[j]
+                # log-ratio of (free) energies for two nearby temperatures
+                self.log_ais_w += \
+                    self.free_energy_fn(bp, state) - \
+                    self.free_energy_fn(bp1, state)
+            else:
+                # move the particles through the temperatures up to the
+                # next stop, sampling on the way
+                next_stop = stops[numpy.searchsorted(stops, i, side='right')]
+                j = min(i + self.chunk_size, next_stop)
+                bp1 = self.betas[j]
+                state, log_w = self.chunk_fn(self.betas[i:j + 1], state)
+                self.log_ais_w += log_w
             # log standard deviation of AIS weights (kind of deprecated)
-            if (i + 1) % self.log_int == 0:
+            if j % self.log_int == 0:
                 m = numpy.max(self.log_ais_w)
                 std_ais = (numpy.log(numpy.std(numpy.exp(self.log_ais_w - m)))
                            + m - numpy.log(self.n_runs) / 2)
@@ -507,10 +785,13 @@ class AIS(object):
                     self.estimate_from_weights(self.log_ais_w)
                 self.logz_beta.insert(0, log_ais_w_bi)
                 self.var_logz_beta.insert(0, var_log_ais_w_bi)
+                self.key_log_ais_w.append(self.log_ais_w.copy())
                 ki += 1
 
             # generate a new sample at temperature beta_{i+1}
-            state = self.sample_fn(bp1, state)
+            if self.chunk_fn is None:
+                state = self.sample_fn(bp1, state)
+            i = j
 
     def estimate_from_weights(self, log_ais_w=None):
         """
@@ -16,7 +16,9 @@ from numpy.lib.stride_tricks import as_strided
 from pylearn2.datasets.dense_design_matrix import DenseDesignMatrix
 from pylearn2.sandbox.nlp.datasets.text import TextDatasetMixin
 from pylearn2.utils import serial
-from pylearn2.utils.iteration import resolve_iterator_class
+from pylearn2.utils.iteration import (resolve_iterator_class,
+                                      EvenSequencesSubsetIterator,
+                                      BucketedSequencesSubsetIterator)
 from pylearn2.utils.rng import make_np_rng
 from pylearn2.sandbox.rnn.space import SequenceDataSpace
 from pylearn2.space import IndexSpace, CompositeSpace
@@ -161,16 +163,24 @@ class PennTreebankSequences(VectorSpacesDataset, PennTreebank):
         subset_iterator = resolve_iterator_class(mode)
         if rng is None and subset_iterator.stochastic:
             rng = make_np_rng()
+        if issubclass(subset_iterator, (EvenSequencesSubsetIterator,
+                                        BucketedSequencesSubsetIterator)):
+            # These iterators group the sequences by length
+            return subset_iterator(self.data[0], batch_size, num_batches,
+                                   rng)
         return subset_iterator(self.get_num_examples(), batch_size,
                                num_batches, rng)
 
     @wraps(VectorSpacesDataset.iterator)
     def iterator(self, batch_size=None, num_batches=None, rng=None,
-                 data_specs=None, return_tuple=False, mode=None):
+                 data_specs=None, return_tuple=False, mode=None,
+                 prefetch=None, batch_buffers=None):
         subset_iterator = self._create_subset_iterator(
             mode=mode, batch_size=batch_size, num_batches=num_batches, rng=rng
         )
         # This should be fixed to allow iteration with default data_specs
         # i.e. add a mask automatically maybe?
         return SequenceDatasetIterator(self, data_specs, subset_iterator,
-                                       return_tuple=return_tuple)
+                                       return_tuple=return_tuple,
+                                       prefetch=prefetch,
+                                       batch_buffers=batch_buffers)
@@ -1,8 +1,6 @@
 """
 Iterator for RNN data
 """
-from functools import wraps
-
 import numpy as np
 from theano import config
 
@@ -35,6 +33,12 @@ class SequenceDatasetIterator(FiniteDatasetIterator):
         A list of callables, in the same order as the sources
         in `data_specs`, that will be called on the individual
         source batches prior to any further processing.
+    prefetch : int, optional
+        See `FiniteDatasetIterator`.
+    batch_buffers : int, optional
+        If set to a positive integer, the padded sequences and their
+        masks are written into preallocated buffers, reused every
+        `batch_buffers` batches. See `FiniteDatasetIterator`.
 
     Notes
     -----
@@ -42,7 +46,8 @@ class SequenceDatasetIterator(FiniteDatasetIterator):
     attribute documentation.
     """
     def __init__(self, dataset, data_specs, subset_iterator,
-                 return_tuple=False, convert=None):
+                 return_tuple=False, convert=None, prefetch=None,
+                 batch_buffers=None):
         # Unpack the data specs into two tuples
         space, source = data_specs
         if not isinstance(source, tuple):
@@ -78,7 +83,8 @@ class SequenceDatasetIterator(FiniteDatasetIterator):
         source = tuple(source[i] for i in retain)
         super(SequenceDatasetIterator, self).__init__(
             dataset, subset_iterator, (space, source),
-            return_tuple=return_tuple, convert=convert
+            return_tuple=return_tuple, convert=convert, prefetch=prefetch,
+            batch_buffers=batch_buffers
         )
         if not isinstance(space, CompositeSpace):
             space = (space,)
@@ -90,7 +96,7 @@ class SequenceDatasetIterator(FiniteDatasetIterator):
     def __iter__(self):
         return self
 
-    def _create_mask(self, data):
+    def _create_mask(self, data, lengths=None, out=None):
         """
         Creates the mask for a given set of data.
 
@@ -98,47 +104,108 @@ class SequenceDatasetIterator(FiniteDatasetIterator):
         ----------
         data : numpy sequence of ndarrays
             A sequence of ndarrays representing sequential data
+        lengths : ndarray, optional
+            The lengths of the sequences, if already known.
+        out : ndarray, optional
+            A (max_sequence_length, len(data)) array of type floatX to
+            write the mask into.
+        """
+        if lengths is None:
+            lengths = self._sequence_lengths(data)
+        if out is None:
+            out = np.empty((lengths.max(), len(lengths)),
+                           dtype=config.floatX)
+        np.less(np.arange(out.shape[0])[:, np.newaxis], lengths, out=out)
+        return out
+
+    def _sequence_lengths(self, data):
+        """
+        Returns the lengths of a sequence of sequences as an array.
+        """
+        return np.fromiter((len(sample) for sample in data), dtype='int64',
+                           count=len(data))
+
+    def _pad(self, data, lengths, out=None):
         """
-        sequence_lengths = [len(sample) for sample in data]
-        max_sequence_length = max(sequence_lengths)
-        mask = np.zeros((max_sequence_length, len(data)), dtype=config.floatX)
-        for i, sequence_length in enumerate(sequence_lengths):
-            mask[:sequence_length, i] = 1
-        return mask
+        Pads sequences of different lengths into a single array whose
+        first axis is time and second axis is the batch.
 
-    @wraps(FiniteDatasetIterator.next)
-    def next(self):
+        All the sequences are concatenated at once, then scattered to
+        their place in the batch with a single indexing operation.
+
+        Parameters
+        ----------
+        data : numpy sequence of ndarrays
+            A sequence of ndarrays representing sequential data
+        lengths : ndarray
+            The lengths of the sequences.
+        out : ndarray, optional
+            A (max(lengths), len(data), ...) array to write the padded
+            batch into.
+        """
+        flat = np.concatenate(list(data))
+        if out is None:
+            out = np.zeros((lengths.max(), len(data)) + flat.shape[1:],
+                           dtype=flat.dtype)
+        else:
+            out[...] = 0
+        starts = np.cumsum(lengths) - lengths
+        batch_idx = np.repeat(np.arange(len(data)), lengths)
+        time_idx = np.arange(len(flat)) - starts[batch_idx]
+        out[time_idx, batch_idx] = flat
+        return out
+
+    def _buffer(self, buffers, key, shape, dtype):
+        """
+        Returns a contiguous array of the given shape, backed by one of
+        the preallocated batch buffers, or a new array if batch buffers
+        are disabled.
+        """
+        if buffers is None:
+            return np.empty(shape, dtype=dtype)
+        size = int(np.prod(shape))
+        storage = buffers.get(key)
+        if (storage is None or storage.dtype != dtype or
+                storage.size < size):
+            storage = np.empty(size, dtype=dtype)
+            buffers[key] = storage
+        return storage[:size].reshape(shape)
+
+    def _fetch(self):
+        """
+        Retrieves the next batch, padding the sequences and adding the
+        requested masks.
+        """
         next_index = self._subset_iterator.next()
+        buffers = None
+        if self._batch_buffers:
+            if self._buffers is None:
+                self._buffers = [dict() for _ in range(self._batch_buffers)]
+            buffers = self._buffers[self._buffer_idx]
+            self._buffer_idx = (self._buffer_idx + 1) % self._batch_buffers
         rvals = []
         for space, source, data, fn in safe_izip(self._space, self._source,
                                                  self._raw_data,
                                                  self._convert):
             rval = data[next_index]
             if isinstance(space, SequenceDataSpace):
-                # Add padding
-                max_sequence_length = max(len(sample) for sample
-                                          in rval)
-                batch = np.zeros((len(rval), max_sequence_length) +
-                                 data[0].shape[1:], dtype=data[0].dtype)
-                for i, sample in enumerate(rval):
-                    batch[i, :len(sample)] = sample
-
-                # Create mask
-                if source in self.mask_needed:
-                    mask = self._create_mask(rval)
-                rval = np.swapaxes(batch, 0, 1)
+                lengths = self._sequence_lengths(rval)
+                max_sequence_length = lengths.max()
+                rval = self._pad(rval, lengths, self._buffer(
+                    buffers, source,
+                    (max_sequence_length, len(rval)) + rval[0].shape[1:],
+                    rval[0].dtype))
                 if fn:
                     rval = fn(rval)
                 rvals.append(rval)
                 if source in self.mask_needed:
-                    rvals.append(mask)
+                    rvals.append(self._create_mask(
+                        None, lengths, self._buffer(
+                            buffers, source + '_mask',
+                            (max_sequence_length, len(lengths)),
+                            np.dtype(config.floatX))))
             else:
                 if fn:
                     rval = fn(rval)
                 rvals.append(rval)
-
-        # Reorder according to given data specs
-
-        if not self._return_tuple and len(rval) == 1:
-            rvals, = rvals
         return tuple(rvals)
@@ -0,0 +1,47 @@
+"""
+Tests for the iterator over sequence data
+"""
+import numpy as np
+from theano import config
+
+from pylearn2.datasets.vector_spaces_dataset import VectorSpacesDataset
+from pylearn2.sandbox.rnn.space import SequenceDataSpace, SequenceMaskSpace
+from pylearn2.sandbox.rnn.utils.iteration import SequenceDatasetIterator
+from pylearn2.space import CompositeSpace, VectorSpace
+from pylearn2.utils.iteration import BucketedSequencesSubsetIterator
+
+
+def test_padding_and_mask():
+    """
+    Compares the padded batches and masks to ones built one sequence at
+    a time, with and without batch buffers.
+    """
+    rng = np.random.RandomState([2014, 12, 1])
+    lengths = rng.randint(1, 12, size=30)
+    X = np.empty(len(lengths), dtype='object')
+    for i, length in enumerate(lengths):
+        X[i] = rng.normal(size=(length, 2)).astype(config.floatX)
+    space = SequenceDataSpace(VectorSpace(dim=2))
+    dataset = VectorSpacesDataset(data=(X,), data_specs=(
+        CompositeSpace([space]), ('features',)))
+    data_specs = (CompositeSpace([space, SequenceMaskSpace()]),
+                  ('features', 'features_mask'))
+
+    for batch_buffers in (None, 1):
+        subset_iterator = BucketedSequencesSubsetIterator(
+            X, batch_size=4, rng=[1, 2], sort_window=2)
+        iterator = SequenceDatasetIterator(dataset, data_specs,
+                                           subset_iterator,
+                                           batch_buffers=batch_buffers)
+        indices = list(BucketedSequencesSubsetIterator(
+            X, batch_size=4, rng=[1, 2], sort_window=2))
+        for index, (batch, mask) in zip(indices, iterator):
+            max_length = lengths[index].max()
+            assert batch.shape == (max_length, len(index), 2)
+            assert mask.shape == (max_length, len(index))
+            assert mask.dtype == config.floatX
+            for i, example in enumerate(index):
+                assert np.array_equal(batch[:lengths[example], i], X[example])
+                assert np.all(batch[lengths[example]:, i] == 0)
+                assert np.all(mask[:lengths[example], i] == 1)
+                assert np.all(mask[lengths[example]:, i] == 0)
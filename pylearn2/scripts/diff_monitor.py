@@ -4,6 +4,8 @@ usage:
 
 diff_monitor.py model_1.pkl model_2.pkl
 
+Either file can also be a monitor log (.jsonl, see pylearn2.monitor_log).
+
 Prints any difference in which set of channels were monitored,
 then prints any difference in the length of the records, then
 prints the first record entry at which each channel differs and
@@ -23,7 +25,7 @@ __maintainer__ = "LISA Lab"
 __email__ = "pylearn-dev@googlegroups"
 
 import sys
-from pylearn2.utils import serial
+from pylearn2.monitor_log import load_monitor
 import numpy as np
 
 # equal -> compare val record entries with np.all(x == y)
@@ -34,9 +36,8 @@ if __name__ == "__main__":
     # Load the records
     _, model_0_path, model_1_path = sys.argv
 
-    model_0, model_1 = [serial.load(path) for path in [model_0_path, model_1_path]]
-
-    monitor_0, monitor_1 = [model.monitor for model in [model_0, model_1]]
+    monitor_0, monitor_1 = [load_monitor(path)
+                            for path in [model_0_path, model_1_path]]
 
     channels_0, channels_1 = [monitor.channels for monitor in [monitor_0, monitor_1]]
 
@@ -8,6 +8,9 @@ Loads any number of .pkl files produced by train.py. Extracts
 all of their monitoring channels and prompts the user to select
 a subset of them to be plotted.
 
+Monitor logs (.jsonl files, see pylearn2.monitor_log) can be given
+instead of .pkl files; only the log is read, not the model.
+
 """
 from __future__ import print_function
 
@@ -23,7 +26,7 @@ import numpy as np
 import sys
 
 from theano.compat.six.moves import input, xrange
-from pylearn2.utils import serial
+from pylearn2.monitor_log import load_monitor, MONITOR_LOG_EXTENSION
 from theano.printing import _TagGenerator
 from pylearn2.utils.string_utils import number_aware_alphabetical_key
 from pylearn2.utils import contains_nan, contains_inf
@@ -81,8 +84,8 @@ def main():
     import matplotlib.pyplot as plt
 
     print('generating names...')
-    model_names = [model_path.replace('.pkl', '!') for model_path in
-            model_paths]
+    model_names = [model_path.replace('.pkl', '!').replace(
+            MONITOR_LOG_EXTENSION, '!') for model_path in model_paths]
     model_names = unique_substrings(model_names, min_size=10)
     model_names = [model_name.replace('!','') for model_name in
             model_names]
@@ -90,14 +93,14 @@ def main():
 
     for i, arg in enumerate(model_paths):
         try:
-            model = serial.load(arg)
+            monitor = load_monitor(arg)
         except Exception:
             if arg.endswith('.yaml'):
                 print(sys.stderr, arg + " is a yaml config file," + 
                       "you need to load a trained model.", file=sys.stderr)
                 quit(-1)
             raise
-        this_model_channels = model.monitor.channels
+        this_model_channels = monitor.channels
 
         if len(sys.argv) > 2:
             postfix = ":" + model_names[i]
@@ -106,7 +109,7 @@ def main():
 
         for channel in this_model_channels:
             channels[channel+postfix] = this_model_channels[channel]
-        del model
+        del monitor
         gc.collect()
 
 
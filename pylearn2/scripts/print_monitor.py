@@ -1,8 +1,11 @@
 #!/usr/bin/env python
 """
-.. todo::
+usage:
 
-    WRITEME
+print_monitor.py model_1.pkl monitor_log_2.jsonl ...
+
+Prints the last value of the monitoring channels of models saved by
+train.py, or of monitor logs (see `pylearn2.monitor_log`).
 """
 from __future__ import print_function
 
@@ -14,20 +17,18 @@ __maintainer__ = "LISA Lab"
 __email__ = "pylearn-dev@googlegroups"
 
 def print_monitor(args):
-    from pylearn2.utils import serial
+    from pylearn2.monitor_log import load_monitor
     import gc
     for model_path in args:
         if len(args) > 1:
             print(model_path)
-        model = serial.load(model_path)
-        monitor = model.monitor
-        del model
+        monitor = load_monitor(model_path)
         gc.collect()
         channels = monitor.channels
-        if not hasattr(monitor, '_epochs_seen'):
+        try:
+            print('epochs seen: ', monitor.get_epochs_seen())
+        except AttributeError:
             print('old file, not all fields parsed correctly')
-        else:
-            print('epochs seen: ', monitor._epochs_seen)
         print('time trained: ', max(channels[key].time_record[-1] for key in
               channels))
         for key in sorted(channels.keys()):
@@ -59,6 +59,9 @@ __license__ = "3-clause BSD"
 __maintainer__ = "LISA Lab"
 __email__ = "pylearn-dev@googlegroups"
 # Standard library imports
+import time
+# Used by --profile-startup to time the imports of this script
+_start_time = time.time()
 import argparse
 import gc
 import logging
@@ -82,6 +85,8 @@ from pylearn2.utils.logger import (
     CustomStreamHandler, CustomFormatter, restore_defaults
 )
 
+_imports_seconds = time.time() - _start_time
+
 
 class FeatureDump(object):
     """
@@ -168,6 +173,12 @@ def make_argument_parser():
                         action='store_true',
                         help='Display any DEBUG-level log messages, '
                              'suppressed by default.')
+    parser.add_argument('--profile-startup', '-P',
+                        action='store_true',
+                        help='Display how long the imports, the parsing '
+                             'and instantiation of the YAML file, the '
+                             'setup and the compilation of the Theano '
+                             'functions took.')
     parser.add_argument('config', action='store',
                         choices=None,
                         help='A YAML configuration file specifying the '
@@ -176,7 +187,7 @@ def make_argument_parser():
 
 
 def train(config, level_name=None, timestamp=None, time_budget=None,
-          verbose_logging=None, debug=None):
+          verbose_logging=None, debug=None, profile_startup=None):
     """
     Trains a given YAML file.
 
@@ -202,8 +213,13 @@ def train(config, level_name=None, timestamp=None, time_budget=None,
     debug : bool, optional
         Display any DEBUG-level log messages,
         False by default.
+    profile_startup : bool, optional
+        Display how long the different startup steps took,
+        once the first training phase has done its first
+        monitoring, False by default.
     """
-    train_obj = serial.load_train_file(config)
+    timings = {}
+    train_obj = serial.load_train_file(config, timings=timings)
     try:
         iter(train_obj)
         iterable = True
@@ -233,6 +249,22 @@ def train(config, level_name=None, timestamp=None, time_budget=None,
     else:
         root_logger.setLevel(logging.INFO)
 
+    def report_startup(train_obj):
+        timings['setup'] = train_obj.setup_seconds
+        timings['first_monitoring'] = (train_obj.startup_seconds -
+                                       train_obj.setup_seconds)
+        print(format_startup_profile(timings))
+
+    def run(obj, profile):
+        # Objects other than Train (e.g. FeatureDump) have no startup
+        # callbacks: their profile is displayed once they are done
+        callbacks = getattr(obj, 'startup_callbacks', None)
+        if profile and callbacks is not None:
+            callbacks.append(report_startup)
+        obj.main_loop(time_budget=time_budget)
+        if profile and callbacks is None:
+            print(format_startup_profile(timings))
+
     if iterable:
         for number, subobj in enumerate(iter(train_obj)):
             # Publish a variable indicating the training phase.
@@ -241,14 +273,53 @@ def train(config, level_name=None, timestamp=None, time_budget=None,
             os.environ[phase_variable] = phase_value
 
             # Execute this training phase.
-            subobj.main_loop(time_budget=time_budget)
+            run(subobj, profile_startup and number == 0)
 
             # Clean up, in case there's a lot of memory used that's
             # necessary for the next phase.
             del subobj
             gc.collect()
     else:
-        train_obj.main_loop(time_budget=time_budget)
+        run(train_obj, profile_startup)
+
+
+def format_startup_profile(timings):
+    """
+    Formats the time spent in the startup steps of `train`.
+
+    Parameters
+    ----------
+    timings : dict
+        The timings filled in by `pylearn2.config.yaml_parse.load`, with
+        the `Train.setup_seconds` of the first training phase in its
+        'setup' item, and the rest of its `Train.startup_seconds` (the
+        first monitoring) in its 'first_monitoring' item.
+
+    Returns
+    -------
+    report : str
+        One line per startup step.
+    """
+    # Imported here so that this script's import time excludes it
+    from pylearn2.utils.compile import compile_seconds
+
+    if timings.get('cached'):
+        parse = 'YAML parsing (cached)'
+    else:
+        parse = 'YAML parsing'
+    steps = [('Script imports', _imports_seconds),
+             ('Imports from YAML tags', timings.get('import', 0.)),
+             (parse, timings.get('parse', 0.)),
+             ('Instantiation', timings.get('instantiate', 0.)),
+             ('Setup', timings.get('setup', 0.)),
+             ('First monitoring', timings.get('first_monitoring', 0.)),
+             ('Function compilation', compile_seconds)]
+    # The training functions are compiled by the setup, the monitoring
+    # functions by the first monitoring
+    lines = ['Startup profile (function compilation is part of the setup '
+             'and first monitoring):']
+    lines.extend('  %-24s %8.3f s' % step for step in steps)
+    return '\n'.join(lines)
 
 
 if __name__ == "__main__":
@@ -258,4 +329,4 @@ if __name__ == "__main__":
     parser = make_argument_parser()
     args = parser.parse_args()
     train(args.config, args.level_name, args.timestamp, args.time_budget,
-          args.verbose_logging, args.debug)
+          args.verbose_logging, args.debug, args.profile_startup)
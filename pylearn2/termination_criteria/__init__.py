@@ -36,6 +36,30 @@ class TerminationCriterion(object):
         raise NotImplementedError(str(type(self)) + " does not implement " +
                                   "continue_learning.")
 
+    def get_state(self):
+        """
+        Returns the state the criterion accumulated over the calls to
+        `continue_learning`, so that it can be stored in training
+        checkpoints.
+
+        Returns
+        -------
+        state : object
+            None (the default) for stateless criteria, otherwise a
+            picklable object that `set_state` accepts.
+        """
+        return None
+
+    def set_state(self, state):
+        """
+        Restores the state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : object
+            The return value of `get_state`.
+        """
+
 
 class MonitorBased(TerminationCriterion):
     """
@@ -105,6 +129,14 @@ class MonitorBased(TerminationCriterion):
         # enough.
         return self.countdown > 0
 
+    @functools.wraps(TerminationCriterion.get_state)
+    def get_state(self):
+        return {'countdown': self.countdown, 'best_value': self.best_value}
+
+    @functools.wraps(TerminationCriterion.set_state)
+    def set_state(self, state):
+        self.__dict__.update(state)
+
 
 class MatchChannel(TerminationCriterion):
     """
@@ -232,6 +264,17 @@ class EpochCounter(TerminationCriterion):
         self._epochs_done += 1
         return self._epochs_done < self._max_epochs
 
+    @functools.wraps(TerminationCriterion.get_state)
+    def get_state(self):
+        if not hasattr(self, "_epochs_done"):
+            return None
+        return {'_epochs_done': self._epochs_done}
+
+    @functools.wraps(TerminationCriterion.set_state)
+    def set_state(self, state):
+        if state is not None:
+            self.__dict__.update(state)
+
 
 class And(TerminationCriterion):
     """
@@ -258,6 +301,15 @@ class And(TerminationCriterion):
         return all(criterion.continue_learning(model)
                    for criterion in self._criteria)
 
+    @functools.wraps(TerminationCriterion.get_state)
+    def get_state(self):
+        return [criterion.get_state() for criterion in self._criteria]
+
+    @functools.wraps(TerminationCriterion.set_state)
+    def set_state(self, state):
+        for criterion, criterion_state in zip(self._criteria, state):
+            criterion.set_state(criterion_state)
+
 
 class Or(TerminationCriterion):
     """
@@ -283,3 +335,12 @@ class Or(TerminationCriterion):
     def continue_learning(self, model):
         return any(criterion.continue_learning(model)
                    for criterion in self._criteria)
+
+    @functools.wraps(TerminationCriterion.get_state)
+    def get_state(self):
+        return [criterion.get_state() for criterion in self._criteria]
+
+    @functools.wraps(TerminationCriterion.set_state)
+    def set_state(self, state):
+        for criterion, criterion_state in zip(self._criteria, state):
+            criterion.set_state(criterion_state)
@@ -99,3 +99,66 @@ def test_ais():
 
     # Estimate can be off when using the wrong base-rate model.
     ais_nodata('mnistvh.mat', do_exact=do_exact, betas=betas)
+
+
+def test_compute_log_z_blocks():
+    """
+    Compares the blocked log Z of a small RBM to a brute force sum.
+    """
+    rng = numpy.random.RandomState([2014, 10, 18])
+    nvis, nhid = 12, 7
+    weights = rng.normal(scale=2., size=(nvis, nhid))
+    visbias = rng.normal(size=nvis)
+    hidbias = rng.normal(size=nhid)
+
+    class ToyRBM(object):
+        pass
+    model = ToyRBM()
+    model.nvis, model.nhid = nvis, nhid
+
+    def free_energy_fn(hid):
+        return -(numpy.dot(hid, hidbias) +
+                 numpy.logaddexp(0, numpy.dot(hid, weights.T) +
+                                 visbias).sum(axis=1))
+
+    hid = numpy.array([[(i >> j) & 1 for j in range(nhid)]
+                       for i in range(2 ** nhid)], dtype=config.floatX)
+    nfe = -free_energy_fn(hid)
+    exact = numpy.log(numpy.exp(nfe - nfe.max()).sum()) + nfe.max()
+
+    for max_bits, n_jobs in [(15, None), (3, None), (3, 2), (1, 3)]:
+        log_z = rbm_tools.compute_log_z(model, free_energy_fn,
+                                        max_bits=max_bits, n_jobs=n_jobs)
+        numpy.testing.assert_allclose(log_z, exact, rtol=1e-5)
+
+
+def test_rbm_ais_chunks_shards():
+    """
+    Compares chunked and sharded AIS estimates of the log Z of a small
+    RBM to a brute force sum.
+    """
+    rng = numpy.random.RandomState([2014, 10, 19])
+    nvis, nhid = 10, 6
+    rbm_params = [numpy.asarray(rng.normal(scale=.3, size=(nvis, nhid)),
+                                dtype=config.floatX),
+                  numpy.asarray(rng.normal(size=nvis), dtype=config.floatX),
+                  numpy.asarray(rng.normal(size=nhid), dtype=config.floatX)]
+    weights, visbias, hidbias = rbm_params
+
+    hid = numpy.array([[(i >> j) & 1 for j in range(nhid)]
+                       for i in range(2 ** nhid)])
+    nfe = (numpy.dot(hid, hidbias) +
+           numpy.logaddexp(0, numpy.dot(hid, weights.T) +
+                           visbias).sum(axis=1))
+    exact = numpy.log(numpy.exp(nfe - nfe.max()).sum()) + nfe.max()
+
+    betas = numpy.linspace(0, 1, 300).astype(config.floatX)
+    key_betas = numpy.asarray([0.5], dtype=config.floatX)
+    for chunk_size, n_shards, n_jobs in [(None, 1, None), (16, 1, None),
+                                         (16, 3, None), (None, 2, 2)]:
+        (log_z, var_dlogz), ais = rbm_tools.rbm_ais(
+            rbm_params, n_runs=60, betas=betas, key_betas=key_betas,
+            chunk_size=chunk_size, n_shards=n_shards, n_jobs=n_jobs)
+        assert ais.n_runs == 60
+        assert len(ais.logz_beta) == 1
+        assert abs(log_z - exact) < 0.1
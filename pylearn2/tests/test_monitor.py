@@ -1,6 +1,8 @@
 from __future__ import print_function
 
 import numpy as np
+import os
+import tempfile
 import warnings
 from nose.tools import assert_raises
 from theano.compat.six.moves import xrange
@@ -8,6 +10,7 @@ from theano.compat.six.moves import xrange
 from theano.compat import exc_message
 from theano import shared
 from theano import tensor as T
+from theano.tensor.shared_randomstreams import RandomStreams
 
 from pylearn2.compat import OrderedDict
 from pylearn2.costs.cost import Cost
@@ -16,8 +19,11 @@ from pylearn2.models.model import Model
 from pylearn2.models.s3c import S3C, E_Step, Grad_M_Step
 from pylearn2.monitor import _err_ambig_data
 from pylearn2.monitor import _err_no_data
+from pylearn2.monitor import ChannelRecord
 from pylearn2.monitor import Monitor
+from pylearn2.monitor import MonitorChannel
 from pylearn2.monitor import push_monitor
+from pylearn2.monitor_log import MonitorLog
 from pylearn2.space import VectorSpace
 from pylearn2.testing.datasets import ArangeDataset
 from pylearn2.training_algorithms.default import DefaultTrainingAlgorithm
@@ -608,5 +614,218 @@ def test_extra_costs():
                   extra_costs=extra_costs)
 
 
+def test_asynchronous():
+
+    # Makes sure asynchronous monitoring records, with the epoch they
+    # belong to, the values of the channels for the parameters at the
+    # time of the call
+
+    num_features = 2
+    monitor = Monitor(DummyModel(num_features))
+    dataset = DummyDataset(num_examples=10, num_features=num_features)
+    monitor.add_dataset(dataset=dataset, batch_size=5)
+    scale = sharedX(1.)
+    vis_batch = T.matrix()
+    data_specs = (monitor.model.get_input_space(),
+                  monitor.model.get_input_source())
+    monitor.add_channel(name='scaled_mean', ipt=vis_batch,
+                        val=scale * vis_batch.mean(), dataset=dataset,
+                        data_specs=data_specs)
+    monitor.set_asynchronous()
+    mean = dataset.get_design_matrix().mean()
+
+    # The first call is synchronous
+    monitor()
+    channel = monitor.channels['scaled_mean']
+    assert len(channel.val_record) == 1
+
+    for epoch in xrange(1, 4):
+        monitor.report_epoch()
+        scale.set_value(float(epoch + 1))
+        monitor()
+        # Training modifies the parameters while the channels are computed
+        scale.set_value(-1.)
+        assert len(channel.val_record) == epoch
+    monitor.wait()
+
+    assert channel.epoch_record == [0, 1, 2, 3]
+    assert np.allclose(channel.val_record, mean * np.arange(1, 5))
+    assert np.all(np.isnan(channel.stderr_record))
+    to_string(monitor)
+
+
+def test_asynchronous_default_update():
+
+    # Makes sure asynchronous monitoring refuses channels depending on
+    # shared variables with a default update, which the background thread
+    # would update while training uses them
+
+    num_features = 2
+    monitor = Monitor(DummyModel(num_features))
+    dataset = DummyDataset(num_examples=10, num_features=num_features)
+    monitor.add_dataset(dataset=dataset, batch_size=5)
+    vis_batch = T.matrix()
+    mask = RandomStreams(1).binomial(size=vis_batch.shape, p=.5)
+    data_specs = (monitor.model.get_input_space(),
+                  monitor.model.get_input_source())
+    monitor.add_channel(name='dropout_mean', ipt=vis_batch,
+                        val=(mask * vis_batch).mean(), dataset=dataset,
+                        data_specs=data_specs)
+    monitor.set_asynchronous()
+    assert_raises(ValueError, monitor)
+
+
+def test_subsample():
+
+    # Makes sure subsampled datasets are evaluated on the same examples
+    # at each call, with the standard error of the batch values
+
+    num_features = 2
+    monitor = Monitor(DummyModel(num_features))
+    dataset = DummyDataset(num_examples=20, num_features=num_features)
+    monitor.add_dataset(dataset=dataset, batch_size=2, subsample=5)
+    vis_batch = T.matrix()
+    data_specs = (monitor.model.get_input_space(),
+                  monitor.model.get_input_source())
+    monitor.add_channel(name='mean', ipt=vis_batch, val=vis_batch.mean(),
+                        dataset=dataset, data_specs=data_specs)
+    monitor()
+    monitor()
+
+    X = dataset.get_design_matrix()
+    it = dataset.iterator(mode='shuffled_sequential', batch_size=2,
+                          num_batches=3, rng=[2013, 2, 22])
+    batch_means = [X[batch].mean() for batch in it.subset_iterator]
+    channel = monitor.channels['mean']
+    assert np.allclose(channel.val_record, np.mean(batch_means))
+    stderr = np.std(batch_means, ddof=1) / np.sqrt(3)
+    assert np.allclose(channel.stderr_record, stderr)
+
+    assert_raises(ValueError, monitor.add_dataset, dataset, subsample=5)
+
+    # Subsamples larger than the dataset are clamped to the dataset
+    monitor = Monitor(DummyModel(num_features))
+    monitor.add_dataset(dataset=dataset, batch_size=3, subsample=50)
+    monitor.add_channel(name='mean', ipt=vis_batch, val=vis_batch.mean(),
+                        dataset=dataset, data_specs=data_specs)
+    monitor()
+    assert np.allclose(monitor.channels['mean'].val_record, X.mean())
+
+
+def test_channel_record():
+
+    # Makes sure ChannelRecord behaves like a list, with views for slices
+    # and bounded retention
+
+    record = ChannelRecord('int64')
+    record += range(3)
+    record.append(3)
+    assert record == [0, 1, 2, 3]
+    assert len(record) == 4 and record[-1] == 3
+    view = record[1:3]
+    assert isinstance(view, np.ndarray)
+    view[0] = 10
+    assert record[1] == 10
+    assert from_string(to_string(record)) == record
+
+    ring = ChannelRecord('float32', range(10), max_length=4,
+                         retention='ring')
+    ring.append(10.)
+    assert ring == [7, 8, 9, 10]
+
+    downsampled = ChannelRecord('int64', max_length=8)
+    for i in xrange(100):
+        downsampled.append(i)
+        assert downsampled[-1] == i
+        assert len(downsampled) <= 8
+    # evenly spaced entries, plus the last one
+    steps = np.diff(downsampled[:-1])
+    assert np.all(steps == steps[0])
+    assert downsampled[0] == 0
+
+    assert_raises(ValueError, record.set_retention, 8, 'oldest')
+
+
+def test_old_channel_records():
+
+    # Makes sure channels pickled with records stored as lists are loaded
+    # with ChannelRecords
+
+    channel = MonitorChannel.__new__(MonitorChannel)
+    channel.__setstate__({'doc': None, 'val_record': [1., 2.],
+                          'batch_record': [5, 10], 'example_record': [5, 10],
+                          'epoch_record': [1, 2]})
+    for record in MonitorChannel.record_dtypes:
+        assert isinstance(getattr(channel, record), ChannelRecord)
+    assert channel.batch_record == [5, 10]
+    assert np.all(np.isnan(channel.time_record))
+    sliced = channel.sliced(1)
+    assert sliced.val_record == [2.] and sliced.epoch_record == [2]
+
+
+def test_log():
+
+    # Makes sure the monitor appends each monitoring step to its log, and
+    # does not serialize the log
+
+    num_features = 2
+    monitor = Monitor(DummyModel(num_features))
+    dataset = DummyDataset(num_examples=10, num_features=num_features)
+    monitor.add_dataset(dataset=dataset, batch_size=5)
+    vis_batch = T.matrix()
+    data_specs = (monitor.model.get_input_space(),
+                  monitor.model.get_input_source())
+    monitor.add_channel(name='mean', ipt=vis_batch, val=vis_batch.mean(),
+                        dataset=dataset, data_specs=data_specs)
+    fd, path = tempfile.mkstemp(suffix='.jsonl')
+    os.close(fd)
+    try:
+        monitor.set_log(path, max_records=3)
+        for epoch in xrange(5):
+            monitor()
+            monitor.report_epoch()
+        channel = monitor.channels['mean']
+        assert channel.epoch_record == [2, 3, 4]
+        assert from_string(to_string(monitor))._log is None
+
+        logged = MonitorLog(path).channels['mean']
+        assert np.array_equal(logged.epoch_record, np.arange(5))
+        assert np.allclose(logged.val_record,
+                           dataset.get_design_matrix().mean())
+    finally:
+        os.remove(path)
+
+
+def test_select_channels():
+
+    # Makes sure only the selected channels are compiled and recorded,
+    # and that channels can be enabled later on
+
+    num_features = 2
+    monitor = Monitor(DummyModel(num_features))
+    dataset = DummyDataset(num_examples=10, num_features=num_features)
+    monitor.add_dataset(dataset=dataset, batch_size=5)
+    vis_batch = T.matrix()
+    data_specs = (monitor.model.get_input_space(),
+                  monitor.model.get_input_source())
+    for name, val in (('mean', vis_batch.mean()),
+                      ('max', vis_batch.max()),
+                      ('min', vis_batch.min())):
+        monitor.add_channel(name=name, ipt=vis_batch, val=val,
+                            dataset=dataset, data_specs=data_specs)
+    monitor.select_channels(['mean', 'm?x'])
+    monitor()
+    assert len(monitor.channels['mean'].val_record) == 1
+    assert len(monitor.channels['max'].val_record) == 1
+    assert len(monitor.channels['min'].val_record) == 0
+    assert len(monitor.accum[0].maker.fgraph.outputs) == 2
+
+    monitor.enable_channels(['min'])
+    monitor()
+    assert len(monitor.channels['min'].val_record) == 1
+    assert np.allclose(monitor.channels['min'].val_record[0],
+                       dataset.get_design_matrix().min())
+
+
 if __name__ == '__main__':
     test_revisit()
@@ -0,0 +1,104 @@
+"""
+Tests for pylearn2.monitor_log
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from nose.tools import assert_raises
+
+from pylearn2.compat import OrderedDict
+from pylearn2.monitor_log import (INDEX_SUFFIX, MonitorLog,
+                                  MonitorLogWriter, is_monitor_log,
+                                  load_monitor)
+from pylearn2.utils.serial import from_string, to_string
+
+
+def test_monitor_log():
+    """
+    Writes a log over an interrupted and resumed run, with a channel
+    added during training, and reads it back.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'monitor.jsonl')
+        assert is_monitor_log(path)
+        writer = MonitorLogWriter(path)
+        for epoch in range(3):
+            values = OrderedDict([('cost', (1. / (epoch + 1), np.nan))])
+            if epoch > 0:
+                values['err'] = (epoch, 0.5)
+            writer.append(epoch, 10 * epoch, 100 * epoch, epoch, values)
+        # the writer is pickled without its file
+        writer = from_string(to_string(writer))
+
+        # the run is resumed from the checkpoint of epoch 1, and the last
+        # line written by the interrupted run was cut short
+        with open(path, 'a') as f:
+            f.write('[3, 30, 300')
+        for epoch in range(1, 4):
+            values = OrderedDict([('cost', (-epoch, np.nan)),
+                                  ('err', (-epoch, 0.5))])
+            writer.append(epoch, 10 * epoch, 100 * epoch, epoch, values)
+        writer.close()
+
+        log = load_monitor(path)
+        assert isinstance(log, MonitorLog)
+        assert list(log.channels.keys()) == ['cost', 'err']
+        cost = log.channels['cost']
+        assert np.array_equal(cost.epoch_record, [0, 1, 2, 3])
+        assert np.array_equal(cost.batch_record, [0, 10, 20, 30])
+        assert np.array_equal(cost.val_record, [1, -1, -2, -3])
+        assert np.all(np.isnan(cost.stderr_record))
+        err = log.channels['err']
+        assert np.array_equal(err.example_record, [100, 200, 300])
+        assert np.array_equal(err.stderr_record, [0.5] * 3)
+        assert log.get_epochs_seen() == 3
+        assert log.get_batches_seen() == 30
+
+        # a line cut short is only allowed at the end of a run
+        with open(path, 'a') as f:
+            f.write('[4, 40\n[5, 50, 500, 5, 0, 0, 0, 0]\n')
+        assert_raises(ValueError, getattr, MonitorLog(path), 'channels')
+
+        assert_raises(IOError, MonitorLog,
+                      os.path.join(tmpdir, 'missing.jsonl'))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_monitor_log_index():
+    """
+    Checks that the index saved next to a log is brought up to date with
+    the lines appended since, and rebuilt when the log is rewritten.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'monitor.jsonl')
+        writer = MonitorLogWriter(path)
+        writer.append(0, 0, 0, 0, OrderedDict([('cost', (1., np.nan))]))
+        assert MonitorLog(path).get_epochs_seen() == 0
+        assert os.path.exists(path + INDEX_SUFFIX)
+
+        # a line being written is left for a later read
+        values = OrderedDict([('cost', (2., np.nan)), ('err', (3., 0.))])
+        writer.append(1, 10, 100, 1, values)
+        with open(path, 'a') as f:
+            f.write('[2, 20')
+        log = MonitorLog(path)
+        assert log.get_epochs_seen() == 1
+        assert np.array_equal(log.channels['cost'].val_record, [1, 2])
+        assert np.array_equal(log.channels['err'].epoch_record, [1])
+
+        # the index of a rewritten log is rebuilt
+        writer.close()
+        os.remove(path)
+        writer.append(5, 50, 500, 5, OrderedDict([('err', (4., 0.))]))
+        writer.close()
+        log = MonitorLog(path)
+        assert list(log.channels.keys()) == ['err']
+        assert np.array_equal(log.channels['err'].val_record, [4])
+        assert log.get_batches_seen() == 50
+    finally:
+        shutil.rmtree(tmpdir)
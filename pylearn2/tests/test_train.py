@@ -5,8 +5,12 @@ __license__ = "3-clause BSD"
 __maintainer__ = "LISA Lab"
 __email__ = "pylearn-dev@googlegroups"
 
+import os
+import shutil
+import tempfile
 from types import MethodType
 import numpy as np
+from nose.tools import assert_raises
 from pylearn2.monitor import Monitor
 from pylearn2.train import Train
 from pylearn2.datasets.dense_design_matrix import DenseDesignMatrix
@@ -15,8 +19,11 @@ from pylearn2.space import VectorSpace
 from pylearn2.training_algorithms.training_algorithm import TrainingAlgorithm
 from pylearn2.train_extensions import TrainExtension
 from pylearn2.models.mlp import MLP, Softmax
-from pylearn2.training_algorithms.sgd import SGD
-from pylearn2.termination_criteria import EpochCounter
+from pylearn2.training_algorithms.sgd import SGD, MonitorBasedLRAdjuster
+from pylearn2.training_algorithms.learning_rule import Momentum
+from pylearn2.training_algorithms.learning_rule import MomentumAdjustor
+from pylearn2.termination_criteria import EpochCounter, MonitorBased
+from pylearn2.utils import serial
 
 class DummyModel(Model):
 
@@ -114,3 +121,230 @@ def test_serialization_guard():
     except RuntimeError:
         return
     assert False # train did not complain, this is a bug
+
+def test_async_save():
+
+    # tests that Train writes checkpoints in the background and that the
+    # saved model matches the parameters at the time of the save
+
+    model = MLP(layers=[Softmax(layer_name='y',
+                                n_classes=2,
+                                irange=0.)],
+                nvis=3)
+
+    dataset = DenseDesignMatrix(X=np.random.normal(size=(6, 3)),
+                                y=np.random.normal(size=(6, 2)))
+
+    algorithm = SGD(batch_size=2, learning_rate=0.1,
+                    termination_criterion=EpochCounter(max_epochs=2))
+
+    fd, save_path = tempfile.mkstemp(suffix='.pkl')
+    os.close(fd)
+    try:
+        train = Train(dataset=dataset,
+                      model=model,
+                      algorithm=algorithm,
+                      save_freq=1,
+                      save_path=save_path,
+                      async_save=True)
+        train.main_loop()
+        assert not train._saver.pending
+
+        saved = serial.load(save_path)
+        for saved_param, param in zip(saved.get_param_values(),
+                                      model.get_param_values()):
+            assert np.array_equal(saved_param, param)
+        assert not os.path.exists(os.path.join(
+            os.path.dirname(save_path),
+            '.tmp-' + os.path.basename(save_path)))
+    finally:
+        os.remove(save_path)
+
+def make_train(termination_criterion, extensions=None,
+               update_callbacks=None, checkpoint_path=None, **kwargs):
+    """
+    Returns a Train object fitting a softmax regression to a random
+    dataset by SGD with momentum, monitored on the same dataset. The
+    dataset and initial parameters are the same at each call.
+
+    If `checkpoint_path` is given, the model is saved at each epoch next
+    to the checkpoint. The other keyword arguments are passed to Train.
+    """
+    rng = np.random.RandomState([2014, 11, 4])
+    model = MLP(layers=[Softmax(layer_name='y',
+                                n_classes=2,
+                                irange=0.1)],
+                nvis=3, seed=rng.randint(1000))
+    dataset = DenseDesignMatrix(X=rng.normal(size=(10, 3)),
+                                y=rng.normal(size=(10, 2)))
+    algorithm = SGD(batch_size=2, learning_rate=0.1,
+                    learning_rule=Momentum(0.5),
+                    monitoring_dataset=dataset,
+                    termination_criterion=termination_criterion,
+                    update_callbacks=update_callbacks)
+    if checkpoint_path is not None:
+        kwargs.update(save_freq=1, save_path=checkpoint_path + '.model.pkl',
+                      checkpoint_path=checkpoint_path)
+    return Train(dataset=dataset, model=model, algorithm=algorithm,
+                 extensions=extensions, **kwargs)
+
+def test_startup_callbacks():
+
+    # tests that the startup callbacks are called once, after the first
+    # monitoring compiled the monitoring functions and before training
+
+    train = make_train(EpochCounter(max_epochs=2))
+    calls = []
+
+    def callback(train):
+        monitor = train.model.monitor
+        calls.append((monitor.get_epochs_seen(),
+                      len(monitor.channels['objective'].val_record)))
+
+    train.startup_callbacks.append(callback)
+    train.main_loop()
+    assert calls == [(0, 1)]
+    assert train.startup_seconds >= train.setup_seconds
+
+class Preemption(Exception):
+    pass
+
+class Preempt(TrainExtension):
+    """
+    Mock train extension interrupting training at a given epoch, after
+    the checkpoint of the previous epoch was written
+    """
+
+    def __init__(self, epoch=None):
+        self.epoch = epoch
+
+    def on_monitor(self, model, dataset, algorithm):
+        if model.monitor.get_epochs_seen() == self.epoch:
+            raise Preemption()
+
+def test_resume_from_checkpoint():
+
+    # tests that a run interrupted and resumed from its checkpoint ends
+    # with the same parameters as an uninterrupted run
+
+    def make_resumable_train(checkpoint_path, preempt_epoch=None):
+        extensions = [MomentumAdjustor(final_momentum=0.9, start=1,
+                                       saturate=3),
+                      Preempt(preempt_epoch)]
+        return make_train(EpochCounter(max_epochs=4), extensions,
+                          checkpoint_path=checkpoint_path)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        reference = make_resumable_train(
+            os.path.join(tmpdir, 'reference.pkl'))
+        reference.main_loop()
+
+        checkpoint_path = os.path.join(tmpdir, 'resumed.pkl')
+        train = make_resumable_train(checkpoint_path, preempt_epoch=3)
+        assert_raises(Preemption, train.main_loop)
+        assert os.path.exists(checkpoint_path)
+
+        resumed = make_resumable_train(checkpoint_path)
+        resumed.main_loop()
+        assert resumed.model.monitor.get_epochs_seen() == 4
+        for param, reference_param in zip(
+                resumed.model.get_param_values(),
+                reference.model.get_param_values()):
+            assert np.array_equal(param, reference_param)
+        objective = resumed.model.monitor.channels['objective']
+        reference_objective = reference.model.monitor.channels['objective']
+        assert np.allclose(objective.val_record,
+                           reference_objective.val_record)
+
+        # a finished run is not trained further
+        finished = make_resumable_train(checkpoint_path)
+        finished.main_loop()
+        assert finished.model.monitor.get_epochs_seen() == 4
+    finally:
+        shutil.rmtree(tmpdir)
+
+def test_checkpoint_requires_state():
+
+    # tests that an algorithm which cannot save its state is rejected
+    # as soon as a checkpoint_path is given
+
+    dataset = DenseDesignMatrix(X=np.random.normal(size=(10, 3)))
+    model = DummyModel(3)
+    assert_raises(ValueError, Train, dataset, model, DummyAlgorithm(),
+                  checkpoint_path='checkpoint.pkl')
+    Train(dataset, model, SGD(learning_rate=0.1, batch_size=2),
+          checkpoint_path='checkpoint.pkl')
+
+def test_monitor_channels_chosen_at_setup():
+
+    # tests that the channel chosen by an extension when it is set up is
+    # selected along with monitor_channels, and that a channel only
+    # chosen during training is rejected
+
+    train = make_train(EpochCounter(max_epochs=1), [MonitorBasedLRAdjuster()],
+                       monitor_channels=['y_misclass'])
+    train.setup()
+    active = train.model.monitor.get_active_channels()
+    assert sorted(active) == ['objective', 'y_misclass']
+
+    train = make_train(MonitorBased(), monitor_channels=['y_misclass'])
+    assert_raises(ValueError, train.setup)
+
+class PreemptAfterBatches(object):
+    """
+    Mock SGD update callback interrupting training after a given number
+    of batches
+    """
+
+    def __init__(self, num_batches=None):
+        self.num_batches = num_batches
+
+    def __call__(self, algorithm):
+        if algorithm.monitor.get_batches_seen() == self.num_batches:
+            raise Preemption()
+
+def test_resume_mid_epoch():
+
+    # tests that a run interrupted during an epoch resumes from the batch
+    # following its last checkpoint and ends as an uninterrupted run
+
+    def make_resumable_train(checkpoint_path, preempt_batches=None):
+        return make_train(EpochCounter(max_epochs=3),
+                          update_callbacks=[
+                              PreemptAfterBatches(preempt_batches)],
+                          checkpoint_path=checkpoint_path,
+                          checkpoint_batches=2)
+
+    tmpdir = tempfile.mkdtemp()
+    try:
+        reference = make_resumable_train(
+            os.path.join(tmpdir, 'reference.pkl'))
+        reference.main_loop()
+
+        # 5 batches per epoch: the last checkpoint is written after the
+        # second batch of the second epoch
+        checkpoint_path = os.path.join(tmpdir, 'resumed.pkl')
+        train = make_resumable_train(checkpoint_path, preempt_batches=8)
+        assert_raises(Preemption, train.main_loop)
+        state = serial.load(checkpoint_path)
+        assert state['mid_epoch']
+        assert state['model'].monitor.get_batches_seen() == 7
+
+        resumed = make_resumable_train(checkpoint_path)
+        resumed.main_loop()
+        monitor = resumed.model.monitor
+        reference_monitor = reference.model.monitor
+        assert monitor.get_batches_seen() == 15
+        assert monitor.get_epochs_seen() == 3
+        for param, reference_param in zip(
+                resumed.model.get_param_values(),
+                reference.model.get_param_values()):
+            assert np.array_equal(param, reference_param)
+        objective = monitor.channels['objective']
+        reference_objective = reference_monitor.channels['objective']
+        assert objective.batch_record == reference_objective.batch_record
+        assert np.allclose(objective.val_record,
+                           reference_objective.val_record)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -5,16 +5,21 @@ __credits__ = ["Ian Goodfellow"]
 __license__ = "3-clause BSD"
 __maintainer__ = "LISA Lab"
 __email__ = "pylearn-dev@googlegroups"
+import copy
 from datetime import datetime
 import os
 import sys
+import time
 import logging
 import warnings
+from theano.compat import six
 from pylearn2.utils import serial
 from pylearn2.utils.string_utils import preprocess
 from pylearn2.monitor import Monitor
 from pylearn2.space import NullSpace
+from pylearn2.training_algorithms.training_algorithm import TrainingAlgorithm
 from pylearn2.utils.timing import log_timing, total_seconds
+from pylearn2.utils import safe_zip
 from pylearn2.utils import sharedX
 
 
@@ -52,11 +57,89 @@ class Train(object):
         If `True`, will save the model to save_path even if there is
         already something there. Otherwise, will raise an error if the
         `save_path` is already occupied.
+    async_save : bool, optional
+        If `True`, `save` only takes a snapshot (deep copy) of the model
+        and a background thread writes it to a temporary file that is
+        then renamed to `save_path`, so that training continues while
+        the model is written. At most one save is pending at any time;
+        the final save of `main_loop` is waited for. Default: `False`.
+    checkpoint_path : str, optional
+        If specified, each save also writes the full training state (see
+        `get_state`) to this path, and if a file already exists there
+        when training starts, training resumes from it instead of
+        starting over: an interrupted job can simply be launched again.
+        Resuming relies on the model, algorithm and extensions being
+        configured as they were when the checkpoint was written. The
+        training algorithm, if any, must implement `get_state` and
+        `set_state`.
+    checkpoint_batches : int, optional
+        If specified, the training state is also saved to
+        `checkpoint_path` during epochs, every `checkpoint_batches`
+        batches, and resuming finishes the interrupted epoch from the
+        batch that followed the checkpoint. This requires a training
+        algorithm with update callbacks (such as SGD) and a training
+        iterator that implements `get_state`.
+    checkpoint_seconds : float, optional
+        Like `checkpoint_batches`, but saves the training state during
+        epochs whenever `checkpoint_seconds` seconds have passed since
+        the last checkpoint. Both can be combined.
+    monitor_log : str, optional
+        If specified, the values of the monitoring channels are appended
+        to a monitor log at this path at each monitoring step (see
+        `Monitor.set_log`). The analysis scripts read the log without
+        loading the model. Its extension should be `.jsonl`.
+    monitor_log_records : int, optional
+        When `monitor_log` is specified, the number of entries kept in
+        the records of the channels of the monitor, which is saved along
+        with the model, so that the saves stay the same size however long
+        training lasts. By default, all the entries are kept.
+    monitor_channels : list of str, optional
+        If specified, only the monitoring channels whose names match
+        these names or shell-style wildcard patterns are compiled and
+        evaluated (see `Monitor.select_channels`), along with the
+        channels named by the `channel_name` of the termination
+        criterion and of the extensions, which must be known once they
+        are set up. Others can be enabled during training with
+        `Monitor.enable_channels`.
     """
 
     def __init__(self, dataset, model, algorithm=None, save_path=None,
-                 save_freq=0, extensions=None, allow_overwrite=True):
+                 save_freq=0, extensions=None, allow_overwrite=True,
+                 async_save=False, checkpoint_path=None,
+                 checkpoint_batches=None, checkpoint_seconds=None,
+                 monitor_log=None, monitor_log_records=None,
+                 monitor_channels=None):
         self.allow_overwrite = allow_overwrite
+        self.async_save = async_save
+        self._saver = serial.AsyncSaver() if async_save else None
+        if checkpoint_path is not None:
+            checkpoint_path = preprocess(checkpoint_path)
+        elif checkpoint_batches is not None or checkpoint_seconds is not None:
+            raise ValueError("checkpoint_batches and checkpoint_seconds "
+                             "require a checkpoint_path.")
+        if (checkpoint_path is not None and algorithm is not None and
+                not _implements_state(algorithm)):
+            # Fail now rather than at the first checkpoint
+            raise ValueError("checkpoint_path requires a training algorithm "
+                             "that implements get_state and set_state, "
+                             "which %s does not." % type(algorithm))
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_batches = checkpoint_batches
+        self.checkpoint_seconds = checkpoint_seconds
+        if monitor_log is not None:
+            monitor_log = preprocess(monitor_log)
+        self.monitor_log = monitor_log
+        self.monitor_log_records = monitor_log_records
+        self.monitor_channels = monitor_channels
+        self._batches_since_checkpoint = 0
+        self._last_checkpoint_time = time.time()
+        # Called with this object by main_loop once it has started (see
+        # _end_startup)
+        self.startup_callbacks = []
+        self._in_epoch = False
+        self._resumed = False
+        self._resumed_mid_epoch = False
+        self._resumed_finished = False
         self.first_save = True
         self.dataset = dataset
         self.model = model
@@ -109,22 +192,157 @@ class Train(object):
         else:
             return False
 
+    def _required_channels(self):
+        """
+        Returns the names of the monitoring channels the termination
+        criterion of the algorithm and the extensions read, as given by
+        their `channel_name` (or `_channel_name`) attribute.
+
+        This is called once the algorithm and the extensions are set up,
+        so that the extensions which choose their channel from those of
+        the monitor (e.g. `MonitorBasedLRAdjuster`) have done so.
+
+        Raises
+        ------
+        ValueError
+            If the attribute of an object is still None, i.e. its channel
+            is only chosen when it is first called.
+        """
+        objects = list(self.extensions)
+        criterion = getattr(self.algorithm, 'termination_criterion', None)
+        if criterion is not None:
+            objects.append(criterion)
+        names = []
+        while objects:
+            obj = objects.pop(0)
+            # And and Or criteria combine other criteria
+            objects.extend(getattr(obj, '_criteria', []))
+            for attr in ('channel_name', '_channel_name'):
+                if not hasattr(obj, attr):
+                    continue
+                name = getattr(obj, attr)
+                if name is None:
+                    raise ValueError("%s reads a monitoring channel which "
+                                     "it only chooses during training, so "
+                                     "it cannot be selected by "
+                                     "monitor_channels. Please specify "
+                                     "its channel_name." %
+                                     type(obj).__name__)
+                if name not in names:
+                    names.append(name)
+        return names
+
     def setup(self):
         """
         Sets up the main loop. This is also called at the start of the
         main loop, so you need only call it if you're using a driver
         script that replaces the main loop with something else.
         """
+        state = None
+        if (self.checkpoint_path is not None and
+                os.path.exists(self.checkpoint_path)):
+            with log_timing(log, 'Resuming from ' + self.checkpoint_path):
+                state = serial.load(self.checkpoint_path)
+            # The saved monitor lost its Theano functions and datasets, so
+            # a new one is set up and continues its learning curves.
+            self.model = state['model']
+            old_monitor = self.model.monitor
+            del self.model.monitor
+            # The files at save_path were written by this same job
+            self.first_save = False
+
+        mid_epoch = state is not None and state.get('mid_epoch', False)
         self.model.monitor = Monitor.get_monitor(self.model)
         self.model.monitor.time_budget_exceeded = False
+        if self.monitor_log is not None:
+            self.model.monitor.set_log(self.monitor_log,
+                                       self.monitor_log_records)
+        if state is not None:
+            # The last records are only up to date at the end of an epoch
+            self.model.monitor.continue_from(old_monitor,
+                                             drop_last=not mid_epoch)
         if self.algorithm is not None:
             self.algorithm.setup(model=self.model, dataset=self.dataset)
+        if (self.checkpoint_batches is not None or
+                self.checkpoint_seconds is not None):
+            if not hasattr(self.algorithm, 'update_callbacks'):
+                raise ValueError("Saving checkpoints during epochs requires "
+                                 "a training algorithm with update "
+                                 "callbacks, such as SGD.")
+            callbacks = self.algorithm.update_callbacks
+            if self._checkpoint_during_epoch not in callbacks:
+                callbacks.append(self._checkpoint_during_epoch)
         self.setup_extensions()
+        # The monitor is compiled at its first call, so selecting the
+        # channels once they are all defined costs nothing
+        monitor_channels = getattr(self, 'monitor_channels', None)
+        if monitor_channels is not None:
+            self.model.monitor.select_channels(
+                list(monitor_channels) + self._required_channels())
+
+        if state is None:
+            # Model.modify_updates is used by the training algorithm to
+            # enforce constraints after each step of learning. Here we
+            # make sure the constraints are enforced from the start.
+            self.model.enforce_constraints()
+        else:
+            self.set_state(state)
+        self._resumed = state is not None
+        self._resumed_mid_epoch = mid_epoch
+        self._resumed_finished = (state is not None and
+                                  old_monitor.training_succeeded)
+
+    def get_state(self):
+        """
+        Returns everything `main_loop` needs to resume training exactly
+        where it currently is.
+
+        Returns
+        -------
+        state : dict
+            The model (along with its monitor) and the states of the
+            training algorithm and of the extensions. During an epoch,
+            the algorithm's state includes its position in the epoch.
+        """
+        extension_states = []
+        for extension in self.extensions:
+            get_state = getattr(extension, 'get_state', None)
+            extension_states.append(None if get_state is None
+                                    else get_state())
+        algorithm_state = None
+        if self.algorithm is not None:
+            algorithm_state = self.algorithm.get_state()
+        return {'model': self.model,
+                'mid_epoch': self._in_epoch,
+                'algorithm': algorithm_state,
+                'extensions': extension_states,
+                'training_seconds': self.training_seconds.get_value(),
+                'total_seconds': self.total_seconds.get_value()}
+
+    def set_state(self, state):
+        """
+        Restores the states of the training algorithm and extensions
+        returned by `get_state`. The model is not restored here: `setup`
+        takes it from the checkpoint before setting up the algorithm.
 
-        # Model.modify_updates is used by the training algorithm to
-        # enforce constraints after each step of learning. Here we
-        # make sure the constraints are enforced from the start.
-        self.model.enforce_constraints()
+        Parameters
+        ----------
+        state : dict
+            The return value of `get_state`.
+        """
+        if len(state['extensions']) != len(self.extensions):
+            raise ValueError("The checkpoint has the states of %d "
+                             "extensions, but there are %d extensions." %
+                             (len(state['extensions']),
+                              len(self.extensions)))
+        if self.algorithm is not None:
+            self.algorithm.set_state(state['algorithm'])
+        for extension, extension_state in safe_zip(self.extensions,
+                                                   state['extensions']):
+            if extension_state is not None:
+                extension.set_state(extension_state)
+        self.training_seconds.set_value(state['training_seconds'])
+        self.total_seconds.set_value(state['total_seconds'])
 
     def main_loop(self, time_budget=None):
         """
@@ -138,10 +356,19 @@ class Train(object):
             training. Default is `None`, no time limit.
         """
         t0 = datetime.now()
+        start = time.time()
         self.setup()
+        # Reported by the --profile-startup option of train.py
+        self.setup_seconds = time.time() - start
+        if self._resumed_finished:
+            log.info("Training had already finished when %s was saved.",
+                     self.checkpoint_path)
+            self._end_startup(start)
+            return
         if self.algorithm is None:
-            self.run_callbacks_and_monitoring()
-            while True:
+            continue_learning = self.first_monitoring()
+            self._end_startup(start)
+            while continue_learning:
                 if self.exceeded_time_budget(t0, time_budget):
                     break
 
@@ -158,8 +385,6 @@ class Train(object):
                 continue_learning = (self.model.continue_learning() and
                                      extension_continue)
                 assert continue_learning in [True, False, 0, 1]
-                if not continue_learning:
-                    break
         else:
             if not hasattr(self.model, 'monitor'):
                 # TODO: is this really necessary? I just put this error here
@@ -193,9 +418,10 @@ already been reported."""
                     val=self.total_seconds,
                     data_specs=(NullSpace(), ''),
                     dataset=self.model.monitor._datasets[0])
-            self.run_callbacks_and_monitoring()
+            continue_learning = self.first_monitoring()
+            self._end_startup(start)
 
-            while True:
+            while continue_learning:
                 if self.exceeded_time_budget(t0, time_budget):
                     break
 
@@ -204,7 +430,11 @@ already been reported."""
                     with log_timing(
                             log, None, final_msg='Time this epoch:',
                             callbacks=[self.training_seconds.set_value]):
-                        rval = self.algorithm.train(dataset=self.dataset)
+                        self._in_epoch = True
+                        try:
+                            rval = self.algorithm.train(dataset=self.dataset)
+                        finally:
+                            self._in_epoch = False
                     if rval is not None:
                         raise ValueError("TrainingAlgorithm.train should not "
                                          "return anything. Use "
@@ -221,13 +451,65 @@ already been reported."""
                     extension_continue
                 )
                 assert continue_learning in [True, False, 0, 1]
-                if not continue_learning:
-                    break
 
+        # Record the channels still being computed in asynchronous mode
+        self.model.monitor.wait()
         self.model.monitor.training_succeeded = True
 
         if self.save_freq > 0:
             self.save()
+        if self._saver is not None:
+            self._saver.wait()
+        for extension in self.extensions:
+            on_training_end = getattr(extension, 'on_training_end', None)
+            if on_training_end is not None:
+                on_training_end(self.model, self.dataset, self.algorithm)
+
+    def _end_startup(self, start):
+        """
+        Records the time spent since `main_loop` started in
+        `startup_seconds`, and calls the `startup_callbacks` with this
+        object. The startup includes the setup and the first monitoring,
+        hence the compilation of the training and monitoring functions.
+
+        Parameters
+        ----------
+        start : float
+            The time when `main_loop` started.
+        """
+        self.startup_seconds = time.time() - start
+        # Trains pickled before startup_callbacks existed have none
+        for callback in getattr(self, 'startup_callbacks', []):
+            callback(self)
+
+    def first_monitoring(self):
+        """
+        Runs the monitoring that precedes the first epoch of `main_loop`.
+
+        Returns
+        -------
+        continue_learning : bool
+            If `False`, the termination test run when resuming from a
+            checkpoint decided that learning is over.
+        """
+        if not self._resumed:
+            self.run_callbacks_and_monitoring()
+            return True
+        if self._resumed_mid_epoch:
+            # The first call to the algorithm's train method finishes the
+            # epoch during which the checkpoint was written
+            return True
+        # The checkpoint was written after the extensions had processed
+        # its last epoch, but before the termination test. Recompute the
+        # monitoring record that Monitor.continue_from dropped, then run
+        # that test.
+        self.model.monitor()
+        if self.algorithm is None:
+            continue_learning = self.model.continue_learning()
+        else:
+            continue_learning = self.algorithm.continue_learning(self.model)
+        assert continue_learning in [True, False, 0, 1]
+        return continue_learning
 
     def run_callbacks_and_monitoring(self):
         """
@@ -256,11 +538,16 @@ already been reported."""
         return continue_learning
 
     def save(self):
-        """Saves the model."""
-        #TODO-- save state of training algorithm so training can be
-        # resumed after a crash
+        """
+        Saves the model, and the full training state if `checkpoint_path`
+        was given.
+        """
         for extension in self.extensions:
             extension.on_save(self.model, self.dataset, self.algorithm)
+        state = None
+        if self._saver is not None and self.checkpoint_path is not None:
+            # A single snapshot is written to both paths
+            state = self._snapshot_state()
         if self.save_path is not None:
             with log_timing(log, 'Saving to ' + self.save_path):
                 if self.first_save and (not self.allow_overwrite) \
@@ -272,11 +559,99 @@ already been reported."""
                 try:
                     # Make sure that saving does not serialize the dataset
                     self.dataset._serialization_guard = SerializationGuard()
-                    serial.save(self.save_path, self.model,
-                                on_overwrite='backup')
+                    if state is not None:
+                        self._saver.save(self.save_path, state['model'],
+                                         snapshot=False)
+                    elif self._saver is not None:
+                        # Only the snapshot happens here, the guard
+                        # applies to it as well.
+                        self._saver.save(self.save_path, self.model)
+                    else:
+                        serial.save(self.save_path, self.model,
+                                    on_overwrite='backup')
                 finally:
                     self.dataset._serialization_guard = None
             self.first_save = False
+        if self.checkpoint_path is not None:
+            self.save_checkpoint(state)
+
+    def _snapshot_state(self):
+        """
+        Returns a deep copy of the training state (see `get_state`),
+        which `AsyncSaver` can write without copying it again.
+        """
+        # The checkpoint must include the monitoring record of its epoch
+        self.model.monitor.wait()
+        try:
+            self.dataset._serialization_guard = SerializationGuard()
+            return copy.deepcopy(self.get_state())
+        finally:
+            self.dataset._serialization_guard = None
+
+    def save_checkpoint(self, state=None):
+        """
+        Saves the training state (see `get_state`) to `checkpoint_path`.
+
+        Parameters
+        ----------
+        state : dict, optional
+            A snapshot returned by `_snapshot_state`, written instead of
+            taking a new one.
+        """
+        # The checkpoint must include the monitoring record of its epoch
+        self.model.monitor.wait()
+        with log_timing(log, 'Saving training state to ' +
+                        self.checkpoint_path):
+            try:
+                self.dataset._serialization_guard = SerializationGuard()
+                if state is not None:
+                    self._saver.save(self.checkpoint_path, state,
+                                     snapshot=False)
+                elif self._saver is not None:
+                    self._saver.save(self.checkpoint_path, self.get_state())
+                else:
+                    serial.save(self.checkpoint_path, self.get_state(),
+                                on_overwrite='backup')
+            finally:
+                self.dataset._serialization_guard = None
+        self._batches_since_checkpoint = 0
+        self._last_checkpoint_time = time.time()
+
+    def _checkpoint_during_epoch(self, algorithm):
+        """
+        Update callback of the training algorithm that saves the training
+        state during epochs, as requested by `checkpoint_batches` and
+        `checkpoint_seconds`.
+
+        Parameters
+        ----------
+        algorithm : TrainingAlgorithm
+            Not used, the state is taken from `self.algorithm`.
+        """
+        self._batches_since_checkpoint += 1
+        batches_due = (self.checkpoint_batches is not None and
+                       self._batches_since_checkpoint >=
+                       self.checkpoint_batches)
+        seconds_due = (self.checkpoint_seconds is not None and
+                       time.time() - self._last_checkpoint_time >=
+                       self.checkpoint_seconds)
+        if batches_due or seconds_due:
+            self.save_checkpoint()
+
+
+def _implements_state(algorithm):
+    """
+    Returns True if `algorithm` overrides the `get_state` and `set_state`
+    methods that `TrainingAlgorithm` leaves unimplemented.
+    """
+    for name in ['get_state', 'set_state']:
+        method = getattr(type(algorithm), name, None)
+        if method is None:
+            return False
+        if (six.get_unbound_function(method) is
+                six.get_unbound_function(getattr(TrainingAlgorithm, name))):
+            return False
+    return True
 
 
 class SerializationGuard(object):
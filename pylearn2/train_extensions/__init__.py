@@ -60,6 +60,50 @@ class TrainExtension(object):
             used to train the model.
         """
 
+    def on_training_end(self, model, dataset, algorithm):
+        """
+        Train calls this at the end of `main_loop`, once training is over
+        and the model was saved, e.g. to wait for pending writes.
+
+        Parameters
+        ----------
+        model : pylearn2.models.Model
+            The model object being trained.
+
+        dataset : pylearn2.datasets.Dataset
+            The dataset object used for training.
+
+        algorithm : pylearn2.training_algorithms.TrainingAlgorithm
+            The object representing the training algorithm being
+            used to train the model.
+        """
+
+    def get_state(self):
+        """
+        Returns the state this extension accumulated during training
+        (e.g. its position in a schedule), so that `Train` can store
+        it in its checkpoints.
+
+        Returns
+        -------
+        state : object
+            None (the default) if the extension has no state to save,
+            otherwise a picklable object that `set_state` accepts.
+        """
+        return None
+
+    def set_state(self, state):
+        """
+        Train calls this when resuming from a checkpoint, after `setup`,
+        with the value `get_state` returned when the checkpoint was
+        written.
+
+        Parameters
+        ----------
+        state : object
+            The return value of `get_state`.
+        """
+
     def setup(self, model, dataset, algorithm):
         """
         Train calls this immediately upon instantiation,
@@ -126,6 +170,15 @@ class SharedSetter(TrainExtension):
                 var.set_value(np.cast[var.dtype](val))
         self._count += 1
 
+    @functools.wraps(TrainExtension.get_state)
+    def get_state(self):
+        return {'_count': self._count}
+
+    @functools.wraps(TrainExtension.set_state)
+    def set_state(self, state):
+        self.__dict__.update(state)
+
+
 class ChannelSmoother(TrainExtension):
     """
     Makes a smoothed version of a monitoring channel by averaging together
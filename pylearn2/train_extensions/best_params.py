@@ -122,9 +122,17 @@ class MonitorBasedSaveBest(TrainExtension):
     tag_key : str, optional
         A unique key to use for storing diagnostic information in
         `model.tag`. If `None`, use the class name (default).
+    async_save : bool, optional
+        If True, the best model is written to `save_path` by a background
+        thread (see `pylearn2.utils.serial.AsyncSaver`), from a snapshot
+        taken when it is found. When `store_best_model` is also True, the
+        in-memory copy is used as the snapshot. The last write is waited
+        for, and its errors re-raised, at the end of training. Default:
+        False.
     """
     def __init__(self, channel_name, save_path=None, store_best_model=False,
-                 start_epoch=0, higher_is_better=False, tag_key=None):
+                 start_epoch=0, higher_is_better=False, tag_key=None,
+                 async_save=False):
         self.channel_name = channel_name
         assert save_path is not None or store_best_model, (
             "Either save_path must be defined or store_best_model must be " +
@@ -137,6 +145,7 @@ class MonitorBasedSaveBest(TrainExtension):
             self.coeff = -1.
         else:
             self.coeff = 1.
+        self._saver = serial.AsyncSaver() if async_save else None
 
         # If no tag key is provided, use the class name by default.
         if tag_key is None:
@@ -204,8 +213,58 @@ class MonitorBasedSaveBest(TrainExtension):
             if self.store_best_model:
                 self.best_model = deepcopy(model)
             if self.save_path is not None:
-                with log_timing(log, 'Saving to ' + self.save_path):
-                    serial.save(self.save_path, model, on_overwrite='backup')
+                saver = getattr(self, '_saver', None)
+                if saver is not None:
+                    if self.store_best_model:
+                        # best_model is already a private snapshot
+                        saver.save(self.save_path, self.best_model,
+                                   snapshot=False)
+                    else:
+                        saver.save(self.save_path, model)
+                else:
+                    with log_timing(log, 'Saving to ' + self.save_path):
+                        serial.save(self.save_path, model,
+                                    on_overwrite='backup')
+
+    def on_training_end(self, model, dataset, algorithm):
+        """
+        Waits for the last write of the best model, if `async_save` is
+        True, and re-raises its error, if any.
+
+        Parameters
+        ----------
+        model : pylearn2.models.model.Model
+            Not used
+        dataset : pylearn2.datasets.dataset.Dataset
+            Not used
+        algorithm : TrainingAlgorithm
+            Not used
+        """
+        saver = getattr(self, '_saver', None)
+        if saver is not None:
+            saver.wait()
+
+    def get_state(self):
+        """
+        Returns the best cost seen so far and, if `store_best_model`
+        is set, the corresponding model.
+
+        Returns
+        -------
+        state : dict
+        """
+        return {'best_cost': self.best_cost, 'best_model': self.best_model}
+
+    def set_state(self, state):
+        """
+        Restores the state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+        """
+        self.best_cost = state['best_cost']
+        self.best_model = state['best_model']
 
     def _update_tag(self, model):
         """
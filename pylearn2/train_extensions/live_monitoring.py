@@ -9,7 +9,6 @@ __license__ = "3-clause BSD"
 __maintainer__ = "LISA Lab"
 __email__ = "pylearn-dev@googlegroups"
 
-import copy
 
 try:
     import zmq
@@ -212,36 +211,22 @@ class LiveMonitoring(TrainExtension):
                 result = {}
                 for channel_name in channel_list:
                     if channel_name in monitor.channels.keys():
-                        chan = copy.deepcopy(
-                            monitor.channels[channel_name]
-                        )
                         end = rsp_msg.end
                         if end == -1:
-                            end = len(chan.batch_record)
-                        # TODO copying and truncating the records individually
-                        # like this is brittle. Is there a more robust
-                        # solution?
-                        chan.batch_record = chan.batch_record[
-                            rsp_msg.start:end:rsp_msg.step
-                        ]
-                        chan.epoch_record = chan.epoch_record[
-                            rsp_msg.start:end:rsp_msg.step
-                        ]
-                        chan.example_record = chan.example_record[
-                            rsp_msg.start:end:rsp_msg.step
-                        ]
-                        chan.time_record = chan.time_record[
-                            rsp_msg.start:end:rsp_msg.step
-                        ]
-                        chan.val_record = chan.val_record[
-                            rsp_msg.start:end:rsp_msg.step
-                        ]
+                            end = None
+                        chan = monitor.channels[channel_name].sliced(
+                            rsp_msg.start, end, rsp_msg.step
+                        )
                         result[channel_name] = chan
                     else:
                         result[channel_name] = KeyError(
                             'Invalid channel: %s' % rsp_msg.channel
                         )
                 rsp_msg.data = result
+                # Channels left out by Monitor.select_channels are
+                # evaluated from the next monitoring step on
+                monitor.enable_channels([name for name in channel_list
+                                         if name in monitor.channels])
 
             self.req_sock.send_pyobj(rsp_msg)
         except zmq.Again:
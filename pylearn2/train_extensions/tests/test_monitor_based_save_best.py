@@ -9,9 +9,11 @@ __maintainer__ = "David Warde-Farley"
 
 import os
 import tempfile
+from nose.tools import assert_raises
 from pylearn2.models.model import Model
 from pylearn2.monitor import Monitor
 from pylearn2.train_extensions.best_params import MonitorBasedSaveBest
+from pylearn2.utils import serial
 
 
 class MockModel(Model):
@@ -116,3 +118,37 @@ def test_tagging():
 
     finally:
         os.remove(fn)
+
+
+def test_async_save():
+    """
+    Test that on_training_end waits for the last write of the best model
+    and re-raises its error.
+    """
+    fd, fn = tempfile.mkstemp(suffix='.pkl')
+    os.close(fd)
+    try:
+        model = MockModel()
+        model.monitor = Monitor(model)
+        model.monitor.channels['foobar'] = MockChannel()
+        ext = MonitorBasedSaveBest(channel_name='foobar', save_path=fn,
+                                   async_save=True)
+        ext.setup(model, None, None)
+        model.monitor.channels['foobar'].val_record.append(5.0)
+        model.monitor.report_epoch()
+        ext.on_monitor(model, None, None)
+        ext.on_training_end(model, None, None)
+        assert not ext._saver.pending
+        assert isinstance(serial.load(fn), MockModel)
+
+        # The parent of the save path is a file, so the write fails
+        ext = MonitorBasedSaveBest(channel_name='foobar', tag_key='failing',
+                                   save_path=os.path.join(fn, 'model.pkl'),
+                                   async_save=True)
+        ext.setup(model, None, None)
+        model.monitor.channels['foobar'].val_record.append(4.0)
+        model.monitor.report_epoch()
+        ext.on_monitor(model, None, None)
+        assert_raises(Exception, ext.on_training_end, model, None, None)
+    finally:
+        os.remove(fn)
@@ -4,8 +4,8 @@
 import warnings
 import numpy
 from . import TrainExtension
+from pylearn2.datasets.augmentation import WindowAndFlipAugmentation
 from pylearn2.datasets.preprocessing import CentralWindow
-from pylearn2.utils.exc import reraise_as
 from pylearn2.utils.rng import make_np_rng
 from pylearn2.utils import py_integer_types
 
@@ -13,9 +13,9 @@ try:
     from ..utils._window_flip import random_window_and_flip_c01b
     from ..utils._window_flip import random_window_and_flip_b01c
 except ImportError:
-    reraise_as(ImportError("Import of Cython module failed. Please make sure "
-                           "you have run 'python setup.py develop' in the "
-                           "pylearn2 directory"))
+    # Only needed to rewrite whole datasets, i.e. unless streaming
+    random_window_and_flip_c01b = None
+    random_window_and_flip_b01c = None
 
 __authors__ = "David Warde-Farley"
 __copyright__ = "Copyright 2010-2012, Universite de Montreal"
@@ -93,6 +93,18 @@ class WindowAndFlip(TrainExtension):
     flip : bool, optional
         Reflect images on the horizontal axis with probability
         0.5. `True` by default.
+    streaming : bool, optional
+        If True, the datasets in `randomize` are not rewritten after
+        each epoch. Instead, each batch drawn from their training
+        iterators is windowed and flipped on the fly (see
+        `pylearn2.datasets.augmentation.WindowAndFlipAugmentation`),
+        which avoids keeping a padded copy of the datasets and pausing
+        between epochs. Their other iterators, e.g. the monitor's, yield
+        the central windows of the images. `False` by default.
+    prefetch : int, optional
+        When streaming, the number of augmented batches the iterators
+        of the datasets in `randomize` prepare in a background thread.
+        By default, batches are augmented when requested.
     """
     def __init__(self,
                  window_shape,
@@ -101,7 +113,9 @@ class WindowAndFlip(TrainExtension):
                  center=None,
                  rng=(2013, 2, 20),
                  pad_randomized=0,
-                 flip=True):
+                 flip=True,
+                 streaming=False,
+                 prefetch=None):
         self._window_shape = tuple(window_shape)
 
         # Defined in setup(). A dict that maps Datasets in self._randomize and
@@ -114,6 +128,8 @@ class WindowAndFlip(TrainExtension):
         self._center = center if center else []
         self._pad_randomized = pad_randomized
         self._flip = flip
+        self._streaming = streaming
+        self._prefetch = prefetch
 
         assert isinstance(self._randomize, list), (
             "The 'randomize' parameter of WindowAndFlip should be a list")
@@ -148,11 +164,20 @@ class WindowAndFlip(TrainExtension):
         for data in self._center:
             preprocessor.apply(data)
 
+        if self._streaming:
+            for data in self._randomize:
+                data.set_augmentation(WindowAndFlipAugmentation(
+                    self._window_shape, pad=self._pad_randomized,
+                    flip=self._flip, rng=self._rng,
+                    prefetch=self._prefetch))
+
         #
         # Do the initial random windowing
         #
 
-        randomize_now = self._randomize + self._randomize_once
+        randomize_now = self._randomize_once
+        if not self._streaming:
+            randomize_now = self._randomize + randomize_now
 
         # maps each dataset in randomize_now to a zero-padded topological view
         # of its data.
@@ -173,6 +198,11 @@ class WindowAndFlip(TrainExtension):
         ----------
         datasets : WRITEME
         """
+        if datasets and random_window_and_flip_c01b is None:
+            raise ImportError("Import of Cython module failed. Please make "
+                              "sure you have run 'python setup.py develop' "
+                              "in the pylearn2 directory, or use "
+                              "streaming=True")
         for dataset in datasets:
             if tuple(dataset.view_converter.axes) == ('c', 0, 1, 'b'):
                 wf_func = random_window_and_flip_c01b
@@ -200,4 +230,5 @@ class WindowAndFlip(TrainExtension):
         dataset = None
         algorithm = None
 
-        self.randomize_datasets(self._randomize)
+        if not getattr(self, '_streaming', False):
+            self.randomize_datasets(self._randomize)
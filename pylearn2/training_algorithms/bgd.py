@@ -88,6 +88,11 @@ class BGD(TrainingAlgorithm):
     theano_function_mode : WRITEME
     init_alpha : WRITEME
     seed : WRITEME
+    prefetch : int, optional
+        If specified, the training batches are fetched by a background
+        thread which keeps up to this many batches ready. The dataset's
+        `iterator` method must accept a `prefetch` argument. See
+        `pylearn2.utils.iteration.FiniteDatasetIterator`.
     """
 
     def __init__(self, cost=None, batch_size=None, batches_per_iter=None,
@@ -97,7 +102,8 @@ class BGD(TrainingAlgorithm):
                  reset_alpha=True, conjugate=False, min_init_alpha=.001,
                  reset_conjugate=True, line_search_mode=None,
                  verbose_optimization=False, scale_step=1.,
-                 theano_function_mode=None, init_alpha=None, seed=None):
+                 theano_function_mode=None, init_alpha=None, seed=None,
+                 prefetch=None):
 
         self.__dict__.update(locals())
         del self.self
@@ -290,12 +296,21 @@ class BGD(TrainingAlgorithm):
                                       "data_specs: %s" % str(data_specs))
         flat_data_specs = (CompositeSpace(space_tuple), source_tuple)
 
+        # Not every dataset's iterator accepts prefetch, so it is only
+        # passed when set. Older pickles have no prefetch attribute.
+        kwargs = {}
+        if getattr(self, 'prefetch', None):
+            kwargs['prefetch'] = self.prefetch
+        if getattr(dataset, 'augmentation', None) is not None:
+            # Only the training batches are randomly augmented, see
+            # DenseDesignMatrix.set_augmentation
+            kwargs['augment'] = True
         iterator = dataset.iterator(mode=train_iteration_mode,
                                     batch_size=self.batch_size,
                                     num_batches=self.batches_per_iter,
                                     data_specs=flat_data_specs,
                                     return_tuple=True,
-                                    rng=rng)
+                                    rng=rng, **kwargs)
 
         mode = self.theano_function_mode
         for data in iterator:
@@ -327,6 +342,43 @@ class BGD(TrainingAlgorithm):
             assert rval in [True, False, 0, 1]
             return rval
 
+    def get_state(self):
+        """
+        Returns the state of the random number generator, of the
+        optimizer and of the termination criterion, along with the
+        current `scale_step`.
+
+        Returns
+        -------
+        state : dict
+        """
+        assert self.bSetup
+        criterion_state = None
+        if hasattr(self.termination_criterion, 'get_state'):
+            criterion_state = self.termination_criterion.get_state()
+        return {'rng': self.rng.get_state(),
+                'first': self.first,
+                'scale_step': self.scale_step,
+                'optimizer': self.optimizer.get_state(),
+                'termination_criterion': criterion_state}
+
+    def set_state(self, state):
+        """
+        Restores the state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+        """
+        assert self.bSetup
+        self.rng.set_state(state['rng'])
+        self.first = state['first']
+        self.scale_step = state['scale_step']
+        self.optimizer.set_state(state['optimizer'])
+        if state['termination_criterion'] is not None:
+            self.termination_criterion.set_state(
+                state['termination_criterion'])
+
     def before_step(self, model):
         """
         .. todo::
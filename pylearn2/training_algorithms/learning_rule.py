@@ -237,6 +237,17 @@ class MomentumAdjustor(TrainExtension):
 
         momentum.set_value(np.cast[config.floatX](self.current_momentum()))
 
+    @wraps(TrainExtension.get_state)
+    def get_state(self):
+        state = {'_count': self._count, '_initialized': self._initialized}
+        if self._initialized:
+            state['_init_momentum'] = self._init_momentum
+        return state
+
+    @wraps(TrainExtension.set_state)
+    def set_state(self, state):
+        self.__dict__.update(state)
+
     def current_momentum(self):
         """Returns the momentum currently desired by the schedule."""
         w = self.saturate - self.start
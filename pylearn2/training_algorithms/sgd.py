@@ -18,6 +18,8 @@ import numpy as np
 from theano.compat import six
 from theano import config
 from theano import function
+from theano.compile.sharedvalue import SharedVariable
+from theano.gof import graph
 from theano.gof.op import get_debug_values
 
 from pylearn2.compat import OrderedDict, first_key
@@ -35,6 +37,7 @@ from pylearn2.utils import serial
 from pylearn2.utils import sharedX
 from pylearn2.utils import contains_nan
 from pylearn2.utils import contains_inf
+from pylearn2.utils.compile import cached_function
 from pylearn2.utils import isfinite
 from pylearn2.utils.data_specs import DataSpecsMapping
 from pylearn2.utils.exc import reraise_as
@@ -96,6 +99,16 @@ class SGD(TrainingAlgorithm):
         monitoring datasets. If not specified, defaults to 'sequential'.
         TODO: make it possible to specify different modes for different
         datasets.
+    monitoring_subsample : int, optional
+        If specified, the monitoring channels are computed on a fixed
+        random subset of about this many examples of each monitoring
+        dataset, and their standard errors are recorded. See
+        `Monitor.add_dataset`.
+    monitor_asynchronously : bool, optional
+        If True, the monitoring channels are computed in a background
+        thread, on a snapshot of the parameters, while the next epoch
+        trains. Their values are then recorded one epoch late. See
+        `Monitor.set_asynchronous`.
     termination_criterion : instance of \
         pylearn2.termination_criteria.TerminationCriterion, optional
 
@@ -149,16 +162,23 @@ class SGD(TrainingAlgorithm):
     seed : valid argument to np.random.RandomState, optional
         The seed used for the random number generate to be passed to the
         training dataset iterator (if any)
+    prefetch : int, optional
+        If specified, the training batches are fetched by a background
+        thread which keeps up to this many batches ready while the
+        updates run. The dataset's `iterator` method must accept a
+        `prefetch` argument. See
+        `pylearn2.utils.iteration.FiniteDatasetIterator`.
     """
     def __init__(self, learning_rate, cost=None, batch_size=None,
                  monitoring_batch_size=None, monitoring_batches=None,
                  monitoring_dataset=None,
                  monitor_iteration_mode='sequential',
+                 monitoring_subsample=None, monitor_asynchronously=False,
                  termination_criterion=None, update_callbacks=None,
                  learning_rule=None, set_batch_size=False,
                  train_iteration_mode=None, batches_per_iter=None,
                  theano_function_mode=None, monitoring_costs=None,
-                 seed=[2012, 10, 5]):
+                 seed=[2012, 10, 5], prefetch=None):
 
         if isinstance(cost, (list, tuple, set)):
             raise TypeError("SGD no longer supports using collections of " +
@@ -176,6 +196,8 @@ class SGD(TrainingAlgorithm):
         self.monitoring_batch_size = monitoring_batch_size
         self.monitoring_batches = monitoring_batches
         self.monitor_iteration_mode = monitor_iteration_mode
+        self.monitoring_subsample = monitoring_subsample
+        self.monitor_asynchronously = monitor_asynchronously
         if monitoring_dataset is None:
             if monitoring_batch_size is not None:
                 raise ValueError("Specified a monitoring batch size " +
@@ -183,6 +205,9 @@ class SGD(TrainingAlgorithm):
             if monitoring_batches is not None:
                 raise ValueError("Specified an amount of monitoring batches " +
                                  "but not a monitoring dataset.")
+            if monitoring_subsample is not None:
+                raise ValueError("Specified a monitoring subsample " +
+                                 "but not a monitoring dataset.")
         self.termination_criterion = termination_criterion
         self._register_update_callbacks(update_callbacks)
         if train_iteration_mode is None:
@@ -192,6 +217,11 @@ class SGD(TrainingAlgorithm):
         self.rng = make_np_rng(seed, which_method=["randn", "randint"])
         self.theano_function_mode = theano_function_mode
         self.monitoring_costs = monitoring_costs
+        self.prefetch = prefetch
+        # The iterator of the epoch in progress, and the state set_state
+        # restores it to when the epoch is resumed from a checkpoint
+        self._iterator = None
+        self._iterator_state = None
 
     def _setup_monitor(self):
         """
@@ -213,7 +243,8 @@ class SGD(TrainingAlgorithm):
                                batch_size=self.monitoring_batch_size,
                                num_batches=self.monitoring_batches,
                                extra_costs=self.monitoring_costs,
-                               mode=self.monitor_iteration_mode)
+                               mode=self.monitor_iteration_mode,
+                               subsample=self.monitoring_subsample)
             dataset_name = first_key(self.monitoring_dataset)
             monitoring_dataset = self.monitoring_dataset[dataset_name]
             # TODO: have Monitor support non-data-dependent channels
@@ -227,6 +258,7 @@ class SGD(TrainingAlgorithm):
                 self.learning_rule.add_channels_to_monitor(
                     self.monitor,
                     monitoring_dataset)
+            self.monitor.set_asynchronous(self.monitor_asynchronously)
 
     def setup(self, model, dataset):
         """
@@ -396,13 +428,23 @@ class SGD(TrainingAlgorithm):
         self._setup_monitor()
 
         with log_timing(log, 'Compiling sgd_update'):
-            self.sgd_update = function(theano_args,
-                                       updates=updates,
-                                       name='sgd_update',
-                                       on_unused_input='ignore',
-                                       mode=self.theano_function_mode)
+            self.sgd_update = cached_function(theano_args,
+                                              updates=updates,
+                                              name='sgd_update',
+                                              on_unused_input='ignore',
+                                              mode=self.theano_function_mode)
         self.params = params
 
+        # Every shared variable read or updated by sgd_update, apart from
+        # the parameters themselves, is part of the training state: the
+        # learning rate, the learning rule's hyperparameters and
+        # accumulators, the states of random streams, etc.
+        self._state_vars = [var for var in updates if var not in params]
+        for var in graph.inputs(list(updates.values())):
+            if (isinstance(var, SharedVariable) and var not in params and
+                    var not in self._state_vars):
+                self._state_vars.append(var)
+
     def train(self, dataset):
         """
         Runs one epoch of SGD training on the specified dataset.
@@ -442,11 +484,28 @@ class SGD(TrainingAlgorithm):
                 "data_specs: %s" % str(data_specs))
         flat_data_specs = (CompositeSpace(space_tuple), source_tuple)
 
+        # Not every dataset's iterator accepts prefetch, so it is only
+        # passed when set. Older pickles have no prefetch attribute.
+        kwargs = {}
+        if getattr(self, 'prefetch', None):
+            kwargs['prefetch'] = self.prefetch
+        if getattr(dataset, 'augmentation', None) is not None:
+            # Only the training batches are randomly augmented, see
+            # DenseDesignMatrix.set_augmentation
+            kwargs['augment'] = True
         iterator = dataset.iterator(mode=self.train_iteration_mode,
                                     batch_size=self.batch_size,
                                     data_specs=flat_data_specs,
                                     return_tuple=True, rng=rng,
-                                    num_batches=self.batches_per_iter)
+                                    num_batches=self.batches_per_iter,
+                                    **kwargs)
+        if self._iterator_state is not None:
+            # Finish the epoch that was interrupted by a checkpoint. This
+            # also restores the state of self.rng, which the new iterator
+            # has just used.
+            iterator.set_state(self._iterator_state)
+            self._iterator_state = None
+        self._iterator = iterator
 
         on_load_batch = self.on_load_batch
         for batch in iterator:
@@ -462,6 +521,7 @@ class SGD(TrainingAlgorithm):
             self.monitor.report_batch(actual_batch_size)
             for callback in self.update_callbacks:
                 callback(self)
+        self._iterator = None
 
         # Make sure none of the parameters have bad values
         for param in self.params:
@@ -484,6 +544,90 @@ class SGD(TrainingAlgorithm):
         else:
             return self.termination_criterion.continue_learning(self.model)
 
+    def get_state(self):
+        """
+        Returns the state of the training iterator's random number
+        generator, the values of all the shared variables used by the
+        update other than the model parameters (learning rate, learning
+        rule accumulators, ...) and the states of the update callbacks
+        and termination criterion.
+
+        When called during an epoch (i.e. from an update callback), the
+        state also contains the position of the training iterator, and
+        the first call to `train` after `set_state` finishes that epoch.
+
+        Returns
+        -------
+        state : dict
+        """
+        if not hasattr(self, 'sgd_update'):
+            raise Exception("get_state called without first calling setup")
+        iterator_state = None
+        if self._iterator is not None:
+            if not hasattr(self._iterator, 'get_state'):
+                raise NotImplementedError("The training iterator (%s) does "
+                                          "not implement get_state, the "
+                                          "state cannot be saved during an "
+                                          "epoch." % type(self._iterator))
+            iterator_state = self._iterator.get_state()
+        callback_states = []
+        for callback in self.update_callbacks:
+            get_state = getattr(callback, 'get_state', None)
+            callback_states.append(None if get_state is None
+                                   else get_state())
+        criterion_state = None
+        if hasattr(self.termination_criterion, 'get_state'):
+            criterion_state = self.termination_criterion.get_state()
+        return {'rng': self.rng.get_state(),
+                'first': self.first,
+                'shared_values': [var.get_value()
+                                  for var in self._state_vars],
+                'update_callbacks': callback_states,
+                'termination_criterion': criterion_state,
+                'iterator': iterator_state}
+
+    def set_state(self, state):
+        """
+        Restores the state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+            The return value of `get_state` on an SGD instance set up
+            with the same model, cost and learning rule.
+        """
+        if not hasattr(self, 'sgd_update'):
+            raise Exception("set_state called without first calling setup")
+        values = state['shared_values']
+        if len(values) != len(self._state_vars):
+            raise ValueError("The saved SGD state has %d shared variables "
+                             "but this SGD instance uses %d. Was it saved "
+                             "with a different model, cost or learning "
+                             "rule?" % (len(values), len(self._state_vars)))
+        for var, value in safe_zip(self._state_vars, values):
+            old_shape = np.shape(var.get_value(borrow=True))
+            if np.shape(value) != old_shape:
+                raise ValueError("The saved value of %s has shape %s, "
+                                 "expected %s." % (var, np.shape(value),
+                                                   old_shape))
+        for var, value in safe_zip(self._state_vars, values):
+            var.set_value(value)
+
+        self.rng.set_state(state['rng'])
+        self.first = state['first']
+        self._iterator_state = state.get('iterator')
+        callback_states = state['update_callbacks']
+        for i, callback_state in enumerate(callback_states):
+            if callback_state is None:
+                continue
+            if i >= len(self.update_callbacks):
+                raise ValueError("The saved SGD state has more update "
+                                 "callbacks than this SGD instance.")
+            self.update_callbacks[i].set_state(callback_state)
+        if state['termination_criterion'] is not None:
+            self.termination_criterion.set_state(
+                state['termination_criterion'])
+
 
 class MonitorBasedLRAdjuster(TrainExtension):
     """
@@ -546,6 +690,51 @@ class MonitorBasedLRAdjuster(TrainExtension):
                 self.dataset_name = dataset_name
             else:
                 self.channel_name = None
+        self._channel_chosen = False
+
+    def _choose_channel(self, monitor, algorithm):
+        """
+        Sets `channel_name` to the only channel of `monitor` whose name
+        ends with "objective", when neither `channel_name` nor
+        `dataset_name` was specified.
+        """
+        channels = [elem for elem in monitor.channels
+                    if elem.endswith("objective")]
+        if len(channels) < 1:
+            raise ValueError(
+                "There are no monitoring channels that end "
+                "with \"objective\". Please specify either "
+                "channel_name or dataset_name.")
+        elif len(channels) > 1:
+            datasets = algorithm.monitoring_dataset.keys()
+            raise ValueError(
+                "There are multiple monitoring channels that"
+                "end with \"_objective\". The list of available "
+                "datasets are: " +
+                str(datasets) + " . Please specify either "
+                "channel_name or dataset_name in the "
+                "MonitorBasedLRAdjuster constructor to "
+                'disambiguate.')
+        self.channel_name = channels[0]
+        self._channel_chosen = True
+        warnings.warn('The channel that has been chosen for '
+                      'monitoring is: ' + str(self.channel_name) + '.')
+
+    def setup(self, model, dataset, algorithm):
+        """
+        Chooses the monitoring channel if it was not specified, now that
+        the channels of the monitor are defined, so that it is known
+        before the first call to `on_monitor` (e.g. by
+        `Train._required_channels`).
+
+        Parameters
+        ----------
+        model : a Model instance
+        dataset : Dataset
+        algorithm : WRITEME
+        """
+        if self.channel_name is None and hasattr(model, 'monitor'):
+            self._choose_channel(model.monitor, algorithm)
 
     def on_monitor(self, model, dataset, algorithm):
         """
@@ -563,31 +752,11 @@ class MonitorBasedLRAdjuster(TrainExtension):
         assert hasattr(model, 'monitor'), ("no monitor associated with "
                                            + str(model))
         monitor = model.monitor
-        monitor_channel_specified = True
 
         if self.channel_name is None:
-            monitor_channel_specified = False
-            channels = [elem for elem in monitor.channels
-                        if elem.endswith("objective")]
-            if len(channels) < 1:
-                raise ValueError(
-                    "There are no monitoring channels that end "
-                    "with \"objective\". Please specify either "
-                    "channel_name or dataset_name.")
-            elif len(channels) > 1:
-                datasets = algorithm.monitoring_dataset.keys()
-                raise ValueError(
-                    "There are multiple monitoring channels that"
-                    "end with \"_objective\". The list of available "
-                    "datasets are: " +
-                    str(datasets) + " . Please specify either "
-                    "channel_name or dataset_name in the "
-                    "MonitorBasedLRAdjuster constructor to "
-                    'disambiguate.')
-            else:
-                self.channel_name = channels[0]
-                warnings.warn('The channel that has been chosen for '
-                              'monitoring is: ' + str(self.channel_name) + '.')
+            self._choose_channel(monitor, algorithm)
+        monitor_channel_specified = not getattr(self, '_channel_chosen',
+                                                False)
 
         try:
             v = monitor.channels[self.channel_name].val_record
@@ -766,6 +935,26 @@ class AnnealedLearningRate(object):
         """
         return self._base * min(1, self._anneal_start / self._count)
 
+    def get_state(self):
+        """
+        Returns the position in the annealing schedule, to be saved in
+        training checkpoints.
+        """
+        return dict((name, getattr(self, name))
+                    for name in ['_initialized', '_count', '_base']
+                    if hasattr(self, name))
+
+    def set_state(self, state):
+        """
+        Restores the position in the annealing schedule returned by
+        `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+        """
+        self.__dict__.update(state)
+
 
 class ExponentialDecay(object):
     """
@@ -822,6 +1011,25 @@ class ExponentialDecay(object):
         new_lr = np.cast[config.floatX](new_lr)
         algorithm.learning_rate.set_value(new_lr)
 
+    def get_state(self):
+        """
+        Returns the position in the decay schedule, to be saved in
+        training checkpoints.
+        """
+        return dict((name, getattr(self, name))
+                    for name in ['_count', '_min_reached', '_base_lr']
+                    if hasattr(self, name))
+
+    def set_state(self, state):
+        """
+        Restores the position in the decay schedule returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+        """
+        self.__dict__.update(state)
+
 
 class LinearDecay(object):
     """
@@ -880,6 +1088,25 @@ class LinearDecay(object):
         new_lr = np.cast[config.floatX](new_lr)
         algorithm.learning_rate.set_value(new_lr)
 
+    def get_state(self):
+        """
+        Returns the position in the decay schedule, to be saved in
+        training checkpoints.
+        """
+        return dict((name, getattr(self, name))
+                    for name in ['_count', '_base_lr', '_step']
+                    if hasattr(self, name))
+
+    def set_state(self, state):
+        """
+        Restores the position in the decay schedule returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+        """
+        self.__dict__.update(state)
+
 
 class EpochMonitor(object):
     """
@@ -993,6 +1220,25 @@ class OneOverEpoch(TrainExtension):
         clipped = max(self.min_lr, lr)
         return clipped
 
+    def get_state(self):
+        """
+        Returns the position in the decay schedule, to be saved in
+        training checkpoints.
+        """
+        return dict((name, getattr(self, name))
+                    for name in ['_initialized', '_count', '_init_lr']
+                    if hasattr(self, name))
+
+    def set_state(self, state):
+        """
+        Restores the position in the decay schedule returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+        """
+        self.__dict__.update(state)
+
 
 class LinearDecayOverEpoch(TrainExtension):
     """
@@ -1077,6 +1323,26 @@ class LinearDecayOverEpoch(TrainExtension):
         assert new_lr > 0
         return new_lr
 
+    def get_state(self):
+        """
+        Returns the position in the decay schedule, to be saved in
+        training checkpoints.
+        """
+        return dict((name, getattr(self, name))
+                    for name in ['_initialized', '_count', '_init_lr',
+                                 '_step']
+                    if hasattr(self, name))
+
+    def set_state(self, state):
+        """
+        Restores the position in the decay schedule returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+        """
+        self.__dict__.update(state)
+
 
 class _PolyakWorker(object):
     """
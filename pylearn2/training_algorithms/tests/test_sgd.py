@@ -1791,6 +1791,29 @@ def test_empty_monitoring_datasets():
     train.main_loop()
 
 
+def test_prefetch():
+    """
+    Test that training with prefetched batches gives the same parameters
+    as training without.
+    """
+    dim = 3
+    rng = np.random.RandomState([25, 9, 2012])
+    X = rng.randn(23, dim)
+
+    def train_params(prefetch):
+        model = SoftmaxModel(dim)
+        algorithm = SGD(1e-3, DummyCost(), batch_size=5,
+                        termination_criterion=EpochCounter(2),
+                        prefetch=prefetch)
+        train = Train(DenseDesignMatrix(X=X), model, algorithm,
+                      save_path=None, save_freq=0)
+        train.main_loop()
+        return model.get_param_values()
+
+    for expected, prefetched in zip(train_params(None), train_params(2)):
+        assert np.allclose(expected, prefetched)
+
+
 def test_uneven_batch_size():
     """
     Testing extensively sgd parametrisations for datasets with a number of
@@ -60,6 +60,43 @@ class TrainingAlgorithm(object):
         """
         raise NotImplementedError()
 
+    def get_state(self):
+        """
+        Returns the state the algorithm accumulated during training
+        (random number generator, learning rule accumulators, ...), so
+        that training can be resumed exactly from a checkpoint.
+
+        Returns
+        -------
+        state : dict
+            A picklable dictionary that `set_state` accepts. It only
+            describes the algorithm, the model is saved separately.
+
+        Notes
+        -----
+        Must be called after `setup`.
+        """
+        raise NotImplementedError(str(type(self)) + " does not implement " +
+                                  "get_state.")
+
+    def set_state(self, state):
+        """
+        Restores the state returned by `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+            The return value of `get_state` on an algorithm that was set
+            up with the same kind of model and cost.
+
+        Notes
+        -----
+        Must be called after `setup`, since `setup` creates most of the
+        variables that hold the state.
+        """
+        raise NotImplementedError(str(type(self)) + " does not implement " +
+                                  "set_state.")
+
     def _set_monitoring_dataset(self, monitoring_dataset):
         """
         .. todo::
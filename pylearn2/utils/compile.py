@@ -1,12 +1,34 @@
 """Utilities related to the compilation of Theano functions."""
 import functools
+import glob
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import theano
+from theano.compat import six
+from theano.compat.six.moves import cPickle
+from theano.compile.sharedvalue import SharedVariable
+from theano.gof import graph
+
+from pylearn2.utils import string_utils
+from pylearn2.utils.disk_cache import evict_lru, hash_update, Uncacheable
 
 __author__ = "David Warde-Farley"
 __copyright__ = "Copyright 2012, David Warde-Farley / Universite de Montreal"
 __license__ = "3-clause BSD"
 __maintainer__ = "David Warde-Farley"
 __email__ = "wardefar@iro"
-__all__ = ["compiled_theano_function", "HasCompiledFunctions"]
+__all__ = ["compiled_theano_function", "HasCompiledFunctions",
+           "FunctionCache", "cached_function", "get_function_cache",
+           "set_function_cache"]
+
+
+log = logging.getLogger(__name__)
 
 
 def compiled_theano_function(fn):
@@ -82,3 +104,390 @@ class HasCompiledFunctions(object):
         if '_compiled_functions' in state:
             del state['_compiled_functions']
         return state
+
+
+def _graph_key(inputs, outputs, updates, givens):
+    """
+    Returns a structural hash of the graph of a function, and its shared
+    variables in the order in which they appear in it.
+
+    Variables are identified by their position in the graph rather than
+    their identity or name, so that the graphs built by two runs of the
+    same code have the same key. The values of the shared variables are
+    not part of the key.
+
+    Parameters
+    ----------
+    inputs : list
+        The explicit inputs of the function.
+    outputs : list
+        Its outputs.
+    updates : list
+        Its `(shared variable, new value)` pairs.
+    givens : list
+        Its `(variable, replacement)` pairs.
+
+    Returns
+    -------
+    key : hash object
+        A `hashlib` hash object describing the graph.
+    shared : list
+        The shared variables of the graph.
+    """
+    h = hashlib.sha1()
+
+    def update(token):
+        h.update(str(token).encode('utf-8'))
+
+    ids = {}
+    shared = []
+
+    def get_id(var):
+        if var not in ids:
+            ids[var] = len(ids)
+            if isinstance(var, SharedVariable):
+                shared.append(var)
+                update(('shared', ids[var]))
+            elif isinstance(var, graph.Constant):
+                update(('constant', ids[var]))
+                hash_update(h, np.asarray(var.data))
+            else:
+                update(('root', ids[var]))
+            hash_update(h, var.type)
+        return ids[var]
+
+    for var in inputs:
+        get_id(var)
+
+    # Shared variables with a default update (e.g. random streams) are
+    # updated by the function even if not in `updates`.
+    roots = list(outputs) + [v for pair in updates + givens for v in pair]
+    updated = set(var for var, _ in updates)
+    seen = set()
+    while True:
+        for node in graph.io_toposort(inputs, roots):
+            if node in seen:
+                continue
+            seen.add(node)
+            input_ids = [get_id(var) for var in node.inputs]
+            update(('apply', input_ids, len(node.outputs)))
+            hash_update(h, node.op)
+            for var in node.outputs:
+                ids[var] = len(ids)
+                hash_update(h, var.type)
+        default_updates = [
+            var for var in graph.inputs(roots)
+            if isinstance(var, SharedVariable) and var not in updated and
+            getattr(var, 'default_update', None) is not None]
+        if not default_updates:
+            break
+        for var in default_updates:
+            updated.add(var)
+            roots.append(var.default_update)
+            update(('default_update', get_id(var)))
+    update(('outputs', [get_id(var) for var in outputs]))
+    update(('updates', [(get_id(var), get_id(value))
+                        for var, value in updates]))
+    update(('givens', [(get_id(var), get_id(value))
+                       for var, value in givens]))
+    return h, shared
+
+
+class FunctionCache(object):
+    """
+    An on-disk cache of compiled Theano functions, so that repeated or
+    restarted jobs building the same training and monitoring functions
+    skip the optimization of their graphs.
+
+    Entries are keyed by a structural hash of the graph of the function
+    (which covers the model, the cost, the spaces and the learning rule
+    it was built from), of its compilation mode and of the Theano
+    configuration. On a hit, the pickled function is loaded without being
+    optimized again and bound to the shared variables of the new graph.
+    When the entries take more than `max_size` bytes, the least recently
+    used ones are evicted.
+
+    Parameters
+    ----------
+    cache_dir : str
+        The directory of the cache.
+    max_size : int, optional
+        The maximum size of the cache in bytes. If None, entries are
+        never evicted.
+
+    Notes
+    -----
+    An entry holds the values the shared variables had when the function
+    was compiled, as part of the pickle of the function.
+    """
+
+    def __init__(self, cache_dir, max_size=None):
+        self.cache_dir = os.path.abspath(string_utils.preprocess(cache_dir))
+        self.max_size = max_size
+
+    def get_key(self, inputs, outputs=None, updates=None, givens=None,
+                mode=None, **kwargs):
+        """
+        Returns the key of the function which `theano.function` would
+        compile from these arguments.
+
+        Parameters
+        ----------
+        inputs, outputs, updates, givens, mode, kwargs :
+            See `theano.function`.
+
+        Returns
+        -------
+        key : str
+            A hexadecimal digest.
+        shared : list
+            The shared variables of the graph, in the order used by the
+            entry.
+        """
+        if isinstance(outputs, (list, tuple)):
+            output_list = list(outputs)
+        elif outputs is None:
+            output_list = []
+        else:
+            output_list = [outputs]
+        updates = list(_pairs(updates))
+        givens = list(_pairs(givens))
+        for var in list(inputs) + output_list:
+            if not isinstance(var, graph.Variable):
+                raise Uncacheable("%s is not a Variable" % str(var))
+
+        h, shared = _graph_key(list(inputs), output_list, updates, givens)
+        hash_update(h, (type(outputs).__name__, sys.version_info[:2],
+                        theano.__version__, str(theano.config)))
+        if mode is None or isinstance(mode, six.string_types):
+            hash_update(h, mode)
+        else:
+            hash_update(h, (type(mode).__module__, type(mode).__name__,
+                            str(mode)))
+        hash_update(h, kwargs)
+        return h.hexdigest(), shared
+
+    def function(self, inputs, outputs=None, updates=None, givens=None,
+                 mode=None, name=None, **kwargs):
+        """
+        Returns the function which `theano.function` compiles from these
+        arguments, loading it from the cache if it was compiled before.
+
+        Parameters
+        ----------
+        inputs, outputs, updates, givens, mode, name, kwargs :
+            See `theano.function`.
+
+        Returns
+        -------
+        function : theano.compile.function_module.Function
+            The compiled function.
+        """
+        def compile_function():
+            return theano.function(inputs, outputs, updates=updates,
+                                   givens=givens, mode=mode, name=name,
+                                   **kwargs)
+
+        if mode is not None and hasattr(mode, 'record'):
+            return compile_function()
+        try:
+            key, shared = self.get_key(inputs, outputs, updates, givens,
+                                       mode, **kwargs)
+        except Uncacheable as e:
+            log.debug("Not caching %s: %s" % (name, e))
+            return compile_function()
+
+        entry = os.path.join(self.cache_dir, key + '.pkl')
+        fn = self._load(entry, shared, name)
+        if fn is not None:
+            log.info("Loaded %s from %s" % (name, entry))
+            return fn
+        fn = compile_function()
+        self._save(entry, fn, shared)
+        if self.max_size is not None:
+            self.evict(self.max_size)
+        return fn
+
+    def _load(self, entry, shared, name):
+        """
+        Loads the function of an entry and binds it to the `shared`
+        variables of the new graph, returning None if the entry does not
+        exist or cannot be used.
+        """
+        reoptimize = getattr(theano.config, 'reoptimize_unpickled_function',
+                             None)
+        try:
+            if reoptimize:
+                theano.config.reoptimize_unpickled_function = False
+            with open(entry, 'rb') as f:
+                fn, cached_shared = cPickle.load(f)
+        except IOError:
+            return None
+        except Exception as e:
+            log.warning("Could not load %s: %s" % (entry, e))
+            return None
+        finally:
+            if reoptimize:
+                theano.config.reoptimize_unpickled_function = reoptimize
+
+        fn_shared = [i.variable for i in fn.maker.inputs
+                     if isinstance(i.variable, SharedVariable)]
+        if len(cached_shared) != len(shared) or \
+                any(old.type != new.type
+                    for old, new in zip(cached_shared, shared)) or \
+                not all(any(var is old for old in cached_shared)
+                        for var in fn_shared):
+            log.warning("The shared variables of %s do not match the "
+                        "function being built, ignoring it." % entry)
+            return None
+        swap = dict((old, new) for old, new in zip(cached_shared, shared)
+                    if any(old is var for var in fn_shared))
+        try:
+            fn = fn.copy(swap=swap, name=name)
+        except TypeError:
+            # Function.copy(swap=...) requires Theano 0.8
+            return None
+        # mark the entry as recently used
+        try:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return fn
+
+    def _save(self, entry, fn, shared):
+        """
+        Writes the entry of `fn`. The file is written under a temporary
+        name and then renamed, so that concurrent jobs never read a
+        partial entry.
+        """
+        try:
+            if not os.path.isdir(self.cache_dir):
+                os.makedirs(self.cache_dir)
+        except OSError:
+            if not os.path.isdir(self.cache_dir):
+                raise
+        handle, tmp = tempfile.mkstemp(prefix='.tmp', dir=self.cache_dir)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                cPickle.dump((fn, shared), f, protocol=2)
+            os.rename(tmp, entry)
+        except Exception as e:
+            log.warning("Could not cache %s: %s" % (fn.name, e))
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def evict(self, max_size):
+        """
+        Removes the least recently used entries until the cache takes at
+        most `max_size` bytes.
+
+        Parameters
+        ----------
+        max_size : int
+            The maximum size of the cache in bytes.
+        """
+        def remove(entry):
+            log.info("Evicting compiled function %s" % entry)
+            try:
+                os.remove(entry)
+            except OSError:
+                # removed by another job
+                pass
+
+        evict_lru(glob.glob(os.path.join(self.cache_dir, '*.pkl')),
+                  max_size, remove)
+
+
+def _pairs(pairs):
+    """
+    Returns the `(variable, value)` pairs of `updates` or `givens`.
+    """
+    if pairs is None:
+        return []
+    if isinstance(pairs, dict):
+        return list(six.iteritems(pairs))
+    return [tuple(pair) for pair in pairs]
+
+
+_function_cache = None
+_function_cache_set = False
+
+# Seconds spent in cached_function, compiling or loading functions
+compile_seconds = 0.
+
+
+def get_function_cache():
+    """
+    Returns the cache used by `cached_function`.
+
+    Unless set with `set_function_cache`, it is a `FunctionCache` in the
+    directory given by the PYLEARN2_FUNCTION_CACHE environment variable,
+    bounded by PYLEARN2_FUNCTION_CACHE_SIZE bytes if defined, or None
+    (no caching) if PYLEARN2_FUNCTION_CACHE is not defined.
+
+    Returns
+    -------
+    cache : FunctionCache or None
+        The cache.
+    """
+    global _function_cache, _function_cache_set
+    if not _function_cache_set:
+        cache_dir = os.environ.get('PYLEARN2_FUNCTION_CACHE')
+        if cache_dir:
+            max_size = os.environ.get('PYLEARN2_FUNCTION_CACHE_SIZE')
+            if max_size is not None:
+                max_size = int(max_size)
+            _function_cache = FunctionCache(cache_dir, max_size)
+        _function_cache_set = True
+    return _function_cache
+
+
+def set_function_cache(cache):
+    """
+    Sets the cache used by `cached_function`.
+
+    Parameters
+    ----------
+    cache : FunctionCache or None
+        The cache. None disables caching.
+    """
+    global _function_cache, _function_cache_set
+    _function_cache = cache
+    _function_cache_set = True
+
+
+def cached_function(inputs, outputs=None, updates=None, givens=None,
+                    mode=None, name=None, on_unused_input='ignore',
+                    **kwargs):
+    """
+    A replacement for `pylearn2.utils.function` which takes the function
+    from the cache returned by `get_function_cache`, if any.
+
+    Parameters
+    ----------
+    inputs, outputs, updates, givens, mode, name, on_unused_input, kwargs :
+        See `theano.function`.
+
+    Returns
+    -------
+    function : theano.compile.function_module.Function
+        The compiled function.
+
+    Notes
+    -----
+    The time spent is added to the module-level `compile_seconds`.
+    """
+    global compile_seconds
+    start = time.time()
+    try:
+        cache = get_function_cache()
+        if cache is None:
+            return theano.function(inputs, outputs, updates=updates,
+                                   givens=givens, mode=mode, name=name,
+                                   on_unused_input=on_unused_input,
+                                   **kwargs)
+        return cache.function(inputs, outputs, updates=updates,
+                              givens=givens, mode=mode, name=name,
+                              on_unused_input=on_unused_input, **kwargs)
+    finally:
+        compile_seconds += time.time() - start
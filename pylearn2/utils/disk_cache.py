@@ -0,0 +1,289 @@
+"""
+Utilities shared by the on-disk caches of pylearn2: hashing objects by
+content to key the entries, evicting the least recently used entries,
+and locking the entries between processes.
+"""
+from contextlib import contextmanager
+import functools
+import hashlib
+import io
+import os
+import types
+
+import numpy
+import theano
+from theano.compat import six
+from theano.compat.six.moves import cPickle, xrange
+
+try:
+    import copyreg
+except ImportError:
+    # Python 2
+    import copy_reg as copyreg
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+
+__license__ = "3-clause BSD"
+__maintainer__ = "LISA Lab"
+__email__ = "pylearn-dev@googlegroups"
+
+
+class Uncacheable(Exception):
+    """
+    Raised by `hash_update` for objects whose state it cannot hash, so
+    that the caller computes the result without caching it rather than
+    risking to return the entry of a different object.
+    """
+
+
+def hash_update(h, obj, memo=None):
+    """
+    Updates the hash `h` with the contents of `obj`.
+
+    Arrays are hashed by content, objects by class and attributes (or
+    slots), and functions by code, defaults and closure, so that two
+    equal configurations built in different processes have the same
+    hash. Theano ops are hashed by their `__props__` if they declare
+    them and by their pickle otherwise, Theano types by description,
+    Theano variables by type and name (and value, for shared variables),
+    and compiled functions by class only, as they are derived from the
+    rest of the state.
+
+    Parameters
+    ----------
+    h : hashlib hash
+        The hash to update.
+    obj : object
+        The object to hash.
+    memo : set, optional
+        The ids of the objects already hashed, to stop at cycles.
+
+    Raises
+    ------
+    Uncacheable
+        If `obj` holds an object whose state is not accessible from
+        Python (for instance an open file).
+    """
+    def update(token):
+        h.update(str(token).encode('utf-8'))
+
+    if memo is None:
+        memo = set()
+    if obj is None or isinstance(obj, (bool, float, complex) +
+                                 six.string_types + six.integer_types +
+                                 (numpy.generic,)):
+        # the type tells apart e.g. 1.0 and numpy.float32(1.0)
+        update((type(obj).__name__, repr(obj)))
+        return
+    if isinstance(obj, bytes):
+        update(('bytes', len(obj)))
+        h.update(obj)
+        return
+    if isinstance(obj, numpy.dtype):
+        # str alone is '|V<n>' for every record dtype of n bytes
+        update(('dtype', obj.str, obj.descr))
+        return
+    if isinstance(obj, type):
+        update(('class', obj.__module__, obj.__name__))
+        return
+    if id(obj) in memo:
+        update('<cycle>')
+        return
+    memo.add(id(obj))
+    if isinstance(obj, numpy.ndarray):
+        update(('ndarray', obj.dtype.str, obj.dtype.descr, obj.shape))
+        if obj.dtype.hasobject:
+            # the buffer holds pointers
+            hash_update(h, obj.tolist(), memo)
+            return
+        obj = numpy.atleast_1d(obj)
+        rows = max(1, (1 << 24) // max(1, obj[:1].nbytes))
+        for i in xrange(0, obj.shape[0], rows):
+            h.update(numpy.ascontiguousarray(obj[i:i + rows]).data)
+    elif isinstance(obj, (list, tuple)):
+        update((type(obj).__name__, len(obj)))
+        for item in obj:
+            hash_update(h, item, memo)
+    elif isinstance(obj, dict):
+        update(('dict', len(obj)))
+        for key in sorted(obj, key=repr):
+            update(repr(key))
+            hash_update(h, obj[key], memo)
+    elif isinstance(obj, (set, frozenset)):
+        # iteration order depends on the hashes of the items, which may
+        # differ between processes, so the digests of the items are sorted
+        digests = []
+        for item in obj:
+            item_hash = hashlib.new(h.name)
+            hash_update(item_hash, item, set(memo))
+            digests.append(item_hash.hexdigest())
+        update((type(obj).__name__, sorted(digests)))
+    elif isinstance(obj, types.FunctionType):
+        update(('function', obj.__module__, obj.__name__))
+        hash_update(h, obj.__code__, memo)
+        hash_update(h, obj.__defaults__, memo)
+        hash_update(h, [cell.cell_contents
+                        for cell in obj.__closure__ or ()], memo)
+    elif isinstance(obj, types.CodeType):
+        update(('code', obj.co_name, obj.co_names, obj.co_varnames))
+        hash_update(h, obj.co_code, memo)
+        hash_update(h, obj.co_consts, memo)
+    elif isinstance(obj, types.MethodType):
+        update(('method', obj.__func__.__name__))
+        hash_update(h, obj.__func__, memo)
+        hash_update(h, obj.__self__, memo)
+    elif isinstance(obj, types.BuiltinFunctionType):
+        update(('builtin', getattr(obj, '__module__', None), obj.__name__))
+        if not isinstance(getattr(obj, '__self__', None), types.ModuleType):
+            hash_update(h, obj.__self__, memo)
+    elif isinstance(obj, numpy.ufunc):
+        update(('ufunc', obj.__name__))
+    elif isinstance(obj, functools.partial):
+        update('partial')
+        hash_update(h, (obj.func, obj.args, obj.keywords), memo)
+    elif isinstance(obj, types.ModuleType):
+        update(('module', obj.__name__))
+    elif isinstance(obj, numpy.random.RandomState):
+        hash_update(h, obj.get_state(), memo)
+    elif isinstance(obj, theano.gof.Type):
+        update(('type', type(obj).__module__, str(obj),
+                getattr(obj, 'broadcastable', None)))
+    elif isinstance(obj, theano.compile.SharedVariable):
+        update(('shared', obj.type, obj.name))
+        hash_update(h, obj.get_value(borrow=True), memo)
+    elif isinstance(obj, theano.gof.Variable):
+        update(('variable', obj.type, obj.name))
+    elif isinstance(obj, theano.compile.function_module.Function):
+        update('function')
+    elif hasattr(obj, '__props__'):
+        update((type(obj).__module__, type(obj).__name__))
+        for prop in obj.__props__:
+            update(prop)
+            hash_update(h, getattr(obj, prop), memo)
+    elif isinstance(obj, theano.gof.Op):
+        # Ops without __props__, e.g. those holding an inner graph, whose
+        # structure the attributes of the nodes do not describe: their
+        # pickle does. A pickle which differs between processes only
+        # causes misses.
+        update((type(obj).__module__, type(obj).__name__))
+        try:
+            h.update(cPickle.dumps(obj, protocol=2))
+        except Exception as e:
+            raise Uncacheable("Cannot describe %s: %s" % (obj, e))
+    elif isinstance(obj, io.IOBase):
+        raise Uncacheable("Cannot hash the state of %s objects" %
+                          type(obj).__name__)
+    elif hasattr(obj, '__dict__') or _slots(type(obj)):
+        update((type(obj).__module__, type(obj).__name__))
+        hash_update(h, getattr(obj, '__dict__', {}), memo)
+        hash_update(h, [getattr(obj, name, '<unset>')
+                        for name in _slots(type(obj))], memo)
+    else:
+        # Types implemented in C, whose state is only accessible through
+        # the pickle protocol (e.g. slice, datetime, compiled regexps)
+        reducer = copyreg.dispatch_table.get(type(obj))
+        try:
+            if reducer is not None:
+                reduced = reducer(obj)
+            else:
+                reduced = obj.__reduce_ex__(2)
+        except Exception:
+            reduced = None
+        if not isinstance(reduced, tuple) or len(reduced) < 2:
+            raise Uncacheable("Cannot hash the state of %s objects" %
+                              type(obj).__name__)
+        update((type(obj).__module__, type(obj).__name__))
+        hash_update(h, reduced[1:], memo)
+
+
+def _slots(cls):
+    """
+    Returns the names of the slots declared by `cls` and its bases.
+
+    Parameters
+    ----------
+    cls : type
+        The class.
+    """
+    names = []
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get('__slots__', ())
+        if isinstance(slots, six.string_types):
+            slots = (slots,)
+        names.extend(name for name in slots
+                     if name not in ('__dict__', '__weakref__'))
+    return names
+
+
+def evict_lru(paths, max_size, remove):
+    """
+    Removes the least recently used of the entries `paths` until they
+    take at most `max_size` bytes.
+
+    An entry is used when it is modified, or its modification time is
+    updated with `os.utime`. Its size is that of the file, or of the
+    files in the directory. Entries removed by another process meanwhile
+    are skipped.
+
+    Parameters
+    ----------
+    paths : list
+        The files or directories of the entries.
+    max_size : int
+        The maximum size of the entries in bytes.
+    remove : callable
+        Called with the path of an entry to remove it. Returns False if
+        the entry was kept, e.g. because it is in use.
+    """
+    entries = []
+    for path in paths:
+        try:
+            if os.path.isdir(path):
+                size = 0
+                for dirpath, dirnames, filenames in os.walk(path):
+                    size += sum(os.path.getsize(os.path.join(dirpath, f))
+                                for f in filenames)
+            else:
+                size = os.path.getsize(path)
+            entries.append((os.path.getmtime(path), size, path))
+        except OSError:
+            # removed by another process
+            continue
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        if remove(path) is not False:
+            total -= size
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Holds an exclusive lock on `path` for the duration of a `with`
+    block, waiting for other processes to release it first.
+
+    The lock is an `fcntl.flock` on an open descriptor of `path`, which
+    is created if needed and never removed. The operating system releases
+    it when the descriptor is closed, even if the process is killed, so
+    unlike lock directories it never goes stale and never needs to be
+    broken. Where `fcntl` is not available, no lock is taken.
+
+    Parameters
+    ----------
+    path : str
+        The lock file.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,96 @@
+"""
+Sharing state with the processes of a `multiprocessing.Pool` by forking.
+
+The arguments of the tasks of a pool are pickled and sent to the
+processes, which is costly for large objects such as datasets or compiled
+Theano functions. A `ForkedState` instead holds such an object in the
+parent process while the pool is created: the forked processes inherit a
+copy-on-write view of the parent's memory, and read the object from the
+same `ForkedState`. This only works with the fork start method, which
+`fork_pool` requires, so it is not available on Windows.
+"""
+from contextlib import contextmanager
+import sys
+
+
+class ForkedState(object):
+    """
+    A value inherited by the processes of the pools created by
+    `fork_pool` while it is bound.
+
+    Instances should be module-level globals, so that the functions run
+    by the processes can find them.
+
+    Examples
+    --------
+    >>> _state = ForkedState()
+    >>> def _task(i):
+    ...     return _state.value[i]
+    >>> with _state.bind(big_array):
+    ...     pool = fork_pool(4)
+    ...     results = pool.map(_task, range(10))
+    """
+
+    def __init__(self):
+        self.value = None
+
+    @contextmanager
+    def bind(self, value):
+        """
+        Sets the value for the duration of a `with` block, in which the
+        pools inheriting it must be created. The value is also available
+        to the tasks run in the parent process itself.
+
+        Parameters
+        ----------
+        value : object
+            The value to share.
+        """
+        previous = self.value
+        self.value = value
+        try:
+            yield value
+        finally:
+            self.value = previous
+
+
+def fork_pool(processes, initializer=None, initargs=()):
+    """
+    Creates a `multiprocessing.Pool` whose processes are forked, so that
+    they inherit the values of the bound `ForkedState` objects.
+
+    Parameters
+    ----------
+    processes : int
+        The number of processes.
+    initializer : callable, optional
+        Called with `initargs` at the start of each process.
+    initargs : tuple, optional
+        The arguments of `initializer`.
+
+    Returns
+    -------
+    pool : multiprocessing.Pool
+        The pool, which the caller must close or terminate, and join.
+
+    Raises
+    ------
+    NotImplementedError
+        If the platform cannot fork processes.
+    """
+    import multiprocessing
+    if hasattr(multiprocessing, 'get_context'):
+        # Python >= 3.4, where the default start method may not fork
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            context = None
+    elif sys.platform == 'win32':
+        context = None
+    else:
+        context = multiprocessing
+    if context is None:
+        raise NotImplementedError("Sharing state with forked processes "
+                                  "requires a platform that can fork "
+                                  "processes.")
+    return context.Pool(processes, initializer, initargs)
@@ -14,12 +14,23 @@ Presets:
 - random_uniform: on each call to next, returns a random subset of the
   dataset. Samples with replacement, but still reports that
   container is empty after num_examples / batch_size calls
+- chunk_shuffled_sequential: shuffles the order of fixed-size chunks of
+  contiguous examples, then shuffles the examples within windows of a
+  few chunks, so that every batch only touches a handful of chunks
+- bucketed_sequences: groups sequences of similar lengths into batches,
+  by length buckets or by sorting windows of shuffled sequences, and
+  returns the batches in random order
 """
 from __future__ import division
 
+import sys
+import threading
+import traceback
 import warnings
+import weakref
 import numpy as np
 from theano.compat import six
+from theano.compat.six.moves import queue, xrange
 
 from pylearn2.space import CompositeSpace
 from pylearn2.utils import safe_izip, wraps
@@ -111,6 +122,60 @@ class SubsetIterator(object):
     def __iter__(self):
         return self
 
+    def get_state(self):
+        """
+        Returns the iteration state: the position in the iteration and,
+        for stochastic iterators, the order of the examples and the
+        state of the random number generator.
+
+        Returns
+        -------
+        state : dict
+            A picklable dictionary that `set_state` accepts.
+        """
+        if self._state_names is None:
+            raise NotImplementedError(str(type(self)) + " does not "
+                                      "implement get_state.")
+        state = {}
+        for name in self._state_names:
+            value = getattr(self, name)
+            if name == '_rng':
+                value = value.get_state()
+            elif isinstance(value, (list, dict)):
+                # Copy the containers that next() modifies in place
+                value = copy.copy(value)
+            state[name] = value
+        return state
+
+    def set_state(self, state):
+        """
+        Restores the iteration state returned by `get_state`, so that
+        the following batches are the ones that followed the call to
+        `get_state`.
+
+        Parameters
+        ----------
+        state : dict
+            The return value of `get_state` on an iterator of the same
+            class, created with the same dataset size, batch size and
+            number of batches.
+        """
+        if self._state_names is None:
+            raise NotImplementedError(str(type(self)) + " does not "
+                                      "implement set_state.")
+        for name in self._state_names:
+            value = state[name]
+            if name == '_rng':
+                self._rng.set_state(value)
+            else:
+                if isinstance(value, (list, dict)):
+                    value = copy.copy(value)
+                setattr(self, name, value)
+
+    # Names of the attributes holding the iteration state, saved by
+    # get_state. None if the iterator does not support saving its state.
+    _state_names = None
+
     # Does this return subsets that need fancy indexing? (i.e. lists
     # of indices)
     fancy = False
@@ -330,6 +395,14 @@ class ForcedEvenIterator(SubsetIterator):
     def __next__(self):
         return self.next()
 
+    @wraps(SubsetIterator.get_state)
+    def get_state(self):
+        return self._base_iterator.get_state()
+
+    @wraps(SubsetIterator.set_state)
+    def set_state(self, state):
+        self._base_iterator.set_state(state)
+
 
 def as_even(iterator_cls):
     """
@@ -424,6 +497,7 @@ class SequentialSubsetIterator(SubsetIterator):
     fancy = False
     stochastic = False
     uniform_batch_size = False
+    _state_names = ('_idx', '_batch')
 
     @property
     @wraps(SubsetIterator.num_examples, assigned=(), updated=())
@@ -452,6 +526,7 @@ class ShuffledSequentialSubsetIterator(SequentialSubsetIterator):
     stochastic = True
     fancy = True
     uniform_batch_size = False
+    _state_names = ('_idx', '_batch', '_shuffled', '_rng')
 
     def __init__(self, dataset_size, batch_size, num_batches, rng=None):
         super(ShuffledSequentialSubsetIterator, self).__init__(
@@ -462,6 +537,13 @@ class ShuffledSequentialSubsetIterator(SequentialSubsetIterator):
         )
         self._rng = make_np_rng(rng, which_method=["random_integers",
                                                    "shuffle"])
+        self._shuffle()
+
+    def _shuffle(self):
+        """
+        Builds the permutation of the example indices that batches are
+        taken from, in `self._shuffled`.
+        """
         self._shuffled = np.arange(self._dataset_size)
         self._rng.shuffle(self._shuffled)
 
@@ -485,6 +567,85 @@ class ShuffledSequentialSubsetIterator(SequentialSubsetIterator):
         return self.next()
 
 
+class ChunkShuffledSubsetIterator(ShuffledSequentialSubsetIterator):
+    """
+    Shuffles the dataset at the chunk level for locality of access.
+
+    The example indices are split into chunks of `chunk_size` contiguous
+    examples. The order of the chunks is shuffled, then the examples are
+    shuffled within windows of `window_chunks` consecutive chunks (in the
+    shuffled chunk order). Batches proceed sequentially through the
+    resulting permutation, so each batch spans at most two windows. This
+    gives stochastic batches while keeping accesses local, which is what
+    on-disk datasets such as HDF5 files with chunked storage need.
+
+    Parameters
+    ----------
+    dataset_size : int
+    batch_size : int
+    num_batches : int
+    rng : `np.random.RandomState` or seed, optional
+    chunk_size : int, optional
+        The number of contiguous examples in a chunk. Defaults to
+        `default_chunk_size`. For HDF5 files it should be (a multiple
+        of) the number of examples in a storage chunk.
+    window_chunks : int, optional
+        The number of chunks whose examples are shuffled together.
+        Defaults to `default_window_chunks`.
+
+    Notes
+    -----
+    Returns lists of indices (`fancy = True`).
+
+    See :py:class:`SubsetIterator` for detailed constructor parameter
+    and attribute documentation.
+    """
+    default_chunk_size = 1024
+    default_window_chunks = 8
+
+    def __init__(self, dataset_size, batch_size, num_batches, rng=None,
+                 chunk_size=None, window_chunks=None):
+        if chunk_size is None:
+            chunk_size = self.default_chunk_size
+        if window_chunks is None:
+            window_chunks = self.default_window_chunks
+        if chunk_size <= 0 or window_chunks <= 0:
+            raise ValueError("chunk_size and window_chunks must be positive, "
+                             "got %s and %s" % (chunk_size, window_chunks))
+        self._chunk_size = chunk_size
+        self._window_chunks = window_chunks
+        super(ChunkShuffledSubsetIterator, self).__init__(
+            dataset_size,
+            batch_size,
+            num_batches,
+            rng
+        )
+
+    def _shuffle(self):
+        """
+        Builds the chunk-level permutation of the example indices.
+        """
+        num_chunks = int(np.ceil(self._dataset_size / self._chunk_size))
+        chunk_order = self._rng.permutation(num_chunks)
+        window_size = self._chunk_size * self._window_chunks
+        self._shuffled = np.empty(self._dataset_size, dtype='int64')
+        pos = 0
+        for start in xrange(0, num_chunks, self._window_chunks):
+            window = np.concatenate([
+                np.arange(c * self._chunk_size,
+                          min((c + 1) * self._chunk_size, self._dataset_size))
+                for c in chunk_order[start:start + self._window_chunks]])
+            assert window.shape[0] <= window_size
+            self._rng.shuffle(window)
+            self._shuffled[pos:pos + window.shape[0]] = window
+            pos += window.shape[0]
+        assert pos == self._dataset_size
+
+    fancy = True
+    stochastic = True
+    uniform_batch_size = False
+
+
 class RandomUniformSubsetIterator(SubsetIterator):
     """
     Selects minibatches of examples by drawing indices uniformly
@@ -529,6 +690,7 @@ class RandomUniformSubsetIterator(SubsetIterator):
     fancy = True
     stochastic = True
     uniform_batch_size = True
+    _state_names = ('_next_batch_no', '_rng')
 
 
 class RandomSliceSubsetIterator(RandomUniformSubsetIterator):
@@ -638,6 +800,7 @@ class BatchwiseShuffledSequentialIterator(SequentialSubsetIterator):
     fancy = False
     stochastic = True
     uniform_batch_size = False
+    _state_names = ('_next_batch_no', '_batch_order', '_rng')
 
 
 class EvenSequencesSubsetIterator(SubsetIterator):
@@ -757,6 +920,138 @@ class EvenSequencesSubsetIterator(SubsetIterator):
     fancy = True
     stochastic = True
     uniform_batch_size = False
+    _state_names = ('len_unique', 'len_indices', 'len_curr_counts',
+                    'len_indices_pos', 'total_curr_counts', 'len_idx',
+                    '_rng')
+
+
+class BucketedSequencesSubsetIterator(SubsetIterator):
+    """
+    An iterator for datasets with sequential data (e.g. list of words)
+    which returns minibatches of sequences of similar lengths, so that
+    little padding is needed to batch them together.
+
+    The sequences are either sorted into buckets of lengths delimited by
+    `boundaries`, or, by default, shuffled and sorted by length within
+    windows of `sort_window` minibatches. Each bucket or window is cut
+    into minibatches of `batch_size` sequences, and the minibatches are
+    returned in random order. Unlike `EvenSequencesSubsetIterator`,
+    sequences of different lengths share minibatches, so only the last
+    minibatch of each bucket or window can be smaller than `batch_size`.
+
+    Notes
+    -----
+    Returns arrays of indices (`fancy = True`).
+
+    Parameters
+    ----------
+    sequence_data : list of lists or ndarray of objects (ndarrays)
+        The sequential data whose lengths determine the minibatches.
+    batch_size : int
+        The maximum number of sequences in a minibatch.
+    num_batches : None
+        Not supported, the number of batches depends on the lengths.
+    rng : `np.random.RandomState` or seed, optional
+        A `np.random.RandomState` object or the seed to be used to
+        create one.
+    boundaries : list of int, optional
+        Increasing sequence lengths delimiting the buckets: bucket `i`
+        holds the sequences whose lengths are in
+        `(boundaries[i - 1], boundaries[i]]`, and the last bucket the
+        sequences longer than `boundaries[-1]`. Defaults to
+        `default_boundaries`. If None, windows are sorted instead.
+    sort_window : int, optional
+        The number of minibatches in a window of shuffled sequences
+        sorted by length, when there are no `boundaries`. Larger windows
+        waste less padding but make minibatches less random. Defaults to
+        `default_sort_window`.
+
+    See :py:class:`SubsetIterator` for detailed constructor parameter
+    and attribute documentation.
+    """
+    default_boundaries = None
+    default_sort_window = 20
+
+    def __init__(self, sequence_data, batch_size, num_batches=None, rng=None,
+                 boundaries=None, sort_window=None):
+        self._rng = make_np_rng(rng, which_method=["permutation"])
+        if batch_size is None:
+            raise ValueError("batch_size cannot be None for bucketed "
+                             "sequences iteration")
+        if num_batches is not None:
+            raise ValueError("BucketedSequencesSubsetIterator doesn't "
+                             "support fixed number of batches")
+        if not isinstance(sequence_data, (list, np.ndarray)):
+            raise ValueError("sequence_data must be of type list or"
+                             " ndarray")
+        if boundaries is None:
+            boundaries = self.default_boundaries
+        if sort_window is None:
+            sort_window = self.default_sort_window
+        if boundaries is not None:
+            boundaries = np.asarray(boundaries)
+            if np.any(np.diff(boundaries) <= 0):
+                raise ValueError("boundaries must be increasing, got %s" %
+                                 str(boundaries))
+        elif sort_window <= 0:
+            raise ValueError("sort_window must be positive, got %s" %
+                             str(sort_window))
+        self._dataset_size = len(sequence_data)
+        self._lengths = np.fromiter((len(s) for s in sequence_data),
+                                    dtype='int64', count=self._dataset_size)
+        self._batch_size = batch_size
+        self._boundaries = boundaries
+        self._sort_window = sort_window
+        self.reset()
+        self._num_batches = len(self._batches)
+
+    def reset(self):
+        """
+        Draws the minibatches of a new epoch.
+        """
+        batch_size = self._batch_size
+        perm = self._rng.permutation(self._dataset_size)
+        if self._boundaries is not None:
+            buckets = np.searchsorted(self._boundaries, self._lengths[perm])
+            # A stable sort keeps the sequences shuffled within buckets
+            perm = perm[np.argsort(buckets, kind='mergesort')]
+            counts = np.bincount(buckets,
+                                 minlength=len(self._boundaries) + 1)
+            groups = np.split(perm, np.cumsum(counts)[:-1])
+        else:
+            window = batch_size * self._sort_window
+            groups = [perm[start:start + window]
+                      for start in xrange(0, self._dataset_size, window)]
+            groups = [group[np.argsort(self._lengths[group],
+                                       kind='mergesort')]
+                      for group in groups]
+        batches = [group[start:start + batch_size] for group in groups
+                   for start in xrange(0, len(group), batch_size)]
+        self._batches = [batches[i]
+                         for i in self._rng.permutation(len(batches))]
+        self._next_batch_no = 0
+
+    @wraps(SubsetIterator.next)
+    def next(self):
+        if self._next_batch_no >= len(self._batches):
+            self.reset()
+            raise StopIteration()
+        self._last = self._batches[self._next_batch_no]
+        self._next_batch_no += 1
+        return self._last
+
+    def __next__(self):
+        return self.next()
+
+    @property
+    @wraps(SubsetIterator.num_examples, assigned=(), updated=())
+    def num_examples(self):
+        return self._dataset_size
+
+    fancy = True
+    stochastic = True
+    uniform_batch_size = False
+    _state_names = ('_batches', '_next_batch_no', '_rng')
 
 
 _iteration_schemes = {
@@ -770,6 +1065,8 @@ _iteration_schemes = {
     'even_batchwise_shuffled_sequential':
     as_even(BatchwiseShuffledSequentialIterator),
     'even_sequences': EvenSequencesSubsetIterator,
+    'bucketed_sequences': BucketedSequencesSubsetIterator,
+    'chunk_shuffled_sequential': ChunkShuffledSubsetIterator,
 }
 
 
@@ -827,6 +1124,89 @@ def resolve_iterator_class(mode):
     return subset_iter_class
 
 
+class _PrefetchTraceback(Exception):
+    """
+    The cause of an error of the prefetching thread re-raised by `next`,
+    holding the text of its traceback in the thread.
+
+    Parameters
+    ----------
+    tb : str
+        The formatted traceback.
+    """
+
+    def __init__(self, tb):
+        super(_PrefetchTraceback, self).__init__(tb)
+        self.tb = tb
+
+    def __str__(self):
+        return '\n\n' + self.tb
+
+
+def _clear_tracebacks(exc):
+    """
+    Removes the traceback of `exc`, and those of the exceptions it was
+    raised from, so that their frames are not kept alive.
+
+    Parameters
+    ----------
+    exc : Exception
+        The exception.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        exc.__traceback__ = None
+        exc = (getattr(exc, '__cause__', None) or
+               getattr(exc, '__context__', None))
+
+
+def _prefetch_worker(iterator_ref, batches, stop):
+    """
+    Body of the prefetching thread of a `FiniteDatasetIterator`: fetches
+    batches until the subset iterator is exhausted, an error occurs, or
+    `stop` is set by `close` or by the garbage collection of the
+    iterator. A `(None, None)` item signals the end of the iteration and
+    a `(None, (exception, traceback))` item an error to be re-raised by
+    `next`, with the text of its traceback: the traceback itself would
+    keep the frames of `_fetch`, hence the iterator, alive.
+
+    Parameters
+    ----------
+    iterator_ref : weakref.ref
+        A weak reference to the iterator, which is only dereferenced
+        while fetching a batch.
+    batches : queue.Queue
+        The bounded queue of prefetched batches.
+    stop : threading.Event
+        Tells the thread to stop.
+    """
+    while not stop.is_set():
+        iterator = iterator_ref()
+        if iterator is None:
+            return
+        try:
+            item = (iterator._fetch(), None)
+        except StopIteration:
+            item = (None, None)
+        except Exception as e:
+            item = (None, (e, traceback.format_exc()))
+            _clear_tracebacks(e)
+        del iterator
+        if hasattr(sys, 'exc_clear'):
+            # Python 2 keeps the last exception handled by the thread
+            sys.exc_clear()
+        # Use a timeout so that a full queue does not prevent stopping.
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        if item[0] is None:
+            return
+
+
 class FiniteDatasetIterator(object):
     """
     A wrapper around subset iterators that actually retrieves
@@ -850,6 +1230,31 @@ class FiniteDatasetIterator(object):
         A list of callables, in the same order as the sources
         in `data_specs`, that will be called on the individual
         source batches prior to any further processing.
+    prefetch : int, optional
+        If set to a positive integer, batches are fetched and formatted
+        by a background thread which keeps up to `prefetch` ready
+        batches in a bounded queue, so that the data path overlaps with
+        whatever the consumer does with the previous batch. Defaults to
+        `None` (batches are fetched synchronously in `next`).
+    batch_buffers : int, optional
+        If set to a positive integer, batches selected with lists of
+        indices (e.g. by shuffled or random uniform iteration) are
+        written with `np.take` into preallocated per-iterator buffers
+        instead of allocating a new array for every batch. The iterator
+        cycles through `batch_buffers` sets of buffers, so a batch
+        remains valid until `batch_buffers` more batches have been
+        returned: use 1 if each batch is consumed before the next call
+        to `next`, 2 (double buffering) if the consumer needs to hold on
+        to the previous batch. Only applies to in-memory `ndarray`
+        sources of datasets using the `get_data` interface. Defaults to
+        `None` (a new array is allocated for every batch).
+    raw_data : dict, optional
+        Maps source names to array-like objects that are indexed with
+        the batch indices instead of the data returned by the dataset
+        for these sources, e.g. a copy of that data stored in another
+        layout. The batches are then passed to the matching `convert`
+        callable. Only applies to datasets using the `get_data`
+        interface.
 
     Notes
     -----
@@ -860,14 +1265,52 @@ class FiniteDatasetIterator(object):
     identifiers and a list or slice of indexes and returns a tuple of batches
     of examples, one for each source. The old interface using `get_data` is
     still supported for the moment being.
+
+    When prefetching, the subset iterator and the dataset are only ever
+    accessed from the worker thread, so the sequence of batches is the
+    same as without prefetching. The dataset must not be modified while
+    the iterator is in use. When combining prefetching with
+    `batch_buffers`, at least `prefetch + 2` buffers are required so
+    that neither the queued batches nor the one held by the consumer get
+    overwritten. The worker thread is a daemon thread that only holds a
+    weak reference to the iterator, so it also stops when an unfinished
+    iterator is garbage collected without `close` having been called.
+
+    If the subset iterator implements `get_state`, so does this iterator,
+    which makes it possible to resume an interrupted iteration exactly.
     """
 
     def __init__(self, dataset, subset_iterator, data_specs=None,
-                 return_tuple=False, convert=None):
+                 return_tuple=False, convert=None, prefetch=None,
+                 batch_buffers=None, raw_data=None):
         self._data_specs = data_specs
         self._dataset = dataset
         self._subset_iterator = subset_iterator
         self._return_tuple = return_tuple
+        if prefetch is not None and prefetch < 0:
+            raise ValueError("prefetch must be a non-negative integer, got "
+                             "%s" % str(prefetch))
+        self._prefetch = prefetch
+        self._prefetch_thread = None
+        self._exhausted = False
+        if batch_buffers is not None and batch_buffers < 0:
+            raise ValueError("batch_buffers must be a non-negative integer, "
+                             "got %s" % str(batch_buffers))
+        if prefetch and batch_buffers and batch_buffers < prefetch + 2:
+            raise ValueError("prefetching %d batches requires at least %d "
+                             "batch_buffers, got %d" %
+                             (prefetch, prefetch + 2, batch_buffers))
+        self._batch_buffers = batch_buffers
+        self._buffers = None
+        self._buffer_idx = 0
+        # get_state describes the position as the state of the subset
+        # iterator at creation plus the number of batches returned since,
+        # because the subset iterator runs ahead when prefetching.
+        try:
+            self._initial_state = subset_iterator.get_state()
+        except (AttributeError, NotImplementedError):
+            self._initial_state = None
+        self._num_batches_returned = 0
 
         # Keep only the needed sources in self._raw_data.
         # Remember what source they correspond to in self._source
@@ -904,15 +1347,21 @@ class FiniteDatasetIterator(object):
             all_data = self._dataset.get_data()
             if not isinstance(all_data, tuple):
                 all_data = (all_data,)
-            raw_data = []
+            source_data = []
             for s in source:
+                if raw_data and s in raw_data:
+                    source_data.append(raw_data[s])
+                    continue
                 try:
-                    raw_data.append(all_data[dataset_source.index(s)])
+                    source_data.append(all_data[dataset_source.index(s)])
                 except ValueError as e:
                     msg = str(e) + '\nThe dataset does not provide '\
                                    'a source with name: ' + s + '.'
                     reraise_as(ValueError(msg))
-            self._raw_data = tuple(raw_data)
+            self._raw_data = tuple(source_data)
+        elif raw_data:
+            raise ValueError("raw_data only applies to datasets using the "
+                             "get_data interface.")
 
         self._source = source
         self._space = sub_spaces
@@ -970,18 +1419,109 @@ class FiniteDatasetIterator(object):
         StopIteration
             When there are no more batches to return.
         """
+        if self._prefetch:
+            rval = self._next_prefetched()
+        else:
+            rval = self._fetch()
+        self._num_batches_returned += 1
+
+        if not self._return_tuple and len(rval) == 1:
+            rval, = rval
+        return rval
+
+    def get_state(self):
+        """
+        Returns the position of the iteration, i.e. which batches have
+        already been returned.
+
+        Returns
+        -------
+        state : dict
+            A picklable dictionary that `set_state` accepts.
+        """
+        if self._initial_state is None:
+            raise NotImplementedError("The subset iterator (%s) does not "
+                                      "implement get_state." %
+                                      type(self._subset_iterator))
+        return {'subset_iterator': self._initial_state,
+                'num_batches_returned': self._num_batches_returned}
+
+    def set_state(self, state):
+        """
+        Makes the iterator continue an iteration from the position
+        returned by `get_state`: the next batch is the one that followed
+        the call to `get_state`. Only the indices of the skipped batches
+        are generated, their data is not read.
+
+        Parameters
+        ----------
+        state : dict
+            The return value of `get_state` on an iterator over the same
+            dataset, created with the same arguments.
+        """
+        if self._num_batches_returned > 0 or self._prefetch_thread is not None:
+            raise ValueError("set_state must be called before iterating.")
+        self._subset_iterator.set_state(state['subset_iterator'])
+        for i in xrange(state['num_batches_returned']):
+            self._subset_iterator.next()
+        self._initial_state = state['subset_iterator']
+        self._num_batches_returned = state['num_batches_returned']
+
+    def _fetch(self):
+        """
+        Retrieves and formats the next batch, as a tuple with one
+        element per source.
+        """
         next_index = self._subset_iterator.next()
         # If the dataset is incompatible with the new interface, fall back to
         # the old one
         if hasattr(self._dataset, 'get'):
-            rval = self._next(next_index)
+            return self._next(next_index)
         else:
-            rval = self._fallback_next(next_index)
+            return self._fallback_next(next_index)
 
-        if not self._return_tuple and len(rval) == 1:
-            rval, = rval
+    def _next_prefetched(self):
+        """
+        Pops the next batch from the prefetch queue, starting the worker
+        thread on the first call.
+        """
+        if self._exhausted:
+            raise StopIteration()
+        if self._prefetch_thread is None:
+            self._queue = queue.Queue(maxsize=self._prefetch)
+            self._stop_prefetch = stop = threading.Event()
+            # The thread must not keep the iterator alive: the callback
+            # stops it when the iterator is garbage collected.
+            iterator_ref = weakref.ref(self, lambda ref: stop.set())
+            self._prefetch_thread = threading.Thread(
+                target=_prefetch_worker,
+                args=(iterator_ref, self._queue, stop))
+            self._prefetch_thread.daemon = True
+            self._prefetch_thread.start()
+
+        rval, error = self._queue.get()
+        if error is not None:
+            self._exhausted = True
+            exc, tb = error
+            # Python 3 displays the traceback of the thread as the cause
+            exc.__cause__ = _PrefetchTraceback(tb)
+            raise exc
+        if rval is None:
+            self._exhausted = True
+            raise StopIteration()
         return rval
 
+    def close(self):
+        """
+        Stops the prefetching thread, if any. Batches that were already
+        prefetched are discarded and the iterator is marked as exhausted.
+        """
+        if self._prefetch_thread is not None:
+            self._stop_prefetch.set()
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
+        self._exhausted = True
+
     def _next(self, next_index):
         return tuple(
             fn(batch) if fn else batch for batch, fn in
@@ -990,13 +1530,45 @@ class FiniteDatasetIterator(object):
         )
 
     def _fallback_next(self, next_index):
-        # TODO: handle fancy-index copies by allocating a buffer and
-        # using np.take()
+        if self._batch_buffers and not isinstance(next_index, slice):
+            return self._buffered_next(next_index)
         return tuple(
             fn(data[next_index]) if fn else data[next_index]
             for data, fn in safe_izip(self._raw_data, self._convert)
         )
 
+    def _buffered_next(self, next_index):
+        """
+        Fancy-indexes the raw data into the next set of preallocated
+        batch buffers using `np.take`.
+        """
+        if self._buffers is None:
+            self._buffers = [[None] * len(self._raw_data)
+                             for _ in xrange(self._batch_buffers)]
+        buffers = self._buffers[self._buffer_idx]
+        self._buffer_idx = (self._buffer_idx + 1) % self._batch_buffers
+
+        next_index = np.asarray(next_index)
+        num_examples = next_index.shape[0]
+        rval = []
+        for i, (data, fn) in enumerate(safe_izip(self._raw_data,
+                                                 self._convert)):
+            if isinstance(data, np.ndarray):
+                buf = buffers[i]
+                if buf is None or buf.shape[0] < num_examples:
+                    size = max(num_examples, self.batch_size or 0)
+                    buf = np.empty((size,) + data.shape[1:], dtype=data.dtype)
+                    buffers[i] = buf
+                # The indices come from the subset iterator and are known
+                # to be in range. mode='raise' would make np.take go
+                # through an intermediate buffer, defeating the purpose.
+                batch = np.take(data, next_index, axis=0,
+                                out=buf[:num_examples], mode='clip')
+            else:
+                batch = data[next_index]
+            rval.append(fn(batch) if fn else batch)
+        return tuple(rval)
+
     def __next__(self):
         return self.next()
 
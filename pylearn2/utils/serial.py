@@ -7,6 +7,7 @@ try:
     from cPickle import BadPickleGet
 except ImportError:
     BadPickleGet = KeyError
+import copy
 import pickle
 import logging
 import numpy as np
@@ -16,6 +17,7 @@ import os
 import time
 import warnings
 import sys
+import threading
 from pylearn2.utils.string_utils import preprocess
 from pylearn2.utils.mem import improve_memory_error_message
 io = None
@@ -24,9 +26,24 @@ import struct
 from pylearn2.utils.exc import reraise_as
 from pylearn2.utils.string_utils import match
 import shutil
+import tempfile
 
 logger = logging.getLogger(__name__)
 
+# Suffix of the array-aware serialization format: a directory holding a
+# pickle of the object graph and one .npy file per large array.
+ARRAY_PICKLE_SUFFIX = '.pkld'
+# Arrays smaller than this (in bytes) are kept in the pickle itself.
+ARRAY_PICKLE_MIN_NBYTES = 1024
+
+
+class ArrayPickleError(ValueError):
+    """
+    Raised by `load` when a directory with the `ARRAY_PICKLE_SUFFIX`
+    suffix is not in that format, or is corrupt. As these directories are
+    only replaced by renaming complete ones, this is not retried.
+    """
+
 
 def raise_cannot_open(path):
     """
@@ -65,7 +82,7 @@ def raise_cannot_open(path):
     assert False
 
 
-def load(filepath, recurse_depth=0, retry=True):
+def load(filepath, recurse_depth=0, retry=True, mmap_mode=None):
     """
     Loads object(s) from file specified by 'filepath'.
 
@@ -77,7 +94,9 @@ def load(filepath, recurse_depth=0, retry=True):
     ----------
     filepath : str
         A path to a file to load. Should be a pickle, Matlab, or NumPy
-        file; or a .txt or .amat file that numpy.loadtxt can load.
+        file; or a .txt or .amat file that numpy.loadtxt can load; or a
+        directory written by `save` with the `ARRAY_PICKLE_SUFFIX`
+        suffix.
     recurse_depth : int, optional
         End users should not use this argument. It is used by the function
         itself to implement the `retry` option recursively.
@@ -89,6 +108,15 @@ def load(filepath, recurse_depth=0, retry=True):
         training script writes at the same time show_weights tries to
         read, but if you try again after a few seconds you should be able
         to open the file.
+    mmap_mode : str, optional
+        If given (e.g. 'r'), .npy files are memory-mapped with this mode
+        instead of being read into memory. This also applies to the
+        arrays of the `ARRAY_PICKLE_SUFFIX` format, which are then loaded
+        lazily, and to the arrays that datasets unpickled from `filepath`
+        load from separate .npy files (see
+        `DenseDesignMatrix.use_design_loc`). Use 'c' (copy-on-write) if
+        the arrays may be modified in place. See the `numpy.load`
+        docstring for details.
 
     Returns
     -------
@@ -104,7 +132,7 @@ def load(filepath, recurse_depth=0, retry=True):
         filepath = preprocess(filepath)
 
     if filepath.endswith('.npy') or filepath.endswith('.npz'):
-        return np.load(filepath)
+        return np.load(filepath, mmap_mode=mmap_mode)
 
     if filepath.endswith('.amat') or filepath.endswith('txt'):
         try:
@@ -147,10 +175,15 @@ def load(filepath, recurse_depth=0, retry=True):
             nsec = 0.5 * (2.0 ** float(recurse_depth))
             logger.info("Waiting {0} seconds and trying again".format(nsec))
             time.sleep(nsec)
-            return load(filepath, recurse_depth + 1, retry)
+            return load(filepath, recurse_depth + 1, retry, mmap_mode)
 
+    # Delay import to avoid circular imports
+    from pylearn2.datasets import control
+    control.push_mmap_mode(mmap_mode)
     try:
-        if not joblib_available:
+        if filepath.endswith(ARRAY_PICKLE_SUFFIX):
+            obj = _load_array_pickle(filepath, mmap_mode, encoding)
+        elif not joblib_available:
             with open(filepath, 'rb') as f:
                 obj = cPickle.load(f, **encoding)
         else:
@@ -178,6 +211,9 @@ def load(filepath, recurse_depth=0, retry=True):
             improve_memory_error_message(e, 
                 "You do not have enough memory to open %s" % filepath)
 
+    except ArrayPickleError:
+        # Not a partially written file: retrying would not help
+        raise
     except (BadPickleGet, EOFError, KeyError) as e:
         if not retry:
             reraise_as(e.__class__('Failed to open {0}'.format(filepath)))
@@ -191,6 +227,8 @@ def load(filepath, recurse_depth=0, retry=True):
     except Exception:
         #assert False
         reraise_as("Couldn't open {0}".format(filepath))
+    finally:
+        control.pop_mmap_mode()
 
     #if the object has no yaml_src, we give it one that just says it
     #came from this file. could cause trouble if you save obj again
@@ -210,12 +248,18 @@ def save(filepath, obj, on_overwrite = 'ignore'):
     Parameters
     ----------
     filepath : str
-        A filename. If the suffix is `.joblib` and joblib can be
-        imported, `joblib.dump` is used in place of the regular
-        pickling mechanisms; this results in much faster saves by
-        saving arrays as separate .npy files on disk. If the file
-        suffix is `.npy` than `numpy.save` is attempted on `obj`.
-        Otherwise, (c)pickle is used.
+        A filename. If the suffix is `ARRAY_PICKLE_SUFFIX` ('.pkld'),
+        `filepath` is written as a directory holding a pickle of the
+        object graph in which every large array (e.g. the values of
+        the shared variables of a model) is replaced by a reference to
+        a separate .npy file; this is much faster and uses much less
+        memory than pickling the arrays, and allows memory-mapping them
+        with `load(filepath, mmap_mode=...)`. If the suffix is `.joblib`
+        and joblib can be imported, `joblib.dump` is used in place of
+        the regular pickling mechanisms; this also saves arrays as
+        separate .npy files on disk. If the file suffix is `.npy` than
+        `numpy.save` is attempted on `obj`. Otherwise, (c)pickle is
+        used.
 
     obj : object
         A Python object to be serialized.
@@ -238,7 +282,10 @@ def save(filepath, obj, on_overwrite = 'ignore'):
             shutil.move(filepath, backup)
             save(filepath, obj)
             try:
-                os.remove(backup)
+                if os.path.isdir(backup):
+                    shutil.rmtree(backup)
+                else:
+                    os.remove(backup)
             except Exception as e:
                 warnings.warn("Got an error while traing to remove "+backup+":"+str(e))
             return
@@ -307,6 +354,9 @@ def _save(filepath, obj):
     if filepath.endswith('.npy'):
         np.save(filepath, obj)
         return
+    if filepath.endswith(ARRAY_PICKLE_SUFFIX):
+        _save_array_pickle(filepath, obj)
+        return
     # This is dumb
     # assert filepath.endswith('.pkl')
     save_dir = os.path.dirname(filepath)
@@ -371,6 +421,232 @@ def _save(filepath, obj):
                        ' is really big?)'.format(filepath, e))
 
 
+def _is_separable_array(obj):
+    """
+    Returns True if `obj` is an array that the `ARRAY_PICKLE_SUFFIX`
+    format stores in its own .npy file.
+    """
+    return (type(obj) in (np.ndarray, np.memmap) and
+            not obj.dtype.hasobject and
+            obj.nbytes >= ARRAY_PICKLE_MIN_NBYTES)
+
+
+def _save_array_pickle(filepath, obj):
+    """
+    Saves `obj` in the `ARRAY_PICKLE_SUFFIX` format.
+
+    The directory `filepath` contains `object.pkl`, a pickle of `obj` in
+    which large arrays are replaced by persistent ids, and `arrays/`,
+    holding the .npy file of each of them. The directory is written
+    under a temporary name unique to the call and then renamed, so that
+    an interrupted save never leaves a partially written `filepath`
+    behind and concurrent saves of the same `filepath` do not write into
+    each other's files.
+
+    Parameters
+    ----------
+    filepath : str
+        The directory to write.
+    obj : object
+        The object to serialize.
+    """
+    save_dir, basename = os.path.split(os.path.abspath(filepath))
+    if not os.path.isdir(save_dir):
+        os.makedirs(save_dir)
+    tmp_path = tempfile.mkdtemp(prefix='.' + basename + '.tmp', dir=save_dir)
+    try:
+        _write_array_pickle(tmp_path, obj)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    if os.path.exists(filepath):
+        # tmp_path is unique, so is the name the old version is moved to
+        old_path = tmp_path + '.old'
+        os.rename(filepath, old_path)
+        os.rename(tmp_path, filepath)
+        shutil.rmtree(old_path)
+    else:
+        os.rename(tmp_path, filepath)
+
+
+def _write_array_pickle(tmp_path, obj):
+    """
+    Writes the files of `_save_array_pickle` in the directory `tmp_path`.
+
+    Parameters
+    ----------
+    tmp_path : str
+        The existing directory to write in.
+    obj : object
+        The object to serialize.
+    """
+    os.mkdir(os.path.join(tmp_path, 'arrays'))
+
+    # Arrays that appear several times in the graph are pickled by
+    # reference to the same file.
+    saved = {}
+
+    def persistent_id(candidate):
+        if not _is_separable_array(candidate):
+            return None
+        key = id(candidate)
+        if key not in saved:
+            name = '%d.npy' % len(saved)
+            np.save(os.path.join(tmp_path, 'arrays', name), candidate)
+            # Keep a reference so that the id is not reused
+            saved[key] = (name, candidate)
+        return 'ndarray:' + saved[key][0]
+
+    with open(os.path.join(tmp_path, 'object.pkl'), 'wb') as f:
+        pickler = cPickle.Pickler(f, get_pickle_protocol())
+        pickler.persistent_id = persistent_id
+        pickler.dump(obj)
+
+
+def _load_array_pickle(filepath, mmap_mode=None, encoding=None):
+    """
+    Loads an object saved in the `ARRAY_PICKLE_SUFFIX` format.
+
+    Parameters
+    ----------
+    filepath : str
+        The directory to read.
+    mmap_mode : str, optional
+        If given, the arrays are memory-mapped with this mode rather than
+        read into memory.
+    encoding : dict, optional
+        Keyword arguments for the unpickler (used to load Python 2
+        pickles with Python 3).
+
+    Returns
+    -------
+    obj : object
+        The deserialized object.
+    """
+    if not os.path.isdir(filepath):
+        raise_cannot_open(os.path.join(filepath, 'object.pkl'))
+    arrays_dir = os.path.join(filepath, 'arrays')
+    loaded = {}
+
+    def persistent_load(pid):
+        kind, name = pid.split(':', 1)
+        if kind != 'ndarray':
+            raise ArrayPickleError("Unknown persistent id %s in %s" %
+                                   (pid, filepath))
+        if name not in loaded:
+            loaded[name] = np.load(os.path.join(arrays_dir, name),
+                                   mmap_mode=mmap_mode)
+        return loaded[name]
+
+    try:
+        with open(os.path.join(filepath, 'object.pkl'), 'rb') as f:
+            unpickler = cPickle.Unpickler(f, **(encoding or {}))
+            unpickler.persistent_load = persistent_load
+            return unpickler.load()
+    except (ArrayPickleError, MemoryError):
+        raise
+    except Exception:
+        reraise_as(ArrayPickleError("%s is not a valid %s directory." %
+                                    (filepath, ARRAY_PICKLE_SUFFIX)))
+
+
+class AsyncSaver(object):
+    """
+    Saves objects with `save` in a background thread.
+
+    Each call to `save` takes a snapshot of the object on the calling
+    thread (with `copy.deepcopy`, which goes through the same
+    `__getstate__` methods as pickling and hence copies the parameter
+    values but not the compiled Theano functions). The snapshot is then
+    serialized by a writer thread to a temporary file in the same
+    directory, which is atomically renamed to the requested path. At most
+    one write is pending at any time: `save` first waits for the previous
+    write to finish.
+
+    Errors raised by the writer are re-raised by the next call to `save`
+    or `wait`.
+    """
+
+    def __init__(self):
+        self._thread = None
+        self._exc_info = None
+
+    def save(self, filepath, obj, snapshot=True):
+        """
+        Starts saving `obj` to `filepath`.
+
+        Parameters
+        ----------
+        filepath : str
+            The destination. The suffix selects the format as in `save`.
+            An existing file (or `ARRAY_PICKLE_SUFFIX` directory) is only
+            replaced once the new one is completely written.
+        obj : object
+            The object to save.
+        snapshot : bool, optional
+            If True (default), `obj` is deep-copied before returning, so
+            the caller may keep modifying it. Pass False if `obj` is
+            already a private copy.
+        """
+        self.wait()
+        filepath = preprocess(filepath)
+        if snapshot:
+            obj = copy.deepcopy(obj)
+        # Not a daemon thread: the interpreter waits for the checkpoint to be
+        # written before exiting.
+        self._thread = threading.Thread(target=self._write,
+                                        args=(filepath, obj))
+        self._thread.start()
+
+    def wait(self):
+        """
+        Blocks until the pending write, if any, is finished and re-raises
+        the error it encountered, if any.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._exc_info is not None:
+            exc_info = self._exc_info
+            self._exc_info = None
+            six.reraise(*exc_info)
+
+    @property
+    def pending(self):
+        """
+        True if a write is in progress.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def _write(self, filepath, obj):
+        """
+        Body of the writer thread.
+        """
+        directory, basename = os.path.split(filepath)
+        # Keep the suffix, it selects the serialization format
+        tmp_path = os.path.join(directory, '.tmp-' + basename)
+        try:
+            save(tmp_path, obj)
+            if os.path.isdir(filepath):
+                old_path = os.path.join(directory, '.old-' + basename)
+                if os.path.exists(old_path):
+                    shutil.rmtree(old_path)
+                os.rename(filepath, old_path)
+                os.rename(tmp_path, filepath)
+                shutil.rmtree(old_path)
+            else:
+                os.rename(tmp_path, filepath)
+        except Exception:
+            logger.exception('Failed to save to {0}'.format(filepath))
+            self._exc_info = sys.exc_info()
+            # Don't leave a partially written checkpoint behind
+            if os.path.isdir(tmp_path):
+                shutil.rmtree(tmp_path, ignore_errors=True)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
 def clone_via_serialize(obj):
     """
     .. todo::
@@ -482,7 +758,7 @@ def read_bin_lush_matrix(filepath):
 
     return rval
 
-def load_train_file(config_file_path, environ=None):
+def load_train_file(config_file_path, environ=None, timings=None):
     """
     Loads and parses a yaml file for a Train object.
     Publishes the relevant training environment variables
@@ -497,6 +773,9 @@ def load_train_file(config_file_path, environ=None):
         environment variables when parsing the YAML file. If a key appears
         both in `os.environ` and this dictionary, the value in this
         dictionary is used.
+    timings : dict, optional
+        Receives the time spent importing, parsing and instantiating.
+        See `pylearn2.config.yaml_parse.load`.
 
 
     Returns
@@ -523,4 +802,5 @@ def load_train_file(config_file_path, environ=None):
     os.environ["PYLEARN2_TRAIN_BASE_NAME"] = config_file_path.split('/')[-1]
     os.environ["PYLEARN2_TRAIN_FILE_STEM"] = config_file_full_stem.split('/')[-1]
 
-    return yaml_parse.load_path(config_file_path, environ=environ)
+    return yaml_parse.load_path(config_file_path, environ=environ,
+                                timings=timings)
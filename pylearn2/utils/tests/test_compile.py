@@ -1,9 +1,16 @@
 """Tests for compilation utilities."""
+import glob
+import os
+import shutil
+import tempfile
+
+import numpy as np
 import theano
 import pickle
 
+from pylearn2.utils import sharedX
 from pylearn2.utils.compile import (
-    compiled_theano_function, HasCompiledFunctions
+    compiled_theano_function, HasCompiledFunctions, FunctionCache
 )
 
 
@@ -32,3 +39,34 @@ def test_pickling():
     assert not hasattr(b, '_compiled_functions')
     assert abs(b.func() - Dummy.const) < 1e-6
     assert not (a.func is b.func)
+
+
+def test_function_cache():
+    """
+    Tests that a function loaded from the cache acts on the shared
+    variables of the new graph.
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        cache = FunctionCache(cache_dir)
+
+        def build(value):
+            W = sharedX(np.ones(3) * value)
+            x = theano.tensor.vector(dtype=W.dtype)
+            f = cache.function([x], (x * W).sum(), updates={W: 2 * W},
+                               name='f')
+            return W, f
+
+        W1, f1 = build(1.)
+        assert len(glob.glob(os.path.join(cache_dir, '*.pkl'))) == 1
+        W2, f2 = build(3.)
+        assert len(glob.glob(os.path.join(cache_dir, '*.pkl'))) == 1
+        x = np.ones(3, dtype=W2.dtype)
+        assert np.allclose(f2(x), 9.)
+        assert np.allclose(W2.get_value(), 6.)
+        assert np.allclose(W1.get_value(), 1.)
+
+        cache.evict(0)
+        assert len(glob.glob(os.path.join(cache_dir, '*.pkl'))) == 0
+    finally:
+        shutil.rmtree(cache_dir)
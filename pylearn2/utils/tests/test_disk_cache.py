@@ -0,0 +1,127 @@
+"""
+Tests for pylearn2.utils.disk_cache
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from pylearn2.utils.disk_cache import (evict_lru, file_lock, hash_update,
+                                       Uncacheable)
+
+
+def _digest(obj):
+    """
+    Returns the digest of `obj` by `hash_update`.
+    """
+    h = hashlib.sha1()
+    hash_update(h, obj)
+    return h.hexdigest()
+
+
+class _Slotted(object):
+    """
+    A class without __dict__.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _adder(n):
+    """
+    Returns a closure adding `n`.
+    """
+    def add(x):
+        return x + n
+    return add
+
+
+def test_hash_update_distinct():
+    """
+    Checks that objects without __dict__ and functions which differ only
+    in their state get different digests.
+    """
+    pairs = [(np.dtype('float32'), np.dtype('float64')),
+             (np.dtype([('a', 'f4')]), np.dtype([('b', 'i4')])),
+             (set([1, 2]), set([1, 3])),
+             (frozenset(['a']), frozenset(['b'])),
+             (_Slotted(1), _Slotted(2)),
+             (lambda x: x + 1, lambda x: x * 2),
+             (_adder(1), _adder(2)),
+             (slice(0, 10), slice(0, 20)),
+             (np.sqrt, np.exp),
+             (int, float),
+             (1.0, np.float32(1.0))]
+    for a, b in pairs:
+        assert _digest(a) != _digest(b), (a, b)
+
+
+def test_hash_update_stable():
+    """
+    Checks that equal objects built separately get the same digest.
+    """
+    assert _digest(set('abcdef')) == _digest(set('fedcba'))
+    assert _digest(_adder(1)) == _digest(_adder(1))
+    assert _digest(_Slotted([1, 2])) == _digest(_Slotted([1, 2]))
+
+
+def test_hash_update_uncacheable():
+    """
+    Checks that objects whose state cannot be hashed raise Uncacheable.
+    """
+    for obj in [threading.Lock(), {'lock': threading.Lock()}]:
+        try:
+            _digest(obj)
+        except Uncacheable:
+            pass
+        else:
+            raise AssertionError("%r was hashed" % obj)
+
+
+def test_file_lock():
+    """
+    Checks that the lock file is created and the lock can be taken
+    again once released.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'entry.lock')
+        with file_lock(path):
+            assert os.path.exists(path)
+        with file_lock(path):
+            pass
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_evict_lru():
+    """
+    Checks that the least recently used entries are removed first, and
+    that entries kept by `remove` do not count as freed.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        paths = []
+        for i in range(4):
+            path = os.path.join(tmpdir, str(i))
+            with open(path, 'wb') as f:
+                f.write(b'x' * 10)
+            # entry 0 is the least recently used
+            os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+            paths.append(path)
+
+        def remove(path):
+            if path == paths[0]:
+                return False
+            os.remove(path)
+
+        evict_lru(paths, 25, remove)
+        assert sorted(os.listdir(tmpdir)) == ['0', '3']
+    finally:
+        shutil.rmtree(tmpdir)
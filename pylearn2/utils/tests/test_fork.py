@@ -0,0 +1,43 @@
+"""
+Tests for pylearn2.utils.fork
+"""
+import sys
+
+from nose.plugins.skip import SkipTest
+
+from pylearn2.utils.fork import ForkedState, fork_pool
+
+
+_state = ForkedState()
+
+
+def _lookup(key):
+    """
+    Task calling a function of the inherited state.
+    """
+    return _state.value[key]()
+
+
+def test_forked_state():
+    """
+    Checks that the processes of a pool inherit the bound value, and
+    that it is unbound afterwards.
+    """
+    if sys.platform == 'win32':
+        raise SkipTest()
+    # A lambda is not picklable, so it can only reach the processes by
+    # being inherited
+    value = dict((i, lambda i=i: i) for i in range(4))
+    with _state.bind(value):
+        pool = fork_pool(2)
+        try:
+            results = pool.map(_lookup, range(4))
+        except Exception:
+            pool.terminate()
+            raise
+        else:
+            pool.close()
+        finally:
+            pool.join()
+    assert _state.value is None
+    assert results == list(range(4))
@@ -1,6 +1,8 @@
 """Tests for iterators."""
 from __future__ import print_function
 
+import gc
+import time
 from nose.tools import assert_raises
 import numpy as np
 import theano
@@ -13,8 +15,11 @@ from pylearn2.utils.iteration import (
     RandomSliceSubsetIterator,
     RandomUniformSubsetIterator,
     BatchwiseShuffledSequentialIterator,
+    ChunkShuffledSubsetIterator,
     as_even,
     EvenSequencesSubsetIterator,
+    BucketedSequencesSubsetIterator,
+    FiniteDatasetIterator,
 )
 
 
@@ -252,3 +257,258 @@ def test_determinism_even_sequences():
         for i in ind_list:
             visited2[i] = b_ind
     assert np.all(np.asarray(visited1) == np.asarray(visited2))
+
+
+def test_bucketed_sequences():
+    """
+    Check that BucketedSequencesSubsetIterator visits every sequence once
+    per epoch, in full batches of sequences from the same bucket or
+    sorted window.
+    """
+    rng = np.random.RandomState(123)
+    lengths = rng.randint(1, 30, 101)
+    data = [['w'] * l for l in lengths]
+    boundaries = [5, 10, 20]
+
+    my_iter = BucketedSequencesSubsetIterator(data, 8, rng=0,
+                                              boundaries=boundaries)
+    for epoch in range(2):
+        batches = list(my_iter)
+        assert len(batches) == my_iter.num_batches
+        visited = np.concatenate(batches)
+        assert np.array_equal(np.sort(visited), np.arange(len(data)))
+        for batch in batches:
+            buckets = np.searchsorted(boundaries, lengths[batch])
+            assert np.all(buckets == buckets[0])
+        # only the last batch of each bucket is not full
+        assert sum(len(batch) < 8 for batch in batches) <= 4
+
+    my_iter = BucketedSequencesSubsetIterator(data, 8, rng=0, sort_window=4)
+    batches = list(my_iter)
+    assert np.array_equal(np.sort(np.concatenate(batches)),
+                          np.arange(len(data)))
+    # windows of sorted sequences waste less padding than random batches
+    padding = sum(lengths[batch].max() * len(batch) - lengths[batch].sum()
+                  for batch in batches)
+    random_batches = np.array_split(rng.permutation(len(data)),
+                                    len(batches))
+    random_padding = sum(lengths[batch].max() * len(batch) -
+                         lengths[batch].sum() for batch in random_batches)
+    assert padding < random_padding / 2
+
+    assert_raises(ValueError, BucketedSequencesSubsetIterator, data, 8,
+                  boundaries=[5, 5])
+    assert_raises(ValueError, BucketedSequencesSubsetIterator, data, 8,
+                  num_batches=3)
+
+def test_prefetch_matches_synchronous():
+    """
+    Check that a prefetching FiniteDatasetIterator returns the same
+    sequence of batches as a synchronous one and then stops.
+    """
+    X = np.random.rand(23, 4).astype(theano.config.floatX)
+    y = np.random.rand(23, 2).astype(theano.config.floatX)
+    dataset = DenseDesignMatrix(X=X, y=y)
+    data_specs = (dataset.get_data_specs()[0], ('features', 'targets'))
+
+    def batches(prefetch):
+        return list(dataset.iterator(mode='shuffled_sequential',
+                                     batch_size=5,
+                                     data_specs=data_specs,
+                                     rng=1234,
+                                     prefetch=prefetch))
+
+    expected = batches(None)
+    prefetched = batches(2)
+    assert len(expected) == len(prefetched) == 5
+    for (X1, y1), (X2, y2) in zip(expected, prefetched):
+        assert np.all(X1 == X2)
+        assert np.all(y1 == y2)
+
+
+def test_prefetch_errors_and_close():
+    """
+    Check that errors raised in the prefetching thread are re-raised
+    by next() and that close() stops an unfinished iterator.
+    """
+    dataset = DenseDesignMatrix(
+        X=np.random.rand(20, 3).astype(theano.config.floatX))
+
+    def fail(batch):
+        raise RuntimeError("conversion failed")
+
+    iterator = FiniteDatasetIterator(dataset,
+                                     SequentialSubsetIterator(20, 5, None),
+                                     data_specs=(VectorSpace(3), 'features'),
+                                     convert=[fail],
+                                     prefetch=1)
+    assert_raises(RuntimeError, iterator.next)
+    assert_raises(StopIteration, iterator.next)
+
+    iterator = dataset.iterator(mode='sequential', batch_size=2, prefetch=1)
+    iterator.next()
+    iterator.close()
+    assert_raises(StopIteration, iterator.next)
+
+    # An abandoned iterator stops its thread when it is collected
+    iterator = dataset.iterator(mode='sequential', batch_size=2, prefetch=1)
+    iterator.next()
+    thread = iterator._prefetch_thread
+    del iterator
+    gc.collect()
+    thread.join(5.)
+    assert not thread.is_alive()
+
+    # Including when its thread is waiting to queue an error, whose
+    # traceback must not keep the iterator alive
+    calls = []
+
+    def fail_third(batch):
+        calls.append(batch)
+        if len(calls) == 3:
+            raise RuntimeError("conversion failed")
+        return batch
+
+    iterator = FiniteDatasetIterator(dataset,
+                                     SequentialSubsetIterator(20, 5, None),
+                                     data_specs=(VectorSpace(3), 'features'),
+                                     convert=[fail_third],
+                                     prefetch=1)
+    iterator.next()
+    thread = iterator._prefetch_thread
+    while len(calls) < 3:
+        time.sleep(.01)
+    # Let the thread reach the full queue
+    time.sleep(.1)
+    del iterator
+    gc.collect()
+    thread.join(5.)
+    assert not thread.is_alive()
+
+
+def test_batch_buffers():
+    """
+    Check that iterating with preallocated batch buffers returns the
+    same batches as fancy indexing and cycles through the buffers.
+    """
+    X = np.random.rand(23, 4).astype(theano.config.floatX)
+    dataset = DenseDesignMatrix(X=X)
+
+    def make_iterator(batch_buffers):
+        return dataset.iterator(mode='shuffled_sequential', batch_size=5,
+                                rng=1234, batch_buffers=batch_buffers)
+
+    expected = list(make_iterator(None))
+    iterator = make_iterator(2)
+    previous = None
+    for i, batch in enumerate(iterator):
+        assert np.all(batch == expected[i])
+        if previous is not None:
+            # double buffering: the previous batch is still valid
+            assert np.all(previous == expected[i - 1])
+            assert not np.may_share_memory(batch, previous)
+        previous = batch
+    assert i == len(expected) - 1
+
+    assert_raises(ValueError, dataset.iterator, mode='shuffled_sequential',
+                  batch_size=5, prefetch=1, batch_buffers=2)
+
+
+def test_chunk_shuffled():
+    """
+    Check that ChunkShuffledSubsetIterator visits every example once and
+    that each batch only touches the chunks of at most two windows.
+    """
+    chunk_size = 10
+    window_chunks = 3
+    iterator = ChunkShuffledSubsetIterator(dataset_size=205, batch_size=16,
+                                           num_batches=None, rng=3,
+                                           chunk_size=chunk_size,
+                                           window_chunks=window_chunks)
+    visited = []
+    for idxs in iterator:
+        assert len(np.unique(idxs // chunk_size)) <= 2 * window_chunks
+        visited.extend(idxs)
+    assert sorted(visited) == list(range(205))
+
+
+def test_subset_iterator_state():
+    """
+    Check that an iterator restored from get_state returns the batches
+    that followed the call to get_state, even with a different seed.
+    """
+    def indices(batch):
+        if isinstance(batch, slice):
+            return list(range(batch.start, batch.stop))
+        return list(batch)
+
+    classes = [SequentialSubsetIterator,
+               ShuffledSequentialSubsetIterator,
+               RandomSliceSubsetIterator,
+               RandomUniformSubsetIterator,
+               BatchwiseShuffledSequentialIterator,
+               ChunkShuffledSubsetIterator,
+               as_even(ShuffledSequentialSubsetIterator)]
+    for cls in classes:
+        def make(seed):
+            rng = None if cls is SequentialSubsetIterator else seed
+            return cls(dataset_size=23, batch_size=5, num_batches=4, rng=rng)
+
+        iterator = make(1)
+        for i in range(2):
+            iterator.next()
+        state = iterator.get_state()
+        expected = [indices(batch) for batch in iterator]
+
+        restored = make(2)
+        restored.set_state(state)
+        assert [indices(batch) for batch in restored] == expected, cls
+
+    sequence_data = [[0] * (i % 3 + 1) for i in range(17)]
+    iterator = EvenSequencesSubsetIterator(sequence_data, batch_size=2,
+                                           rng=1)
+    iterator.next()
+    state = iterator.get_state()
+    expected = [list(batch) for batch in iterator]
+    restored = EvenSequencesSubsetIterator(sequence_data, batch_size=2,
+                                           rng=2)
+    restored.set_state(state)
+    assert [list(batch) for batch in restored] == expected
+
+    iterator = BucketedSequencesSubsetIterator(sequence_data, batch_size=2,
+                                               rng=1, sort_window=2)
+    iterator.next()
+    state = iterator.get_state()
+    expected = [list(batch) for batch in iterator]
+    restored = BucketedSequencesSubsetIterator(sequence_data, batch_size=2,
+                                               rng=2, sort_window=2)
+    restored.set_state(state)
+    assert [list(batch) for batch in restored] == expected
+
+
+def test_finite_dataset_iterator_state():
+    """
+    Check that a FiniteDatasetIterator restored from get_state resumes
+    from the right batch, including when prefetching.
+    """
+    X = np.random.rand(23, 4).astype(theano.config.floatX)
+    dataset = DenseDesignMatrix(X=X)
+
+    for prefetch in [None, 3]:
+        iterator = dataset.iterator(mode='shuffled_sequential',
+                                    batch_size=5, rng=1234,
+                                    prefetch=prefetch)
+        iterator.next()
+        iterator.next()
+        state = iterator.get_state()
+        expected = list(iterator)
+
+        restored = dataset.iterator(mode='shuffled_sequential',
+                                    batch_size=5, rng=0,
+                                    prefetch=prefetch)
+        restored.set_state(state)
+        resumed = list(restored)
+        assert len(resumed) == len(expected) == 3
+        for X1, X2 in zip(expected, resumed):
+            assert np.all(X1 == X2)
+        assert_raises(ValueError, restored.set_state, state)
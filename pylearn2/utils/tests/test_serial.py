@@ -1,10 +1,17 @@
 """
 Tests for the pylearn2.utils.serial module. Currently only tests
-read_bin_lush_matrix and load_train_file methods.
+read_bin_lush_matrix, load_train_file, the array-aware serialization
+format and AsyncSaver.
 """
-from theano.compat.six.moves import xrange
+import os
+import shutil
+import tempfile
+from nose.tools import assert_raises
+from theano.compat.six.moves import cPickle, xrange
 import pylearn2
 from pylearn2.utils.serial import read_bin_lush_matrix, load_train_file
+from pylearn2.utils.serial import load, save, ARRAY_PICKLE_SUFFIX
+from pylearn2.utils.serial import AsyncSaver, ArrayPickleError
 import numpy as np
 
 pylearn2_path = pylearn2.__path__[0]
@@ -135,3 +142,86 @@ def test_load_train_file():
     }
     load_train_file(yaml_path + 'test_model.yaml')
     load_train_file(yaml_path + 'test_model.yaml', environ=environ)
+
+
+def test_array_pickle_format():
+    """
+    Save and load an object with the array-aware serialization format,
+    checking that large arrays are stored separately, that arrays shared
+    in the object graph stay shared and that they can be memory-mapped.
+    """
+    W = np.random.RandomState(0).rand(50, 40)
+    b = np.zeros(3)
+    obj = {'W': W, 'W_alias': W, 'b': b, 'name': 'model'}
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'model' + ARRAY_PICKLE_SUFFIX)
+        save(path, obj)
+        # saving again replaces the previous checkpoint
+        save(path, obj)
+        assert len(os.listdir(os.path.join(path, 'arrays'))) == 1
+        assert sorted(os.listdir(tmpdir)) == ['model' + ARRAY_PICKLE_SUFFIX]
+
+        loaded = load(path)
+        assert np.all(loaded['W'] == W)
+        assert loaded['W'] is loaded['W_alias']
+        assert np.all(loaded['b'] == b)
+        assert loaded['name'] == 'model'
+
+        loaded = load(path, mmap_mode='r')
+        assert isinstance(loaded['W'], np.memmap)
+        assert np.all(loaded['W'] == W)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_array_pickle_format_errors():
+    """
+    Check that loading a corrupt or foreign directory with the
+    array-aware suffix fails at once, instead of being retried.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'model' + ARRAY_PICKLE_SUFFIX)
+        os.makedirs(os.path.join(path, 'arrays'))
+        with open(os.path.join(path, 'object.pkl'), 'wb') as f:
+            pickler = cPickle.Pickler(f, 2)
+            pickler.persistent_id = lambda obj: (
+                'table:0' if isinstance(obj, set) else None)
+            pickler.dump({'rows': set()})
+        assert_raises(ArrayPickleError, load, path)
+
+        with open(os.path.join(path, 'object.pkl'), 'wb') as f:
+            f.write(b'not a pickle')
+        assert_raises(ArrayPickleError, load, path)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_async_saver():
+    """
+    Check that AsyncSaver writes a snapshot of the object taken when save
+    is called, and that writer errors are re-raised by wait().
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'obj.pkl')
+        saver = AsyncSaver()
+        obj = {'W': np.zeros(10)}
+        saver.save(path, obj)
+        # modifying the object after save() does not affect the checkpoint
+        obj['W'] += 1
+        saver.save(path, obj)
+        obj['W'] += 1
+        saver.wait()
+        assert not saver.pending
+        assert np.all(load(path)['W'] == 1)
+        assert os.listdir(tmpdir) == ['obj.pkl']
+
+        # lambdas can be deep-copied but not pickled
+        saver.save(os.path.join(tmpdir, 'bad.pkl'), {'f': lambda x: x})
+        assert_raises(Exception, saver.wait)
+        # the error is only reported once
+        saver.wait()
+    finally:
+        shutil.rmtree(tmpdir)
@@ -1,6 +1,12 @@
 from __future__ import print_function
 
+import os
+import shutil
+import tempfile
 import warnings
+from distutils.ccompiler import new_compiler
+from distutils.errors import CompileError, LinkError
+from distutils.sysconfig import customize_compiler
 from setuptools import setup, find_packages, Extension
 from setuptools.command.install import install
 import numpy
@@ -15,20 +21,60 @@ try:
     from Cython.Distutils import build_ext
     cython_available = True
 except ImportError:
-    warnings.warn("Cython was not found and hence pylearn2.utils._window_flip "
-                  "and pylearn2.utils._video and classes that depend on them "
+    warnings.warn("Cython was not found and hence "
+                  "pylearn2.utils._window_flip, pylearn2.utils._video, "
+                  "pylearn2.models._kmeans and classes that depend on them "
                   "(e.g. pylearn2.train_extensions.window_flip) will not be "
                   "available")
     cython_available = False
 
+
+def openmp_flags():
+    """
+    Returns the compile and link arguments that enable OpenMP, or empty
+    lists (i.e. a serial build) if the C compiler does not support it or
+    if the PYLEARN2_NO_OPENMP environment variable is set.
+    """
+    if os.environ.get('PYLEARN2_NO_OPENMP'):
+        return [], []
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    if compiler.compiler_type == 'msvc':
+        return ['/openmp'], []
+    tmpdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(tmpdir, 'openmp_test.c')
+        with open(source, 'w') as f:
+            f.write("#include <omp.h>\n"
+                    "int main(void) { return omp_get_max_threads() < 1; }\n")
+        objects = compiler.compile([source], output_dir=tmpdir,
+                                   extra_postargs=['-fopenmp'])
+        compiler.link_executable(objects,
+                                 os.path.join(tmpdir, 'openmp_test'),
+                                 extra_postargs=['-fopenmp'])
+    except (CompileError, LinkError):
+        warnings.warn("The C compiler does not support OpenMP, "
+                      "pylearn2.models._kmeans will not be parallelized.")
+        return [], []
+    finally:
+        shutil.rmtree(tmpdir)
+    return ['-fopenmp'], ['-fopenmp']
+
+
 if cython_available:
     cmdclass = {'build_ext': build_ext}
+    openmp_compile_args, openmp_link_args = openmp_flags()
     ext_modules = [Extension("pylearn2.utils._window_flip",
                              ["pylearn2/utils/_window_flip.pyx"],
                              include_dirs=[numpy.get_include()]),
                    Extension("pylearn2.utils._video",
                              ["pylearn2/utils/_video.pyx"],
-                             include_dirs=[numpy.get_include()])]
+                             include_dirs=[numpy.get_include()]),
+                   Extension("pylearn2.models._kmeans",
+                             ["pylearn2/models/_kmeans.pyx"],
+                             include_dirs=[numpy.get_include()],
+                             extra_compile_args=openmp_compile_args,
+                             extra_link_args=openmp_link_args)]
 else:
     cmdclass = {}
     ext_modules = []